@@ -20,9 +20,10 @@ from flask_cors import CORS
 from models import db
 from config import Config
 from controllers.material_controller import material_bp, material_global_bp
-from controllers.reference_file_controller import reference_file_bp
+from controllers.reference_file_controller import reference_file_bp, recover_interrupted_parsing
 from controllers.settings_controller import settings_bp
 from controllers import project_bp, page_bp, template_bp, user_template_bp, export_bp, file_bp
+from services.task_manager import task_manager
 
 
 # Enable SQLite WAL mode for all connections
@@ -112,6 +113,9 @@ def create_app():
         # Load settings from database and sync to app.config
         _load_settings_to_config(app)
 
+    # Bind the durable task queue (workers start on first enqueue or at server startup)
+    task_manager.init_app(app)
+
     # Health check endpoint
     @app.route('/health')
     def health_check():
@@ -214,11 +218,22 @@ if __name__ == '__main__':
         f"Output Language: {Config.OUTPUT_LANGUAGE}\n"
         f"Environment: {os.getenv('FLASK_ENV', 'development')}\n"
         f"Debug mode: {debug}\n"
+        f"Task worker mode: {task_manager.mode}\n"
         f"API Base URL: http://localhost:{port}/api\n"
         f"Database: {app.config['SQLALCHEMY_DATABASE_URI']}\n"
         f"Uploads: {app.config['UPLOAD_FOLDER']}"
     )
     
+    # Start task workers (resuming interrupted tasks) only in the serving process,
+    # not in the reloader's file-watching parent process.
+    # In external mode jobs are executed by `python -m services.worker` instead.
+    if task_manager.runs_embedded and os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        task_manager.start()
+    
+    # 参考文件解析队列在本进程内存中，重启后复位上次未完成的解析状态
+    if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        recover_interrupted_parsing(app)
+    
     # Enable reloader for hot reload in development
     # Using absolute paths for database, so WSL path issues should not occur
     app.run(host='0.0.0.0', port=port, debug=debug, use_reloader=True)
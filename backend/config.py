@@ -41,6 +41,26 @@ class Config:
     ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'webp'}
     ALLOWED_REFERENCE_FILE_EXTENSIONS = {'pdf', 'docx', 'pptx', 'doc', 'ppt', 'xlsx', 'xls', 'csv', 'txt', 'md'}
     
+    # 生成图片的保存格式：original 直接写入服务商返回的原始编码数据（不重新编码）；png / jpeg / webp 按下方参数重新编码
+    IMAGE_SAVE_FORMAT = os.getenv('IMAGE_SAVE_FORMAT', 'original').lower()
+    IMAGE_SAVE_QUALITY = int(os.getenv('IMAGE_SAVE_QUALITY', '90'))  # JPEG / WebP 质量
+    IMAGE_PNG_COMPRESS_LEVEL = int(os.getenv('IMAGE_PNG_COMPRESS_LEVEL', '6'))  # PNG 压缩级别 0-9，越小越快、文件越大
+    
+    # 参考图预处理缓存：模板等参考图按 (路径, 修改时间) 缓存解码、缩放和编码结果，供各页复用
+    REFERENCE_IMAGE_CACHE_SIZE = int(os.getenv('REFERENCE_IMAGE_CACHE_SIZE', '16'))
+    # 发送给服务商的参考图最长边像素；默认 0 不缩放。设置后会有损缩小参考图（包括编辑页面时传入的当前页面图片），仅在需要减少上传体积时开启
+    REFERENCE_IMAGE_MAX_SIDE = int(os.getenv('REFERENCE_IMAGE_MAX_SIDE', '0'))
+    
+    # 描述中远程图片的下载缓存：按 URL 存储，过期后用 ETag / Last-Modified 重新验证，超出总大小按最近最少使用淘汰
+    REMOTE_IMAGE_CACHE_DIR = os.getenv('REMOTE_IMAGE_CACHE_DIR', os.path.join(BASE_DIR, 'instance', 'remote_images'))
+    REMOTE_IMAGE_CACHE_MAX_MB = int(os.getenv('REMOTE_IMAGE_CACHE_MAX_MB', '200'))
+    REMOTE_IMAGE_MAX_MB = int(os.getenv('REMOTE_IMAGE_MAX_MB', '20'))  # 单张图片大小上限
+    REMOTE_IMAGE_CACHE_FRESH_SECONDS = int(os.getenv('REMOTE_IMAGE_CACHE_FRESH_SECONDS', '3600'))  # 此时间内直接使用缓存，不重新验证
+    
+    # 图片缩略图（WebP，/files/...?size=thumb|medium）：保存页面图片时生成，关闭后改为首次请求时生成
+    IMAGE_DERIVATIVES_ON_SAVE = os.getenv('IMAGE_DERIVATIVES_ON_SAVE', 'true').lower() == 'true'
+    IMAGE_DERIVATIVE_QUALITY = int(os.getenv('IMAGE_DERIVATIVE_QUALITY', '80'))
+    
     # AI服务配置
     GOOGLE_API_KEY = os.getenv('GOOGLE_API_KEY', '')
     GOOGLE_API_BASE = os.getenv('GOOGLE_API_BASE', '')
@@ -59,6 +79,17 @@ class Config:
     # MinerU 文件解析服务配置
     MINERU_TOKEN = os.getenv('MINERU_TOKEN', '')
     MINERU_API_BASE = os.getenv('MINERU_API_BASE', 'https://mineru.net')
+    # 解析结果轮询：所有批次共用一个轮询线程，间隔从初始值按倍数递增到上限
+    MINERU_POLL_INITIAL_SECONDS = float(os.getenv('MINERU_POLL_INITIAL_SECONDS', '2'))
+    MINERU_POLL_MAX_SECONDS = float(os.getenv('MINERU_POLL_MAX_SECONDS', '15'))
+    MINERU_POLL_BACKOFF = float(os.getenv('MINERU_POLL_BACKOFF', '1.5'))
+    MINERU_PARSE_TIMEOUT_SECONDS = int(os.getenv('MINERU_PARSE_TIMEOUT_SECONDS', '600'))
+    MINERU_RESULT_WORKERS = int(os.getenv('MINERU_RESULT_WORKERS', '2'))  # 下载结果、生成图片描述的线程数
+    
+    # 参考文件解析队列：同时运行的解析任务数、单个项目同时运行的任务数，以及每个文件生成图片描述的并发数
+    PARSE_WORKERS = int(os.getenv('PARSE_WORKERS', '2'))
+    PARSE_PROJECT_CONCURRENCY = int(os.getenv('PARSE_PROJECT_CONCURRENCY', '1'))
+    PARSE_CAPTION_WORKERS = int(os.getenv('PARSE_CAPTION_WORKERS', '4'))
     
     # 图片识别模型配置
     IMAGE_CAPTION_MODEL = os.getenv('IMAGE_CAPTION_MODEL', 'gemini-2.5-flash')
@@ -66,6 +97,52 @@ class Config:
     # 并发配置
     MAX_DESCRIPTION_WORKERS = int(os.getenv('MAX_DESCRIPTION_WORKERS', '5'))
     MAX_IMAGE_WORKERS = int(os.getenv('MAX_IMAGE_WORKERS', '8'))
+    EXPORT_MAX_WORKERS = int(os.getenv('EXPORT_MAX_WORKERS', '4'))  # 导出时并行读取/解码页面图片的线程数
+    EXPORT_KEEP_VERSIONS = int(os.getenv('EXPORT_KEEP_VERSIONS', '3'))  # 每个导出文件名保留的最近版本数
+    EXPORT_RETENTION_HOURS = float(os.getenv('EXPORT_RETENTION_HOURS', '24'))  # 最近使用时间在此之内的旧版本不清理
+    
+    # AI 调用全局限流（进程内所有任务共享，按 provider + model 区分；0 表示不限制）
+    AI_TEXT_MAX_CONCURRENCY = int(os.getenv('AI_TEXT_MAX_CONCURRENCY', '16'))
+    AI_TEXT_RPM = int(os.getenv('AI_TEXT_RPM', '0'))
+    AI_IMAGE_MAX_CONCURRENCY = int(os.getenv('AI_IMAGE_MAX_CONCURRENCY', '8'))
+    AI_IMAGE_RPM = int(os.getenv('AI_IMAGE_RPM', '0'))
+    # 按模型覆盖，JSON 格式: {"gemini:gemini-3-pro-image-preview": {"concurrency": 4, "rpm": 20}}
+    AI_RATE_LIMITS = os.getenv('AI_RATE_LIMITS', '')
+    
+    # AI 调用重试策略（仅重试 429/5xx/超时等瞬时错误，优先遵循 Retry-After）
+    AI_RETRY_MAX_ATTEMPTS = int(os.getenv('AI_RETRY_MAX_ATTEMPTS', '4'))  # 含首次调用
+    AI_RETRY_BASE_DELAY = float(os.getenv('AI_RETRY_BASE_DELAY', '1.0'))  # 指数退避基数（秒）
+    AI_RETRY_MAX_DELAY = float(os.getenv('AI_RETRY_MAX_DELAY', '30'))  # 单次退避上限（秒）
+    AI_RETRY_DEADLINE = float(os.getenv('AI_RETRY_DEADLINE', '300'))  # 总重试时限（秒），0 表示不限
+    
+    # 文本生成结果缓存（按 模型+提示词+thinking_budget 的哈希命中，默认关闭，适合演示/测试环境）
+    TEXT_CACHE_ENABLED = os.getenv('TEXT_CACHE_ENABLED', 'false').lower() == 'true'
+    TEXT_CACHE_PATH = os.getenv('TEXT_CACHE_PATH', os.path.join(BASE_DIR, 'instance', 'text_cache.db'))
+    TEXT_CACHE_TTL_SECONDS = int(os.getenv('TEXT_CACHE_TTL_SECONDS', str(7 * 24 * 3600)))  # 0 表示永不过期
+    TEXT_CACHE_MAX_MB = int(os.getenv('TEXT_CACHE_MAX_MB', '100'))  # 超出后按最近最少使用淘汰
+    
+    # 提示词共享前缀复用（参考文件+大纲放在最前；Gemini 使用显式上下文缓存，OpenAI 自动缓存相同前缀）
+    PROMPT_PREFIX_CACHE_ENABLED = os.getenv('PROMPT_PREFIX_CACHE_ENABLED', 'true').lower() == 'true'
+    PROMPT_PREFIX_CACHE_MIN_CHARS = int(os.getenv('PROMPT_PREFIX_CACHE_MIN_CHARS', '8000'))  # 短于此长度的前缀直接内联发送
+    PROMPT_PREFIX_CACHE_TTL_SECONDS = int(os.getenv('PROMPT_PREFIX_CACHE_TTL_SECONDS', '600'))
+    
+    # 参考文件检索（参考文件总长度超过阈值时，每页描述只携带 BM25 检索出的相关片段）
+    REFERENCE_RETRIEVAL_ENABLED = os.getenv('REFERENCE_RETRIEVAL_ENABLED', 'true').lower() == 'true'
+    REFERENCE_RETRIEVAL_MIN_CHARS = int(os.getenv('REFERENCE_RETRIEVAL_MIN_CHARS', '30000'))
+    REFERENCE_RETRIEVAL_TOP_K = int(os.getenv('REFERENCE_RETRIEVAL_TOP_K', '6'))
+    REFERENCE_CHUNK_MAX_CHARS = int(os.getenv('REFERENCE_CHUNK_MAX_CHARS', '1500'))
+    
+    # 后台任务队列配置（任务持久化在数据库中，重启后可恢复）
+    TASK_QUEUE_WORKERS = int(os.getenv('TASK_QUEUE_WORKERS', '4'))  # 进程内任务工作线程数
+    TASK_LEASE_SECONDS = int(os.getenv('TASK_LEASE_SECONDS', '60'))  # 任务租约时长，超时未心跳则可被重新领取
+    TASK_MAX_ATTEMPTS = int(os.getenv('TASK_MAX_ATTEMPTS', '3'))  # 单个任务最大执行次数（含中断后的重试）
+    # 任务执行模式: embedded（API 进程内执行）或 external（API 只入队，由 python -m services.worker 执行）
+    TASK_WORKER_MODE = os.getenv('TASK_WORKER_MODE', 'embedded').lower()
+    # 任务进度批量写入：累计 N 个页面结果或间隔 T 秒后合并为一次数据库事务
+    TASK_PROGRESS_FLUSH_BATCH = int(os.getenv('TASK_PROGRESS_FLUSH_BATCH', '5'))
+    TASK_PROGRESS_FLUSH_INTERVAL = float(os.getenv('TASK_PROGRESS_FLUSH_INTERVAL', '1.0'))
+    # 任务进度 SSE 推送：没有收到本进程事件时，每隔多少秒从数据库兜底读取一次（外部 worker 模式下的更新靠它获取）
+    TASK_EVENTS_POLL_INTERVAL = float(os.getenv('TASK_EVENTS_POLL_INTERVAL', '5.0'))
     
     # 图片生成配置
     DEFAULT_ASPECT_RATIO = "16:9"
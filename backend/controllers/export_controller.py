@@ -2,103 +2,150 @@
 Export Controller - handles file export endpoints
 """
 from flask import Blueprint, request, current_app
-from models import db, Project, Page
+from models import db, Project, Page, Task
 from utils import error_response, not_found, bad_request, success_response
 from services import ExportService, FileService
+from services.task_manager import task_manager
 import os
-import io
 
 export_bp = Blueprint('export', __name__, url_prefix='/api/projects')
 
 
+def _find_page_jsons(project_id: str, pages: list) -> list:
+    """
+    PPT Agent mode: if ALL pages have a corresponding JSON file in
+    uploads/{project_id}/{page.id}.json, the PPTX is re-rendered from them
+    
+    Returns:
+        JSON paths in page order, or an empty list
+    """
+    json_paths = []
+    for page in pages:
+        json_path = os.path.join(current_app.config['UPLOAD_FOLDER'], project_id, f"{page.id}.json")
+        if not os.path.exists(json_path):
+            return []
+        json_paths.append(json_path)
+    return json_paths
+
+
+def _download_data(project_id: str, filename: str) -> dict:
+    """Download URLs of an export artifact"""
+    download_path = f"/files/{project_id}/exports/{filename}"
+    base_url = request.url_root.rstrip("/")
+    return {
+        "download_url": download_path,
+        "download_url_absolute": f"{base_url}{download_path}",
+    }
+
+
+def _export(project_id: str, export_format: str):
+    """
+    Return the cached artifact of a deck, or start a background export task
+    
+    The artifact name contains a hash of the ordered page image paths (image
+    versions have unique paths), so exporting an unchanged deck again returns
+    the existing file without regenerating it.
+    """
+    project = Project.query.get(project_id)
+    
+    if not project:
+        return not_found('Project')
+    
+    # Get all completed pages
+    pages = Page.query.filter_by(project_id=project_id).order_by(Page.order_index).all()
+    
+    if not pages:
+        return bad_request("No pages found for project")
+    
+    image_paths = [page.generated_image_path for page in pages if page.generated_image_path]
+    
+    if not image_paths:
+        return bad_request("No generated images found for project")
+    
+    sources = image_paths
+    json_paths = _find_page_jsons(project_id, pages) if export_format == 'pptx' else []
+    if json_paths:
+        # JSON 文件可能被原地重写，连同修改时间一起参与哈希
+        sources = [f"{path}:{os.stat(path).st_mtime_ns}" for path in json_paths]
+    
+    # Get filename from query params or use default
+    stem = os.path.basename(request.args.get('filename', f'presentation_{project_id}'))
+    if stem.endswith(f'.{export_format}'):
+        stem = stem[:-len(export_format) - 1]
+    key = ExportService.artifact_key(export_format, sources)[:16]
+    filename = f"{stem}_{key}.{export_format}"
+    
+    file_service = FileService(current_app.config['UPLOAD_FOLDER'])
+    artifact_path = file_service._get_exports_dir(project_id) / filename
+    if artifact_path.exists():
+        # 刷新修改时间，清理旧版本时保留近期仍在下发的文件
+        os.utime(artifact_path)
+        data = _download_data(project_id, filename)
+        data['cached'] = True
+        return success_response(data=data, message=f"Export {export_format.upper()} ready")
+    
+    # 同一文件已在导出中时直接返回该任务
+    task_type = f'EXPORT_{export_format.upper()}'
+    running = Task.query.filter(
+        Task.project_id == project_id,
+        Task.task_type == task_type,
+        Task.status.in_(['PENDING', 'PROCESSING'])
+    ).all()
+    for task in running:
+        if task.get_progress().get('filename') == filename:
+            return success_response({'task_id': task.id, 'status': task.status}, status_code=202)
+    
+    task = Task(
+        project_id=project_id,
+        task_type=task_type,
+        status='PENDING'
+    )
+    task.set_progress({
+        'total': len(image_paths),
+        'completed': 0,
+        'failed': 0,
+        'filename': filename
+    })
+    db.session.add(task)
+    db.session.commit()
+    
+    task_manager.enqueue(
+        task.id,
+        'EXPORT',
+        project_id=project_id,
+        export_format=export_format,
+        image_paths=image_paths,
+        filename=filename,
+        json_paths=json_paths or None
+    )
+    
+    return success_response(
+        {'task_id': task.id, 'status': 'PENDING'},
+        message=f"Export {export_format.upper()} task created",
+        status_code=202
+    )
+
+
 @export_bp.route('/<project_id>/export/pptx', methods=['GET'])
 def export_pptx(project_id):
     """
     GET /api/projects/{project_id}/export/pptx?filename=... - Export PPTX
     
     Returns:
-        JSON with download URL, e.g.
+        200 with download URLs when the deck was already exported, e.g.
         {
             "success": true,
             "data": {
                 "download_url": "/files/{project_id}/exports/xxx.pptx",
-                "download_url_absolute": "http://host:port/files/{project_id}/exports/xxx.pptx"
+                "download_url_absolute": "http://host:port/files/{project_id}/exports/xxx.pptx",
+                "cached": true
             }
         }
+        otherwise 202 with {"task_id": "...", "status": "PENDING"}; the completed
+        task's progress contains "download_url"
     """
     try:
-        project = Project.query.get(project_id)
-        
-        if not project:
-            return not_found('Project')
-        
-        # Get all completed pages
-        pages = Page.query.filter_by(project_id=project_id).order_by(Page.order_index).all()
-        
-        if not pages:
-            return bad_request("No pages found for project")
-        
-        # Get image paths
-        from flask import current_app
-        file_service = FileService(current_app.config['UPLOAD_FOLDER'])
-        
-        image_paths = []
-        for page in pages:
-            if page.generated_image_path:
-                abs_path = file_service.get_absolute_path(page.generated_image_path)
-                image_paths.append(abs_path)
-        
-        if not image_paths:
-            return bad_request("No generated images found for project")
-        
-        # Determine export directory and filename
-        file_service = FileService(current_app.config['UPLOAD_FOLDER'])
-        exports_dir = file_service._get_exports_dir(project_id)
-        
-        # Get filename from query params or use default
-        filename = request.args.get('filename', f'presentation_{project_id}.pptx')
-        if not filename.endswith('.pptx'):
-            filename += '.pptx'
-
-        output_path = os.path.join(exports_dir, filename)
-
-        # Check if we can merge existing PPTX files (PPT Agent mode)
-        # Strategy: If ALL pages have a corresponding .pptx file in uploads/{project_id}/{page.id}.pptx, use merge.
-        can_merge_pptx = False
-        pptx_paths = []
-        all_pptx_exist = True
-
-        for page in pages:
-            # Construct path: uploads/{project_id}/{page.id}.pptx
-            pptx_path = os.path.join(current_app.config['UPLOAD_FOLDER'], project_id, f"{page.id}.json")
-            print(f"Checking for PPTX file: {pptx_path}")
-            if os.path.exists(pptx_path):
-                pptx_paths.append(pptx_path)
-            else:
-                all_pptx_exist = False
-                break
-
-        if all_pptx_exist and pptx_paths:
-            can_merge_pptx = True
-
-        # Generate PPTX file on disk
-        if can_merge_pptx:
-            ExportService.create_pptx_from_jsons(pptx_paths, output_file=output_path, assets_dir=os.path.join(current_app.config['UPLOAD_FOLDER'], project_id))
-        else:
-            ExportService.create_pptx_from_images(image_paths, output_file=output_path)
-
-        # Build download URLs
-        download_path = f"/files/{project_id}/exports/{filename}"
-        base_url = request.url_root.rstrip("/")
-        download_url_absolute = f"{base_url}{download_path}"
-
-        return success_response(
-            data={
-                "download_url": download_path,
-                "download_url_absolute": download_url_absolute,
-            },
-            message="Export PPTX task created"
-        )
+        return _export(project_id, 'pptx')
     
     except Exception as e:
         return error_response('SERVER_ERROR', str(e), 500)
@@ -110,67 +157,11 @@ def export_pdf(project_id):
     GET /api/projects/{project_id}/export/pdf?filename=... - Export PDF
     
     Returns:
-        JSON with download URL, e.g.
-        {
-            "success": true,
-            "data": {
-                "download_url": "/files/{project_id}/exports/xxx.pdf",
-                "download_url_absolute": "http://host:port/files/{project_id}/exports/xxx.pdf"
-            }
-        }
+        Same as export/pptx: 200 with download URLs for a cached artifact,
+        otherwise 202 with a task_id
     """
     try:
-        project = Project.query.get(project_id)
-        
-        if not project:
-            return not_found('Project')
-        
-        # Get all completed pages
-        pages = Page.query.filter_by(project_id=project_id).order_by(Page.order_index).all()
-        
-        if not pages:
-            return bad_request("No pages found for project")
-        
-        # Get image paths
-        from flask import current_app
-        file_service = FileService(current_app.config['UPLOAD_FOLDER'])
-        
-        image_paths = []
-        for page in pages:
-            if page.generated_image_path:
-                abs_path = file_service.get_absolute_path(page.generated_image_path)
-                image_paths.append(abs_path)
-        
-        if not image_paths:
-            return bad_request("No generated images found for project")
-        
-        # Determine export directory and filename
-        file_service = FileService(current_app.config['UPLOAD_FOLDER'])
-        exports_dir = file_service._get_exports_dir(project_id)
-
-        # Get filename from query params or use default
-        filename = request.args.get('filename', f'presentation_{project_id}.pdf')
-        if not filename.endswith('.pdf'):
-            filename += '.pdf'
-
-        output_path = os.path.join(exports_dir, filename)
-
-        # Generate PDF file on disk
-        ExportService.create_pdf_from_images(image_paths, output_file=output_path)
-
-        # Build download URLs
-        download_path = f"/files/{project_id}/exports/{filename}"
-        base_url = request.url_root.rstrip("/")
-        download_url_absolute = f"{base_url}{download_path}"
-
-        return success_response(
-            data={
-                "download_url": download_path,
-                "download_url_absolute": download_url_absolute,
-            },
-            message="Export PDF task created"
-        )
+        return _export(project_id, 'pdf')
     
     except Exception as e:
         return error_response('SERVER_ERROR', str(e), 500)
-
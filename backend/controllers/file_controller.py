@@ -1,21 +1,92 @@
 """
 File Controller - handles static file serving
 """
-from flask import Blueprint, send_from_directory, current_app
-from utils import error_response, not_found
-from utils.path_utils import find_file_with_prefix
+from flask import Blueprint, send_from_directory, current_app, request
+from utils import error_response, not_found, bad_request
+from utils.path_utils import resolve_mineru_file
+from services.image_derivatives import DERIVATIVE_SIZES, get_derivative, is_image
+import hashlib
 import os
+import re
+from functools import lru_cache
 from pathlib import Path
 from werkzeug.utils import secure_filename
 
 file_bp = Blueprint('files', __name__, url_prefix='/files')
 
+# 文件名带版本号或毫秒时间戳的文件（页面图片版本、素材及其缩略图）写入后不会被覆盖，可以永久缓存；
+# 其他文件（template.png、导出文件等）可能被覆盖，每次使用前需按 ETag 重新验证
+_IMMUTABLE_NAME_PATTERN = re.compile(r'_(v\d+|\d{13})(\.(thumb|medium))?\.\w+$')
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+
+
+@lru_cache(maxsize=4096)
+def _content_etag(path: str, mtime_ns: int, size: int) -> str:
+    """Strong ETag from the file content, memoized per (path, mtime, size)"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()[:32]
+
+
+def _send_cached(file_dir: str, filename: str, immutable: bool = None):
+    """
+    Send a file with a content-based ETag and Cache-Control
+    
+    Conditional requests (If-None-Match / If-Modified-Since) are answered with
+    304 by send_from_directory.
+    
+    Args:
+        file_dir: Directory containing the file
+        filename: File name
+        immutable: Whether the file never changes once written (default: inferred from the name)
+    """
+    if immutable is None:
+        immutable = bool(_IMMUTABLE_NAME_PATTERN.search(filename))
+    
+    stat = os.stat(os.path.join(file_dir, filename))
+    etag = _content_etag(os.path.abspath(os.path.join(file_dir, filename)), stat.st_mtime_ns, stat.st_size)
+    response = send_from_directory(
+        file_dir, filename,
+        etag=etag,
+        max_age=IMMUTABLE_MAX_AGE if immutable else 0
+    )
+    if immutable:
+        response.cache_control.immutable = True
+    else:
+        response.cache_control.no_cache = True
+    return response
+
+
+def _send_file(file_dir: str, filename: str):
+    """
+    Send a file, or its downscaled WebP derivative when ?size=thumb|medium is given
+    
+    Falls back to the original when the file is not an image or the derivative
+    cannot be generated.
+    """
+    size = request.args.get('size')
+    if size:
+        if size not in DERIVATIVE_SIZES:
+            return bad_request(f"size must be one of: {', '.join(DERIVATIVE_SIZES)}")
+        source = Path(file_dir) / filename
+        if is_image(source):
+            derivative = get_derivative(source, size)
+            if derivative is not None:
+                return _send_cached(str(derivative.parent), derivative.name)
+    
+    return _send_cached(file_dir, filename)
+
 
 @file_bp.route('/<project_id>/<file_type>/<filename>', methods=['GET'])
 def serve_file(project_id, file_type, filename):
     """
     GET /files/{project_id}/{type}/{filename} - Serve static files
     
+    Query params:
+    - size: "thumb" or "medium" to get a downscaled WebP of an image
+    
     Args:
         project_id: Project UUID
         file_type: 'template' or 'pages'
@@ -42,7 +113,7 @@ def serve_file(project_id, file_type, filename):
             return not_found('File')
         
         # Serve file
-        return send_from_directory(file_dir, filename)
+        return _send_file(file_dir, filename)
     
     except Exception as e:
         return error_response('SERVER_ERROR', str(e), 500)
@@ -75,7 +146,7 @@ def serve_user_template(template_id, filename):
             return not_found('File')
         
         # Serve file
-        return send_from_directory(file_dir, filename)
+        return _send_file(file_dir, filename)
     
     except Exception as e:
         return error_response('SERVER_ERROR', str(e), 500)
@@ -107,7 +178,7 @@ def serve_global_material(filename):
             return not_found('File')
         
         # Serve file
-        return send_from_directory(file_dir, safe_filename)
+        return _send_file(file_dir, safe_filename)
     
     except Exception as e:
         return error_response('SERVER_ERROR', str(e), 500)
@@ -138,8 +209,8 @@ def serve_mineru_file(extract_id, filepath):
             # If we can't resolve the path at all, it's invalid
             return error_response('INVALID_PATH', 'Invalid file path', 403)
 
-        # Try to find file with prefix matching
-        matched_path = find_file_with_prefix(full_path)
+        # Look up the short path in the extract's manifest (prefix matching for older extracts)
+        matched_path = resolve_mineru_file(Path(root_dir), filepath)
         
         if matched_path is not None:
             # Additional security check for matched path
@@ -154,7 +225,8 @@ def serve_mineru_file(extract_id, filepath):
             except Exception:
                 return error_response('INVALID_PATH', 'Invalid file path', 403)
             
-            return send_from_directory(str(matched_path.parent), matched_path.name)
+            # 解析结果按 extract_id 存放，不会被覆盖
+            return _send_cached(str(matched_path.parent), matched_path.name, immutable=True)
 
         return not_found('File')
     except Exception as e:
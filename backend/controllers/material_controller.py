@@ -4,8 +4,8 @@ Material Controller - handles standalone material image generation
 from flask import Blueprint, request, current_app
 from models import db, Project, Material, Task
 from utils import success_response, error_response, not_found, bad_request
-from services import AIService, FileService
-from services.task_manager import task_manager, generate_material_image_task
+from services import FileService
+from services.task_manager import task_manager
 from pathlib import Path
 from werkzeug.utils import secure_filename
 from typing import Optional
@@ -186,10 +186,6 @@ def generate_material_image(project_id):
             if not project:
                 return not_found('Project')
 
-        # Initialize services
-        ai_service = AIService()
-        file_service = FileService(current_app.config['UPLOAD_FOLDER'])
-
         # 创建临时目录保存参考图片（后台任务会清理）
         temp_dir = Path(tempfile.mkdtemp(dir=current_app.config['UPLOAD_FOLDER']))
         temp_dir_str = str(temp_dir)
@@ -229,23 +225,17 @@ def generate_material_image(project_id):
             db.session.add(task)
             db.session.commit()
 
-            # Get app instance for background task
-            app = current_app._get_current_object()
-
-            # Submit background task
-            task_manager.submit_task(
+            # Enqueue background task (persisted, survives restarts)
+            task_manager.enqueue(
                 task.id,
-                generate_material_image_task,
-                task_project_id,  # 传递给任务函数，它会处理'global'的情况
-                prompt,
-                ai_service,
-                file_service,
-                ref_path_str,
-                additional_ref_images if additional_ref_images else None,
-                current_app.config['DEFAULT_ASPECT_RATIO'],
-                current_app.config['DEFAULT_RESOLUTION'],
-                temp_dir_str,
-                app
+                'GENERATE_MATERIAL',
+                project_id=task_project_id,  # 传递给任务函数，它会处理'global'的情况
+                prompt=prompt,
+                ref_image_path=ref_path_str,
+                additional_ref_images=additional_ref_images if additional_ref_images else None,
+                aspect_ratio=current_app.config['DEFAULT_ASPECT_RATIO'],
+                resolution=current_app.config['DEFAULT_RESOLUTION'],
+                temp_dir=temp_dir_str
             )
 
             # Return task_id immediately (不再清理temp_dir，由后台任务清理)
@@ -4,10 +4,12 @@ Page Controller - handles page-related endpoints
 import logging
 from flask import Blueprint, request, current_app
 from models import db, Project, Page, PageImageVersion, Task
-from utils import success_response, error_response, not_found, bad_request
+from utils import success_response, error_response, not_found, bad_request, sse_event, sse_response
 from services import AIService, FileService, ProjectContext
-from services.task_manager import task_manager, generate_single_page_image_task, edit_page_image_task
+from services.reference_index import load_reference_index
+from services.task_manager import task_manager
 from datetime import datetime
+from textwrap import dedent
 from pathlib import Path
 from werkzeug.utils import secure_filename
 import shutil
@@ -188,6 +190,84 @@ def update_page_description(project_id, page_id):
         return error_response('SERVER_ERROR', str(e), 500)
 
 
+def _prepare_page_description(project_id: str, page_id: str):
+    """
+    Validate a page description request and build everything needed to generate it
+    
+    Returns:
+        Tuple of (error response or None, dict with page, ai_service, project_context,
+        outline, page_data and language)
+    """
+    page = Page.query.get(page_id)
+    
+    if not page or page.project_id != project_id:
+        return not_found('Page'), None
+    
+    project = Project.query.get(project_id)
+    if not project:
+        return not_found('Project'), None
+    
+    data = request.get_json() or {}
+    force_regenerate = data.get('force_regenerate', False)
+    language = data.get('language', current_app.config.get('OUTPUT_LANGUAGE', 'zh'))
+    
+    # Check if already generated
+    if page.get_description_content() and not force_regenerate:
+        return bad_request("Description already exists. Set force_regenerate=true to regenerate"), None
+    
+    # Get outline content
+    outline_content = page.get_outline_content()
+    if not outline_content:
+        return bad_request("Page must have outline content first"), None
+    
+    # Reconstruct full outline
+    all_pages = Page.query.filter_by(project_id=project_id).order_by(Page.order_index).all()
+    outline = []
+    for p in all_pages:
+        oc = p.get_outline_content()
+        if oc:
+            page_data = oc.copy()
+            if p.part:
+                page_data['part'] = p.part
+            outline.append(page_data)
+    
+    # Initialize AI service
+    ai_service = AIService()
+    
+    # Get reference files content and create project context
+    from controllers.project_controller import _get_project_reference_files_content
+    reference_files_content = _get_project_reference_files_content(project_id)
+    project_context = ProjectContext(project, reference_files_content)
+    project_context.reference_index = load_reference_index(project_id, reference_files_content)
+    
+    page_data = outline_content.copy()
+    if page.part:
+        page_data['part'] = page.part
+    
+    return None, {
+        'page': page,
+        'ai_service': ai_service,
+        'project_context': project_context,
+        'outline': outline,
+        'page_data': page_data,
+        'language': language,
+    }
+
+
+def _save_page_description(page: Page, desc_text: str):
+    """Store a generated description on the page and commit"""
+    desc_content = {
+        "text": desc_text,
+        "generated_at": datetime.utcnow().isoformat()
+    }
+    
+    page.set_description_content(desc_content)
+    page.status = 'DESCRIPTION_GENERATED'
+    page.updated_at = datetime.utcnow()
+    
+    db.session.commit()
+
+
 @page_bp.route('/<project_id>/pages/<page_id>/generate/description', methods=['POST'])
 def generate_page_description(project_id, page_id):
     """
@@ -199,71 +279,22 @@ def generate_page_description(project_id, page_id):
     }
     """
     try:
-        page = Page.query.get(page_id)
-        
-        if not page or page.project_id != project_id:
-            return not_found('Page')
-        
-        project = Project.query.get(project_id)
-        if not project:
-            return not_found('Project')
-        
-        data = request.get_json() or {}
-        force_regenerate = data.get('force_regenerate', False)
-        language = data.get('language', current_app.config.get('OUTPUT_LANGUAGE', 'zh'))
-        
-        # Check if already generated
-        if page.get_description_content() and not force_regenerate:
-            return bad_request("Description already exists. Set force_regenerate=true to regenerate")
-        
-        # Get outline content
-        outline_content = page.get_outline_content()
-        if not outline_content:
-            return bad_request("Page must have outline content first")
-        
-        # Reconstruct full outline
-        all_pages = Page.query.filter_by(project_id=project_id).order_by(Page.order_index).all()
-        outline = []
-        for p in all_pages:
-            oc = p.get_outline_content()
-            if oc:
-                page_data = oc.copy()
-                if p.part:
-                    page_data['part'] = p.part
-                outline.append(page_data)
-        
-        # Initialize AI service
-        ai_service = AIService()
-        
-        # Get reference files content and create project context
-        from controllers.project_controller import _get_project_reference_files_content
-        reference_files_content = _get_project_reference_files_content(project_id)
-        project_context = ProjectContext(project, reference_files_content)
+        error, job = _prepare_page_description(project_id, page_id)
+        if error:
+            return error
         
         # Generate description
-        page_data = outline_content.copy()
-        if page.part:
-            page_data['part'] = page.part
-        
-        desc_text = ai_service.generate_page_description(
-            project_context,
-            outline,
-            page_data,
+        page = job['page']
+        desc_text = job['ai_service'].generate_page_description(
+            job['project_context'],
+            job['outline'],
+            job['page_data'],
             page.order_index + 1,
-            language=language
+            language=job['language']
         )
         
         # Save description
-        desc_content = {
-            "text": desc_text,
-            "generated_at": datetime.utcnow().isoformat()
-        }
-        
-        page.set_description_content(desc_content)
-        page.status = 'DESCRIPTION_GENERATED'
-        page.updated_at = datetime.utcnow()
-        
-        db.session.commit()
+        _save_page_description(page, desc_text)
         
         return success_response(page.to_dict())
     
@@ -272,6 +303,58 @@ def generate_page_description(project_id, page_id):
         return error_response('AI_SERVICE_ERROR', str(e), 503)
 
 
+@page_bp.route('/<project_id>/pages/<page_id>/generate/description/stream', methods=['POST'])
+def stream_page_description(project_id, page_id):
+    """
+    POST /api/projects/{project_id}/pages/{page_id}/generate/description/stream - Generate single
+    page description, streaming the text as it is generated (Server-Sent Events)
+    
+    Request body: same as generate/description
+    
+    Events:
+        delta: {"text": "..."} - next chunk of the description
+        done: page.to_dict() - the description has been saved
+        error: {"message": "..."} - generation failed, nothing was saved
+    """
+    try:
+        error, job = _prepare_page_description(project_id, page_id)
+        if error:
+            return error
+    except Exception as e:
+        db.session.rollback()
+        return error_response('AI_SERVICE_ERROR', str(e), 503)
+    
+    page_index = job['page'].order_index + 1
+    
+    def generate():
+        chunks = []
+        try:
+            for chunk in job['ai_service'].stream_page_description(
+                job['project_context'],
+                job['outline'],
+                job['page_data'],
+                page_index,
+                language=job['language']
+            ):
+                chunks.append(chunk)
+                yield sse_event('delta', {'text': chunk})
+            
+            # 流式生成期间页面可能被修改：让会话中的对象失效，保存前从数据库重新加载
+            db.session.expire_all()
+            page = Page.query.get(page_id)
+            if not page:
+                yield sse_event('error', {'message': 'Page was deleted during generation'})
+                return
+            _save_page_description(page, dedent(''.join(chunks)))
+            yield sse_event('done', page.to_dict())
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f"Streaming description for page {page_id} failed: {str(e)}", exc_info=True)
+            yield sse_event('error', {'message': str(e)})
+    
+    return sse_response(generate())
+
+
 @page_bp.route('/<project_id>/pages/<page_id>/generate/image', methods=['POST'])
 def generate_page_image(project_id, page_id):
     """
@@ -359,8 +442,6 @@ def generate_page_image(project_id, page_id):
         
         # Initialize services
         from flask import current_app
-        ai_service = AIService()
-        
         file_service = FileService(current_app.config['UPLOAD_FOLDER'])
         
         # Get template path
@@ -392,7 +473,7 @@ def generate_page_image(project_id, page_id):
         
         # 从描述文本中提取图片
         if desc_text:
-            image_urls = ai_service.extract_image_urls_from_markdown(desc_text)
+            image_urls = AIService.extract_image_urls_from_markdown(desc_text)
             if image_urls:
                 logger.info(f"Found {len(image_urls)} image(s) in page {page_id} description")
                 additional_ref_images = image_urls
@@ -412,24 +493,18 @@ def generate_page_image(project_id, page_id):
         db.session.add(task)
         db.session.commit()
         
-        # Get app instance for background task
-        app = current_app._get_current_object()
-        
-        # Submit background task
-        task_manager.submit_task(
+        # Enqueue background task (persisted, survives restarts)
+        task_manager.enqueue(
             task.id,
-            generate_single_page_image_task,
-            project_id,
-            page_id,
-            ai_service,
-            file_service,
-            outline,
-            use_template,
-            current_app.config['DEFAULT_ASPECT_RATIO'],
-            current_app.config['DEFAULT_RESOLUTION'],
-            app,
-            project.extra_requirements,
-            language
+            'GENERATE_PAGE_IMAGE',
+            project_id=project_id,
+            page_id=page_id,
+            outline=outline,
+            use_template=use_template,
+            aspect_ratio=current_app.config['DEFAULT_ASPECT_RATIO'],
+            resolution=current_app.config['DEFAULT_RESOLUTION'],
+            extra_requirements=project.extra_requirements,
+            language=language
         )
         
         # Return task_id immediately
@@ -480,8 +555,6 @@ def edit_page_image(project_id, page_id):
         
         # Initialize services
         from flask import current_app
-        ai_service = AIService()
-        
         file_service = FileService(current_app.config['UPLOAD_FOLDER'])
         
         # Parse request data (support both JSON and multipart/form-data)
@@ -586,24 +659,18 @@ def edit_page_image(project_id, page_id):
         db.session.add(task)
         db.session.commit()
         
-        # Get app instance for background task
-        app = current_app._get_current_object()
-        
-        # Submit background task
-        task_manager.submit_task(
+        # Enqueue background task (persisted, survives restarts)
+        task_manager.enqueue(
             task.id,
-            edit_page_image_task,
-            project_id,
-            page_id,
-            data['edit_instruction'],
-            ai_service,
-            file_service,
-            current_app.config['DEFAULT_ASPECT_RATIO'],
-            current_app.config['DEFAULT_RESOLUTION'],
-            original_description,
-            additional_ref_images if additional_ref_images else None,
-            str(temp_dir) if temp_dir else None,
-            app
+            'EDIT_PAGE_IMAGE',
+            project_id=project_id,
+            page_id=page_id,
+            edit_instruction=data['edit_instruction'],
+            aspect_ratio=current_app.config['DEFAULT_ASPECT_RATIO'],
+            resolution=current_app.config['DEFAULT_RESOLUTION'],
+            original_description=original_description,
+            additional_ref_images=additional_ref_images if additional_ref_images else None,
+            temp_dir=str(temp_dir) if temp_dir else None
         )
         
         # Return task_id immediately
@@ -2,12 +2,15 @@
 Project Controller - handles project-related endpoints
 """
 import logging
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, current_app, request, jsonify
 from models import db, Project, Page, Task, ReferenceFile
-from utils import success_response, error_response, not_found, bad_request
+from utils import success_response, error_response, not_found, bad_request, sse_event, sse_response
 from services import AIService, ProjectContext
-from services.task_manager import task_manager, generate_descriptions_task, generate_images_task
+from services.task_manager import task_manager
+from services.task_events import task_events
+from services.outline_reconciler import reconcile_pages, outline_key
 import json
+import queue
 import traceback
 from datetime import datetime
 
@@ -42,12 +45,14 @@ def _get_project_reference_files_content(project_id: str) -> list:
     return files_content
 
 
-def _reconstruct_outline_from_pages(pages: list) -> list:
+def _reconstruct_outline_from_pages(pages: list, with_ids: bool = False) -> list:
     """
     Reconstruct outline structure from Page objects
     
     Args:
         pages: List of Page objects ordered by order_index
+        with_ids: Add each page's identity key ("p1", "p2", ...) so a refined outline
+                  can be matched back to existing pages (see outline_reconciler)
         
     Returns:
         Outline structure (list) with optional part grouping
@@ -56,12 +61,14 @@ def _reconstruct_outline_from_pages(pages: list) -> list:
     current_part = None
     current_part_pages = []
     
-    for page in pages:
+    for position, page in enumerate(pages):
         outline_content = page.get_outline_content()
         if not outline_content:
             continue
             
         page_data = outline_content.copy()
+        if with_ids:
+            page_data = {'id': outline_key(position), **page_data}
         
         # 如果当前页面属于一个 part
         if page.part:
@@ -101,6 +108,95 @@ def _reconstruct_outline_from_pages(pages: list) -> list:
     return outline
 
 
+IMAGE_RESUME_MODES = ('all', 'skip_completed', 'only_failed')
+
+
+def _select_pages_for_image_generation(pages: list, resume_mode: str, file_service) -> list:
+    """
+    Select the pages that need (re)generation for a batch image request
+    
+    Args:
+        pages: Project pages ordered by order_index
+        resume_mode: 'all' regenerates every page,
+                     'skip_completed' skips pages that are COMPLETED and whose image file exists,
+                     'only_failed' only schedules pages in FAILED state
+        file_service: FileService used to check that generated images are still on disk
+        
+    Returns:
+        List of pages to generate, in the original order
+    """
+    if resume_mode == 'only_failed':
+        return [page for page in pages if page.status == 'FAILED']
+    
+    if resume_mode == 'skip_completed':
+        return [
+            page for page in pages
+            if not (page.status == 'COMPLETED'
+                    and page.generated_image_path
+                    and file_service.file_exists(page.generated_image_path))
+        ]
+    
+    return pages
+
+
+def _list_project_summaries(limit: int, offset: int):
+    """
+    Load a page of project summaries with a single query
+    
+    Per-project page statistics (page count, first page title, first generated
+    image, whether any page has a description) are computed by correlated
+    subqueries, and the total project count by a window function, so the
+    history view costs one query regardless of how many projects it lists.
+    
+    Returns:
+        (list of summary dicts, total project count)
+    """
+    from sqlalchemy import desc, exists, func, select
+    
+    def first_page(column, *conditions):
+        return (select(column)
+                .where(Page.project_id == Project.id, *conditions)
+                .order_by(Page.order_index)
+                .limit(1)
+                .correlate(Project)
+                .scalar_subquery())
+    
+    has_image = Page.generated_image_path.isnot(None)
+    rows = db.session.query(
+        Project,
+        select(func.count(Page.id)).where(Page.project_id == Project.id)
+        .correlate(Project).scalar_subquery().label('page_count'),
+        exists().where(Page.project_id == Project.id, Page.description_content.isnot(None))
+        .correlate(Project).label('has_descriptions'),
+        first_page(Page.outline_content).label('first_outline'),
+        first_page(Page.generated_image_path, has_image).label('cover_image_path'),
+        first_page(Page.updated_at, has_image).label('cover_updated_at'),
+        func.count().over().label('total'),
+    ).order_by(desc(Project.updated_at)).limit(limit).offset(offset).all()
+    
+    summaries = []
+    for project, page_count, has_descriptions, first_outline, cover_image_path, cover_updated_at, _ in rows:
+        try:
+            first_page_title = (json.loads(first_outline) or {}).get('title') if first_outline else None
+        except (ValueError, AttributeError):
+            first_page_title = None
+        
+        data = project.to_dict()
+        data.update({
+            'page_count': page_count,
+            'first_page_title': first_page_title,
+            'has_descriptions': bool(has_descriptions),
+            'has_images': cover_image_path is not None,
+            'cover_image_url': f'/files/{project.id}/pages/{cover_image_path.split("/")[-1]}' if cover_image_path else None,
+            'cover_updated_at': cover_updated_at.isoformat() if cover_updated_at else None,
+        })
+        summaries.append(data)
+    
+    # 偏移量超出范围时没有行可以携带总数，单独统计
+    total = rows[0][-1] if rows else Project.query.count()
+    return summaries, total
+
+
 @project_bp.route('', methods=['GET'])
 def list_projects():
     """
@@ -109,19 +205,32 @@ def list_projects():
     Query params:
     - limit: number of projects to return (default: 50)
     - offset: offset for pagination (default: 0)
+    - view: "summary" (default) returns page statistics instead of pages;
+            "full" includes every page of every project
     """
     try:
         from sqlalchemy import desc
         
         limit = request.args.get('limit', 50, type=int)
         offset = request.args.get('offset', 0, type=int)
+        view = request.args.get('view', 'summary')
+        
+        if view == 'full':
+            # Get projects ordered by updated_at descending
+            projects = Project.query.order_by(desc(Project.updated_at)).limit(limit).offset(offset).all()
+            
+            return success_response({
+                'projects': [project.to_dict(include_pages=True) for project in projects],
+                'total': Project.query.count()
+            })
         
-        # Get projects ordered by updated_at descending
-        projects = Project.query.order_by(desc(Project.updated_at)).limit(limit).offset(offset).all()
+        if view != 'summary':
+            return bad_request("view must be 'summary' or 'full'")
         
+        summaries, total = _list_project_summaries(limit, offset)
         return success_response({
-            'projects': [project.to_dict(include_pages=True) for project in projects],
-            'total': Project.query.count()
+            'projects': summaries,
+            'total': total
         })
     
     except Exception as e:
@@ -545,27 +654,19 @@ def generate_descriptions(project_id):
         db.session.add(task)
         db.session.commit()
         
-        # Initialize AI service
-        ai_service = AIService()
-        
         # Get reference files content and create project context
         reference_files_content = _get_project_reference_files_content(project_id)
         project_context = ProjectContext(project, reference_files_content)
         
-        # Get app instance for background task
-        app = current_app._get_current_object()
-        
-        # Submit background task
-        task_manager.submit_task(
+        # Enqueue background task (persisted, survives restarts)
+        task_manager.enqueue(
             task.id,
-            generate_descriptions_task,
-            project_id,
-            ai_service,
-            project_context,
-            outline,
-            max_workers,
-            app,
-            language
+            'GENERATE_DESCRIPTIONS',
+            project_id=project_id,
+            project_context=project_context.to_dict(),
+            outline=outline,
+            max_workers=max_workers,
+            language=language
         )
         
         # Update project status
@@ -592,7 +693,8 @@ def generate_images(project_id):
     {
         "max_workers": 8,
         "use_template": true,
-        "language": "zh"  # output language: zh, en, ja, auto
+        "language": "zh",  # output language: zh, en, ja, auto
+        "resume_mode": "all"  # all (default), skip_completed, only_failed
     }
     """
     try:
@@ -622,6 +724,21 @@ def generate_images(project_id):
         max_workers = data.get('max_workers', current_app.config.get('MAX_IMAGE_WORKERS', 8))
         use_template = data.get('use_template', True)
         language = data.get('language', current_app.config.get('OUTPUT_LANGUAGE', 'zh'))
+        resume_mode = data.get('resume_mode') or 'all'
+        
+        if resume_mode not in IMAGE_RESUME_MODES:
+            return bad_request(f"Invalid resume_mode, must be one of: {', '.join(IMAGE_RESUME_MODES)}")
+        
+        # 断点续传：只调度尚未成功生成的页面，已完成的页面不再重复生成
+        from services import FileService
+        file_service = FileService(current_app.config['UPLOAD_FOLDER'])
+        target_pages = _select_pages_for_image_generation(pages, resume_mode, file_service)
+        
+        if not target_pages:
+            return bad_request("No pages need image generation")
+        
+        # None means all pages, keeps the job payload small for full runs
+        page_ids = [page.id for page in target_pages] if resume_mode != 'all' else None
         
         # Create task
         task = Task(
@@ -630,7 +747,7 @@ def generate_images(project_id):
             status='PENDING'
         )
         task.set_progress({
-            'total': len(pages),
+            'total': len(target_pages),
             'completed': 0,
             'failed': 0
         })
@@ -638,30 +755,19 @@ def generate_images(project_id):
         db.session.add(task)
         db.session.commit()
         
-        # Initialize services
-        ai_service = AIService()
-        
-        from services import FileService
-        file_service = FileService(current_app.config['UPLOAD_FOLDER'])
-        
-        # Get app instance for background task
-        app = current_app._get_current_object()
-        
-        # Submit background task
-        task_manager.submit_task(
+        # Enqueue background task (persisted, survives restarts)
+        task_manager.enqueue(
             task.id,
-            generate_images_task,
-            project_id,
-            ai_service,
-            file_service,
-            outline,
-            use_template,
-            max_workers,
-            current_app.config['DEFAULT_ASPECT_RATIO'],
-            current_app.config['DEFAULT_RESOLUTION'],
-            app,
-            project.extra_requirements,
-            language
+            'GENERATE_IMAGES',
+            project_id=project_id,
+            outline=outline,
+            use_template=use_template,
+            max_workers=max_workers,
+            aspect_ratio=current_app.config['DEFAULT_ASPECT_RATIO'],
+            resolution=current_app.config['DEFAULT_RESOLUTION'],
+            extra_requirements=project.extra_requirements,
+            language=language,
+            page_ids=page_ids
         )
         
         # Update project status
@@ -671,7 +777,8 @@ def generate_images(project_id):
         return success_response({
             'task_id': task.id,
             'status': 'GENERATING_IMAGES',
-            'total_pages': len(pages)
+            'total_pages': len(target_pages),
+            'skipped_pages': len(pages) - len(target_pages)
         }, status_code=202)
     
     except Exception as e:
@@ -696,6 +803,64 @@ def get_task_status(project_id, task_id):
         return error_response('SERVER_ERROR', str(e), 500)
 
 
+@project_bp.route('/<project_id>/tasks/<task_id>/events', methods=['GET'])
+def stream_task_events(project_id, task_id):
+    """
+    GET /api/projects/{project_id}/tasks/{task_id}/events - Stream task progress (Server-Sent Events)
+    
+    Events:
+        task: Task status/progress snapshot (same shape as GET .../tasks/{task_id}), sent
+              immediately and whenever it changes
+        page: A page of the project changed status, {"page_id", "order_index", "status",
+              "generated_image_url", "updated_at"}
+    
+    The stream ends after the task reaches COMPLETED or FAILED.
+    """
+    task = Task.query.get(task_id)
+    if not task or task.project_id != project_id:
+        return not_found('Task')
+    
+    poll_interval = current_app.config.get('TASK_EVENTS_POLL_INTERVAL', 5.0)
+    subscriber = task_events.subscribe(project_id)
+    snapshot = task.to_dict()
+    # 连接期间不持有数据库会话，兜底轮询时再按需打开
+    db.session.remove()
+    
+    def read_snapshot():
+        """Re-read the task (covers updates committed by other processes)"""
+        try:
+            current = Task.query.get(task_id)
+            return current.to_dict() if current else None
+        finally:
+            db.session.remove()
+    
+    def generate():
+        last = snapshot
+        try:
+            yield sse_event('task', last)
+            while last['status'] not in ('COMPLETED', 'FAILED'):
+                try:
+                    event_type, data = subscriber.get(timeout=poll_interval)
+                except queue.Empty:
+                    data = read_snapshot()
+                    if data is None:
+                        break
+                    if data == last:
+                        yield ": keep-alive\n\n"
+                        continue
+                    event_type = 'task'
+                
+                if event_type == 'task':
+                    if data.get('task_id') != task_id:
+                        continue
+                    last = data
+                yield sse_event(event_type, data)
+        finally:
+            task_events.unsubscribe(project_id, subscriber)
+    
+    return sse_response(generate())
+
+
 @project_bp.route('/<project_id>/refine/outline', methods=['POST'])
 def refine_outline(project_id):
     """
@@ -732,7 +897,7 @@ def refine_outline(project_id):
             logger.info(f"项目 {project_id} 当前没有页面，将从空开始生成")
             current_outline = []  # 空大纲
         else:
-            current_outline = _reconstruct_outline_from_pages(pages)
+            current_outline = _reconstruct_outline_from_pages(pages, with_ids=True)
         
         # Initialize AI service
         from flask import current_app
@@ -766,65 +931,12 @@ def refine_outline(project_id):
         # Flatten outline to pages
         pages_data = ai_service.flatten_outline(refined_outline)
         
-        # 在删除旧页面之前，先保存已有的页面描述（按标题匹配）
-        old_pages = Page.query.filter_by(project_id=project_id).order_by(Page.order_index).all()
-        descriptions_map = {}  # {title: description_content}
-        old_status_map = {}  # {title: status} 用于保留状态
-        
-        for old_page in old_pages:
-            old_outline = old_page.get_outline_content()
-            if old_outline and old_outline.get('title'):
-                title = old_outline.get('title')
-                if old_page.description_content:
-                    descriptions_map[title] = old_page.description_content
-                # 如果旧页面已经有描述，保留状态
-                if old_page.status in ['DESCRIPTION_GENERATED', 'IMAGE_GENERATED']:
-                    old_status_map[title] = old_page.status
-        
-        # Delete existing pages (using ORM session to trigger cascades)
-        for old_page in old_pages:
-            db.session.delete(old_page)
-        
-        # Create pages from refined outline
-        pages_list = []
-        has_descriptions = False
-        preserved_count = 0
-        new_count = 0
-        
-        for i, page_data in enumerate(pages_data):
-            page = Page(
-                project_id=project_id,
-                order_index=i,
-                part=page_data.get('part'),
-                status='DRAFT'
-            )
-            page.set_outline_content({
-                'title': page_data.get('title'),
-                'points': page_data.get('points', [])
-            })
-            
-            # 尝试匹配并恢复已有的描述
-            title = page_data.get('title')
-            if title in descriptions_map:
-                # 恢复描述内容
-                page.description_content = descriptions_map[title]
-                # 恢复状态（如果有）
-                if title in old_status_map:
-                    page.status = old_status_map[title]
-                else:
-                    page.status = 'DESCRIPTION_GENERATED'
-                has_descriptions = True
-                preserved_count += 1
-            else:
-                # 新页面或标题改变的页面，描述为空
-                # 这包括：新增的页面、合并的页面、标题改变的页面
-                page.status = 'DRAFT'
-                new_count += 1
-            
-            db.session.add(page)
-            pages_list.append(page)
+        # 按 id / 标题 / 相似度将新大纲匹配到已有页面，原地更新，未改动的页面保留描述、图片和历史版本
+        pages_list, changes = reconcile_pages(project_id, pages, pages_data)
+        has_descriptions = any(p.description_content for p in pages_list)
         
-        logger.info(f"描述匹配完成: 保留了 {preserved_count} 个页面的描述, {new_count} 个页面需要重新生成描述")
+        logger.info(f"页面匹配完成: 未改动 {changes['unchanged']} 页, 更新 {changes['updated']} 页, "
+                    f"新增 {changes['added']} 页, 删除 {changes['removed']} 页")
         
         # Update project status
         # 如果所有页面都有描述，保持 DESCRIPTION_GENERATED 状态
@@ -837,11 +949,12 @@ def refine_outline(project_id):
         
         db.session.commit()
         
-        logger.info(f"大纲修改完成: 项目 {project_id}, 创建了 {len(pages_list)} 个页面")
+        logger.info(f"大纲修改完成: 项目 {project_id}, 共 {len(pages_list)} 个页面")
         
         # Return pages
         return success_response({
             'pages': [page.to_dict() for page in pages_list],
+            'changes': changes,
             'message': '大纲修改成功'
         })
     
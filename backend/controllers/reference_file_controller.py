@@ -4,6 +4,7 @@ Reference File Controller - handles file upload and parsing
 import os
 import logging
 import re
+import threading
 import uuid
 from flask import Blueprint, request, current_app
 from werkzeug.utils import secure_filename
@@ -11,11 +12,13 @@ from pathlib import Path
 from config import Config
 from datetime import datetime
 from urllib.parse import unquote
-import threading
+from typing import Callable, Dict, List, Optional, Tuple
 
-from models import db, ReferenceFile, Project
+from models import db, ReferenceFile, ReferenceChunk, Project
 from utils.response import success_response, error_response, bad_request, not_found
 from services.file_parser_service import FileParserService
+from services.reference_index import build_reference_index
+from services.parse_queue import get_parse_queue
 
 logger = logging.getLogger(__name__)
 
@@ -35,6 +38,91 @@ def _get_file_type(filename: str) -> str:
     return 'unknown'
 
 
+def _file_dicts(reference_files: List[ReferenceFile], **kwargs) -> List[Dict]:
+    """Serialize reference files, adding each queued file's position in the parse queue"""
+    positions = {}
+    if any(f.parse_status == 'queued' for f in reference_files):
+        positions = get_parse_queue().queue_positions()
+    result = []
+    for reference_file in reference_files:
+        data = reference_file.to_dict(**kwargs)
+        data['queue_position'] = (
+            positions.get(reference_file.id) if reference_file.parse_status == 'queued' else None
+        )
+        result.append(data)
+    return result
+
+
+def _file_dict(reference_file: ReferenceFile, **kwargs) -> Dict:
+    """Serialize a single reference file (see _file_dicts)"""
+    return _file_dicts([reference_file], **kwargs)[0]
+
+
+def _create_parser() -> FileParserService:
+    """Create a parser service from the app config"""
+    return FileParserService(
+        mineru_token=current_app.config['MINERU_TOKEN'],
+        mineru_api_base=current_app.config['MINERU_API_BASE'],
+        google_api_key=current_app.config.get('GOOGLE_API_KEY', ''),
+        google_api_base=current_app.config.get('GOOGLE_API_BASE', ''),
+        openai_api_key=current_app.config.get('OPENAI_API_KEY', ''),
+        openai_api_base=current_app.config.get('OPENAI_API_BASE', ''),
+        image_caption_model=current_app.config['IMAGE_CAPTION_MODEL']
+    )
+
+
+def _save_parse_result(file_id: str, batch_id: Optional[str], markdown_content: Optional[str],
+                       error_message: Optional[str], failed_image_count: int):
+    """
+    Store a parsing result and build the retrieval index (requires an app context)
+    
+    Args:
+        file_id: Reference file ID
+        batch_id: MinerU batch ID (None for files parsed locally)
+        markdown_content: Parsed markdown
+        error_message: Error message if parsing failed
+        failed_image_count: Number of images that failed to generate captions
+    """
+    reference_file = ReferenceFile.query.get(file_id)
+    if not reference_file:
+        logger.error(f"Reference file {file_id} not found")
+        return
+    
+    reference_file.mineru_batch_id = batch_id
+    if error_message:
+        reference_file.parse_status = 'failed'
+        reference_file.error_message = error_message
+        logger.error(f"File parsing failed: {error_message}")
+    else:
+        reference_file.parse_status = 'completed'
+        reference_file.markdown_content = markdown_content
+        # 建立检索索引，失败不影响解析结果（生成描述时会再次尝试）
+        try:
+            build_reference_index(reference_file)
+        except Exception as index_error:
+            logger.warning(f"Failed to index reference file {reference_file.filename}: {index_error}", exc_info=True)
+        if failed_image_count > 0:
+            logger.warning(f"File parsing completed: {reference_file.filename}, but {failed_image_count} images failed to generate captions")
+        else:
+            logger.info(f"File parsing completed: {reference_file.filename}")
+    
+    reference_file.updated_at = datetime.utcnow()
+    db.session.commit()
+
+
+def _mark_parse_failed(file_id: str, error: Exception):
+    """Record an unexpected parsing error on a reference file (requires an app context)"""
+    try:
+        reference_file = ReferenceFile.query.get(file_id)
+        if reference_file:
+            reference_file.parse_status = 'failed'
+            reference_file.error_message = f"Parsing error: {str(error)}"
+            reference_file.updated_at = datetime.utcnow()
+            db.session.commit()
+    except Exception as db_error:
+        logger.error(f"Failed to update error status: {str(db_error)}")
+
+
 def _parse_file_async(file_id: str, file_path: str, filename: str, app):
     """
     Parse file asynchronously in background
@@ -52,53 +140,154 @@ def _parse_file_async(file_id: str, file_path: str, filename: str, app):
                 logger.error(f"Reference file {file_id} not found")
                 return
             
-            # Update status to parsing
+            # 由解析队列取出后才进入 parsing 状态
             reference_file.parse_status = 'parsing'
             db.session.commit()
             
-            # Initialize parser service
-            parser = FileParserService(
-                mineru_token=current_app.config['MINERU_TOKEN'],
-                mineru_api_base=current_app.config['MINERU_API_BASE'],
-                google_api_key=current_app.config.get('GOOGLE_API_KEY', ''),
-                google_api_base=current_app.config.get('GOOGLE_API_BASE', ''),
-                openai_api_key=current_app.config.get('OPENAI_API_KEY', ''),
-                openai_api_base=current_app.config.get('OPENAI_API_BASE', ''),
-                image_caption_model=current_app.config['IMAGE_CAPTION_MODEL']
-            )
-            
             # Parse file
             logger.info(f"Starting to parse file: {filename}")
-            batch_id, markdown_content, error_message, failed_image_count = parser.parse_file(file_path, filename)
-            
-            # Update database
-            reference_file.mineru_batch_id = batch_id
-            if error_message:
-                reference_file.parse_status = 'failed'
-                reference_file.error_message = error_message
-                logger.error(f"File parsing failed: {error_message}")
-            else:
-                reference_file.parse_status = 'completed'
-                reference_file.markdown_content = markdown_content
-                if failed_image_count > 0:
-                    logger.warning(f"File parsing completed: {filename}, but {failed_image_count} images failed to generate captions")
-                else:
-                    logger.info(f"File parsing completed: {filename}")
+            batch_id, markdown_content, error_message, failed_image_count = _create_parser().parse_file(file_path, filename)
+            _save_parse_result(file_id, batch_id, markdown_content, error_message, failed_image_count)
             
-            reference_file.updated_at = datetime.utcnow()
+        except Exception as e:
+            logger.error(f"Error in async file parsing: {str(e)}", exc_info=True)
+            _mark_parse_failed(file_id, e)
+
+
+def _parse_files_batch_async(files: List[Tuple[str, str, str]], app, release: Callable[[], None]):
+    """
+    Submit several files to MinerU as one batch; results are saved as each file finishes
+    
+    Runs as a deferred parse-queue job: polling, captioning and saving happen on
+    the MinerU poller's threads, and the job's queue slot is released once every
+    file of the batch has a result.
+    
+    Args:
+        files: (file_id, file_path, filename) of each file
+        app: Flask app instance (for app context)
+        release: Frees the parse-queue slot
+    """
+    remaining = {file_id for file_id, _, _ in files}
+    remaining_lock = threading.Lock()
+    
+    def on_result(file_id, batch_id, markdown_content, error_message, failed_image_count):
+        try:
+            with app.app_context():
+                try:
+                    _save_parse_result(file_id, batch_id, markdown_content, error_message, failed_image_count)
+                except Exception as e:
+                    logger.error(f"Error saving parse result for {file_id}: {str(e)}", exc_info=True)
+                    db.session.rollback()
+                    _mark_parse_failed(file_id, e)
+        finally:
+            with remaining_lock:
+                remaining.discard(file_id)
+                done = not remaining
+            if done:
+                release()
+    
+    with app.app_context():
+        try:
+            ReferenceFile.query.filter(
+                ReferenceFile.id.in_([file_id for file_id, _, _ in files])
+            ).update({'parse_status': 'parsing'}, synchronize_session=False)
             db.session.commit()
             
+            logger.info(f"Starting to parse {len(files)} file(s) in one MinerU batch")
+            _create_parser().submit_batch(files, on_result)
         except Exception as e:
-            logger.error(f"Error in async file parsing: {str(e)}", exc_info=True)
-            try:
-                reference_file = ReferenceFile.query.get(file_id)
-                if reference_file:
-                    reference_file.parse_status = 'failed'
-                    reference_file.error_message = f"Parsing error: {str(e)}"
-                    reference_file.updated_at = datetime.utcnow()
-                    db.session.commit()
-            except Exception as db_error:
-                logger.error(f"Failed to update error status: {str(db_error)}")
+            logger.error(f"Error submitting MinerU batch: {str(e)}", exc_info=True)
+            for file_id, _, _ in files:
+                _mark_parse_failed(file_id, e)
+            release()
+
+
+def _start_parsing(reference_files: List[ReferenceFile]) -> List[ReferenceFile]:
+    """
+    Reset and start parsing reference files in the background
+    
+    Files that need MinerU are uploaded together as one batch per project; plain
+    text and spreadsheets are parsed locally, one job each. Jobs run on the
+    bounded parse queue (see services/parse_queue.py).
+    
+    Files are marked 'queued' here and 'parsing' once a worker picks them up.
+    
+    Returns:
+        The files parsing was started for (files already queued or parsing, or missing on disk, are skipped)
+    """
+    upload_folder = current_app.config['UPLOAD_FOLDER']
+    started = []
+    for reference_file in reference_files:
+        # 已排队或正在解析的文件不重复提交
+        if reference_file.parse_status in ['queued', 'parsing']:
+            continue
+        file_path = Path(upload_folder) / reference_file.file_path
+        if not file_path.exists():
+            logger.warning(f"Reference file missing on disk: {file_path}")
+            continue
+        
+        # 如果解析完成或失败，可以重新解析：清空之前的解析结果
+        if reference_file.parse_status in ['completed', 'failed']:
+            reference_file.markdown_content = None
+            reference_file.mineru_batch_id = None
+            ReferenceChunk.query.filter_by(reference_file_id=reference_file.id).delete()
+        reference_file.error_message = None
+        reference_file.parse_status = 'queued'
+        started.append((reference_file, str(file_path)))
+    db.session.commit()
+    
+    # 交给有界的解析队列，按项目限制并发
+    app = current_app._get_current_object()
+    parse_queue = get_parse_queue()
+    mineru_files = {}
+    for reference_file, file_path in started:
+        project_key = reference_file.project_id or 'global'
+        if FileParserService.needs_mineru(reference_file.filename):
+            mineru_files.setdefault(project_key, []).append(
+                (reference_file.id, file_path, reference_file.filename)
+            )
+        else:
+            parse_queue.submit([reference_file.id], project_key, _parse_file_async,
+                               reference_file.id, file_path, reference_file.filename, app)
+    
+    # 每个项目的 MinerU 文件合并为一个批次
+    for project_key, files in mineru_files.items():
+        parse_queue.submit([file_id for file_id, _, _ in files], project_key,
+                           _parse_files_batch_async, files, app, deferred=True)
+    
+    return [reference_file for reference_file, _ in started]
+
+
+def recover_interrupted_parsing(app):
+    """
+    Reset reference files left queued or parsing by a previous server process
+    
+    The parse queue lives in memory, so after a restart these files would stay
+    queued/parsing forever and could not be re-triggered. Queued files never
+    started and go back to 'pending'; files that were being parsed are marked
+    'failed' so they can be parsed again.
+    """
+    with app.app_context():
+        try:
+            queued = ReferenceFile.query.filter_by(parse_status='queued').update(
+                {'parse_status': 'pending'}, synchronize_session=False
+            )
+            parsing = ReferenceFile.query.filter_by(parse_status='parsing').update(
+                {
+                    'parse_status': 'failed',
+                    'error_message': 'Parsing was interrupted by a server restart, please parse the file again',
+                },
+                synchronize_session=False
+            )
+            db.session.commit()
+            if queued or parsing:
+                logger.warning(
+                    f"Parse recovery: reset {queued} queued file(s) to pending, "
+                    f"marked {parsing} interrupted file(s) as failed"
+                )
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f"Failed to recover interrupted parsing: {str(e)}", exc_info=True)
 
 
 @reference_file_bp.route('/upload', methods=['POST'])
@@ -202,7 +391,7 @@ def upload_reference_file():
         # Lazy parsing: 不立即解析，等待用户选择确定后再解析
         # 解析将在用户选择文件并确认时触发
         
-        return success_response({'file': reference_file.to_dict()})
+        return success_response({'file': _file_dict(reference_file)})
         
     except Exception as e:
         logger.error(f"Error uploading reference file: {str(e)}", exc_info=True)
@@ -223,7 +412,7 @@ def get_reference_file(file_id):
             return not_found('Reference file')
         
         # 单个文件查询时包含内容和失败计数（会在 to_dict 中根据状态判断是否计算）
-        return success_response({'file': reference_file.to_dict(include_content=True, include_failed_count=True)})
+        return success_response({'file': _file_dict(reference_file, include_content=True, include_failed_count=True)})
         
     except Exception as e:
         logger.error(f"Error getting reference file: {str(e)}", exc_info=True)
@@ -296,7 +485,7 @@ def list_project_reference_files(project_id):
         
         # 列表查询时不包含 markdown_content 和失败计数，加快响应速度
         return success_response({
-            'files': [f.to_dict(include_content=False) for f in reference_files]
+            'files': _file_dicts(reference_files, include_content=False)
         })
         
     except Exception as e:
@@ -317,22 +506,13 @@ def trigger_file_parse(file_id):
         if not reference_file:
             return not_found('Reference file')
         
-        # 如果正在解析，直接返回
-        if reference_file.parse_status == 'parsing':
+        # 如果已排队或正在解析，直接返回
+        if reference_file.parse_status in ['queued', 'parsing']:
             return success_response({
-                'file': reference_file.to_dict(),
+                'file': _file_dict(reference_file),
                 'message': 'File is already being parsed'
             })
         
-        # 如果解析完成或失败，可以重新解析
-        if reference_file.parse_status in ['completed', 'failed']:
-            reference_file.parse_status = 'pending'
-            reference_file.error_message = None
-            # 清空之前的解析结果，以便重新解析
-            reference_file.markdown_content = None
-            reference_file.mineru_batch_id = None
-            db.session.commit()
-        
         # 获取文件路径
         upload_folder = current_app.config['UPLOAD_FOLDER']
         file_path = Path(upload_folder) / reference_file.file_path
@@ -341,17 +521,61 @@ def trigger_file_parse(file_id):
             return error_response('FILE_NOT_FOUND', f'File not found: {file_path}', 404)
         
         # 启动异步解析
-        thread = threading.Thread(
-            target=_parse_file_async,
-            args=(reference_file.id, str(file_path), reference_file.filename, current_app._get_current_object())
-        )
-        thread.daemon = True
-        thread.start()
+        _start_parsing([reference_file])
         
         logger.info(f"Triggered parsing for file: {reference_file.filename} (ID: {file_id})")
         
         return success_response({
-            'file': reference_file.to_dict(),
+            'file': _file_dict(reference_file),
+            'message': 'Parsing started'
+        })
+        
+    except Exception as e:
+        logger.error(f"Error triggering file parse: {str(e)}", exc_info=True)
+        return error_response('SERVER_ERROR', str(e), 500)
+
+
+@reference_file_bp.route('/parse', methods=['POST'])
+def trigger_files_parse():
+    """
+    POST /api/reference-files/parse - Trigger parsing for several reference files at once
+    
+    Files that need MinerU are submitted as a single MinerU batch.
+    
+    Request body (one of):
+    {
+        "file_ids": ["file-id-1", "file-id-2"],
+        "project_id": "project-id-here"   // all pending files of the project ('global' for global files)
+    }
+    
+    Returns:
+        Files parsing was started for
+    """
+    try:
+        data = request.get_json() or {}
+        file_ids = data.get('file_ids')
+        project_id = data.get('project_id')
+        
+        if file_ids:
+            if not isinstance(file_ids, list):
+                return bad_request("file_ids must be a list")
+            reference_files = ReferenceFile.query.filter(ReferenceFile.id.in_(file_ids)).all()
+        elif project_id:
+            query = ReferenceFile.query.filter_by(parse_status='pending')
+            if project_id in ['global', 'none']:
+                reference_files = query.filter_by(project_id=None).all()
+            else:
+                if not Project.query.get(project_id):
+                    return not_found('Project')
+                reference_files = query.filter_by(project_id=project_id).all()
+        else:
+            return bad_request("file_ids or project_id is required")
+        
+        started = _start_parsing(reference_files)
+        logger.info(f"Triggered parsing for {len(started)} file(s)")
+        
+        return success_response({
+            'files': _file_dicts(started, include_content=False),
             'message': 'Parsing started'
         })
         
@@ -396,7 +620,7 @@ def associate_file_to_project(file_id):
         
         logger.info(f"Associated reference file {file_id} to project {project_id}")
         
-        return success_response({'file': reference_file.to_dict()})
+        return success_response({'file': _file_dict(reference_file)})
         
     except Exception as e:
         logger.error(f"Error associating reference file: {str(e)}", exc_info=True)
@@ -426,7 +650,7 @@ def dissociate_file_from_project(file_id):
         
         logger.info(f"Dissociated reference file {file_id} from project")
         
-        return success_response({'file': reference_file.to_dict(), 'message': 'File removed from project'})
+        return success_response({'file': _file_dict(reference_file), 'message': 'File removed from project'})
         
     except Exception as e:
         logger.error(f"Error dissociating reference file: {str(e)}", exc_info=True)
@@ -6,6 +6,7 @@ from models import db, Settings
 from utils import success_response, error_response, bad_request
 from datetime import datetime, timezone
 from config import Config
+from services.ai_providers import clear_provider_cache, get_text_cache, get_prefix_tracker
 
 logger = logging.getLogger(__name__)
 
@@ -172,6 +173,45 @@ def reset_settings():
         )
 
 
+@settings_bp.route("/text-cache", methods=["GET"], strict_slashes=False)
+def get_text_cache_stats():
+    """
+    GET /api/settings/text-cache - Text generation cache hit/miss statistics
+    """
+    cache = get_text_cache()
+    if cache is None:
+        return success_response({"enabled": False})
+    return success_response(cache.stats())
+
+
+@settings_bp.route("/text-cache", methods=["DELETE"], strict_slashes=False)
+def clear_text_cache():
+    """
+    DELETE /api/settings/text-cache - Remove all cached text responses
+    """
+    cache = get_text_cache()
+    if cache is None:
+        return success_response({"enabled": False})
+    try:
+        cache.clear()
+        return success_response(cache.stats(), "Text cache cleared")
+    except Exception as e:
+        logger.error(f"Error clearing text cache: {str(e)}")
+        return error_response(
+            "CLEAR_CACHE_ERROR",
+            f"Failed to clear text cache: {str(e)}",
+            500,
+        )
+
+
+@settings_bp.route("/prompt-cache", methods=["GET"], strict_slashes=False)
+def get_prompt_cache_stats():
+    """
+    GET /api/settings/prompt-cache - Shared prompt prefix size and reuse statistics
+    """
+    return success_response(get_prefix_tracker().stats())
+
+
 def _sync_settings_to_config(settings: Settings):
     """Sync settings to Flask app config"""
     # Sync AI provider format (always sync, has default value)
@@ -218,3 +258,6 @@ def _sync_settings_to_config(settings: Settings):
     current_app.config['MAX_DESCRIPTION_WORKERS'] = settings.max_description_workers
     current_app.config['MAX_IMAGE_WORKERS'] = settings.max_image_workers
     logger.info(f"Updated worker settings: desc={settings.max_description_workers}, img={settings.max_image_workers}")
+
+    # Cached provider clients were built with the previous configuration
+    clear_provider_cache()
@@ -16,11 +16,13 @@ db = SQLAlchemy(
 from .project import Project
 from .page import Page
 from .task import Task
+from .task_job import TaskJob
 from .user_template import UserTemplate
 from .page_image_version import PageImageVersion
 from .material import Material
 from .reference_file import ReferenceFile
+from .reference_chunk import ReferenceChunk
 from .settings import Settings
 
-__all__ = ['db', 'Project', 'Page', 'Task', 'UserTemplate', 'PageImageVersion', 'Material', 'ReferenceFile', 'Settings']
+__all__ = ['db', 'Project', 'Page', 'Task', 'TaskJob', 'UserTemplate', 'PageImageVersion', 'Material', 'ReferenceFile', 'ReferenceChunk', 'Settings']
 
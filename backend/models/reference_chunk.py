@@ -0,0 +1,34 @@
+"""
+Reference Chunk model - stores the retrieval index of a parsed reference file
+"""
+from . import db
+
+
+class ReferenceChunk(db.Model):
+    """
+    Reference Chunk model - one markdown section of a reference file, with its search terms
+    """
+    __tablename__ = 'reference_chunks'
+    
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    reference_file_id = db.Column(db.String(36), db.ForeignKey('reference_files.id'), nullable=False, index=True)
+    chunk_index = db.Column(db.Integer, nullable=False)  # 在文件中的顺序，从0开始
+    heading = db.Column(db.String(500), nullable=True)  # 所属的标题路径，如 "第一章 > 背景"
+    content = db.Column(db.Text, nullable=False)
+    terms = db.Column(db.Text, nullable=False)  # 分词结果（空格分隔），解析完成时计算一次
+    
+    # Relationships
+    reference_file = db.relationship('ReferenceFile', back_populates='chunks')
+    
+    def to_dict(self):
+        """Convert to dictionary"""
+        return {
+            'id': self.id,
+            'reference_file_id': self.reference_file_id,
+            'chunk_index': self.chunk_index,
+            'heading': self.heading,
+            'content': self.content,
+        }
+    
+    def __repr__(self):
+        return f'<ReferenceChunk {self.reference_file_id}#{self.chunk_index}>'
@@ -18,7 +18,7 @@ class ReferenceFile(db.Model):
     file_path = db.Column(db.String(500), nullable=False)  # Path relative to upload folder
     file_size = db.Column(db.Integer, nullable=False)  # File size in bytes
     file_type = db.Column(db.String(50), nullable=False)  # pdf, docx, pptx, etc.
-    parse_status = db.Column(db.String(50), nullable=False, default='pending')  # pending|parsing|completed|failed
+    parse_status = db.Column(db.String(50), nullable=False, default='pending')  # pending|queued|parsing|completed|failed
     markdown_content = db.Column(db.Text, nullable=True)  # Parsed markdown with enhanced image descriptions
     error_message = db.Column(db.Text, nullable=True)  # Error message if parsing failed
     mineru_batch_id = db.Column(db.String(100), nullable=True)  # Mineru service batch ID
@@ -27,6 +27,8 @@ class ReferenceFile(db.Model):
     
     # Relationships
     project = db.relationship('Project', backref='reference_files', foreign_keys=[project_id])
+    chunks = db.relationship('ReferenceChunk', back_populates='reference_file', lazy='dynamic',
+                             cascade='all, delete-orphan', order_by='ReferenceChunk.chunk_index')
     
     def to_dict(self, include_content=True, include_failed_count=False):
         """
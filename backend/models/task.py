@@ -24,6 +24,8 @@ class Task(db.Model):
     
     # Relationships
     project = db.relationship('Project', back_populates='tasks')
+    job = db.relationship('TaskJob', back_populates='task', uselist=False,
+                          cascade='all, delete-orphan')
     
     def get_progress(self):
         """Parse progress from JSON string"""
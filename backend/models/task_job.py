@@ -0,0 +1,65 @@
+"""
+Task Job model - durable queue entries backing background tasks
+"""
+import json
+from datetime import datetime
+from . import db
+
+
+class TaskJob(db.Model):
+    """
+    Task Job model - a persisted, claimable unit of background work
+
+    Each row shares its id with the Task it drives. Workers claim a job by
+    taking a time-limited lease and keep it alive with heartbeats; a job whose
+    lease has expired (e.g. the worker process died) can be claimed again.
+    """
+    __tablename__ = 'task_jobs'
+
+    id = db.Column(db.String(36), db.ForeignKey('tasks.id'), primary_key=True)  # Same as Task.id
+    job_type = db.Column(db.String(50), nullable=False)  # Handler name, e.g. GENERATE_IMAGES
+    payload = db.Column(db.Text, nullable=True)  # JSON string: handler keyword arguments
+    status = db.Column(db.String(20), nullable=False, default='QUEUED', index=True)  # QUEUED|RUNNING
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    max_attempts = db.Column(db.Integer, nullable=False, default=3)
+    lease_owner = db.Column(db.String(100), nullable=True)  # Worker id holding the lease
+    lease_expires_at = db.Column(db.DateTime, nullable=True)
+    heartbeat_at = db.Column(db.DateTime, nullable=True)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    # Relationships
+    task = db.relationship('Task', back_populates='job')
+
+    def get_payload(self):
+        """Parse payload from JSON string"""
+        if self.payload:
+            try:
+                return json.loads(self.payload)
+            except json.JSONDecodeError:
+                return {}
+        return {}
+
+    def set_payload(self, data):
+        """Set payload as JSON string"""
+        if data:
+            self.payload = json.dumps(data, ensure_ascii=False)
+        else:
+            self.payload = None
+
+    def to_dict(self):
+        """Convert to dictionary"""
+        return {
+            'job_id': self.id,
+            'job_type': self.job_type,
+            'status': self.status,
+            'attempts': self.attempts,
+            'max_attempts': self.max_attempts,
+            'lease_owner': self.lease_owner,
+            'lease_expires_at': self.lease_expires_at.isoformat() if self.lease_expires_at else None,
+            'heartbeat_at': self.heartbeat_at.isoformat() if self.heartbeat_at else None,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+        }
+
+    def __repr__(self):
+        return f'<TaskJob {self.id}: {self.job_type} - {self.status} (attempt {self.attempts})>'
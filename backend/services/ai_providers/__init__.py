@@ -21,18 +21,28 @@ Environment Variables:
         OPENAI_API_BASE: API base URL (e.g., https://aihubmix.com/v1)
 """
 import os
+import hashlib
 import logging
-from typing import Tuple, Type
+import threading
+from typing import Callable, Dict, Tuple, Type, Union
 
-from .text import TextProvider, GenAITextProvider, OpenAITextProvider
+from .text import (
+    TextProvider, GenAITextProvider, OpenAITextProvider, CachedTextProvider, get_text_cache,
+    get_prefix_tracker
+)
 from .image import ImageProvider, GenAIImageProvider, OpenAIImageProvider
+from .rate_limiter import ProviderRateLimiter, get_rate_limiter
+from .retry_policy import RetryPolicy, classify_error
 
 logger = logging.getLogger(__name__)
 
 __all__ = [
-    'TextProvider', 'GenAITextProvider', 'OpenAITextProvider',
+    'TextProvider', 'GenAITextProvider', 'OpenAITextProvider', 'CachedTextProvider', 'get_text_cache',
+    'get_prefix_tracker',
     'ImageProvider', 'GenAIImageProvider', 'OpenAIImageProvider',
-    'get_text_provider', 'get_image_provider', 'get_provider_format'
+    'get_text_provider', 'get_image_provider', 'get_provider_format', 'clear_provider_cache',
+    'ProviderRateLimiter', 'get_rate_limiter',
+    'RetryPolicy', 'classify_error'
 ]
 
 
@@ -131,10 +141,45 @@ def _get_provider_config() -> Tuple[str, str, str]:
     return provider_format, api_key, api_base
 
 
+# Provider instances (and their SDK clients / HTTP connection pools) are shared
+# across requests and tasks. Keyed by (kind, format, api_key hash, api_base, model).
+_provider_cache: Dict[Tuple[str, str, str, str, str], Union[TextProvider, ImageProvider]] = {}
+_provider_cache_lock = threading.Lock()
+
+
+def _get_cached_provider(kind: str, provider_format: str, api_key: str, api_base: str,
+                         model: str, factory: Callable[[], Union[TextProvider, ImageProvider]]):
+    """Return the cached provider for this configuration, creating it with factory on a miss"""
+    key_digest = hashlib.sha256((api_key or '').encode('utf-8')).hexdigest()[:16]
+    cache_key = (kind, provider_format, key_digest, api_base or '', model)
+    with _provider_cache_lock:
+        provider = _provider_cache.get(cache_key)
+        if provider is None:
+            provider = factory()
+            _provider_cache[cache_key] = provider
+        return provider
+
+
+def clear_provider_cache():
+    """
+    Drop all cached providers
+    
+    Called when settings change so new requests pick up the new configuration;
+    calls already in flight keep using the provider they hold.
+    """
+    with _provider_cache_lock:
+        count = len(_provider_cache)
+        _provider_cache.clear()
+    if count:
+        logger.info(f"Cleared {count} cached AI provider(s)")
+
+
 def get_text_provider(model: str = "gemini-2.5-flash") -> TextProvider:
     """
     Factory function to get text generation provider based on configuration
     
+    Providers are cached per configuration, so repeated calls reuse the same client.
+    
     Args:
         model: Model name to use
         
@@ -143,12 +188,23 @@ def get_text_provider(model: str = "gemini-2.5-flash") -> TextProvider:
     """
     provider_format, api_key, api_base = _get_provider_config()
     
-    if provider_format == 'openai':
-        logger.info(f"Using OpenAI format for text generation, model: {model}")
-        return OpenAITextProvider(api_key=api_key, api_base=api_base, model=model)
-    else:
-        logger.info(f"Using Gemini format for text generation, model: {model}")
-        return GenAITextProvider(api_key=api_key, api_base=api_base, model=model)
+    def create() -> TextProvider:
+        # 每次请求尝试都经过该模型的全局限流（重试等待期间不占用名额）
+        retry_policy = RetryPolicy.from_config(limiter=get_rate_limiter(provider_format, model, kind='text'))
+        if provider_format == 'openai':
+            logger.info(f"Using OpenAI format for text generation, model: {model}")
+            provider = OpenAITextProvider(api_key=api_key, api_base=api_base, model=model,
+                                          retry_policy=retry_policy)
+        else:
+            logger.info(f"Using Gemini format for text generation, model: {model}")
+            provider = GenAITextProvider(api_key=api_key, api_base=api_base, model=model,
+                                         retry_policy=retry_policy)
+        
+        # Opt-in response cache (TEXT_CACHE_ENABLED)
+        cache = get_text_cache()
+        return CachedTextProvider(provider, cache) if cache else provider
+    
+    return _get_cached_provider('text', provider_format, api_key, api_base, model, create)
 
 
 def get_image_provider(model: str = "gemini-3-pro-image-preview") -> ImageProvider:
@@ -164,13 +220,20 @@ def get_image_provider(model: str = "gemini-3-pro-image-preview") -> ImageProvid
     Note:
         OpenAI format does NOT support 4K resolution, only 1K is available.
         If you need higher resolution images, use Gemini format.
+        Providers are cached per configuration, so repeated calls reuse the same client.
     """
     provider_format, api_key, api_base = _get_provider_config()
     
-    if provider_format == 'openai':
-        logger.info(f"Using OpenAI format for image generation, model: {model}")
-        logger.warning("OpenAI format only supports 1K resolution, 4K is not available")
-        return OpenAIImageProvider(api_key=api_key, api_base=api_base, model=model)
-    else:
-        logger.info(f"Using Gemini format for image generation, model: {model}")
-        return GenAIImageProvider(api_key=api_key, api_base=api_base, model=model)
+    def create() -> ImageProvider:
+        retry_policy = RetryPolicy.from_config(limiter=get_rate_limiter(provider_format, model, kind='image'))
+        if provider_format == 'openai':
+            logger.info(f"Using OpenAI format for image generation, model: {model}")
+            logger.warning("OpenAI format only supports 1K resolution, 4K is not available")
+            return OpenAIImageProvider(api_key=api_key, api_base=api_base, model=model,
+                                       retry_policy=retry_policy)
+        else:
+            logger.info(f"Using Gemini format for image generation, model: {model}")
+            return GenAIImageProvider(api_key=api_key, api_base=api_base, model=model,
+                                      retry_policy=retry_policy)
+    
+    return _get_cached_provider('image', provider_format, api_key, api_base, model, create)
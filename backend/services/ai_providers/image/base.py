@@ -2,9 +2,39 @@
 Abstract base class for image generation providers
 """
 from abc import ABC, abstractmethod
-from typing import Optional, List
+from io import BytesIO
+from typing import Optional, List, Tuple
 from PIL import Image
 
+# 随图片一起保留的服务商原始编码数据（见 image_from_bytes）
+_ENCODED_ATTR = 'encoded_bytes'
+_EXTENSIONS = {'PNG': 'png', 'JPEG': 'jpg', 'WEBP': 'webp', 'GIF': 'gif'}
+
+
+def image_from_bytes(data: bytes) -> Image.Image:
+    """
+    Open image bytes returned by a provider, keeping the encoded bytes
+    
+    The pixels are decoded lazily; FileService writes the kept bytes as they are
+    instead of re-encoding the image (see get_encoded_bytes).
+    """
+    image = Image.open(BytesIO(data))
+    setattr(image, _ENCODED_ATTR, data)
+    return image
+
+
+def get_encoded_bytes(image) -> Optional[Tuple[bytes, str]]:
+    """
+    Return (bytes, file extension) of an image that still has its provider encoding
+    
+    Images that were created or modified locally (a new Image object) return None.
+    """
+    data = getattr(image, _ENCODED_ATTR, None)
+    extension = _EXTENSIONS.get(getattr(image, 'format', None))
+    if data is None or extension is None:
+        return None
+    return data, extension
+
 
 class ImageProvider(ABC):
     """Abstract base class for image generation"""
@@ -2,11 +2,14 @@
 Google GenAI SDK implementation for image generation
 """
 import logging
-from typing import Optional, List
+from io import BytesIO
+from typing import Optional, List, Tuple
 from google import genai
 from google.genai import types
 from PIL import Image
-from .base import ImageProvider
+from .base import ImageProvider, image_from_bytes
+from .reference_cache import get_original_bytes, get_reference_payload
+from ..retry_policy import RetryPolicy
 
 logger = logging.getLogger(__name__)
 
@@ -14,7 +17,8 @@ logger = logging.getLogger(__name__)
 class GenAIImageProvider(ImageProvider):
     """Image generation using Google GenAI SDK"""
     
-    def __init__(self, api_key: str, api_base: str = None, model: str = "gemini-3-pro-image-preview"):
+    def __init__(self, api_key: str, api_base: str = None, model: str = "gemini-3-pro-image-preview",
+                 retry_policy: RetryPolicy = None):
         """
         Initialize GenAI image provider
         
@@ -22,12 +26,81 @@ class GenAIImageProvider(ImageProvider):
             api_key: Google API key
             api_base: API base URL (for proxies like aihubmix)
             model: Model name to use
+            retry_policy: Retry policy for transient errors (defaults to AI_RETRY_* config)
         """
-        self.client = genai.Client(
-            http_options=types.HttpOptions(base_url=api_base) if api_base else None,
-            api_key=api_key
-        )
+        http_options = types.HttpOptions(base_url=api_base) if api_base else None
+        self.client = genai.Client(http_options=http_options, api_key=api_key)
         self.model = model
+        self.retry_policy = retry_policy or RetryPolicy.from_config()
+    
+    @staticmethod
+    def _reference_blob(image: Image.Image) -> Tuple[bytes, str]:
+        """(bytes, mime type) sent for a reference image: original file bytes when available, else PNG"""
+        original = get_original_bytes(image)
+        if original:
+            return original
+        buffered = BytesIO()
+        image.save(buffered, format='PNG')
+        return buffered.getvalue(), 'image/png'
+    
+    def _build_request(self, prompt: str, ref_images: Optional[List[Image.Image]],
+                       aspect_ratio: str, resolution: str) -> dict:
+        """Build the generate_content arguments for a request"""
+        # Build contents list with prompt and reference images
+        contents = []
+        
+        # Add reference images first (if any)
+        if ref_images:
+            for ref_img in ref_images:
+                # 缓存的参考图直接发送文件原始字节或一次编码的结果，SDK 不再逐页转 PNG
+                blob = get_reference_payload(ref_img, 'genai-blob', self._reference_blob)
+                contents.append(types.Part.from_bytes(data=blob[0], mime_type=blob[1]))
+        
+        # Add text prompt
+        contents.append(prompt)
+        
+        logger.debug(f"Calling GenAI API for image generation with {len(ref_images) if ref_images else 0} reference images...")
+        logger.debug(f"Config - aspect_ratio: {aspect_ratio}, resolution: {resolution}")
+        
+        return dict(
+            model=self.model,
+            contents=contents,
+            config=types.GenerateContentConfig(
+                response_modalities=['TEXT', 'IMAGE'],
+                image_config=types.ImageConfig(
+                    aspect_ratio=aspect_ratio,
+                    image_size=resolution
+                ),
+            ),
+            description=f"GenAI image generation ({self.model})"
+        )
+    
+    def _extract_image(self, response) -> Image.Image:
+        """Extract the generated image from a GenAI response, raises ValueError if there is none"""
+        logger.debug("GenAI API call completed")
+        
+        for i, part in enumerate(response.parts):
+            if part.text is not None:
+                logger.debug(f"Part {i}: TEXT - {part.text[:100] if len(part.text) > 100 else part.text}")
+            else:
+                try:
+                    logger.debug(f"Part {i}: Attempting to extract image...")
+                    # 保留服务商返回的编码数据，保存时直接写入而不重新编码
+                    image = image_from_bytes(part.inline_data.data) if part.inline_data and part.inline_data.data else None
+                    if image:
+                        logger.debug(f"Successfully extracted image from part {i}")
+                        return image
+                except Exception as e:
+                    logger.debug(f"Part {i}: Failed to extract image - {str(e)}")
+        
+        # No image found in response
+        error_msg = "No image found in API response. "
+        if response.parts:
+            error_msg += f"Response had {len(response.parts)} parts but none contained valid images."
+        else:
+            error_msg += "Response had no parts."
+        
+        raise ValueError(error_msg)
     
     def generate_image(
         self,
@@ -53,56 +126,9 @@ class GenAIImageProvider(ImageProvider):
             Generated PIL Image object, or None if failed
         """
         try:
-            # Build contents list with prompt and reference images
-            contents = []
-            
-            # Add reference images first (if any)
-            if ref_images:
-                for ref_img in ref_images:
-                    contents.append(ref_img)
-            
-            # Add text prompt
-            contents.append(prompt)
-            
-            logger.debug(f"Calling GenAI API for image generation with {len(ref_images) if ref_images else 0} reference images...")
-            logger.debug(f"Config - aspect_ratio: {aspect_ratio}, resolution: {resolution}")
-            
-            response = self.client.models.generate_content(
-                model=self.model,
-                contents=contents,
-                config=types.GenerateContentConfig(
-                    response_modalities=['TEXT', 'IMAGE'],
-                    image_config=types.ImageConfig(
-                        aspect_ratio=aspect_ratio,
-                        image_size=resolution
-                    ),
-                )
-            )
-            
-            logger.debug("GenAI API call completed")
-            
-            # Extract image from response
-            for i, part in enumerate(response.parts):
-                if part.text is not None:
-                    logger.debug(f"Part {i}: TEXT - {part.text[:100] if len(part.text) > 100 else part.text}")
-                else:
-                    try:
-                        logger.debug(f"Part {i}: Attempting to extract image...")
-                        image = part.as_image()
-                        if image:
-                            logger.debug(f"Successfully extracted image from part {i}")
-                            return image
-                    except Exception as e:
-                        logger.debug(f"Part {i}: Failed to extract image - {str(e)}")
-            
-            # No image found in response
-            error_msg = "No image found in API response. "
-            if response.parts:
-                error_msg += f"Response had {len(response.parts)} parts but none contained valid images."
-            else:
-                error_msg += "Response had no parts."
-            
-            raise ValueError(error_msg)
+            request = self._build_request(prompt, ref_images, aspect_ratio, resolution)
+            response = self.retry_policy.call(self.client.models.generate_content, **request)
+            return self._extract_image(response)
             
         except Exception as e:
             error_detail = f"Error generating image with GenAI: {type(e).__name__}: {str(e)}"
@@ -10,7 +10,9 @@ from io import BytesIO
 from typing import Optional, List
 from openai import OpenAI
 from PIL import Image
-from .base import ImageProvider
+from .base import ImageProvider, image_from_bytes
+from .reference_cache import get_reference_payload
+from ..retry_policy import RetryPolicy
 from .ppt_agent import generate_single_page_ppt
 
 logger = logging.getLogger(__name__)
@@ -19,7 +21,8 @@ logger = logging.getLogger(__name__)
 class OpenAIImageProvider(ImageProvider):
     """Image generation using OpenAI SDK (compatible with Gemini via proxy)"""
     
-    def __init__(self, api_key: str, api_base: str = None, model: str = "gemini-3-pro-image-preview"):
+    def __init__(self, api_key: str, api_base: str = None, model: str = "gemini-3-pro-image-preview",
+                 retry_policy: RetryPolicy = None):
         """
         Initialize OpenAI image provider
         
@@ -27,12 +30,15 @@ class OpenAIImageProvider(ImageProvider):
             api_key: API key
             api_base: API base URL (e.g., https://aihubmix.com/v1)
             model: Model name to use
+            retry_policy: Retry policy for transient errors (defaults to AI_RETRY_* config)
         """
         self.client = OpenAI(
             api_key=api_key,
-            base_url=api_base
+            base_url=api_base,
+            max_retries=0  # retries are handled by retry_policy
         )
         self.model = model
+        self.retry_policy = retry_policy or RetryPolicy.from_config()
     
     def _encode_image_to_base64(self, image: Image.Image) -> str:
         """
@@ -44,12 +50,160 @@ class OpenAIImageProvider(ImageProvider):
         Returns:
             Base64 encoded string
         """
-        buffered = BytesIO()
-        # Convert to RGB if necessary (e.g., RGBA images)
-        if image.mode in ('RGBA', 'LA', 'P'):
-            image = image.convert('RGB')
-        image.save(buffered, format="JPEG", quality=95)
-        return base64.b64encode(buffered.getvalue()).decode('utf-8')
+        def encode(image: Image.Image) -> str:
+            buffered = BytesIO()
+            # Convert to RGB if necessary (e.g., RGBA images)
+            if image.mode in ('RGBA', 'LA', 'P'):
+                image = image.convert('RGB')
+            image.save(buffered, format="JPEG", quality=95)
+            return base64.b64encode(buffered.getvalue()).decode('utf-8')
+        
+        # 缓存的参考图（如项目模板）只编码一次，各页复用
+        return get_reference_payload(image, 'jpeg-base64', encode)
+    
+    def _build_messages(self, prompt: str, ref_images: Optional[List[Image.Image]],
+                        aspect_ratio: str) -> List[dict]:
+        """Build the chat messages for a request"""
+        # Build message content
+        content = []
+        
+        # Add reference images first (if any)
+        if ref_images:
+            for ref_img in ref_images:
+                base64_image = self._encode_image_to_base64(ref_img)
+                content.append({
+                    "type": "image_url",
+                    "image_url": {
+                        "url": f"data:image/jpeg;base64,{base64_image}"
+                    }
+                })
+        
+        # Add text prompt
+        content.append({"type": "text", "text": prompt})
+        
+        logger.debug(f"Calling OpenAI API for image generation with {len(ref_images) if ref_images else 0} reference images...")
+        logger.debug(f"Config - aspect_ratio: {aspect_ratio} (resolution ignored, OpenAI format only supports 1K)")
+        
+        # Note: resolution is not supported in OpenAI format, only aspect_ratio via system message
+        return [
+            {"role": "system", "content": f"aspect_ratio={aspect_ratio}"},
+            {"role": "user", "content": content},
+        ]
+    
+    def _extract_image_from_message(self, message) -> Image.Image:
+        """
+        Extract the generated image from a response message, handling different response formats
+        
+        Raises:
+            ValueError: If the message contains no usable image
+        """
+        # Debug: log available attributes
+        logger.debug(f"Response message attributes: {dir(message)}")
+        
+        # Try multi_mod_content first (custom format from some proxies)
+        if hasattr(message, 'multi_mod_content') and message.multi_mod_content:
+            parts = message.multi_mod_content
+            for part in parts:
+                if "text" in part:
+                    logger.debug(f"Response text: {part['text'][:100] if len(part['text']) > 100 else part['text']}")
+                if "inline_data" in part:
+                    image_data = base64.b64decode(part["inline_data"]["data"])
+                    image = image_from_bytes(image_data)
+                    logger.debug(f"Successfully extracted image: {image.size}, {image.mode}")
+                    return image
+        
+        # Try standard OpenAI content format (list of content parts)
+        if hasattr(message, 'content') and message.content:
+            # If content is a list (multimodal response)
+            if isinstance(message.content, list):
+                for part in message.content:
+                    if isinstance(part, dict):
+                        # Handle image_url type
+                        if part.get('type') == 'image_url':
+                            image_url = part.get('image_url', {}).get('url', '')
+                            if image_url.startswith('data:image'):
+                                # Extract base64 data from data URL
+                                base64_data = image_url.split(',', 1)[1]
+                                image_data = base64.b64decode(base64_data)
+                                image = image_from_bytes(image_data)
+                                logger.debug(f"Successfully extracted image from content: {image.size}, {image.mode}")
+                                return image
+                        # Handle text type
+                        elif part.get('type') == 'text':
+                            text = part.get('text', '')
+                            if text:
+                                logger.debug(f"Response text: {text[:100] if len(text) > 100 else text}")
+                    elif hasattr(part, 'type'):
+                        # Handle as object with attributes
+                        if part.type == 'image_url':
+                            image_url = getattr(part, 'image_url', {})
+                            if isinstance(image_url, dict):
+                                url = image_url.get('url', '')
+                            else:
+                                url = getattr(image_url, 'url', '')
+                            if url.startswith('data:image'):
+                                base64_data = url.split(',', 1)[1]
+                                image_data = base64.b64decode(base64_data)
+                                image = image_from_bytes(image_data)
+                                logger.debug(f"Successfully extracted image from content object: {image.size}, {image.mode}")
+                                return image
+            # If content is a string, try to extract image from it
+            elif isinstance(message.content, str):
+                content_str = message.content
+                logger.debug(f"Response content (string): {content_str[:200] if len(content_str) > 200 else content_str}")
+                
+                # Try to extract Markdown image URL: ![...](url)
+                markdown_pattern = r'!\[.*?\]\((https?://[^\s\)]+)\)'
+                markdown_matches = re.findall(markdown_pattern, content_str)
+                if markdown_matches:
+                    image_url = markdown_matches[0]  # Use the first image URL found
+                    logger.debug(f"Found Markdown image URL: {image_url}")
+                    try:
+                        response = requests.get(image_url, timeout=30, stream=True)
+                        response.raise_for_status()
+                        image = image_from_bytes(response.content)
+                        image.load()  # Ensure image is fully loaded
+                        logger.debug(f"Successfully downloaded image from Markdown URL: {image.size}, {image.mode}")
+                        return image
+                    except Exception as download_error:
+                        logger.warning(f"Failed to download image from Markdown URL: {download_error}")
+                
+                # Try to extract plain URL (not in Markdown format)
+                url_pattern = r'(https?://[^\s\)\]]+\.(?:png|jpg|jpeg|gif|webp|bmp)(?:\?[^\s\)\]]*)?)'
+                url_matches = re.findall(url_pattern, content_str, re.IGNORECASE)
+                if url_matches:
+                    image_url = url_matches[0]
+                    logger.debug(f"Found plain image URL: {image_url}")
+                    try:
+                        response = requests.get(image_url, timeout=30, stream=True)
+                        response.raise_for_status()
+                        image = image_from_bytes(response.content)
+                        image.load()
+                        logger.debug(f"Successfully downloaded image from plain URL: {image.size}, {image.mode}")
+                        return image
+                    except Exception as download_error:
+                        logger.warning(f"Failed to download image from plain URL: {download_error}")
+                
+                # Try to extract base64 data URL from string
+                base64_pattern = r'data:image/[^;]+;base64,([A-Za-z0-9+/=]+)'
+                base64_matches = re.findall(base64_pattern, content_str)
+                if base64_matches:
+                    base64_data = base64_matches[0]
+                    logger.debug(f"Found base64 image data in string")
+                    try:
+                        image_data = base64.b64decode(base64_data)
+                        image = image_from_bytes(image_data)
+                        logger.debug(f"Successfully extracted base64 image from string: {image.size}, {image.mode}")
+                        return image
+                    except Exception as decode_error:
+                        logger.warning(f"Failed to decode base64 image from string: {decode_error}")
+        
+        # Log raw response for debugging
+        logger.warning(f"Unable to extract image. Raw message type: {type(message)}")
+        logger.warning(f"Message content type: {type(getattr(message, 'content', None))}")
+        logger.warning(f"Message content: {getattr(message, 'content', 'N/A')}")
+        
+        raise ValueError("No valid multimodal response received from OpenAI API")
     
     def _generate_standard_image(
         self,
@@ -60,154 +214,22 @@ class OpenAIImageProvider(ImageProvider):
     ) -> Optional[Image.Image]:
         """Original generation logic using OpenAI API"""
         try:
-            # Build message content
-            content = []
-            
-            # Add reference images first (if any)
-            if ref_images:
-                for ref_img in ref_images:
-                    base64_image = self._encode_image_to_base64(ref_img)
-                    content.append({
-                        "type": "image_url",
-                        "image_url": {
-                            "url": f"data:image/jpeg;base64,{base64_image}"
-                        }
-                    })
-            
-            # Add text prompt
-            content.append({"type": "text", "text": prompt})
-            
-            logger.debug(f"Calling OpenAI API for image generation with {len(ref_images) if ref_images else 0} reference images...")
-            logger.debug(f"Config - aspect_ratio: {aspect_ratio} (resolution ignored, OpenAI format only supports 1K)")
-            
-            # Note: resolution is not supported in OpenAI format, only aspect_ratio via system message
-            response = self.client.chat.completions.create(
+            response = self.retry_policy.call(
+                self.client.chat.completions.create,
                 model=self.model,
-                messages=[
-                    {"role": "system", "content": f"aspect_ratio={aspect_ratio}"},
-                    {"role": "user", "content": content},
-                ],
-                modalities=["text", "image"]
+                messages=self._build_messages(prompt, ref_images, aspect_ratio),
+                modalities=["text", "image"],
+                description=f"OpenAI image generation ({self.model})"
             )
             
             logger.debug("OpenAI API call completed")
-            
-            # Extract image from response - handle different response formats
-            message = response.choices[0].message
-            
-            # Debug: log available attributes
-            logger.debug(f"Response message attributes: {dir(message)}")
-            
-            # Try multi_mod_content first (custom format from some proxies)
-            if hasattr(message, 'multi_mod_content') and message.multi_mod_content:
-                parts = message.multi_mod_content
-                for part in parts:
-                    if "text" in part:
-                        logger.debug(f"Response text: {part['text'][:100] if len(part['text']) > 100 else part['text']}")
-                    if "inline_data" in part:
-                        image_data = base64.b64decode(part["inline_data"]["data"])
-                        image = Image.open(BytesIO(image_data))
-                        logger.debug(f"Successfully extracted image: {image.size}, {image.mode}")
-                        return image
-            
-            # Try standard OpenAI content format (list of content parts)
-            if hasattr(message, 'content') and message.content:
-                # If content is a list (multimodal response)
-                if isinstance(message.content, list):
-                    for part in message.content:
-                        if isinstance(part, dict):
-                            # Handle image_url type
-                            if part.get('type') == 'image_url':
-                                image_url = part.get('image_url', {}).get('url', '')
-                                if image_url.startswith('data:image'):
-                                    # Extract base64 data from data URL
-                                    base64_data = image_url.split(',', 1)[1]
-                                    image_data = base64.b64decode(base64_data)
-                                    image = Image.open(BytesIO(image_data))
-                                    logger.debug(f"Successfully extracted image from content: {image.size}, {image.mode}")
-                                    return image
-                            # Handle text type
-                            elif part.get('type') == 'text':
-                                text = part.get('text', '')
-                                if text:
-                                    logger.debug(f"Response text: {text[:100] if len(text) > 100 else text}")
-                        elif hasattr(part, 'type'):
-                            # Handle as object with attributes
-                            if part.type == 'image_url':
-                                image_url = getattr(part, 'image_url', {})
-                                if isinstance(image_url, dict):
-                                    url = image_url.get('url', '')
-                                else:
-                                    url = getattr(image_url, 'url', '')
-                                if url.startswith('data:image'):
-                                    base64_data = url.split(',', 1)[1]
-                                    image_data = base64.b64decode(base64_data)
-                                    image = Image.open(BytesIO(image_data))
-                                    logger.debug(f"Successfully extracted image from content object: {image.size}, {image.mode}")
-                                    return image
-                # If content is a string, try to extract image from it
-                elif isinstance(message.content, str):
-                    content_str = message.content
-                    logger.debug(f"Response content (string): {content_str[:200] if len(content_str) > 200 else content_str}")
-                    
-                    # Try to extract Markdown image URL: ![...](url)
-                    markdown_pattern = r'!\[.*?\]\((https?://[^\s\)]+)\)'
-                    markdown_matches = re.findall(markdown_pattern, content_str)
-                    if markdown_matches:
-                        image_url = markdown_matches[0]  # Use the first image URL found
-                        logger.debug(f"Found Markdown image URL: {image_url}")
-                        try:
-                            response = requests.get(image_url, timeout=30, stream=True)
-                            response.raise_for_status()
-                            image = Image.open(BytesIO(response.content))
-                            image.load()  # Ensure image is fully loaded
-                            logger.debug(f"Successfully downloaded image from Markdown URL: {image.size}, {image.mode}")
-                            return image
-                        except Exception as download_error:
-                            logger.warning(f"Failed to download image from Markdown URL: {download_error}")
-                    
-                    # Try to extract plain URL (not in Markdown format)
-                    url_pattern = r'(https?://[^\s\)\]]+\.(?:png|jpg|jpeg|gif|webp|bmp)(?:\?[^\s\)\]]*)?)'
-                    url_matches = re.findall(url_pattern, content_str, re.IGNORECASE)
-                    if url_matches:
-                        image_url = url_matches[0]
-                        logger.debug(f"Found plain image URL: {image_url}")
-                        try:
-                            response = requests.get(image_url, timeout=30, stream=True)
-                            response.raise_for_status()
-                            image = Image.open(BytesIO(response.content))
-                            image.load()
-                            logger.debug(f"Successfully downloaded image from plain URL: {image.size}, {image.mode}")
-                            return image
-                        except Exception as download_error:
-                            logger.warning(f"Failed to download image from plain URL: {download_error}")
-                    
-                    # Try to extract base64 data URL from string
-                    base64_pattern = r'data:image/[^;]+;base64,([A-Za-z0-9+/=]+)'
-                    base64_matches = re.findall(base64_pattern, content_str)
-                    if base64_matches:
-                        base64_data = base64_matches[0]
-                        logger.debug(f"Found base64 image data in string")
-                        try:
-                            image_data = base64.b64decode(base64_data)
-                            image = Image.open(BytesIO(image_data))
-                            logger.debug(f"Successfully extracted base64 image from string: {image.size}, {image.mode}")
-                            return image
-                        except Exception as decode_error:
-                            logger.warning(f"Failed to decode base64 image from string: {decode_error}")
-            
-            # Log raw response for debugging
-            logger.warning(f"Unable to extract image. Raw message type: {type(message)}")
-            logger.warning(f"Message content type: {type(getattr(message, 'content', None))}")
-            logger.warning(f"Message content: {getattr(message, 'content', 'N/A')}")
-            
-            raise ValueError("No valid multimodal response received from OpenAI API")
+            return self._extract_image_from_message(response.choices[0].message)
             
         except Exception as e:
             error_detail = f"Error generating image with OpenAI (model={self.model}): {type(e).__name__}: {str(e)}"
             logger.error(error_detail, exc_info=True)
             raise Exception(error_detail) from e
-
+    
     def generate_image(
         self,
         prompt: str,
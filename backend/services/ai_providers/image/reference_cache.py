@@ -0,0 +1,156 @@
+"""
+Prepared reference images shared across image generation calls
+
+Every page of a deck sends the same project template (and often the same
+material images) as reference. Instead of re-opening and re-encoding the file
+for each page, the prepared image is cached per file, keyed by
+(path, mtime, size), so replacing the template invalidates it automatically:
+    - the decoded image, with the file handle closed right after loading
+    - the encoded payloads providers send (original file bytes when the image
+      was not resized, JPEG base64 for OpenAI, ...), built once on first use
+
+Configuration (see config.py):
+    REFERENCE_IMAGE_CACHE_SIZE: Number of prepared images kept (least recently used evicted)
+    REFERENCE_IMAGE_MAX_SIDE: Opt-in, lossy downscaling of references to this longest
+        side in pixels. Defaults to 0 (images are sent at full resolution); when set
+        it also shrinks the current page image passed in by edit_image.
+"""
+import logging
+import os
+import threading
+from collections import OrderedDict
+from io import BytesIO
+from typing import Callable, Dict, Optional, Tuple
+
+from PIL import Image
+
+logger = logging.getLogger(__name__)
+
+# 预处理结果挂在图片对象上，各服务商通过 get_reference_payload 复用
+_PAYLOADS_ATTR = 'reference_payloads'
+_ORIGINAL_MIME_TYPES = {'PNG': 'image/png', 'JPEG': 'image/jpeg'}
+
+
+class _Payloads:
+    """Encoded forms of one prepared image, built lazily under a lock"""
+
+    def __init__(self, original: Optional[Tuple[bytes, str]]):
+        self.values: Dict[str, object] = {}
+        if original:
+            self.values['original'] = original
+        self.lock = threading.Lock()
+
+
+def get_reference_payload(image: Image.Image, key: str, build: Callable[[Image.Image], object]):
+    """
+    Return an encoded form of a reference image, building it once per prepared image
+
+    Images that did not come from the cache (downloads, images passed in by the
+    caller) are encoded on every call, as before.
+
+    Args:
+        image: Reference image
+        key: Name of the encoded form, e.g. "jpeg-base64"
+        build: Function encoding the image
+    """
+    payloads: Optional[_Payloads] = getattr(image, _PAYLOADS_ATTR, None)
+    if payloads is None:
+        return build(image)
+    with payloads.lock:
+        if key not in payloads.values:
+            payloads.values[key] = build(image)
+        return payloads.values[key]
+
+
+def get_original_bytes(image: Image.Image) -> Optional[Tuple[bytes, str]]:
+    """(file bytes, mime type) of a prepared image that was not resized and is PNG/JPEG, else None"""
+    payloads: Optional[_Payloads] = getattr(image, _PAYLOADS_ATTR, None)
+    return payloads.values.get('original') if payloads else None
+
+
+class ReferenceImageCache:
+    """Bounded LRU of prepared reference images keyed by (path, mtime, size)"""
+
+    def __init__(self, max_entries: int = 16, max_side: int = 0):
+        """
+        Args:
+            max_entries: Number of prepared images kept
+            max_side: Longest side of prepared images; larger images are downscaled
+                (lossy). 0 keeps the original size
+        """
+        self.max_entries = max_entries
+        self.max_side = max_side
+        self.hits = 0
+        self.misses = 0
+        self._entries: 'OrderedDict[Tuple[str, int, int], Image.Image]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _prepare(self, path: str) -> Image.Image:
+        """Decode the file, closing its handle, and downscale it when max_side is set"""
+        with open(path, 'rb') as f:
+            data = f.read()
+        with Image.open(BytesIO(data)) as opened:
+            opened.load()
+            image_format = opened.format
+            if self.max_side and max(opened.size) > self.max_side:
+                image = opened.copy()
+                image.thumbnail((self.max_side, self.max_side), Image.LANCZOS)
+                original = None
+            else:
+                image = opened.copy()
+                mime_type = _ORIGINAL_MIME_TYPES.get(image_format)
+                original = (data, mime_type) if mime_type else None
+        setattr(image, _PAYLOADS_ATTR, _Payloads(original))
+        return image
+
+    def get(self, path: str) -> Image.Image:
+        """
+        Return the prepared image for a local file, loading it on first use
+
+        Raises:
+            OSError: If the file cannot be read or decoded
+        """
+        stat = os.stat(path)
+        key = (os.path.abspath(path), stat.st_mtime_ns, stat.st_size)
+        with self._lock:
+            image = self._entries.get(key)
+            if image is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return image
+            self.misses += 1
+
+        # 在锁外解码，同一文件并发首次加载时最多重复解码一次
+        image = self._prepare(path)
+        with self._lock:
+            image = self._entries.setdefault(key, image)
+            self._entries.move_to_end(key)
+            # 同一路径的旧版本（文件已被替换）和超出容量的条目一并移除
+            for stale in [k for k in self._entries if k[0] == key[0] and k != key]:
+                del self._entries[stale]
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return image
+
+    def clear(self):
+        """Drop every prepared image"""
+        with self._lock:
+            self._entries.clear()
+
+
+_cache: Optional[ReferenceImageCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_reference_cache() -> ReferenceImageCache:
+    """Return the process-wide reference image cache"""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            from config import get_config
+            config = get_config()
+            _cache = ReferenceImageCache(
+                max_entries=config.REFERENCE_IMAGE_CACHE_SIZE,
+                max_side=config.REFERENCE_IMAGE_MAX_SIDE
+            )
+        return _cache
@@ -0,0 +1,67 @@
+"""
+Per-event-loop holder for async SDK clients
+
+Async HTTP clients (httpx/aiohttp) are bound to the event loop they were first
+used on. Providers are cached and shared across threads (see get_text_provider),
+and each batch runs its own event loop, so async clients are created lazily
+once per loop instead of once per provider. A batch calls close_loop_clients()
+before its loop ends so their connection pools are released.
+"""
+import asyncio
+import inspect
+import logging
+import threading
+import weakref
+from typing import Callable, Generic, TypeVar
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar('T')
+
+# 所有 LoopLocal 实例，供 close_loop_clients 在事件循环结束前统一关闭
+_instances: 'weakref.WeakSet[LoopLocal]' = weakref.WeakSet()
+_instances_lock = threading.Lock()
+
+
+class LoopLocal(Generic[T]):
+    """Lazily creates one object per running event loop"""
+
+    def __init__(self, factory: Callable[[], T]):
+        self._factory = factory
+        self._items: 'weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, T]' = weakref.WeakKeyDictionary()
+        self._lock = threading.Lock()
+        with _instances_lock:
+            _instances.add(self)
+
+    def get(self) -> T:
+        """Return the object for the current event loop (must be called from a coroutine)"""
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            item = self._items.get(loop)
+            if item is None:
+                item = self._factory()
+                self._items[loop] = item
+            return item
+
+    async def aclose_current(self):
+        """Drop the object of the current event loop, closing it if it is a client"""
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            item = self._items.pop(loop, None)
+        close = getattr(item, 'aclose', None) or getattr(item, 'close', None)
+        if close is None:
+            return
+        try:
+            result = close()
+            if inspect.isawaitable(result):
+                await result
+        except Exception as e:
+            logger.warning(f"Failed to close async client: {e}")
+
+
+async def close_loop_clients():
+    """Close every async client created for the current event loop"""
+    with _instances_lock:
+        instances = list(_instances)
+    for instance in instances:
+        await instance.aclose_current()
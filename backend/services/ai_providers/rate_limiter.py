@@ -0,0 +1,217 @@
+"""
+Process-wide rate limiting for AI provider calls
+
+All tasks share one limiter per (provider format, model), so concurrent
+generation jobs cannot exceed the provider's concurrency or RPM limits no
+matter how many per-task thread pools are running.
+
+Configuration (see config.py):
+    AI_TEXT_MAX_CONCURRENCY / AI_TEXT_RPM: defaults for text models
+    AI_IMAGE_MAX_CONCURRENCY / AI_IMAGE_RPM: defaults for image models
+    AI_RATE_LIMITS: JSON overrides per "format:model", e.g.
+        {"gemini:gemini-3-pro-image-preview": {"concurrency": 4, "rpm": 20}}
+    A value of 0 disables the corresponding limit.
+
+Providers hold a slot for one request attempt only (see RetryPolicy), so
+backoff sleeps between retries never occupy a slot. Slots are handed to
+waiting threads and coroutines in FIFO order.
+"""
+import asyncio
+import json
+import logging
+import threading
+import time
+from collections import deque
+from contextlib import asynccontextmanager, contextmanager
+from typing import Deque, Dict, Tuple, Union
+
+logger = logging.getLogger(__name__)
+
+
+class ProviderRateLimiter:
+    """Concurrency cap plus token-bucket RPM limit for a single provider/model"""
+
+    def __init__(self, name: str, max_concurrency: int = 0, rpm: int = 0):
+        """
+        Args:
+            name: Limiter name for logging, e.g. "gemini:gemini-2.5-flash"
+            max_concurrency: Maximum number of in-flight calls (0 = unlimited)
+            rpm: Maximum requests per minute (0 = unlimited)
+        """
+        self.name = name
+        self.max_concurrency = max_concurrency
+        self.rpm = rpm
+        # 并发名额：空闲名额数 + 等待队列（线程用 Event，协程用所在事件循环的 Future），释放时按先后交给下一个等待者
+        self._available = max_concurrency
+        self._waiters: Deque[Union[threading.Event, Tuple[asyncio.AbstractEventLoop, asyncio.Future]]] = deque()
+        self._slots_lock = threading.Lock()
+        # 令牌桶：容量为 rpm，按 rpm/60 每秒匀速补充
+        self._tokens = float(rpm)
+        self._refill_rate = rpm / 60.0
+        self._last_refill = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _try_take_token(self) -> float:
+        """Take a request token if available, returns 0 on success or the seconds to wait"""
+        if self.rpm <= 0:
+            return 0.0
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(float(self.rpm), self._tokens + (now - self._last_refill) * self._refill_rate)
+            self._last_refill = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return 0.0
+            return (1 - self._tokens) / self._refill_rate
+
+    def _take_token(self):
+        """Block until a request token is available"""
+        while True:
+            wait = self._try_take_token()
+            if wait <= 0:
+                return
+            logger.debug(f"[RATE LIMIT] {self.name}: RPM limit reached, waiting {wait:.2f}s")
+            time.sleep(wait)
+
+    def _acquire_slot(self):
+        """Block until a concurrency slot is free"""
+        with self._slots_lock:
+            if self._available > 0 and not self._waiters:
+                self._available -= 1
+                return
+            event = threading.Event()
+            self._waiters.append(event)
+        logger.debug(f"[RATE LIMIT] {self.name}: {self.max_concurrency} calls in flight, waiting for a slot")
+        # 名额由 _release_slot 直接转交，无需再次获取
+        event.wait()
+
+    async def _acquire_slot_async(self):
+        """Wait for a concurrency slot without blocking the event loop"""
+        loop = asyncio.get_running_loop()
+        with self._slots_lock:
+            if self._available > 0 and not self._waiters:
+                self._available -= 1
+                return
+            waiter = (loop, loop.create_future())
+            self._waiters.append(waiter)
+        logger.debug(f"[RATE LIMIT] {self.name}: {self.max_concurrency} calls in flight, waiting for a slot")
+        try:
+            await waiter[1]
+        except asyncio.CancelledError:
+            with self._slots_lock:
+                if waiter in self._waiters:
+                    self._waiters.remove(waiter)
+                    raise
+            # 名额已转交：已到手则归还，尚在转交途中则由 _hand_over 归还
+            if waiter[1].done() and not waiter[1].cancelled():
+                self._release_slot()
+            raise
+
+    def _hand_over(self, future: asyncio.Future):
+        """Runs on the waiter's event loop: give it the slot, or pass the slot on if it gave up"""
+        if future.cancelled():
+            self._release_slot()
+        else:
+            future.set_result(None)
+
+    def _release_slot(self):
+        """Hand the slot to the longest waiting caller, or return it to the pool"""
+        with self._slots_lock:
+            while self._waiters:
+                waiter = self._waiters.popleft()
+                if isinstance(waiter, threading.Event):
+                    waiter.set()
+                    return
+                loop, future = waiter
+                if loop.is_closed():
+                    continue
+                loop.call_soon_threadsafe(self._hand_over, future)
+                return
+            self._available += 1
+
+    @contextmanager
+    def acquire(self):
+        """Hold a concurrency slot and a request token for the duration of one call"""
+        if self.max_concurrency > 0:
+            self._acquire_slot()
+        try:
+            self._take_token()
+            yield
+        finally:
+            if self.max_concurrency > 0:
+                self._release_slot()
+
+    @asynccontextmanager
+    async def acquire_async(self):
+        """
+        Async variant of acquire() for coroutines
+
+        Shares the same slots and tokens as threaded callers, but waits on an
+        asyncio future so the event loop is never blocked.
+        """
+        if self.max_concurrency > 0:
+            await self._acquire_slot_async()
+        try:
+            while True:
+                wait = self._try_take_token()
+                if wait <= 0:
+                    break
+                await asyncio.sleep(wait)
+            yield
+        finally:
+            if self.max_concurrency > 0:
+                self._release_slot()
+
+
+_limiters: Dict[Tuple[str, str], ProviderRateLimiter] = {}
+_limiters_lock = threading.Lock()
+
+
+def _load_limits(provider_format: str, model: str, kind: str) -> Tuple[int, int]:
+    """Resolve (max_concurrency, rpm) for a provider/model from the config"""
+    from config import get_config
+    config = get_config()
+
+    if kind == 'image':
+        concurrency = config.AI_IMAGE_MAX_CONCURRENCY
+        rpm = config.AI_IMAGE_RPM
+    else:
+        concurrency = config.AI_TEXT_MAX_CONCURRENCY
+        rpm = config.AI_TEXT_RPM
+
+    overrides = config.AI_RATE_LIMITS
+    if overrides:
+        try:
+            override = json.loads(overrides).get(f"{provider_format}:{model}") or {}
+            concurrency = int(override.get('concurrency', concurrency))
+            rpm = int(override.get('rpm', rpm))
+        except (ValueError, AttributeError) as e:
+            logger.warning(f"Invalid AI_RATE_LIMITS config, using defaults: {e}")
+
+    return concurrency, rpm
+
+
+def get_rate_limiter(provider_format: str, model: str, kind: str = 'text') -> ProviderRateLimiter:
+    """
+    Get the shared limiter for a provider/model, creating it on first use
+
+    Args:
+        provider_format: "gemini" or "openai"
+        model: Model name
+        kind: "text" or "image", selects the default limits for a new limiter.
+              A model used for both shares one limiter, created with the limits
+              of whichever kind used it first.
+
+    Returns:
+        ProviderRateLimiter shared by every caller in this process
+    """
+    key = (provider_format, model)
+    with _limiters_lock:
+        limiter = _limiters.get(key)
+        if limiter is None:
+            concurrency, rpm = _load_limits(provider_format, model, kind)
+            limiter = ProviderRateLimiter(f"{provider_format}:{model}", concurrency, rpm)
+            _limiters[key] = limiter
+            logger.info(f"Rate limiter for {limiter.name}: concurrency={concurrency or 'unlimited'}, "
+                        f"rpm={rpm or 'unlimited'}")
+        return limiter
@@ -0,0 +1,257 @@
+"""
+Shared retry policy for AI provider calls
+
+Transient provider errors (HTTP 408/429/5xx, timeouts, dropped connections)
+are retried with jittered exponential backoff. A Retry-After header (or the
+retryDelay hint returned by Gemini) takes precedence over the computed delay.
+Retries stop after max_attempts or once the next attempt would start past the
+deadline. Any other error (bad request, auth, content errors) fails immediately.
+
+A policy created with a rate limiter acquires it for each attempt, so the
+limiter slot is released while waiting for the next retry.
+
+Configuration (see config.py):
+    AI_RETRY_MAX_ATTEMPTS, AI_RETRY_BASE_DELAY, AI_RETRY_MAX_DELAY, AI_RETRY_DEADLINE
+"""
+import itertools
+import logging
+import re
+import time
+from contextlib import ExitStack
+from email.utils import parsedate_to_datetime
+from typing import Awaitable, Callable, Iterable, Iterator, List, Optional, Tuple, TypeVar
+
+from tenacity import (
+    AsyncRetrying, Retrying, retry_if_exception, stop_after_attempt, stop_before_delay,
+    wait_random_exponential
+)
+
+from .rate_limiter import ProviderRateLimiter
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar('T')
+
+RETRYABLE_STATUS_CODES = {408, 429, 500, 502, 503, 504}
+
+# 按类名识别网络类异常，避免直接依赖 openai / httpx / requests 的异常层级
+_TRANSIENT_ERROR_NAMES = {
+    'APITimeoutError', 'APIConnectionError',  # openai
+    'TimeoutException', 'ConnectError', 'ReadError', 'RemoteProtocolError',  # httpx
+    'Timeout', 'ConnectTimeout', 'ReadTimeout', 'ConnectionError', 'ChunkedEncodingError',  # requests
+}
+
+_RETRY_DELAY_PATTERN = re.compile(r"retryDelay['\"]?\s*[:=]\s*['\"]?(\d+(?:\.\d+)?)s")
+
+
+def _iter_causes(exc: BaseException):
+    """Yield the exception and its causes (providers wrap SDK errors in a generic Exception)"""
+    seen = set()
+    while exc is not None and id(exc) not in seen:
+        seen.add(id(exc))
+        yield exc
+        exc = exc.__cause__ or exc.__context__
+
+
+def _status_code(exc: BaseException) -> Optional[int]:
+    """Extract an HTTP status code from openai/google-genai/requests style errors"""
+    for attr in ('status_code', 'code'):
+        value = getattr(exc, attr, None)
+        if isinstance(value, int):
+            return value
+    response = getattr(exc, 'response', None)
+    value = getattr(response, 'status_code', None)
+    return value if isinstance(value, int) else None
+
+
+def _retry_after_seconds(exc: BaseException) -> Optional[float]:
+    """Read the server-requested delay from a Retry-After header or a Gemini retryDelay hint"""
+    response = getattr(exc, 'response', None)
+    headers = getattr(response, 'headers', None)
+    if headers:
+        value = headers.get('retry-after') or headers.get('Retry-After')
+        if value:
+            try:
+                return max(0.0, float(value))
+            except ValueError:
+                try:
+                    return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+                except (TypeError, ValueError):
+                    pass
+
+    match = _RETRY_DELAY_PATTERN.search(str(getattr(exc, 'details', '')) or str(exc))
+    if match:
+        return float(match.group(1))
+    return None
+
+
+def classify_error(exc: BaseException) -> Tuple[bool, Optional[float]]:
+    """
+    Decide whether an error is transient
+
+    Args:
+        exc: Exception raised by a provider call
+
+    Returns:
+        Tuple of (retryable, retry_after_seconds)
+    """
+    for error in _iter_causes(exc):
+        status = _status_code(error)
+        if status is not None:
+            if status in RETRYABLE_STATUS_CODES:
+                return True, _retry_after_seconds(error)
+            return False, None
+        if isinstance(error, (TimeoutError, ConnectionError)) or type(error).__name__ in _TRANSIENT_ERROR_NAMES:
+            return True, None
+    return False, None
+
+
+class _LimitedStream:
+    """Stream iterator holding a rate limiter slot until it is exhausted or closed"""
+
+    def __init__(self, items: Iterator[T], slot: ExitStack):
+        self._items = items
+        self._slot = slot
+
+    def __iter__(self):
+        return self
+
+    def __next__(self) -> T:
+        try:
+            return next(self._items)
+        except BaseException:
+            self.close()
+            raise
+
+    def close(self):
+        self._slot.close()
+
+    def __del__(self):
+        self.close()
+
+
+class RetryPolicy:
+    """Retry transient provider errors with jittered backoff, Retry-After and a deadline"""
+
+    def __init__(self, max_attempts: int = 4, base_delay: float = 1.0,
+                 max_delay: float = 30.0, deadline: Optional[float] = 300.0,
+                 limiter: Optional[ProviderRateLimiter] = None):
+        """
+        Args:
+            max_attempts: Maximum number of attempts including the first one
+            base_delay: Backoff multiplier in seconds
+            max_delay: Upper bound for a computed backoff delay
+            deadline: Total seconds after which no new attempt is started (None = no deadline)
+            limiter: Rate limiter held for each attempt (None = not limited)
+        """
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.deadline = deadline
+        self.limiter = limiter
+
+    @classmethod
+    def from_config(cls, limiter: Optional[ProviderRateLimiter] = None) -> 'RetryPolicy':
+        """Create a policy from the AI_RETRY_* settings"""
+        from config import get_config
+        config = get_config()
+        return cls(
+            max_attempts=config.AI_RETRY_MAX_ATTEMPTS,
+            base_delay=config.AI_RETRY_BASE_DELAY,
+            max_delay=config.AI_RETRY_MAX_DELAY,
+            deadline=config.AI_RETRY_DEADLINE or None,
+            limiter=limiter
+        )
+
+    def _wait(self, retry_state) -> float:
+        """Prefer the server-requested delay, otherwise full-jitter exponential backoff"""
+        _, retry_after = classify_error(retry_state.outcome.exception())
+        if retry_after is not None:
+            return retry_after
+        return wait_random_exponential(multiplier=self.base_delay, max=self.max_delay)(retry_state)
+
+    def _log_retry(self, retry_state, description: str):
+        """Log each retry with the upcoming delay"""
+        exc = retry_state.outcome.exception()
+        logger.warning(
+            f"{description} failed with a transient error (attempt {retry_state.attempt_number}/"
+            f"{self.max_attempts}), retrying in {retry_state.upcoming_sleep:.1f}s: "
+            f"{type(exc).__name__}: {exc}"
+        )
+
+    def _retry_kwargs(self, description: str, deadline: Optional[float]) -> dict:
+        """Build the tenacity arguments shared by the sync and async paths"""
+        deadline = self.deadline if deadline is None else deadline
+        stop = stop_after_attempt(self.max_attempts)
+        if deadline:
+            stop = stop | stop_before_delay(deadline)
+
+        return dict(
+            stop=stop,
+            wait=self._wait,
+            retry=retry_if_exception(lambda e: classify_error(e)[0]),
+            before_sleep=lambda state: self._log_retry(state, description),
+            reraise=True
+        )
+
+    def call(self, fn: Callable[..., T], *args, description: str = 'AI provider call',
+             deadline: Optional[float] = None, **kwargs) -> T:
+        """
+        Call fn, retrying transient errors
+
+        Args:
+            fn: Function performing a single provider request
+            description: Label used in log messages
+            deadline: Overrides the policy deadline for this call (seconds)
+
+        Returns:
+            fn's return value; the last error is re-raised when retries are exhausted
+        """
+        def attempt():
+            if self.limiter is None:
+                return fn(*args, **kwargs)
+            with self.limiter.acquire():
+                return fn(*args, **kwargs)
+
+        retrying = Retrying(**self._retry_kwargs(description, deadline))
+        return retrying(attempt)
+
+    def call_stream(self, fn: Callable[..., Iterable[T]], *args, description: str = 'AI provider call',
+                    deadline: Optional[float] = None, **kwargs) -> Iterator[T]:
+        """
+        Call a streaming fn, retrying transient errors until its first item arrives
+        
+        Errors raised after the first item are passed to the consumer unchanged,
+        since part of the response has already been delivered. The limiter slot
+        of the successful attempt is held until the stream is exhausted or closed.
+        
+        Returns:
+            Iterator over the complete stream
+        """
+        def open_stream() -> Tuple[List[T], Iterator[T], ExitStack]:
+            with ExitStack() as slot:
+                if self.limiter is not None:
+                    slot.enter_context(self.limiter.acquire())
+                stream = iter(fn(*args, **kwargs))
+                head = list(itertools.islice(stream, 1))
+                return head, stream, slot.pop_all()
+        
+        retrying = Retrying(**self._retry_kwargs(description, deadline))
+        head, stream, slot = retrying(open_stream)
+        if self.limiter is None:
+            return itertools.chain(head, stream)
+        return _LimitedStream(itertools.chain(head, stream), slot)
+    
+    async def call_async(self, fn: Callable[..., Awaitable[T]], *args,
+                         description: str = 'AI provider call',
+                         deadline: Optional[float] = None, **kwargs) -> T:
+        """Async variant of call(): awaits fn and sleeps between attempts without blocking the loop"""
+        async def attempt():
+            # SDK methods may be sync wrappers returning a coroutine, so always await here
+            if self.limiter is None:
+                return await fn(*args, **kwargs)
+            async with self.limiter.acquire_async():
+                return await fn(*args, **kwargs)
+
+        retrying = AsyncRetrying(**self._retry_kwargs(description, deadline))
+        return await retrying(attempt)
@@ -2,5 +2,11 @@
 from .base import TextProvider
 from .genai_provider import GenAITextProvider
 from .openai_provider import OpenAITextProvider
+from .cache import TextResponseCache, CachedTextProvider, get_text_cache
+from .prefix_cache import PrefixReuseTracker, get_prefix_tracker
 
-__all__ = ['TextProvider', 'GenAITextProvider', 'OpenAITextProvider']
+__all__ = [
+    'TextProvider', 'GenAITextProvider', 'OpenAITextProvider',
+    'TextResponseCache', 'CachedTextProvider', 'get_text_cache',
+    'PrefixReuseTracker', 'get_prefix_tracker'
+]
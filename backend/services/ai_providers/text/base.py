@@ -1,7 +1,10 @@
 """
 Abstract base class for text generation providers
 """
+import asyncio
 from abc import ABC, abstractmethod
+from typing import Iterator
+from .prefix_cache import get_prefix_tracker
 
 
 class TextProvider(ABC):
@@ -20,3 +23,65 @@ class TextProvider(ABC):
             Generated text content
         """
         pass
+    
+    async def generate_text_async(self, prompt: str, thinking_budget: int = 1000) -> str:
+        """
+        Async variant of generate_text
+        
+        The default runs generate_text in a worker thread; providers whose SDK
+        has a native async client override this.
+        """
+        return await asyncio.to_thread(self.generate_text, prompt, thinking_budget)
+    
+    def generate_text_with_prefix(self, prefix: str, suffix: str, thinking_budget: int = 1000) -> str:
+        """
+        Generate text from a prompt split into a shared prefix and a per-call suffix
+        
+        Callers issuing many prompts with the same prefix (e.g. one per page) use
+        this so providers can reuse the prefix server side. The default sends
+        prefix + suffix inline and only records the prefix for reuse statistics.
+        
+        Args:
+            prefix: Leading part of the prompt shared across calls
+            suffix: Remaining call-specific part of the prompt
+            thinking_budget: Budget for thinking/reasoning (provider-specific)
+            
+        Returns:
+            Generated text content
+        """
+        get_prefix_tracker().record(prefix)
+        return self.generate_text(prefix + suffix, thinking_budget)
+    
+    async def generate_text_with_prefix_async(self, prefix: str, suffix: str,
+                                              thinking_budget: int = 1000) -> str:
+        """Async variant of generate_text_with_prefix"""
+        get_prefix_tracker().record(prefix)
+        return await self.generate_text_async(prefix + suffix, thinking_budget)
+    
+    def stream_text(self, prompt: str, thinking_budget: int = 1000) -> Iterator[str]:
+        """
+        Generate text incrementally, yielding chunks as the model produces them
+        
+        The default yields the complete generate_text result as a single chunk;
+        providers whose SDK supports streaming override this.
+        
+        Args:
+            prompt: The input prompt for text generation
+            thinking_budget: Budget for thinking/reasoning (provider-specific)
+            
+        Yields:
+            Text chunks, concatenating to the full response
+        """
+        yield self.generate_text(prompt, thinking_budget)
+    
+    def stream_text_with_prefix(self, prefix: str, suffix: str, thinking_budget: int = 1000) -> Iterator[str]:
+        """Streaming variant of generate_text_with_prefix"""
+        get_prefix_tracker().record(prefix)
+        yield from self.stream_text(prefix + suffix, thinking_budget)
+    
+    def invalidate(self, prompt: str, thinking_budget: int = 1000):
+        """
+        Drop any stored response for this prompt so the next call regenerates it
+        
+        No-op for uncached providers; CachedTextProvider overrides this.
+        """
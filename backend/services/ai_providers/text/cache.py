@@ -0,0 +1,290 @@
+"""
+Content-addressed response cache for text generation (opt-in)
+
+Responses are stored in a standalone SQLite file keyed by
+sha256(model, thinking_budget, prompt), so re-issued prompts (regenerate
+clicks, replayed demo projects) return instantly without an API call.
+
+Configuration (see config.py):
+    TEXT_CACHE_ENABLED: "true" to wrap text providers with the cache
+    TEXT_CACHE_PATH: SQLite file path (default: backend/instance/text_cache.db)
+    TEXT_CACHE_TTL_SECONDS: Entries older than this are treated as misses
+    TEXT_CACHE_MAX_MB: Total response size kept; least recently used entries are evicted
+"""
+import asyncio
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, Optional
+
+from .base import TextProvider
+
+logger = logging.getLogger(__name__)
+
+
+class TextResponseCache:
+    """SQLite-backed cache with TTL, size-based LRU eviction and hit/miss counters"""
+
+    def __init__(self, path: str, ttl_seconds: int = 7 * 24 * 3600, max_bytes: int = 100 * 1024 * 1024):
+        """
+        Args:
+            path: SQLite database file
+            ttl_seconds: Entry lifetime (0 = never expires)
+            max_bytes: Maximum total size of cached responses
+        """
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS text_cache ("
+                " key TEXT PRIMARY KEY,"
+                " model TEXT NOT NULL,"
+                " response TEXT NOT NULL,"
+                " size INTEGER NOT NULL,"
+                " created_at REAL NOT NULL,"
+                " last_access REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_text_cache_last_access ON text_cache (last_access)")
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        """Open a short-lived autocommit connection (safe to use from any thread)"""
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    @staticmethod
+    def make_key(model: str, prompt: str, thinking_budget: int) -> str:
+        """Hash (model, thinking_budget, prompt) into a cache key"""
+        digest = hashlib.sha256()
+        for part in (model, str(thinking_budget), prompt):
+            digest.update(part.encode('utf-8'))
+            digest.update(b'\0')
+        return digest.hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        """Return the cached response or None, counting the hit/miss"""
+        now = time.time()
+        try:
+            with self._connect() as conn:
+                row = conn.execute(
+                    "SELECT response, created_at FROM text_cache WHERE key = ?", (key,)
+                ).fetchone()
+                if row and self.ttl_seconds and now - row[1] > self.ttl_seconds:
+                    conn.execute("DELETE FROM text_cache WHERE key = ?", (key,))
+                    row = None
+                if row:
+                    conn.execute("UPDATE text_cache SET last_access = ? WHERE key = ?", (now, key))
+        except sqlite3.Error as e:
+            logger.warning(f"Text cache read failed: {e}")
+            row = None
+
+        with self._lock:
+            if row:
+                self.hits += 1
+            else:
+                self.misses += 1
+        return row[0] if row else None
+
+    def set(self, key: str, model: str, response: str):
+        """Store a response and evict least recently used entries beyond max_bytes"""
+        now = time.time()
+        size = len(response.encode('utf-8'))
+        try:
+            with self._connect() as conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO text_cache (key, model, response, size, created_at, last_access)"
+                    " VALUES (?, ?, ?, ?, ?, ?)",
+                    (key, model, response, size, now, now)
+                )
+                self._evict(conn)
+        except sqlite3.Error as e:
+            logger.warning(f"Text cache write failed: {e}")
+
+    def delete(self, key: str):
+        """Remove a single entry (e.g. a response the caller could not use)"""
+        try:
+            with self._connect() as conn:
+                conn.execute("DELETE FROM text_cache WHERE key = ?", (key,))
+        except sqlite3.Error as e:
+            logger.warning(f"Text cache delete failed: {e}")
+
+    def _evict(self, conn: sqlite3.Connection):
+        """Delete the least recently used entries until the total size fits max_bytes"""
+        if not self.max_bytes:
+            return
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM text_cache").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+
+        evicted = 0
+        for key, size in conn.execute("SELECT key, size FROM text_cache ORDER BY last_access").fetchall():
+            if total <= self.max_bytes:
+                break
+            conn.execute("DELETE FROM text_cache WHERE key = ?", (key,))
+            total -= size
+            evicted += 1
+        with self._lock:
+            self.evictions += evicted
+
+    def clear(self):
+        """Remove all entries and reset the counters"""
+        with self._connect() as conn:
+            conn.execute("DELETE FROM text_cache")
+        with self._lock:
+            self.hits = self.misses = self.evictions = 0
+
+    def stats(self) -> Dict:
+        """Hit/miss counters since startup plus current cache size"""
+        try:
+            with self._connect() as conn:
+                entries, total = conn.execute(
+                    "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM text_cache"
+                ).fetchone()
+        except sqlite3.Error:
+            entries, total = None, None
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'enabled': True,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+                'evictions': self.evictions,
+                'entries': entries,
+                'size_bytes': total,
+                'max_bytes': self.max_bytes,
+                'ttl_seconds': self.ttl_seconds,
+            }
+
+
+class CachedTextProvider(TextProvider):
+    """Wraps a TextProvider and serves repeated prompts from a TextResponseCache"""
+
+    def __init__(self, provider: TextProvider, cache: TextResponseCache):
+        self.provider = provider
+        self.cache = cache
+        self.model = getattr(provider, 'model', type(provider).__name__)
+
+    def generate_text(self, prompt: str, thinking_budget: int = 1000) -> str:
+        """Return the cached response, or generate and cache it"""
+        key = self.cache.make_key(self.model, prompt, thinking_budget)
+        cached = self.cache.get(key)
+        if cached is not None:
+            logger.debug(f"Text cache hit ({self.model})")
+            return cached
+
+        response = self.provider.generate_text(prompt, thinking_budget)
+        if response:
+            self.cache.set(key, self.model, response)
+        return response
+
+    async def generate_text_async(self, prompt: str, thinking_budget: int = 1000) -> str:
+        """Async variant of generate_text (SQLite access runs in a worker thread)"""
+        key = self.cache.make_key(self.model, prompt, thinking_budget)
+        cached = await asyncio.to_thread(self.cache.get, key)
+        if cached is not None:
+            logger.debug(f"Text cache hit ({self.model})")
+            return cached
+
+        response = await self.provider.generate_text_async(prompt, thinking_budget)
+        if response:
+            await asyncio.to_thread(self.cache.set, key, self.model, response)
+        return response
+
+    def generate_text_with_prefix(self, prefix: str, suffix: str, thinking_budget: int = 1000) -> str:
+        """Cache on the full prompt, delegating misses with the prefix split intact"""
+        key = self.cache.make_key(self.model, prefix + suffix, thinking_budget)
+        cached = self.cache.get(key)
+        if cached is not None:
+            logger.debug(f"Text cache hit ({self.model})")
+            return cached
+
+        response = self.provider.generate_text_with_prefix(prefix, suffix, thinking_budget)
+        if response:
+            self.cache.set(key, self.model, response)
+        return response
+
+    async def generate_text_with_prefix_async(self, prefix: str, suffix: str,
+                                              thinking_budget: int = 1000) -> str:
+        """Async variant of generate_text_with_prefix (SQLite access runs in a worker thread)"""
+        key = self.cache.make_key(self.model, prefix + suffix, thinking_budget)
+        cached = await asyncio.to_thread(self.cache.get, key)
+        if cached is not None:
+            logger.debug(f"Text cache hit ({self.model})")
+            return cached
+
+        response = await self.provider.generate_text_with_prefix_async(prefix, suffix, thinking_budget)
+        if response:
+            await asyncio.to_thread(self.cache.set, key, self.model, response)
+        return response
+
+    def invalidate(self, prompt: str, thinking_budget: int = 1000):
+        """Delete the cached response for this prompt so a retry reaches the provider"""
+        self.cache.delete(self.cache.make_key(self.model, prompt, thinking_budget))
+
+    def _stream_cached(self, key: str, open_stream: Callable[[], Iterator[str]]) -> Iterator[str]:
+        """Yield a cached response in one chunk, or stream it and cache the complete text"""
+        cached = self.cache.get(key)
+        if cached is not None:
+            logger.debug(f"Text cache hit ({self.model})")
+            yield cached
+            return
+
+        chunks = []
+        for chunk in open_stream():
+            chunks.append(chunk)
+            yield chunk
+        # 只缓存完整读取的响应，客户端中途断开时不会走到这里
+        response = ''.join(chunks)
+        if response:
+            self.cache.set(key, self.model, response)
+
+    def stream_text(self, prompt: str, thinking_budget: int = 1000) -> Iterator[str]:
+        """Streaming variant of generate_text"""
+        key = self.cache.make_key(self.model, prompt, thinking_budget)
+        return self._stream_cached(key, lambda: self.provider.stream_text(prompt, thinking_budget))
+
+    def stream_text_with_prefix(self, prefix: str, suffix: str, thinking_budget: int = 1000) -> Iterator[str]:
+        """Streaming variant of generate_text_with_prefix"""
+        key = self.cache.make_key(self.model, prefix + suffix, thinking_budget)
+        return self._stream_cached(
+            key, lambda: self.provider.stream_text_with_prefix(prefix, suffix, thinking_budget)
+        )
+
+
+_cache: Optional[TextResponseCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_text_cache() -> Optional[TextResponseCache]:
+    """Return the shared cache if TEXT_CACHE_ENABLED, otherwise None"""
+    global _cache
+    from config import get_config
+    config = get_config()
+    if not config.TEXT_CACHE_ENABLED:
+        return None
+
+    with _cache_lock:
+        if _cache is None:
+            _cache = TextResponseCache(
+                config.TEXT_CACHE_PATH,
+                ttl_seconds=config.TEXT_CACHE_TTL_SECONDS,
+                max_bytes=config.TEXT_CACHE_MAX_MB * 1024 * 1024
+            )
+            logger.info(f"Text response cache enabled: {config.TEXT_CACHE_PATH}")
+        return _cache
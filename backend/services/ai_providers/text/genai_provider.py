@@ -1,18 +1,30 @@
 """
 Google GenAI SDK implementation for text generation
 """
+import asyncio
 import logging
+import threading
+import time
+from concurrent.futures import Future
+from typing import Dict, Iterator, Optional, Tuple
 from google import genai
 from google.genai import types
 from .base import TextProvider
+from .prefix_cache import get_prefix_tracker, prefix_digest
+from ..retry_policy import RetryPolicy, classify_error
+from ..loop_local import LoopLocal
 
 logger = logging.getLogger(__name__)
 
+# 缓存到期前预留的时间，避免引用一个即将过期的缓存
+_CONTEXT_CACHE_EXPIRY_MARGIN = 30
+
 
 class GenAITextProvider(TextProvider):
     """Text generation using Google GenAI SDK"""
     
-    def __init__(self, api_key: str, api_base: str = None, model: str = "gemini-2.5-flash"):
+    def __init__(self, api_key: str, api_base: str = None, model: str = "gemini-2.5-flash",
+                 retry_policy: RetryPolicy = None):
         """
         Initialize GenAI text provider
         
@@ -20,12 +32,36 @@ class GenAITextProvider(TextProvider):
             api_key: Google API key
             api_base: API base URL (for proxies like aihubmix)
             model: Model name to use
+            retry_policy: Retry policy for transient errors (defaults to AI_RETRY_* config)
         """
-        self.client = genai.Client(
-            http_options=types.HttpOptions(base_url=api_base) if api_base else None,
-            api_key=api_key
-        )
+        http_options = types.HttpOptions(base_url=api_base) if api_base else None
+        self.client = genai.Client(http_options=http_options, api_key=api_key)
         self.model = model
+        self.retry_policy = retry_policy or RetryPolicy.from_config()
+        self._async_clients = LoopLocal(
+            lambda: genai.Client(http_options=http_options, api_key=api_key).aio
+        )
+        
+        # Explicit context caching for shared prompt prefixes (see prefix_cache.py)
+        from config import get_config
+        config = get_config()
+        self.context_cache_enabled = config.PROMPT_PREFIX_CACHE_ENABLED
+        self.context_cache_min_chars = config.PROMPT_PREFIX_CACHE_MIN_CHARS
+        self.context_cache_ttl = config.PROMPT_PREFIX_CACHE_TTL_SECONDS
+        # prefix hash -> (cache name or None if it could not be created, expiry as time.monotonic())
+        self._context_caches: Dict[str, Tuple[Optional[str], float]] = {}
+        self._context_cache_lock = threading.Lock()
+        # prefix hash -> creation in progress; concurrent callers wait for it instead of
+        # creating the same cache again (the shared lock is never held during the request)
+        self._context_cache_flights: Dict[str, Future] = {}
+        self._async_context_cache_flights = LoopLocal(dict)
+    
+    def _build_config(self, thinking_budget: int, cached_content: str = None) -> types.GenerateContentConfig:
+        """Build the generation config shared by the sync and async paths"""
+        return types.GenerateContentConfig(
+            thinking_config=types.ThinkingConfig(thinking_budget=thinking_budget),
+            cached_content=cached_content,
+        )
     
     def generate_text(self, prompt: str, thinking_budget: int = 1000) -> str:
         """
@@ -38,11 +74,233 @@ class GenAITextProvider(TextProvider):
         Returns:
             Generated text
         """
-        response = self.client.models.generate_content(
+        response = self.retry_policy.call(
+            self.client.models.generate_content,
+            model=self.model,
+            contents=prompt,
+            config=self._build_config(thinking_budget),
+            description=f"GenAI text generation ({self.model})"
+        )
+        return response.text
+    
+    async def generate_text_async(self, prompt: str, thinking_budget: int = 1000) -> str:
+        """Generate text with the GenAI async client"""
+        client = self._async_clients.get()
+        response = await self.retry_policy.call_async(
+            client.models.generate_content,
             model=self.model,
             contents=prompt,
-            config=types.GenerateContentConfig(
-                thinking_config=types.ThinkingConfig(thinking_budget=thinking_budget),
-            ),
+            config=self._build_config(thinking_budget),
+            description=f"GenAI text generation ({self.model})"
+        )
+        return response.text
+    
+    @staticmethod
+    def _cached_tokens(response) -> int:
+        """Prompt tokens served from a cached context, explicit or implicit (0 if not reported)"""
+        usage = getattr(response, 'usage_metadata', None)
+        return getattr(usage, 'cached_content_token_count', None) or 0
+    
+    def _should_cache_prefix(self, prefix: str) -> bool:
+        """Only prefixes long enough to meet Gemini's minimum cache size are cached explicitly"""
+        return self.context_cache_enabled and len(prefix) >= self.context_cache_min_chars
+    
+    def _lookup_context_cache(self, digest: str) -> Tuple[bool, Optional[str]]:
+        """Return (known, cache name) for a prefix hash, ignoring entries about to expire"""
+        entry = self._context_caches.get(digest)
+        if entry and entry[1] - _CONTEXT_CACHE_EXPIRY_MARGIN > time.monotonic():
+            return True, entry[0]
+        return False, None
+    
+    def _remember_context_cache(self, digest: str, name: Optional[str]):
+        """Store the cache name for a prefix (None marks a prefix that could not be cached)"""
+        self._context_caches[digest] = (name, time.monotonic() + self.context_cache_ttl)
+    
+    def _cache_config(self, prefix: str) -> types.CreateCachedContentConfig:
+        """Config for a cached context holding the prefix"""
+        return types.CreateCachedContentConfig(
+            contents=[prefix],
+            ttl=f"{self.context_cache_ttl}s",
+            display_name=f"banana-slides-prefix-{prefix_digest(prefix)[:16]}",
+        )
+    
+    def _get_context_cache(self, prefix: str) -> Optional[str]:
+        """Return the cached context name for the prefix, creating it on first use"""
+        if not self._should_cache_prefix(prefix):
+            return None
+        digest = prefix_digest(prefix)
+        # 同一前缀只创建一次缓存，并发的其他页面等待创建完成后复用；
+        # 创建请求在锁外发出，不阻塞其他前缀
+        with self._context_cache_lock:
+            known, name = self._lookup_context_cache(digest)
+            if known:
+                return name
+            flight = self._context_cache_flights.get(digest)
+            if flight is None:
+                flight = self._context_cache_flights[digest] = Future()
+                owner = True
+            else:
+                owner = False
+        if not owner:
+            return flight.result()
+        
+        name = None
+        try:
+            cached = self.retry_policy.call(
+                self.client.caches.create,
+                model=self.model,
+                config=self._cache_config(prefix),
+                description=f"GenAI context cache creation ({self.model})"
+            )
+            name = cached.name
+            logger.info(f"Created GenAI context cache {name} for a {len(prefix)}-char prompt prefix")
+        except Exception as e:
+            # 代理不支持或前缀 token 数不足时直接内联发送，TTL 内不再重试
+            logger.warning(f"GenAI context caching unavailable, sending prefix inline: {e}")
+        finally:
+            with self._context_cache_lock:
+                self._remember_context_cache(digest, name)
+                self._context_cache_flights.pop(digest, None)
+            flight.set_result(name)
+        return name
+    
+    async def _get_context_cache_async(self, prefix: str) -> Optional[str]:
+        """Async variant of _get_context_cache (single-flight per event loop)"""
+        if not self._should_cache_prefix(prefix):
+            return None
+        digest = prefix_digest(prefix)
+        flights = self._async_context_cache_flights.get()
+        with self._context_cache_lock:
+            known, name = self._lookup_context_cache(digest)
+        if known:
+            return name
+        flight = flights.get(digest)
+        if flight is not None:
+            # shield：等待方被取消时不取消共享的创建结果
+            return await asyncio.shield(flight)
+        
+        flight = flights[digest] = asyncio.get_running_loop().create_future()
+        name = None
+        try:
+            client = self._async_clients.get()
+            cached = await self.retry_policy.call_async(
+                client.caches.create,
+                model=self.model,
+                config=self._cache_config(prefix),
+                description=f"GenAI context cache creation ({self.model})"
+            )
+            name = cached.name
+            logger.info(f"Created GenAI context cache {name} for a {len(prefix)}-char prompt prefix")
+        except Exception as e:
+            logger.warning(f"GenAI context caching unavailable, sending prefix inline: {e}")
+        finally:
+            with self._context_cache_lock:
+                self._remember_context_cache(digest, name)
+            flights.pop(digest, None)
+            flight.set_result(name)
+        return name
+    
+    def _handle_cached_call_error(self, prefix: str, error: Exception):
+        """Drop a cached context the API rejected (expired or deleted); transient errors are re-raised"""
+        if classify_error(error)[0]:
+            raise error
+        logger.warning(f"GenAI call with cached context failed, retrying with the prefix inline: {error}")
+        with self._context_cache_lock:
+            self._context_caches.pop(prefix_digest(prefix), None)
+    
+    def generate_text_with_prefix(self, prefix: str, suffix: str, thinking_budget: int = 1000) -> str:
+        """
+        Generate text, referencing the shared prefix through an explicit context cache
+        
+        Falls back to sending prefix + suffix inline when the prefix is too short,
+        caching is disabled, or the endpoint does not support cached contents.
+        """
+        cache_name = self._get_context_cache(prefix)
+        if cache_name:
+            try:
+                response = self.retry_policy.call(
+                    self.client.models.generate_content,
+                    model=self.model,
+                    contents=suffix,
+                    config=self._build_config(thinking_budget, cached_content=cache_name),
+                    description=f"GenAI text generation ({self.model})"
+                )
+                get_prefix_tracker().record(prefix, cached_tokens=self._cached_tokens(response))
+                return response.text
+            except Exception as e:
+                self._handle_cached_call_error(prefix, e)
+        
+        response = self.retry_policy.call(
+            self.client.models.generate_content,
+            model=self.model,
+            contents=prefix + suffix,
+            config=self._build_config(thinking_budget),
+            description=f"GenAI text generation ({self.model})"
         )
+        get_prefix_tracker().record(prefix, cached_tokens=self._cached_tokens(response))
         return response.text
+    
+    async def generate_text_with_prefix_async(self, prefix: str, suffix: str,
+                                              thinking_budget: int = 1000) -> str:
+        """Async variant of generate_text_with_prefix"""
+        client = self._async_clients.get()
+        cache_name = await self._get_context_cache_async(prefix)
+        if cache_name:
+            try:
+                response = await self.retry_policy.call_async(
+                    client.models.generate_content,
+                    model=self.model,
+                    contents=suffix,
+                    config=self._build_config(thinking_budget, cached_content=cache_name),
+                    description=f"GenAI text generation ({self.model})"
+                )
+                get_prefix_tracker().record(prefix, cached_tokens=self._cached_tokens(response))
+                return response.text
+            except Exception as e:
+                self._handle_cached_call_error(prefix, e)
+        
+        response = await self.retry_policy.call_async(
+            client.models.generate_content,
+            model=self.model,
+            contents=prefix + suffix,
+            config=self._build_config(thinking_budget),
+            description=f"GenAI text generation ({self.model})"
+        )
+        get_prefix_tracker().record(prefix, cached_tokens=self._cached_tokens(response))
+        return response.text
+    
+    def _open_stream(self, contents: str, thinking_budget: int, cached_content: str = None) -> Iterator[str]:
+        """Start a streaming request, retrying transient errors until the first chunk arrives"""
+        return self.retry_policy.call_stream(
+            self.client.models.generate_content_stream,
+            model=self.model,
+            contents=contents,
+            config=self._build_config(thinking_budget, cached_content=cached_content),
+            description=f"GenAI text streaming ({self.model})"
+        )
+    
+    @staticmethod
+    def _iter_text(stream) -> Iterator[str]:
+        """Yield the text of each streamed response chunk"""
+        for chunk in stream:
+            if chunk.text:
+                yield chunk.text
+    
+    def stream_text(self, prompt: str, thinking_budget: int = 1000) -> Iterator[str]:
+        """Stream text with generate_content_stream"""
+        yield from self._iter_text(self._open_stream(prompt, thinking_budget))
+    
+    def stream_text_with_prefix(self, prefix: str, suffix: str, thinking_budget: int = 1000) -> Iterator[str]:
+        """Streaming variant of generate_text_with_prefix, referencing the prefix through a context cache"""
+        stream = None
+        cache_name = self._get_context_cache(prefix)
+        if cache_name:
+            try:
+                stream = self._open_stream(suffix, thinking_budget, cached_content=cache_name)
+            except Exception as e:
+                self._handle_cached_call_error(prefix, e)
+        if stream is None:
+            stream = self._open_stream(prefix + suffix, thinking_budget)
+        
+        get_prefix_tracker().record(prefix)
+        yield from self._iter_text(stream)
@@ -2,8 +2,12 @@
 OpenAI SDK implementation for text generation
 """
 import logging
-from openai import OpenAI
+from typing import Iterator
+from openai import OpenAI, AsyncOpenAI
 from .base import TextProvider
+from .prefix_cache import get_prefix_tracker
+from ..retry_policy import RetryPolicy
+from ..loop_local import LoopLocal
 
 logger = logging.getLogger(__name__)
 
@@ -11,7 +15,8 @@ logger = logging.getLogger(__name__)
 class OpenAITextProvider(TextProvider):
     """Text generation using OpenAI SDK (compatible with Gemini via proxy)"""
     
-    def __init__(self, api_key: str, api_base: str = None, model: str = "gemini-2.5-flash"):
+    def __init__(self, api_key: str, api_base: str = None, model: str = "gemini-2.5-flash",
+                 retry_policy: RetryPolicy = None):
         """
         Initialize OpenAI text provider
         
@@ -19,12 +24,18 @@ class OpenAITextProvider(TextProvider):
             api_key: API key
             api_base: API base URL (e.g., https://aihubmix.com/v1)
             model: Model name to use
+            retry_policy: Retry policy for transient errors (defaults to AI_RETRY_* config)
         """
         self.client = OpenAI(
             api_key=api_key,
-            base_url=api_base
+            base_url=api_base,
+            max_retries=0  # retries are handled by retry_policy
         )
         self.model = model
+        self.retry_policy = retry_policy or RetryPolicy.from_config()
+        self._async_clients = LoopLocal(
+            lambda: AsyncOpenAI(api_key=api_key, base_url=api_base, max_retries=0)
+        )
     
     def generate_text(self, prompt: str, thinking_budget: int = 1000) -> str:
         """
@@ -37,10 +48,80 @@ class OpenAITextProvider(TextProvider):
         Returns:
             Generated text
         """
-        response = self.client.chat.completions.create(
+        response = self.retry_policy.call(
+            self.client.chat.completions.create,
+            model=self.model,
+            messages=[
+                {"role": "user", "content": prompt}
+            ],
+            description=f"OpenAI text generation ({self.model})"
+        )
+        return response.choices[0].message.content
+    
+    async def generate_text_async(self, prompt: str, thinking_budget: int = 1000) -> str:
+        """Generate text with the OpenAI async client"""
+        client = self._async_clients.get()
+        response = await self.retry_policy.call_async(
+            client.chat.completions.create,
             model=self.model,
             messages=[
                 {"role": "user", "content": prompt}
-            ]
+            ],
+            description=f"OpenAI text generation ({self.model})"
+        )
+        return response.choices[0].message.content
+    
+    @staticmethod
+    def _cached_tokens(response) -> int:
+        """Prompt tokens served from OpenAI's automatic prompt cache (0 if not reported)"""
+        details = getattr(getattr(response, 'usage', None), 'prompt_tokens_details', None)
+        return getattr(details, 'cached_tokens', None) or 0
+    
+    def generate_text_with_prefix(self, prefix: str, suffix: str, thinking_budget: int = 1000) -> str:
+        """
+        Generate text with the shared prefix first in the message
+        
+        OpenAI caches identical leading prompt tokens automatically, so keeping the
+        prefix byte-identical and first is all that is needed for reuse.
+        """
+        response = self.retry_policy.call(
+            self.client.chat.completions.create,
+            model=self.model,
+            messages=[
+                {"role": "user", "content": prefix + suffix}
+            ],
+            description=f"OpenAI text generation ({self.model})"
         )
+        get_prefix_tracker().record(prefix, cached_tokens=self._cached_tokens(response))
         return response.choices[0].message.content
+    
+    async def generate_text_with_prefix_async(self, prefix: str, suffix: str,
+                                              thinking_budget: int = 1000) -> str:
+        """Async variant of generate_text_with_prefix"""
+        client = self._async_clients.get()
+        response = await self.retry_policy.call_async(
+            client.chat.completions.create,
+            model=self.model,
+            messages=[
+                {"role": "user", "content": prefix + suffix}
+            ],
+            description=f"OpenAI text generation ({self.model})"
+        )
+        get_prefix_tracker().record(prefix, cached_tokens=self._cached_tokens(response))
+        return response.choices[0].message.content
+    
+    def stream_text(self, prompt: str, thinking_budget: int = 1000) -> Iterator[str]:
+        """Stream text with chat completions (stream=True)"""
+        stream = self.retry_policy.call_stream(
+            self.client.chat.completions.create,
+            model=self.model,
+            messages=[
+                {"role": "user", "content": prompt}
+            ],
+            stream=True,
+            description=f"OpenAI text streaming ({self.model})"
+        )
+        for chunk in stream:
+            # 部分兼容接口会发送不含 choices 的用量块
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
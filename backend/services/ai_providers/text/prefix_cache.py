@@ -0,0 +1,97 @@
+"""
+Prompt prefix reuse tracking
+
+Page description prompts are split into a shared prefix (reference files,
+original request and full outline) and a short per-page suffix. Providers that
+support it reuse the prefix server side:
+    - Gemini: explicit context caching (a CachedContent created once per prefix)
+    - OpenAI: automatic prompt caching of identical leading tokens
+
+Every call is also recorded here so the prefix size and how often it is reused
+can be inspected even when the provider (or a proxy in front of it) does not
+cache anything.
+
+Configuration (see config.py):
+    PROMPT_PREFIX_CACHE_ENABLED: "false" disables Gemini explicit context caching
+    PROMPT_PREFIX_CACHE_MIN_CHARS: Shorter prefixes are sent inline (provider minimum token counts)
+    PROMPT_PREFIX_CACHE_TTL_SECONDS: Lifetime of a Gemini cached context
+"""
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional
+
+
+def prefix_digest(prefix: str) -> str:
+    """Stable hash identifying a prompt prefix"""
+    return hashlib.sha256(prefix.encode('utf-8')).hexdigest()
+
+
+class PrefixReuseTracker:
+    """Counts prefix bytes sent and how many of them repeat an earlier prefix"""
+
+    def __init__(self, max_prefixes: int = 1024):
+        """
+        Args:
+            max_prefixes: Number of distinct prefix hashes remembered (oldest are forgotten)
+        """
+        self.max_prefixes = max_prefixes
+        self._seen: 'OrderedDict[str, int]' = OrderedDict()
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """Reset all counters"""
+        with self._lock:
+            self._seen.clear()
+            self.calls = 0
+            self.reused_calls = 0
+            self.prefix_bytes = 0
+            self.reused_prefix_bytes = 0
+            self.provider_cached_tokens = 0
+
+    def record(self, prefix: str, cached_tokens: Optional[int] = None):
+        """
+        Record one call made with this prefix
+
+        Args:
+            prefix: Shared prompt prefix sent (or referenced) by the call
+            cached_tokens: Prompt tokens the provider reported as served from its cache
+        """
+        digest = prefix_digest(prefix)
+        size = len(prefix.encode('utf-8'))
+        with self._lock:
+            self.calls += 1
+            self.prefix_bytes += size
+            if digest in self._seen:
+                self.reused_calls += 1
+                self.reused_prefix_bytes += size
+                self._seen.move_to_end(digest)
+            else:
+                self._seen[digest] = size
+                if len(self._seen) > self.max_prefixes:
+                    self._seen.popitem(last=False)
+            if cached_tokens:
+                self.provider_cached_tokens += cached_tokens
+
+    def stats(self) -> Dict:
+        """Prefix size and reuse ratio since startup"""
+        with self._lock:
+            return {
+                'calls': self.calls,
+                'unique_prefixes': len(self._seen),
+                'reused_calls': self.reused_calls,
+                'reuse_ratio': round(self.reused_calls / self.calls, 4) if self.calls else 0.0,
+                'prefix_bytes': self.prefix_bytes,
+                'reused_prefix_bytes': self.reused_prefix_bytes,
+                'avg_prefix_bytes': self.prefix_bytes // self.calls if self.calls else 0,
+                'provider_cached_tokens': self.provider_cached_tokens,
+            }
+
+
+_tracker = PrefixReuseTracker()
+
+
+def get_prefix_tracker() -> PrefixReuseTracker:
+    """Return the process-wide prefix reuse tracker"""
+    return _tracker
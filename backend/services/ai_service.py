@@ -6,16 +6,19 @@ TODO: use structured output API
 import os
 import json
 import re
+import asyncio
+import contextvars
 import logging
-import requests
-from typing import List, Dict, Optional, Union
+import queue
+import threading
+from typing import Iterator, List, Dict, Optional, Tuple, Union
 from textwrap import dedent
 from PIL import Image
 from tenacity import retry, stop_after_attempt, retry_if_exception_type
 from .prompts import (
     get_outline_generation_prompt,
     get_outline_parsing_prompt,
-    get_page_description_prompt,
+    get_page_description_prompt_parts,
     get_image_generation_prompt,
     get_image_edit_prompt,
     get_description_to_outline_prompt,
@@ -24,6 +27,9 @@ from .prompts import (
     get_descriptions_refinement_prompt
 )
 from .ai_providers import get_text_provider, get_image_provider, TextProvider, ImageProvider
+from .ai_providers.image.reference_cache import get_reference_cache
+from .ai_providers.loop_local import close_loop_clients
+from .remote_image_cache import get_remote_image_cache
 from config import get_config
 
 logger = logging.getLogger(__name__)
@@ -53,6 +59,8 @@ class ProjectContext:
             self.creation_type = project_or_dict.get('creation_type', 'idea')
         
         self.reference_files_content = reference_files_content or []
+        # 参考文件检索索引（ReferenceIndex），设置后页面描述只携带相关片段
+        self.reference_index = None
     
     def to_dict(self) -> Dict:
         """转换为字典，方便传递"""
@@ -169,6 +177,8 @@ class AIService:
             return json.loads(cleaned_text)
         except json.JSONDecodeError as e:
             logger.warning(f"JSON解析失败，将重新生成。原始文本: {cleaned_text[:200]}... 错误: {str(e)}")
+            # 丢弃缓存中的错误响应，否则重试会再次命中同一段文本
+            self.text_provider.invalidate(prompt, thinking_budget)
             raise
     
     @staticmethod
@@ -190,7 +200,7 @@ class AIService:
     @staticmethod
     def download_image_from_url(url: str) -> Optional[Image.Image]:
         """
-        从 URL 下载图片并返回 PIL Image 对象
+        从 URL 下载图片并返回 PIL Image 对象（经 remote_image_cache 缓存）
         
         Args:
             url: 图片 URL
@@ -200,13 +210,8 @@ class AIService:
         """
         try:
             logger.debug(f"Downloading image from URL: {url}")
-            response = requests.get(url, timeout=30, stream=True)
-            response.raise_for_status()
-            
-            # 从响应内容创建 PIL Image
-            image = Image.open(response.raw)
-            # 确保图片被加载
-            image.load()
+            # 经共享缓存下载，同一图片在整套 PPT 中只下载一次
+            image = get_remote_image_cache().open_image(url)
             logger.debug(f"Successfully downloaded image: {image.size}, {image.mode}")
             return image
         except Exception as e:
@@ -276,21 +281,143 @@ class AIService:
         Returns:
             Text description for the page
         """
+        prefix, suffix = self._build_page_description_prompt(
+            project_context, outline, page_outline, page_index, language
+        )
+        
+        # 共享前缀（参考文件+大纲）由 provider 复用，每页只需发送页面相关的后缀
+        response_text = self.text_provider.generate_text_with_prefix(prefix, suffix, thinking_budget=1000)
+        
+        return dedent(response_text)
+    
+    def stream_page_description(self, project_context: ProjectContext, outline: List[Dict],
+                                page_outline: Dict, page_index: int, language='zh') -> Iterator[str]:
+        """
+        Streaming variant of generate_page_description
+        
+        Yields text chunks as the model produces them. The provider holds its rate
+        limiter slot until the stream is exhausted or closed.
+        
+        Args:
+            project_context: 项目上下文对象，包含所有原始信息
+            outline: Complete outline
+            page_outline: Outline for this specific page
+            page_index: Page number (1-indexed)
+        
+        Yields:
+            Description text chunks (not dedented, see generate_page_description)
+        """
+        prefix, suffix = self._build_page_description_prompt(
+            project_context, outline, page_outline, page_index, language
+        )
+        
+        yield from self.text_provider.stream_text_with_prefix(prefix, suffix, thinking_budget=1000)
+    
+    def _build_page_description_prompt(self, project_context: ProjectContext, outline: List[Dict],
+                                       page_outline: Dict, page_index: int, language='zh') -> Tuple[str, str]:
+        """Build the (shared prefix, page suffix) prompt pair used by the sync and async paths"""
         part_info = f"\nThis page belongs to: {page_outline['part']}" if 'part' in page_outline else ""
         
-        desc_prompt = get_page_description_prompt(
+        reference_chunks = None
+        if project_context.reference_index is not None:
+            reference_chunks = project_context.reference_index.search_for_page(
+                page_outline, top_k=get_config().REFERENCE_RETRIEVAL_TOP_K
+            )
+        
+        return get_page_description_prompt_parts(
             project_context=project_context,
             outline=outline,
             page_outline=page_outline,
             page_index=page_index,
             part_info=part_info,
-            language=language
+            language=language,
+            reference_chunks=reference_chunks
+        )
+    
+    async def generate_page_description_async(self, project_context: ProjectContext, outline: List[Dict],
+                                              page_outline: Dict, page_index: int, language='zh') -> str:
+        """Async variant of generate_page_description, shares the same global rate limiter"""
+        prefix, suffix = self._build_page_description_prompt(
+            project_context, outline, page_outline, page_index, language
         )
         
-        response_text = self.text_provider.generate_text(desc_prompt, thinking_budget=1000)
+        response_text = await self.text_provider.generate_text_with_prefix_async(
+            prefix, suffix, thinking_budget=1000
+        )
         
         return dedent(response_text)
     
+    def iter_page_descriptions(
+        self, project_context: ProjectContext, outline: List[Dict], page_outlines: List[Dict],
+        language='zh', max_concurrency: int = 16, idle_timeout: Optional[float] = None
+    ) -> Iterator[Optional[Tuple[int, Optional[str], Optional[Exception]]]]:
+        """
+        Generate descriptions for many pages concurrently on a single event loop
+        
+        All requests are in flight on one background event loop thread instead of
+        one OS thread per page; the global rate limiter still caps what reaches the
+        provider. Results are handed back to the calling thread, so blocking work
+        done with them (e.g. database writes) never stalls the requests in flight.
+        
+        Args:
+            project_context: 项目上下文对象，包含所有原始信息
+            outline: Complete outline
+            page_outlines: Outlines of the pages to describe, page_index is position + 1
+            language: Output language
+            max_concurrency: Maximum number of requests this batch keeps in flight
+            idle_timeout: If set, None is yielded whenever this many seconds pass
+                          without a finished page
+        
+        Yields:
+            (position, text, error) as each page finishes, or None on idle timeout
+        """
+        results: queue.Queue = queue.Queue()
+        finished = object()
+        
+        async def run_batch():
+            semaphore = asyncio.Semaphore(max(1, max_concurrency))
+            
+            async def describe(position: int, page_outline: Dict):
+                text, error = None, None
+                async with semaphore:
+                    try:
+                        text = await self.generate_page_description_async(
+                            project_context, outline, page_outline, position + 1, language=language
+                        )
+                    except Exception as e:
+                        error = e
+                results.put((position, text, error))
+            
+            try:
+                await asyncio.gather(*(describe(i, po) for i, po in enumerate(page_outlines)))
+            finally:
+                # 事件循环随 asyncio.run 结束，关闭为它创建的异步客户端以释放连接池
+                await close_loop_clients()
+        
+        def run():
+            try:
+                asyncio.run(run_batch())
+            except Exception as e:
+                results.put(e)
+            finally:
+                results.put(finished)
+        
+        # 事件循环线程沿用调用方的上下文（包括 Flask 应用上下文）
+        context = contextvars.copy_context()
+        threading.Thread(target=context.run, args=(run,), name='page-descriptions', daemon=True).start()
+        
+        while True:
+            try:
+                item = results.get(timeout=idle_timeout)
+            except queue.Empty:
+                yield None
+                continue
+            if item is finished:
+                return
+            if isinstance(item, Exception):
+                raise item
+            yield item
+    
     def generate_outline_text(self, outline: List[Dict]) -> str:
         """
         Convert outline to text format for prompts
@@ -379,13 +506,14 @@ class AIService:
 
             # 构建参考图片列表
             ref_images = []
+            reference_cache = get_reference_cache()
             
             # 添加主参考图片（如果提供了路径）
             if ref_image_path:
                 if not os.path.exists(ref_image_path):
                     raise FileNotFoundError(f"Reference image not found: {ref_image_path}")
-                main_ref_image = Image.open(ref_image_path)
-                ref_images.append(main_ref_image)
+                # 同一项目各页共用模板的预处理结果（按修改时间失效）
+                ref_images.append(reference_cache.get(ref_image_path))
             
             # 添加额外的参考图片
             if additional_ref_images:
@@ -397,7 +525,7 @@ class AIService:
                         # 可能是本地路径或 URL
                         if os.path.exists(ref_img):
                             # 本地路径
-                            ref_images.append(Image.open(ref_img))
+                            ref_images.append(reference_cache.get(ref_img))
                         elif ref_img.startswith('http://') or ref_img.startswith('https://'):
                             # URL，需要下载
                             downloaded_img = self.download_image_from_url(ref_img)
@@ -409,7 +537,7 @@ class AIService:
                             # MinerU 本地文件路径，需要转换为文件系统路径（支持前缀匹配）
                             local_path = self._convert_mineru_path_to_local(ref_img)
                             if local_path and os.path.exists(local_path):
-                                ref_images.append(Image.open(local_path))
+                                ref_images.append(reference_cache.get(local_path))
                                 logger.debug(f"Loaded MinerU image from local path: {local_path}")
                             else:
                                 logger.warning(f"MinerU image file not found (with prefix matching): {ref_img}, skipping...")
@@ -418,7 +546,7 @@ class AIService:
             
             logger.debug(f"Calling image provider for generation with {len(ref_images)} reference images...")
             
-            # 使用 image_provider 生成图片
+            # 使用 image_provider 生成图片（provider 内经全局限流，避免多任务并发触发服务商限速）
             return self.image_provider.generate_image(
                 prompt=prompt,
                 ref_images=ref_images if ref_images else None,
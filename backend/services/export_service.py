@@ -2,25 +2,96 @@
 Export Service - handles PPTX and PDF export
 Based on demo.py create_pptx_from_images()
 """
+import hashlib
 import io
 import json
 import logging
 import os
-from typing import List
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List, TypeVar
 
-from PIL import Image
 from .ai_providers.image.ppt_agent import SlideRenderer
+from .pdf_writer import StreamingPdfWriter, prepare_image
+from PIL import Image
 from pptx import Presentation
 from pptx.util import Inches
 
 logger = logging.getLogger(__name__)
 
+T = TypeVar('T')
+
+# python-pptx 可直接嵌入的图片格式（PNG / JPEG / GIF / BMP / TIFF）的文件头
+_PPTX_IMAGE_SIGNATURES = (b'\x89PNG', b'\xff\xd8', b'GIF8', b'BM', b'II*\x00', b'MM\x00*')
+
 
 class ExportService:
     """Service for exporting presentations"""
     
     @staticmethod
-    def create_pptx_from_images(image_paths: List[str], output_file: str = None) -> bytes:
+    def artifact_key(export_format: str, sources: List[str]) -> str:
+        """
+        Hash identifying an export artifact
+        
+        Args:
+            export_format: 'pptx' or 'pdf'
+            sources: Ordered identifiers of the exported pages (versioned image paths)
+        
+        Returns:
+            Hex digest; the same deck exported again yields the same key
+        """
+        digest = hashlib.sha256(export_format.encode('utf-8'))
+        for source in sources:
+            digest.update(b'\0')
+            digest.update(source.encode('utf-8'))
+        return digest.hexdigest()
+    
+    @staticmethod
+    def _load_pages(image_paths: List[str], loader: Callable[[str], T], max_workers: int = 4) -> List[T]:
+        """
+        Load page images in parallel, keeping their order and skipping missing files
+        
+        Args:
+            image_paths: List of absolute paths to images
+            loader: Reads one image (runs in a worker thread)
+            max_workers: Number of images loaded concurrently
+        """
+        existing = []
+        for image_path in image_paths:
+            if os.path.exists(image_path):
+                existing.append(image_path)
+            else:
+                logger.warning(f"Image not found: {image_path}")
+        
+        if len(existing) <= 1 or max_workers <= 1:
+            return [loader(image_path) for image_path in existing]
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            return list(executor.map(loader, existing))
+    
+    @staticmethod
+    def _read_bytes(image_path: str) -> io.BytesIO:
+        """
+        Read an image file into memory (python-pptx embeds the bytes as they are)
+        
+        Formats python-pptx cannot embed (e.g. WebP pages saved with
+        IMAGE_SAVE_FORMAT=webp) are converted to PNG.
+        """
+        with open(image_path, 'rb') as f:
+            data = f.read()
+        if data.startswith(_PPTX_IMAGE_SIGNATURES):
+            return io.BytesIO(data)
+        
+        with Image.open(io.BytesIO(data)) as image:
+            if image.mode not in ('RGB', 'RGBA', 'L', 'LA', 'P'):
+                image = image.convert('RGBA' if 'A' in image.getbands() else 'RGB')
+            stream = io.BytesIO()
+            image.save(stream, format='PNG', compress_level=1)
+        stream.seek(0)
+        return stream
+    
+    @staticmethod
+    def create_pptx_from_images(image_paths: List[str], output_file: str = None,
+                                max_workers: int = 4) -> bytes:
         """
         Create PPTX file from image paths
         Based on demo.py create_pptx_from_images()
@@ -28,6 +99,7 @@ class ExportService:
         Args:
             image_paths: List of absolute paths to images
             output_file: Optional output file path (if None, returns bytes)
+            max_workers: Number of images read concurrently
         
         Returns:
             PPTX file as bytes if output_file is None
@@ -40,18 +112,14 @@ class ExportService:
         prs.slide_height = Inches(5.625)
         
         # Add each image as a slide
-        for image_path in image_paths:
-            if not os.path.exists(image_path):
-                logger.warning(f"Image not found: {image_path}")
-                continue
-            
+        for image_stream in ExportService._load_pages(image_paths, ExportService._read_bytes, max_workers):
             # Add blank slide layout (layout 6 is typically blank)
             blank_slide_layout = prs.slide_layouts[6]
             slide = prs.slides.add_slide(blank_slide_layout)
             
             # Add image to fill entire slide
             slide.shapes.add_picture(
-                image_path,
+                image_stream,
                 left=0,
                 top=0,
                 width=prs.slide_width,
@@ -70,56 +138,52 @@ class ExportService:
             return pptx_bytes.getvalue()
     
     @staticmethod
-    def create_pdf_from_images(image_paths: List[str], output_file: str = None) -> bytes:
+    def create_pdf_from_images(image_paths: List[str], output_file: str = None,
+                               max_workers: int = 4) -> bytes:
         """
         Create PDF file from image paths
         
+        Pages are written one by one with StreamingPdfWriter, embedding the
+        JPEG/PNG data without decoding it, so memory use stays flat regardless
+        of the number of pages.
+        
         Args:
             image_paths: List of absolute paths to images
             output_file: Optional output file path (if None, returns bytes)
+            max_workers: Number of pages read and prepared ahead concurrently
         
         Returns:
             PDF file as bytes if output_file is None
         """
-        images = []
-        
-        # Load all images
+        existing = []
         for image_path in image_paths:
-            if not os.path.exists(image_path):
+            if os.path.exists(image_path):
+                existing.append(image_path)
+            else:
                 logger.warning(f"Image not found: {image_path}")
-                continue
-            
-            img = Image.open(image_path)
-            
-            # Convert to RGB if necessary (PDF requires RGB)
-            if img.mode != 'RGB':
-                img = img.convert('RGB')
-            
-            images.append(img)
         
-        if not images:
+        if not existing:
             raise ValueError("No valid images found for PDF export")
         
-        # Save as PDF
-        if output_file:
-            images[0].save(
-                output_file,
-                save_all=True,
-                append_images=images[1:],
-                format='PDF'
-            )
-            return None
-        else:
-            # Save to bytes
-            pdf_bytes = io.BytesIO()
-            images[0].save(
-                pdf_bytes,
-                save_all=True,
-                append_images=images[1:],
-                format='PDF'
-            )
-            pdf_bytes.seek(0)
-            return pdf_bytes.getvalue()
+        stream = open(output_file, 'wb') if output_file else io.BytesIO()
+        try:
+            writer = StreamingPdfWriter(stream)
+            # 最多提前准备 max_workers 页，写入顺序与页面顺序一致
+            with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+                pending = deque()
+                for image_path in existing:
+                    pending.append(executor.submit(prepare_image, image_path))
+                    if len(pending) >= max(1, max_workers):
+                        writer.add_page(pending.popleft().result())
+                while pending:
+                    writer.add_page(pending.popleft().result())
+            writer.close()
+            
+            if output_file:
+                return None
+            return stream.getvalue()
+        finally:
+            stream.close()
 
     """Service for exporting presentations"""
 
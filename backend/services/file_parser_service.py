@@ -3,19 +3,26 @@ File Parser Service - handles file parsing using MinerU service and image captio
 """
 import os
 import re
-import time
 import logging
 import zipfile
 import io
 import base64
+import threading
 import requests
-from typing import Optional, List
+from typing import Callable, Dict, Optional, List, Tuple
 from concurrent.futures import ThreadPoolExecutor, as_completed
 from PIL import Image
 from markitdown import MarkItDown
+from .ai_providers import get_rate_limiter, RetryPolicy
 
 logger = logging.getLogger(__name__)
 
+# on_result(data_id, batch_id, markdown_content, error_message, failed_image_count)
+ParseResultCallback = Callable[[str, Optional[str], Optional[str], Optional[str], int], None]
+
+# parse_file 在轮询超时之外再等待的时间（上传、下载结果和生成图片描述）
+PARSE_WAIT_MARGIN_SECONDS = 300
+
 
 def _get_ai_provider_format() -> str:
     """Get the configured AI provider format"""
@@ -57,6 +64,10 @@ class FileParserService:
         self._gemini_client = None
         self._openai_client = None
         self._provider_format = _get_ai_provider_format()
+        # 每次请求尝试获取全局限流名额，重试等待期间不占用
+        self._retry_policy = RetryPolicy.from_config(
+            limiter=get_rate_limiter(self._provider_format, image_caption_model, kind='text')
+        )
     
     def _get_gemini_client(self):
         """Lazily initialize Gemini client"""
@@ -75,7 +86,8 @@ class FileParserService:
             from openai import OpenAI
             self._openai_client = OpenAI(
                 api_key=self._openai_api_key,
-                base_url=self._openai_api_base
+                base_url=self._openai_api_base,
+                max_retries=0  # retries are handled by _retry_policy
             )
         return self._openai_client
     
@@ -117,48 +129,126 @@ class FileParserService:
             # For other file types, use MinerU service
             logger.info(f"File {filename} requires MinerU parsing...")
             
-            # Step 1: Get upload URL
-            logger.info(f"Step 1/4: Requesting upload URL for {filename}...")
-            batch_id, upload_url, error = self._get_upload_url(filename)
-            if error:
-                return None, None, error, 0
-            
-            logger.info(f"Got upload URL. Batch ID: {batch_id}")
-            
-            # Step 2: Upload file
-            logger.info(f"Step 2/4: Uploading file {filename}...")
-            error = self._upload_file(file_path, upload_url)
-            if error:
-                return batch_id, None, error, 0
+            # 单文件也走共享的批量提交和轮询，等待结果回调
+            done = threading.Event()
+            outcome = {}
             
-            logger.info("File uploaded successfully.")
+            def on_result(data_id, batch_id, markdown_content, error, failed_count):
+                outcome.update(batch_id=batch_id, content=markdown_content, error=error, failed=failed_count)
+                done.set()
             
-            # Step 3: Poll for parsing result
-            logger.info("Step 3/4: Waiting for parsing to complete...")
-            markdown_content, error = self._poll_result(batch_id)
-            if error:
-                return batch_id, None, error, 0
-            
-            logger.info("File parsed successfully.")
-            
-            # Step 4: Enhance markdown with image captions
-            if markdown_content and self._can_generate_captions():
-                logger.info("Step 4/4: Enhancing markdown with image captions...")
-                enhanced_content, failed_count = self._enhance_markdown_with_captions(markdown_content)
-                if failed_count > 0:
-                    logger.warning(f"Markdown enhanced with image captions, but {failed_count} images failed to generate captions.")
-                else:
-                    logger.info("Markdown enhanced with image captions (all images succeeded).")
-                return batch_id, enhanced_content, None, failed_count
-            else:
-                logger.info("Skipping image caption enhancement (no Gemini client).")
-                return batch_id, markdown_content, None, 0
+            from config import get_config
+            self.submit_batch([('file', file_path, filename)], on_result)
+            wait_seconds = get_config().MINERU_PARSE_TIMEOUT_SECONDS + PARSE_WAIT_MARGIN_SECONDS
+            if not done.wait(wait_seconds):
+                error_msg = f"Parsing timeout: no result after {int(wait_seconds)} seconds"
+                logger.error(f"{filename}: {error_msg}")
+                return outcome.get('batch_id'), None, error_msg, 0
+            return outcome['batch_id'], outcome['content'], outcome['error'], outcome['failed']
             
         except Exception as e:
             error_msg = f"Unexpected error during file parsing: {str(e)}"
             logger.error(error_msg, exc_info=True)
             return None, None, error_msg, 0
     
+    @staticmethod
+    def needs_mineru(filename: str) -> bool:
+        """Whether a file is parsed by MinerU (plain text and spreadsheets are parsed locally)"""
+        file_ext = filename.rsplit('.', 1)[-1].lower() if '.' in filename else ''
+        return file_ext not in ['txt', 'md', 'markdown', 'xlsx', 'xls', 'csv']
+    
+    def submit_batch(self, files: List[Tuple[str, str, str]], on_result: ParseResultCallback) -> Optional[str]:
+        """
+        Upload several files as one MinerU batch and poll it with the shared poller
+        
+        Returns once the files are uploaded; results arrive through on_result,
+        called once per file from a worker thread.
+        
+        Args:
+            files: (data_id, file_path, filename) of each file, data_id unique within the batch
+            on_result: on_result(data_id, batch_id, markdown_content, error_message, failed_image_count)
+            
+        Returns:
+            MinerU batch ID, or None if the batch could not be created
+        """
+        def report(data_id, batch_id, markdown_content, error, failed_count=0):
+            try:
+                on_result(data_id, batch_id, markdown_content, error, failed_count)
+            except Exception as e:
+                logger.error(f"Parse result callback failed for {data_id}: {e}", exc_info=True)
+        
+        # Step 1: Get upload URLs for every file in one request
+        logger.info(f"Step 1/4: Requesting upload URLs for {len(files)} file(s)...")
+        batch_id, upload_urls, error = self._get_upload_urls([(data_id, filename) for data_id, _, filename in files])
+        if error:
+            for data_id, _, _ in files:
+                report(data_id, None, None, error)
+            return None
+        logger.info(f"Got upload URLs. Batch ID: {batch_id}")
+        
+        # Step 2: Upload files
+        logger.info(f"Step 2/4: Uploading {len(files)} file(s)...")
+        with ThreadPoolExecutor(max_workers=min(4, len(files))) as executor:
+            upload_errors = list(executor.map(
+                lambda item: self._upload_file(item[0][1], item[1]), zip(files, upload_urls)
+            ))
+        uploaded = {}
+        for (data_id, _, filename), upload_error in zip(files, upload_errors):
+            if upload_error:
+                report(data_id, batch_id, None, upload_error)
+            else:
+                uploaded[data_id] = filename
+        
+        # Step 3: Wait for the parsing results (shared poller)
+        def handle_result(data_id, zip_url, poll_error):
+            if poll_error:
+                report(data_id, batch_id, None, poll_error)
+                return
+            try:
+                markdown_content, download_error = self._download_markdown(zip_url)
+                if download_error:
+                    report(data_id, batch_id, None, download_error)
+                    return
+                content, failed_count = self._enhance_parsed_markdown(markdown_content)
+            except Exception as e:
+                logger.error(f"Failed to process parsing result: {str(e)}", exc_info=True)
+                report(data_id, batch_id, None, f"Failed to process parsing result: {str(e)}")
+                return
+            report(data_id, batch_id, content, None, failed_count)
+        
+        from config import get_config
+        from .mineru_poller import get_mineru_poller
+        logger.info("Step 3/4: Waiting for parsing to complete...")
+        try:
+            get_mineru_poller().track(
+                batch_id,
+                self.get_result_api_template.format(batch_id),
+                self._api_headers(),
+                uploaded,
+                handle_result,
+                timeout=get_config().MINERU_PARSE_TIMEOUT_SECONDS
+            )
+        except Exception as e:
+            # 未能开始轮询的文件不会再有结果回调，在此报告失败
+            logger.error(f"Failed to start polling MinerU batch {batch_id}: {str(e)}", exc_info=True)
+            for data_id in uploaded:
+                report(data_id, batch_id, None, f"Failed to wait for parsing result: {str(e)}")
+        return batch_id
+    
+    def _enhance_parsed_markdown(self, markdown_content: str) -> Tuple[str, int]:
+        """Step 4: Enhance MinerU markdown with image captions, returns (content, failed_image_count)"""
+        if markdown_content and self._can_generate_captions():
+            logger.info("Step 4/4: Enhancing markdown with image captions...")
+            enhanced_content, failed_count = self._enhance_markdown_with_captions(markdown_content)
+            if failed_count > 0:
+                logger.warning(f"Markdown enhanced with image captions, but {failed_count} images failed to generate captions.")
+            else:
+                logger.info("Markdown enhanced with image captions (all images succeeded).")
+            return enhanced_content, failed_count
+        
+        logger.info("Skipping image caption enhancement (no Gemini client).")
+        return markdown_content, 0
+    
     def _parse_text_file(self, file_path: str, filename: str) -> tuple[Optional[str], Optional[str], Optional[str], int]:
         """
         Parse plain text file directly without MinerU
@@ -244,22 +334,31 @@ class FileParserService:
             logger.error(error_msg, exc_info=True)
             return None, None, error_msg, 0
     
-    def _get_upload_url(self, filename: str) -> tuple[Optional[str], Optional[str], Optional[str]]:
-        """Get upload URL from MinerU"""
-        headers = {
+    def _api_headers(self) -> Dict[str, str]:
+        return {
             "Content-Type": "application/json",
             "Authorization": f"Bearer {self.mineru_token}"
         }
+    
+    def _get_upload_urls(self, files: List[Tuple[str, str]]) -> tuple[Optional[str], Optional[List[str]], Optional[str]]:
+        """
+        Get upload URLs for a batch of files from MinerU
         
+        Args:
+            files: (data_id, filename) of each file
+            
+        Returns:
+            Tuple of (batch_id, upload_urls in the same order, error_message)
+        """
         upload_data = {
-            "files": [{"name": filename}],
+            "files": [{"name": filename, "data_id": data_id} for data_id, filename in files],
             "model_version": "vlm"  # or "pipeline"
         }
         
         try:
             response = requests.post(
                 self.get_upload_url_api,
-                headers=headers,
+                headers=self._api_headers(),
                 json=upload_data,
                 timeout=30
             )
@@ -272,8 +371,12 @@ class FileParserService:
                 return None, None, error_msg
             
             batch_id = result["data"]["batch_id"]
-            upload_url = result["data"]["file_urls"][0]
-            return batch_id, upload_url, None
+            upload_urls = result["data"]["file_urls"]
+            if len(upload_urls) != len(files):
+                error_msg = f"Expected {len(files)} upload URLs, got {len(upload_urls)}"
+                logger.error(error_msg)
+                return None, None, error_msg
+            return batch_id, upload_urls, None
             
         except requests.exceptions.RequestException as e:
             error_msg = f"Network error while requesting upload URL: {str(e)}"
@@ -302,52 +405,6 @@ class FileParserService:
             logger.error(error_msg)
             return error_msg
     
-    def _poll_result(self, batch_id: str, max_wait_time: int = 600) -> tuple[Optional[str], Optional[str]]:
-        """Poll for parsing result"""
-        headers = {
-            "Content-Type": "application/json",
-            "Authorization": f"Bearer {self.mineru_token}"
-        }
-        
-        result_url = self.get_result_api_template.format(batch_id)
-        start_time = time.time()
-        
-        while True:
-            if time.time() - start_time > max_wait_time:
-                error_msg = f"Parsing timeout after {max_wait_time} seconds"
-                logger.error(error_msg)
-                return None, error_msg
-            
-            try:
-                response = requests.get(result_url, headers=headers, timeout=30)
-                response.raise_for_status()
-                task_info = response.json()
-                
-                if task_info.get("code") != 0:
-                    error_msg = f"Failed to query task status: {task_info.get('msg')}"
-                    logger.error(error_msg)
-                    return None, error_msg
-                
-                task_status = task_info["data"]["extract_result"][0]["state"]
-                
-                if task_status == "done":
-                    logger.info("File parsing completed!")
-                    full_zip_url = task_info["data"]["extract_result"][0]["full_zip_url"]
-                    # Download and extract markdown
-                    return self._download_markdown(full_zip_url)
-                elif task_status == "failed":
-                    err_msg = task_info["data"]["extract_result"][0].get("err_msg", "Unknown error")
-                    error_msg = f"File parsing failed: {err_msg}"
-                    logger.error(error_msg)
-                    return None, error_msg
-                else:
-                    logger.debug(f"Current task status: {task_status}, waiting...")
-                    time.sleep(2)  # Wait 2 seconds before next poll
-                    
-            except requests.exceptions.RequestException as e:
-                logger.warning(f"Network error while polling result: {str(e)}, retrying...")
-                time.sleep(2)
-    
     def _download_markdown(self, zip_url: str) -> tuple[Optional[str], Optional[str]]:
         """Download and extract markdown from result zip, save images to local server"""
         try:
@@ -398,12 +455,18 @@ class FileParserService:
                     return None, error_msg
             
             # Replace relative image paths with local server URLs
+            short_paths = {}
             markdown_content = self._replace_image_paths(
                 markdown_content, 
                 markdown_file_path,
-                extract_id
+                extract_id,
+                short_paths
             )
             
+            # 记录短路径到实际文件的映射，之后读取图片时无需扫描目录
+            from utils.path_utils import write_mineru_manifest
+            write_mineru_manifest(mineru_storage, short_paths)
+            
             return markdown_content, None
                 
         except requests.exceptions.RequestException as e:
@@ -419,8 +482,14 @@ class FileParserService:
             logger.error(error_msg)
             return None, error_msg
     
-    def _replace_image_paths(self, markdown_content: str, markdown_file_path: str, extract_id: str) -> str:
-        """Replace relative image paths in markdown with local server URLs"""
+    def _replace_image_paths(self, markdown_content: str, markdown_file_path: str, extract_id: str,
+                             short_paths: Optional[Dict[str, str]] = None) -> str:
+        """
+        Replace relative image paths in markdown with local server URLs
+        
+        Args:
+            short_paths: If given, filled with {short path in the URL: real relative path}
+        """
         import os
         
         # Get the directory where the markdown file is located (within the extracted ZIP)
@@ -454,7 +523,10 @@ class FileParserService:
             
             # Construct the local server URL
             # The files are served at /files/mineru/{extract_id}/{rel_path}
-            new_url = f"/files/mineru/{extract_id}/{rel_path[:15]}.{rel_path.split('.')[-1]}" # "images/...(8)"
+            short_path = f"{rel_path[:15]}.{rel_path.split('.')[-1]}"  # "images/...(8)"
+            new_url = f"/files/mineru/{extract_id}/{short_path}"
+            if short_paths is not None:
+                short_paths.setdefault(short_path, rel_path)
             
             logger.debug(f"Replacing image path: {img_path} -> {new_url}")
             return f"![{alt_text}]({new_url})"
@@ -524,44 +596,38 @@ class FileParserService:
         
         return enhanced_content, failed_count
     
-    def _generate_captions_parallel(self, image_urls: List[str], max_workers: int = 12, max_retries: int = 3) -> tuple[List[str], int]:
+    def _generate_captions_parallel(self, image_urls: List[str], max_workers: Optional[int] = None) -> tuple[List[str], int]:
         """
-        Generate captions for multiple images in parallel with retry mechanism
+        Generate captions for multiple images in parallel
+        
+        Transient provider errors are retried by the shared RetryPolicy inside
+        _generate_single_caption; other errors fail the image right away.
         
         Args:
             image_urls: List of image URLs
-            max_workers: Maximum number of parallel workers
-            max_retries: Maximum number of retries for each image
+            max_workers: Maximum number of parallel workers (default: PARSE_CAPTION_WORKERS)
             
         Returns:
             Tuple of (list of captions, number of failed images)
         """
+        if max_workers is None:
+            from config import get_config
+            max_workers = get_config().PARSE_CAPTION_WORKERS
         captions = [""] * len(image_urls)
         failed_count = 0
         
-        def generate_with_retry(url: str, idx: int) -> tuple[int, str, bool]:
-            """Generate caption with retry logic"""
-            for attempt in range(max_retries):
-                try:
-                    caption = self._generate_single_caption(url)
-                    if caption:
-                        logger.debug(f"Generated caption for image {idx + 1}/{len(image_urls)} (attempt {attempt + 1})")
-                        return (idx, caption, True)
-                    else:
-                        logger.warning(f"Empty caption for image {idx + 1} (attempt {attempt + 1}/{max_retries})")
-                except Exception as e:
-                    logger.warning(f"Failed to generate caption for image {idx + 1} (attempt {attempt + 1}/{max_retries}): {str(e)}")
-                    if attempt < max_retries - 1:
-                        import time
-                        time.sleep(1 * (attempt + 1))  # Exponential backoff: 1s, 2s, 3s
-            
-            # All retries failed
-            logger.error(f"Failed to generate caption for image {idx + 1} after {max_retries} attempts")
+        def generate_caption(url: str, idx: int) -> tuple[int, str, bool]:
+            """Generate the caption of one image"""
+            caption = self._generate_single_caption(url)
+            if caption:
+                logger.debug(f"Generated caption for image {idx + 1}/{len(image_urls)}")
+                return (idx, caption, True)
+            logger.error(f"Failed to generate caption for image {idx + 1}")
             return (idx, "", False)
         
         with ThreadPoolExecutor(max_workers=max_workers) as executor:
             future_to_idx = {
-                executor.submit(generate_with_retry, url, idx): idx
+                executor.submit(generate_caption, url, idx): idx
                 for idx, url in enumerate(image_urls)
             }
             
@@ -591,10 +657,9 @@ class FileParserService:
         try:
             # Load image based on URL type
             if image_url.startswith('http://') or image_url.startswith('https://'):
-                # Download from HTTP(S) URL
-                response = requests.get(image_url, timeout=30)
-                response.raise_for_status()
-                image = Image.open(io.BytesIO(response.content))
+                # Download from HTTP(S) URL (shared cache, see remote_image_cache)
+                from services.remote_image_cache import get_remote_image_cache
+                image = get_remote_image_cache().open_image(image_url)
             elif image_url.startswith('/files/mineru/'):
                 # Local MinerU extracted file with prefix matching support
                 from utils.path_utils import find_mineru_file_with_prefix
@@ -615,54 +680,70 @@ class FileParserService:
             # Generate caption based on provider format
             prompt = "请用一句简短的中文描述这张图片的主要内容。只返回描述文字，不要其他解释。"
             
-            if self._provider_format == 'openai':
-                # Use OpenAI SDK format
-                client = self._get_openai_client()
-                if not client:
-                    logger.warning("OpenAI client not initialized, skipping caption generation")
-                    return ""
-                
-                # Encode image to base64
-                buffered = io.BytesIO()
-                if image.mode in ('RGBA', 'LA', 'P'):
-                    image = image.convert('RGB')
-                image.save(buffered, format="JPEG", quality=95)
-                base64_image = base64.b64encode(buffered.getvalue()).decode('utf-8')
-                
-                response = client.chat.completions.create(
-                    model=self.image_caption_model,
-                    messages=[
-                        {
-                            "role": "user",
-                            "content": [
-                                {"type": "image_url", "image_url": {"url": f"data:image/jpeg;base64,{base64_image}"}},
-                                {"type": "text", "text": prompt}
-                            ]
-                        }
-                    ],
-                    temperature=0.3
-                )
-                caption = response.choices[0].message.content.strip()
-            else:
-                # Use Gemini SDK format (default)
-                from google.genai import types
-                client = self._get_gemini_client()
-                if not client:
-                    logger.warning("Gemini client not initialized, skipping caption generation")
-                    return ""
-                
-                result = client.models.generate_content(
-                    model=self.image_caption_model,
-                    contents=[image, prompt],
-                    config=types.GenerateContentConfig(
-                        temperature=0.3,  # Lower temperature for more consistent captions
-                    )
-                )
-                caption = result.text.strip()
-            
-            return caption
+            return self._retry_policy.call(
+                self._request_caption, image, prompt,
+                description=f"Image caption ({self.image_caption_model})"
+            )
             
         except Exception as e:
             logger.warning(f"Failed to generate caption for {image_url}: {str(e)}")
             return ""  # Return empty string on failure
+    
+    def _request_caption(self, image: Image.Image, prompt: str) -> str:
+        """
+        Call the configured provider to caption an image
+        
+        Args:
+            image: Image to describe
+            prompt: Caption prompt
+            
+        Returns:
+            Generated caption, empty string if no client is available
+        """
+        if self._provider_format == 'openai':
+            # Use OpenAI SDK format
+            client = self._get_openai_client()
+            if not client:
+                logger.warning("OpenAI client not initialized, skipping caption generation")
+                return ""
+            
+            # Encode image to base64
+            buffered = io.BytesIO()
+            if image.mode in ('RGBA', 'LA', 'P'):
+                image = image.convert('RGB')
+            image.save(buffered, format="JPEG", quality=95)
+            base64_image = base64.b64encode(buffered.getvalue()).decode('utf-8')
+            
+            response = client.chat.completions.create(
+                model=self.image_caption_model,
+                messages=[
+                    {
+                        "role": "user",
+                        "content": [
+                            {"type": "image_url", "image_url": {"url": f"data:image/jpeg;base64,{base64_image}"}},
+                            {"type": "text", "text": prompt}
+                        ]
+                    }
+                ],
+                temperature=0.3
+            )
+            caption = response.choices[0].message.content.strip()
+        else:
+            # Use Gemini SDK format (default)
+            from google.genai import types
+            client = self._get_gemini_client()
+            if not client:
+                logger.warning("Gemini client not initialized, skipping caption generation")
+                return ""
+            
+            result = client.models.generate_content(
+                model=self.image_caption_model,
+                contents=[image, prompt],
+                config=types.GenerateContentConfig(
+                    temperature=0.3,  # Lower temperature for more consistent captions
+                )
+            )
+            caption = result.text.strip()
+        
+        return caption
 
@@ -2,11 +2,30 @@
 File Service - handles all file operations
 """
 import os
+import threading
 import uuid
+from concurrent.futures import Future, ThreadPoolExecutor
 from pathlib import Path
 from typing import Optional
 from werkzeug.utils import secure_filename
 from PIL import Image
+from .ai_providers.image.base import get_encoded_bytes
+from .image_derivatives import create_derivatives_async, delete_derivatives
+
+# 重新编码时各格式的文件扩展名
+_FORMAT_EXTENSIONS = {'PNG': 'png', 'JPEG': 'jpg', 'WEBP': 'webp'}
+
+# 重新编码生成图片的后台线程池（见 FileService.submit_generated_image）
+_encode_executor: Optional[ThreadPoolExecutor] = None
+_encode_executor_lock = threading.Lock()
+
+
+def _get_encode_executor() -> ThreadPoolExecutor:
+    global _encode_executor
+    with _encode_executor_lock:
+        if _encode_executor is None:
+            _encode_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='image-encode')
+        return _encode_executor
 
 
 class FileService:
@@ -47,6 +66,46 @@ class FileService:
         materials_dir.mkdir(exist_ok=True, parents=True)
         return materials_dir
     
+    def _write_image(self, image: Image.Image, directory: Path, stem: str,
+                     image_format: str = 'PNG') -> Path:
+        """
+        Write an image file named {stem}.{ext}
+        
+        With IMAGE_SAVE_FORMAT=original (default), bytes returned by the image
+        provider are written as they are, in their own format (no decode/encode).
+        Otherwise, or for images without provider bytes, the image is encoded as
+        IMAGE_SAVE_FORMAT (or image_format) with the configured quality settings.
+        
+        Returns:
+            Path of the written file
+        """
+        from config import get_config
+        config = get_config()
+        
+        encoded = get_encoded_bytes(image)
+        if config.IMAGE_SAVE_FORMAT == 'original' and encoded:
+            data, ext = encoded
+            filepath = directory / f"{stem}.{ext}"
+            filepath.write_bytes(data)
+            return filepath
+        
+        target = image_format if config.IMAGE_SAVE_FORMAT == 'original' else config.IMAGE_SAVE_FORMAT
+        target = 'JPEG' if target.upper() == 'JPG' else target.upper()
+        ext = _FORMAT_EXTENSIONS.get(target, target.lower())
+        filepath = directory / f"{stem}.{ext}"
+        
+        if target == 'PNG':
+            image.save(str(filepath), format='PNG', compress_level=config.IMAGE_PNG_COMPRESS_LEVEL)
+        elif target == 'JPEG':
+            # JPEG 不支持透明通道
+            image = image if image.mode in ('RGB', 'L') else image.convert('RGB')
+            image.save(str(filepath), format='JPEG', quality=config.IMAGE_SAVE_QUALITY)
+        elif target == 'WEBP':
+            image.save(str(filepath), format='WEBP', quality=config.IMAGE_SAVE_QUALITY)
+        else:
+            image.save(str(filepath))
+        return filepath
+    
     def save_template_image(self, file, project_id: str) -> str:
         """
         Save template image file
@@ -81,7 +140,7 @@ class FileService:
             image: PIL Image object
             project_id: Project ID
             page_id: Page ID
-            image_format: Image format (PNG, JPEG, etc.)
+            image_format: Format used when the image has to be encoded (PNG, JPEG, etc.)
             version_number: Optional version number. If None, uses timestamp-based naming
         
         Returns:
@@ -89,27 +148,51 @@ class FileService:
         """
         pages_dir = self._get_pages_dir(project_id)
         
-        # Use lowercase extension
-        ext = image_format.lower()
-        
         # Generate filename with version number or timestamp
         if version_number is not None:
-            filename = f"{page_id}_v{version_number}.{ext}"
+            stem = f"{page_id}_v{version_number}"
         else:
             # Use timestamp for unique filename
             import time
             timestamp = int(time.time() * 1000)  # milliseconds
-            filename = f"{page_id}_{timestamp}.{ext}"
+            stem = f"{page_id}_{timestamp}"
         
-        filepath = pages_dir / filename
+        # Save image (extension follows the stored format, see _write_image)
+        filepath = self._write_image(image, pages_dir, stem, image_format)
         
-        # Save image - format is determined by file extension or explicitly specified
-        # Some PIL Image objects may not support format parameter, so we use extension
-        image.save(str(filepath))
+        # 在后台生成缩略图，供幻灯片卡片和历史列表使用
+        from config import get_config
+        if get_config().IMAGE_DERIVATIVES_ON_SAVE:
+            create_derivatives_async(filepath)
         
         # Return relative path
         return filepath.relative_to(self.upload_folder).as_posix()
 
+    def submit_generated_image(self, image: Image.Image, project_id: str, page_id: str,
+                               image_format: str = 'PNG', version_number: int = None) -> 'Future[str]':
+        """
+        Save a generated image, re-encoding it on a background thread if needed
+        
+        Provider bytes kept as they are (IMAGE_SAVE_FORMAT=original) are written
+        immediately. Images that have to be encoded are handed to a small encoder
+        pool, so the generation worker can start its next provider call instead of
+        spending seconds compressing a 4K image.
+        
+        Returns:
+            Future resolving to the relative file path (see save_generated_image)
+        """
+        from config import get_config
+        if get_config().IMAGE_SAVE_FORMAT == 'original' and get_encoded_bytes(image):
+            future: Future = Future()
+            try:
+                future.set_result(self.save_generated_image(image, project_id, page_id,
+                                                            image_format, version_number))
+            except Exception as e:
+                future.set_exception(e)
+            return future
+        return _get_encode_executor().submit(self.save_generated_image, image, project_id, page_id,
+                                             image_format, version_number)
+
     def save_material_image(self, image: Image.Image, project_id: Optional[str],
                             image_format: str = 'PNG') -> str:
         """
@@ -118,7 +201,7 @@ class FileService:
         Args:
             image: PIL Image object
             project_id: Project ID (None for global materials)
-            image_format: Image format (PNG, JPEG, etc.)
+            image_format: Format used when the image has to be encoded (PNG, JPEG, etc.)
 
         Returns:
             Relative file path from upload folder
@@ -130,18 +213,12 @@ class FileService:
         else:
             materials_dir = self._get_materials_dir(project_id)
 
-        # Use lowercase extension
-        ext = image_format.lower()
-
         # Generate unique filename
         import time
         timestamp = int(time.time() * 1000)  # milliseconds
-        filename = f"material_{timestamp}.{ext}"
-
-        filepath = materials_dir / filename
 
-        # Save image
-        image.save(str(filepath))
+        # Save image (extension follows the stored format, see _write_image)
+        filepath = self._write_image(image, materials_dir, f"material_{timestamp}", image_format)
 
         # Return relative path
         return filepath.relative_to(self.upload_folder).as_posix()
@@ -157,6 +234,7 @@ class FileService:
             True if deleted successfully
         """
         filepath = self.upload_folder / image_path.replace('\\', '/')
+        delete_derivatives(filepath)
         if filepath.exists() and filepath.is_file():
             filepath.unlink()
             return True
@@ -226,6 +304,7 @@ class FileService:
         # Find and delete page image (any extension)
         for file in pages_dir.glob(f"{page_id}.*"):
             if file.is_file():
+                delete_derivatives(file)
                 file.unlink()
         
         return True
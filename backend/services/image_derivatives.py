@@ -0,0 +1,173 @@
+"""
+Downscaled WebP derivatives of stored images
+
+Generated slides are 2K/4K PNGs, but slide cards, history covers and preview
+lists only need a small picture. Derivatives are written next to the original
+in a "derivatives" subdirectory:
+
+    {project_id}/pages/{page_id}_v3.png
+    {project_id}/pages/derivatives/{page_id}_v3.thumb.webp
+    {project_id}/pages/derivatives/{page_id}_v3.medium.webp
+
+They are created in the background when a page image is saved, or lazily the
+first time /files/...?size=thumb|medium asks for one. A derivative older than its original
+(e.g. an overwritten template.png) is regenerated. Concurrent requests for the same
+derivative wait for a single generation.
+
+Configuration (see config.py):
+    IMAGE_DERIVATIVES_ON_SAVE: "false" only creates derivatives on first request
+    IMAGE_DERIVATIVE_QUALITY: WebP quality (1-100)
+"""
+import logging
+import os
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from PIL import Image
+
+logger = logging.getLogger(__name__)
+
+DERIVATIVES_DIR = 'derivatives'
+
+# size 名称 -> 最长边像素
+DERIVATIVE_SIZES = {
+    'thumb': 480,
+    'medium': 1280,
+}
+
+IMAGE_EXTENSIONS = {'.png', '.jpg', '.jpeg', '.webp', '.gif', '.bmp'}
+
+
+def _quality() -> int:
+    from config import get_config
+    return get_config().IMAGE_DERIVATIVE_QUALITY
+
+
+def derivative_path(source: Path, size: str) -> Path:
+    """Location of a derivative of the source image"""
+    return source.parent / DERIVATIVES_DIR / f"{source.stem}.{size}.webp"
+
+
+def is_image(path: Path) -> bool:
+    """Whether a derivative can be generated for the file"""
+    return path.suffix.lower() in IMAGE_EXTENSIONS
+
+
+_flights_lock = threading.Lock()
+# derivative path -> [per-path lock, number of threads using it]
+_flights: Dict[Path, List] = {}
+
+
+@contextmanager
+def _single_flight(target: Path):
+    """Hold the lock of one derivative path so it is generated by a single thread at a time"""
+    with _flights_lock:
+        flight = _flights.setdefault(target, [threading.Lock(), 0])
+        flight[1] += 1
+    try:
+        with flight[0]:
+            yield
+    finally:
+        with _flights_lock:
+            flight[1] -= 1
+            if flight[1] == 0:
+                _flights.pop(target, None)
+
+
+def _is_fresh(target: Path, source: Path) -> bool:
+    """Whether the derivative exists and is not older than its original"""
+    return target.exists() and target.stat().st_mtime >= source.stat().st_mtime
+
+
+def _write_derivative(image: Image.Image, target: Path, max_side: int, quality: int):
+    """Resize a copy of the image and write it atomically as WebP"""
+    derivative = image.copy()
+    if derivative.mode not in ('RGB', 'RGBA'):
+        derivative = derivative.convert('RGBA' if 'A' in derivative.getbands() else 'RGB')
+    derivative.thumbnail((max_side, max_side), Image.LANCZOS)
+
+    target.parent.mkdir(exist_ok=True, parents=True)
+    # 先写临时文件再替换，并发请求不会读到写了一半的文件
+    tmp = target.with_name(f".{target.name}.{uuid.uuid4().hex}.tmp")
+    try:
+        derivative.save(tmp, format='WEBP', quality=quality, method=4)
+        os.replace(tmp, target)
+    finally:
+        if tmp.exists():
+            tmp.unlink()
+
+
+def create_derivatives(source: Path, image: Optional[Image.Image] = None):
+    """
+    Write every derivative size of an image (errors are logged, never raised)
+
+    Args:
+        source: Path of the stored original
+        image: The already loaded original, to avoid decoding it again
+    """
+    try:
+        quality = _quality()
+        if image is None:
+            with Image.open(source) as opened:
+                opened.load()
+                image = opened.copy()
+        for size, max_side in DERIVATIVE_SIZES.items():
+            target = derivative_path(source, size)
+            with _single_flight(target):
+                _write_derivative(image, target, max_side, quality)
+    except Exception as e:
+        logger.warning(f"Failed to create image derivatives for {source}: {e}")
+
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def create_derivatives_async(source: Path):
+    """Queue create_derivatives on a background thread so saving an image returns immediately"""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='image-derivatives')
+    _executor.submit(create_derivatives, source)
+
+
+def get_derivative(source: Path, size: str) -> Optional[Path]:
+    """
+    Return the derivative of an image, generating it if missing or outdated
+
+    Args:
+        source: Path of the original image
+        size: One of DERIVATIVE_SIZES
+
+    Returns:
+        Path of the derivative, or None when it cannot be generated
+        (the caller should then serve the original)
+    """
+    target = derivative_path(source, size)
+    try:
+        if _is_fresh(target, source):
+            return target
+        # 同一缩略图的并发首次请求只解码一次原图，其余请求等待后直接使用结果
+        with _single_flight(target):
+            if _is_fresh(target, source):
+                return target
+            with Image.open(source) as image:
+                image.load()
+                _write_derivative(image, target, DERIVATIVE_SIZES[size], _quality())
+        return target
+    except Exception as e:
+        logger.warning(f"Failed to create {size} derivative for {source}: {e}")
+        return None
+
+
+def delete_derivatives(source: Path):
+    """Remove every derivative of an image"""
+    for size in DERIVATIVE_SIZES:
+        target = derivative_path(source, size)
+        if target.exists():
+            target.unlink()
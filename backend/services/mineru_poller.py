@@ -0,0 +1,196 @@
+"""
+Shared poller for outstanding MinerU batches
+
+Instead of one thread per file sleeping in a polling loop, every submitted
+batch is registered here and a single daemon thread queries the batch result
+API when each batch is due:
+    - the polling interval of a batch starts at MINERU_POLL_INITIAL_SECONDS and
+      grows by MINERU_POLL_BACKOFF after every poll, up to MINERU_POLL_MAX_SECONDS
+    - as soon as a file of the batch is done or failed, its callback is run on a
+      small worker pool (download, image captions, database update), so slow
+      result handling never delays the polling of other batches
+    - files still unfinished after MINERU_PARSE_TIMEOUT_SECONDS fail with a timeout
+"""
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Optional
+
+import requests
+
+logger = logging.getLogger(__name__)
+
+# on_result(key, full_zip_url, error_message)
+ResultCallback = Callable[[str, Optional[str], Optional[str]], None]
+
+
+class _TrackedBatch:
+    """A MinerU batch and the files of it still waiting for a result"""
+
+    def __init__(self, batch_id: str, result_url: str, headers: Dict[str, str],
+                 files: Dict[str, str], on_result: ResultCallback,
+                 timeout: float, interval: float):
+        self.batch_id = batch_id
+        self.result_url = result_url
+        self.headers = headers
+        # data_id -> filename
+        self.pending = dict(files)
+        self.on_result = on_result
+        self.timeout = timeout
+        self.deadline = time.monotonic() + timeout
+        self.interval = interval
+        self.next_poll = time.monotonic() + interval
+
+
+class MinerUPoller:
+    """Single background thread polling every outstanding MinerU batch"""
+
+    def __init__(self, initial_interval: float = 2, max_interval: float = 15,
+                 backoff: float = 1.5, result_workers: int = 2):
+        """
+        Args:
+            initial_interval: Seconds before the first poll of a batch
+            max_interval: Upper bound of the polling interval
+            backoff: Factor applied to the interval after every poll
+            result_workers: Threads running result callbacks
+        """
+        self.initial_interval = initial_interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+        self._batches: Dict[str, _TrackedBatch] = {}
+        self._condition = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+        self._executor = ThreadPoolExecutor(max_workers=result_workers, thread_name_prefix='mineru-result')
+
+    def track(self, batch_id: str, result_url: str, headers: Dict[str, str],
+              files: Dict[str, str], on_result: ResultCallback, timeout: float = 600):
+        """
+        Start polling a batch
+
+        Args:
+            batch_id: MinerU batch ID
+            result_url: Batch result API URL
+            headers: Request headers (authorization)
+            files: data_id -> filename of the files to wait for
+            on_result: Called once per file with (data_id, full_zip_url, None) or (data_id, None, error)
+            timeout: Seconds after which unfinished files fail
+        """
+        if not files:
+            return
+        batch = _TrackedBatch(batch_id, result_url, headers, files, on_result, timeout, self.initial_interval)
+        with self._condition:
+            self._batches[batch_id] = batch
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='mineru-poller', daemon=True)
+                self._thread.start()
+            self._condition.notify()
+        logger.info(f"Polling MinerU batch {batch_id} for {len(files)} file(s)")
+
+    def outstanding(self) -> int:
+        """Number of files still waiting for a result"""
+        with self._condition:
+            return sum(len(batch.pending) for batch in self._batches.values())
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self._batches:
+                    self._condition.wait()
+                now = time.monotonic()
+                next_due = min(batch.next_poll for batch in self._batches.values())
+                if next_due > now:
+                    self._condition.wait(next_due - now)
+                    continue
+                due = [batch for batch in self._batches.values() if batch.next_poll <= now]
+
+            for batch in due:
+                try:
+                    finished = self._poll(batch)
+                except Exception as e:
+                    logger.error(f"Unexpected error while polling MinerU batch {batch.batch_id}: {e}", exc_info=True)
+                    finished = False
+                with self._condition:
+                    if finished or not batch.pending:
+                        self._batches.pop(batch.batch_id, None)
+                    else:
+                        batch.interval = min(batch.interval * self.backoff, self.max_interval)
+                        batch.next_poll = time.monotonic() + batch.interval
+
+    def _dispatch(self, batch: _TrackedBatch, data_id: str, zip_url: Optional[str], error: Optional[str]):
+        batch.pending.pop(data_id, None)
+
+        def run():
+            try:
+                batch.on_result(data_id, zip_url, error)
+            except Exception as e:
+                logger.error(f"MinerU result callback failed for {data_id}: {e}", exc_info=True)
+
+        self._executor.submit(run)
+
+    def _fail_pending(self, batch: _TrackedBatch, error: str):
+        for data_id in list(batch.pending):
+            self._dispatch(batch, data_id, None, error)
+
+    def _poll(self, batch: _TrackedBatch) -> bool:
+        """Query one batch and dispatch finished files; returns True when the batch is finished"""
+        if time.monotonic() > batch.deadline:
+            error_msg = f"Parsing timeout after {int(batch.timeout)} seconds"
+            logger.error(f"MinerU batch {batch.batch_id}: {error_msg}")
+            self._fail_pending(batch, error_msg)
+            return True
+
+        try:
+            response = requests.get(batch.result_url, headers=batch.headers, timeout=30)
+            response.raise_for_status()
+            task_info = response.json()
+        except (requests.exceptions.RequestException, ValueError) as e:
+            logger.warning(f"Network error while polling MinerU batch {batch.batch_id}: {str(e)}, retrying...")
+            return False
+
+        if task_info.get("code") != 0:
+            error_msg = f"Failed to query task status: {task_info.get('msg')}"
+            logger.error(error_msg)
+            self._fail_pending(batch, error_msg)
+            return True
+
+        by_name = {filename: data_id for data_id, filename in batch.pending.items()}
+        for entry in task_info.get("data", {}).get("extract_result", []):
+            data_id = entry.get("data_id")
+            if data_id not in batch.pending:
+                data_id = by_name.get(entry.get("file_name"))
+            if data_id not in batch.pending:
+                continue
+
+            state = entry.get("state")
+            if state == "done":
+                logger.info(f"MinerU parsing completed: {batch.pending[data_id]}")
+                self._dispatch(batch, data_id, entry.get("full_zip_url"), None)
+            elif state == "failed":
+                error_msg = f"File parsing failed: {entry.get('err_msg') or 'Unknown error'}"
+                logger.error(f"{batch.pending[data_id]}: {error_msg}")
+                self._dispatch(batch, data_id, None, error_msg)
+            else:
+                logger.debug(f"MinerU batch {batch.batch_id}: {batch.pending[data_id]} is {state}")
+
+        return not batch.pending
+
+
+_poller: Optional[MinerUPoller] = None
+_poller_lock = threading.Lock()
+
+
+def get_mineru_poller() -> MinerUPoller:
+    """Return the process-wide MinerU poller"""
+    global _poller
+    with _poller_lock:
+        if _poller is None:
+            from config import get_config
+            config = get_config()
+            _poller = MinerUPoller(
+                initial_interval=config.MINERU_POLL_INITIAL_SECONDS,
+                max_interval=config.MINERU_POLL_MAX_SECONDS,
+                backoff=config.MINERU_POLL_BACKOFF,
+                result_workers=config.MINERU_RESULT_WORKERS
+            )
+        return _poller
@@ -0,0 +1,178 @@
+"""
+Outline reconciler - applies a refined outline to existing pages in place
+
+Instead of deleting every page and recreating it, each entry of the refined
+outline is matched to an existing page, in this order:
+    1. Stable identity: the "id" key ("p1", "p2", ...) that the current outline
+       carries into the refinement prompt and the model copies back
+    2. Identical title and points
+    3. Identical title
+    4. Fuzzy title + points similarity above a threshold (best pairs first)
+
+Matched pages keep their row, generated image and image version history:
+    - unchanged: only order_index is updated
+    - same title, new points/part: outline updated, description kept (as before)
+    - new title: outline updated, description cleared, status reset to DRAFT
+Unmatched entries become new pages; unmatched old pages are deleted.
+"""
+import logging
+from difflib import SequenceMatcher
+from typing import Dict, List, Optional, Tuple
+
+from models import db, Page
+
+logger = logging.getLogger(__name__)
+
+# 模糊匹配的相似度阈值，以及标题、要点各自的权重
+MATCH_THRESHOLD = 0.6
+TITLE_WEIGHT = 0.6
+POINTS_WEIGHT = 0.4
+
+
+def outline_key(position: int) -> str:
+    """Identity key of the page at the given position in the current outline"""
+    return f"p{position + 1}"
+
+
+def _normalize(text) -> str:
+    return ' '.join(str(text or '').split()).lower()
+
+
+def _points_text(outline: Dict) -> str:
+    points = outline.get('points') or []
+    if isinstance(points, str):
+        points = [points]
+    return '\n'.join(_normalize(p) for p in points)
+
+
+def similarity(old: Dict, new: Dict) -> float:
+    """
+    Weighted title + points similarity of two outline entries
+
+    Returns:
+        Score between 0 and 1
+    """
+    title_ratio = SequenceMatcher(None, _normalize(old.get('title')), _normalize(new.get('title'))).ratio()
+    old_points, new_points = _points_text(old), _points_text(new)
+    if not old_points and not new_points:
+        points_ratio = 1.0
+    else:
+        points_ratio = SequenceMatcher(None, old_points, new_points).ratio()
+    return TITLE_WEIGHT * title_ratio + POINTS_WEIGHT * points_ratio
+
+
+def match_outlines(old_outlines: List[Dict], new_outlines: List[Dict],
+                   threshold: float = MATCH_THRESHOLD) -> List[Optional[int]]:
+    """
+    Match refined outline entries to current ones
+
+    Args:
+        old_outlines: Current outline entries (title, points), in page order
+        new_outlines: Refined outline entries (title, points, optional id)
+        threshold: Minimum similarity for a fuzzy match
+
+    Returns:
+        For each new entry, the index of the matched old entry or None
+    """
+    matches: List[Optional[int]] = [None] * len(new_outlines)
+    used = set()
+
+    def assign(new_index: int, old_index: int):
+        matches[new_index] = old_index
+        used.add(old_index)
+
+    # 1. 模型原样带回的 id
+    keys = {outline_key(i): i for i in range(len(old_outlines))}
+    for new_index, new in enumerate(new_outlines):
+        old_index = keys.get(str(new.get('id') or '').strip())
+        if old_index is not None and old_index not in used:
+            assign(new_index, old_index)
+
+    # 2. 标题和要点完全相同；3. 标题相同
+    for key_of in (lambda o: (_normalize(o.get('title')), _points_text(o)),
+                   lambda o: _normalize(o.get('title'))):
+        old_by_key: Dict = {}
+        for old_index, old in enumerate(old_outlines):
+            if old_index not in used:
+                old_by_key.setdefault(key_of(old), []).append(old_index)
+        for new_index, new in enumerate(new_outlines):
+            if matches[new_index] is None:
+                candidates = old_by_key.get(key_of(new))
+                if candidates:
+                    assign(new_index, candidates.pop(0))
+
+    # 4. 剩余条目按相似度从高到低贪心配对
+    pairs = []
+    for new_index, new in enumerate(new_outlines):
+        if matches[new_index] is not None:
+            continue
+        for old_index, old in enumerate(old_outlines):
+            if old_index not in used:
+                score = similarity(old, new)
+                if score >= threshold:
+                    pairs.append((score, new_index, old_index))
+    for score, new_index, old_index in sorted(pairs, key=lambda p: -p[0]):
+        if matches[new_index] is None and old_index not in used:
+            assign(new_index, old_index)
+
+    return matches
+
+
+def reconcile_pages(project_id: str, old_pages: List[Page],
+                    pages_data: List[Dict]) -> Tuple[List[Page], Dict[str, int]]:
+    """
+    Apply a flattened refined outline to a project's pages (the caller commits)
+
+    Args:
+        project_id: Project ID
+        old_pages: Current pages ordered by order_index (their positions define the "id" keys)
+        pages_data: Flattened refined outline (title, points, optional part and id)
+
+    Returns:
+        (pages in the new order, counts of unchanged/updated/added/removed pages)
+    """
+    old_outlines = [page.get_outline_content() or {} for page in old_pages]
+    matches = match_outlines(old_outlines, pages_data)
+    stats = {'unchanged': 0, 'updated': 0, 'added': 0, 'removed': 0}
+
+    pages_list = []
+    for i, (page_data, old_index) in enumerate(zip(pages_data, matches)):
+        outline = {
+            'title': page_data.get('title'),
+            'points': page_data.get('points', [])
+        }
+        part = page_data.get('part')
+
+        if old_index is None:
+            page = Page(project_id=project_id, order_index=i, part=part, status='DRAFT')
+            page.set_outline_content(outline)
+            db.session.add(page)
+            stats['added'] += 1
+            pages_list.append(page)
+            continue
+
+        page = old_pages[old_index]
+        old_outline = old_outlines[old_index]
+        if page.order_index != i:
+            page.order_index = i
+
+        if old_outline == outline and page.part == part:
+            stats['unchanged'] += 1
+        else:
+            if _normalize(old_outline.get('title')) != _normalize(outline['title']):
+                # 标题变了，原描述已不适用；图片和历史版本保留，便于对比和回退
+                page.description_content = None
+                page.status = 'DRAFT'
+            page.set_outline_content(outline)
+            page.part = part
+            stats['updated'] += 1
+        pages_list.append(page)
+
+    matched = set(m for m in matches if m is not None)
+    for old_index, old_page in enumerate(old_pages):
+        if old_index not in matched:
+            # 通过 ORM 删除以级联删除图片版本
+            db.session.delete(old_page)
+            stats['removed'] += 1
+
+    return pages_list, stats
@@ -0,0 +1,152 @@
+"""
+Bounded worker pool for reference file parsing
+
+Parse requests used to start one thread each, so a bulk upload could run
+dozens of parses (each with its own caption thread pool) at the same time.
+Jobs are now queued and run by at most PARSE_WORKERS threads, with at most
+PARSE_PROJECT_CONCURRENCY jobs of the same project running at once, so one
+large upload does not hold up every other project. Jobs of a project run in
+submission order; a job whose project is at its cap is skipped until a slot
+frees up.
+
+A job covers one or more reference files (a MinerU batch covers several);
+queue_position()/queue_positions() report where a file's job is in the queue.
+
+A deferred job hands its result handling to other threads (MinerU results
+arrive on the poller's pool). It receives a release callable as its last
+argument and keeps its worker and project slot until it calls it, so the
+limits cover the whole parse, not just the upload.
+"""
+import logging
+import threading
+from collections import deque
+from typing import Callable, Deque, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class _ParseJob:
+    def __init__(self, file_ids: List[str], project_key: str, fn: Callable, args: tuple,
+                 deferred: bool = False):
+        self.file_ids = file_ids
+        self.project_key = project_key
+        self.fn = fn
+        self.args = args
+        self.deferred = deferred
+        self.released = False
+
+
+class ParseQueue:
+    """FIFO parse queue with a global worker limit and a per-project concurrency cap"""
+
+    def __init__(self, max_workers: int = 2, per_project_limit: int = 1):
+        """
+        Args:
+            max_workers: Number of parse jobs running at once
+            per_project_limit: Number of jobs of one project running at once
+        """
+        self.max_workers = max(1, max_workers)
+        self.per_project_limit = max(1, per_project_limit)
+        self._queue: Deque[_ParseJob] = deque()
+        self._running: Dict[str, int] = {}  # project_key -> jobs holding a slot
+        self._active = 0  # jobs holding a slot across all projects
+        self._condition = threading.Condition()
+        self._workers: List[threading.Thread] = []
+
+    def submit(self, file_ids: List[str], project_key: str, fn: Callable, *args, deferred: bool = False):
+        """
+        Queue a parse job
+
+        Args:
+            file_ids: Reference files the job parses (for queue_position)
+            project_key: Project ID, or 'global' for files without a project
+            fn: Function run by a worker thread as fn(*args), or fn(*args, release) if deferred
+            deferred: The job's slot is held until it calls release() (or fn raises)
+        """
+        with self._condition:
+            self._queue.append(_ParseJob(list(file_ids), project_key, fn, args, deferred))
+            if len(self._workers) < self.max_workers:
+                worker = threading.Thread(target=self._work, name=f'parse-worker-{len(self._workers)}', daemon=True)
+                self._workers.append(worker)
+                worker.start()
+            self._condition.notify_all()
+
+    def queue_position(self, file_id: str) -> Optional[int]:
+        """1-based position of the file's job among queued jobs, None if it is not waiting"""
+        with self._condition:
+            for position, job in enumerate(self._queue, 1):
+                if file_id in job.file_ids:
+                    return position
+        return None
+
+    def queue_positions(self) -> Dict[str, int]:
+        """1-based queue positions of all waiting files, taken in a single pass"""
+        positions: Dict[str, int] = {}
+        with self._condition:
+            for position, job in enumerate(self._queue, 1):
+                for file_id in job.file_ids:
+                    positions.setdefault(file_id, position)
+        return positions
+
+    def _next_job(self) -> Optional[_ParseJob]:
+        """Take the oldest job whose project is below its cap (caller holds the lock)"""
+        if self._active >= self.max_workers:
+            return None
+        for job in self._queue:
+            if self._running.get(job.project_key, 0) < self.per_project_limit:
+                self._queue.remove(job)
+                self._running[job.project_key] = self._running.get(job.project_key, 0) + 1
+                self._active += 1
+                return job
+        return None
+
+    def _release(self, job: _ParseJob):
+        """Free the job's slot (idempotent, callable from any thread)"""
+        with self._condition:
+            if job.released:
+                return
+            job.released = True
+            self._active -= 1
+            self._running[job.project_key] -= 1
+            if not self._running[job.project_key]:
+                del self._running[job.project_key]
+            # 名额释放后，被跳过的同项目任务可以运行了
+            self._condition.notify_all()
+
+    def _work(self):
+        while True:
+            with self._condition:
+                job = self._next_job()
+                while job is None:
+                    self._condition.wait()
+                    job = self._next_job()
+
+            try:
+                if job.deferred:
+                    job.fn(*job.args, lambda job=job: self._release(job))
+                else:
+                    job.fn(*job.args)
+            except Exception as e:
+                logger.error(f"Parse job for {job.file_ids} failed: {e}", exc_info=True)
+                self._release(job)
+            else:
+                if not job.deferred:
+                    self._release(job)
+
+
+_queue: Optional[ParseQueue] = None
+_queue_lock = threading.Lock()
+
+
+def get_parse_queue() -> ParseQueue:
+    """Return the process-wide parse queue"""
+    global _queue
+    with _queue_lock:
+        if _queue is None:
+            from config import get_config
+            config = get_config()
+            _queue = ParseQueue(
+                max_workers=config.PARSE_WORKERS,
+                per_project_limit=config.PARSE_PROJECT_CONCURRENCY
+            )
+        return _queue
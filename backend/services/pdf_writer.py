@@ -0,0 +1,197 @@
+"""
+Streaming image-to-PDF writer
+
+Writes one page per image straight to the output file, so memory use does not
+grow with the number of pages. Already encoded image data is embedded as it is,
+without decoding:
+    - JPEG (grayscale/RGB): the file bytes become a DCTDecode stream
+    - PNG (non-interlaced, grayscale/RGB/palette, up to 8 bits): the IDAT data
+      is already a zlib stream with PNG row filters, which FlateDecode with a
+      PNG predictor reads directly
+Other images (alpha channel, 16-bit, interlaced, other formats) are decoded
+one at a time, converted to RGB and Flate-compressed.
+
+Like PIL's PDF output (72 dpi), each page is as large in points as the image
+is in pixels.
+"""
+import io
+import logging
+import struct
+import zlib
+from typing import BinaryIO, Dict, List, Optional
+
+from PIL import Image
+
+logger = logging.getLogger(__name__)
+
+_PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+# PNG color type -> (PDF color space, components)
+_PNG_COLOR_SPACES = {0: ('/DeviceGray', 1), 2: ('/DeviceRGB', 3), 3: (None, 1)}
+
+
+class PdfImage:
+    """An image ready to be embedded: dictionary entries plus encoded stream data"""
+
+    def __init__(self, width: int, height: int, entries: str, data: bytes):
+        self.width = width
+        self.height = height
+        self.entries = entries
+        self.data = data
+
+
+def _from_jpeg(raw: bytes) -> Optional[PdfImage]:
+    """Embed JPEG bytes as they are (header is read without decoding the pixels)"""
+    with Image.open(io.BytesIO(raw)) as image:
+        if image.mode not in ('L', 'RGB'):
+            return None
+        width, height = image.size
+        color_space = '/DeviceGray' if image.mode == 'L' else '/DeviceRGB'
+    entries = f"/ColorSpace {color_space} /BitsPerComponent 8 /Filter /DCTDecode"
+    return PdfImage(width, height, entries, raw)
+
+
+def _from_png(raw: bytes) -> Optional[PdfImage]:
+    """Embed the IDAT stream of a PNG with a PNG predictor, if PDF can read it directly"""
+    position = len(_PNG_SIGNATURE)
+    header = None
+    palette = b''
+    idat: List[bytes] = []
+    while position + 8 <= len(raw):
+        length, chunk_type = struct.unpack('>I4s', raw[position:position + 8])
+        chunk = raw[position + 8:position + 8 + length]
+        position += 12 + length
+        if chunk_type == b'IHDR':
+            header = struct.unpack('>IIBBBBB', chunk)
+        elif chunk_type == b'PLTE':
+            palette = chunk
+        elif chunk_type == b'IDAT':
+            idat.append(chunk)
+        elif chunk_type == b'IEND':
+            break
+
+    if header is None or not idat:
+        return None
+    width, height, bit_depth, color_type, _, _, interlace = header
+    if color_type not in _PNG_COLOR_SPACES or bit_depth > 8 or interlace:
+        return None
+
+    color_space, colors = _PNG_COLOR_SPACES[color_type]
+    if color_type == 3:
+        if not palette:
+            return None
+        color_space = f"[/Indexed /DeviceRGB {len(palette) // 3 - 1} <{palette.hex()}>]"
+    entries = (f"/ColorSpace {color_space} /BitsPerComponent {bit_depth} /Filter /FlateDecode "
+               f"/DecodeParms << /Predictor 15 /Colors {colors} /BitsPerComponent {bit_depth} "
+               f"/Columns {width} >>")
+    return PdfImage(width, height, entries, b''.join(idat))
+
+
+def _decoded(raw: bytes) -> PdfImage:
+    """Fallback: decode the image, convert it to RGB and Flate-compress the pixels"""
+    with Image.open(io.BytesIO(raw)) as image:
+        rgb = image.convert('RGB')
+    width, height = rgb.size
+    data = zlib.compress(rgb.tobytes(), 6)
+    return PdfImage(width, height, "/ColorSpace /DeviceRGB /BitsPerComponent 8 /Filter /FlateDecode", data)
+
+
+def prepare_image(image_path: str) -> PdfImage:
+    """
+    Read an image file and prepare it for embedding (safe to call from worker threads)
+
+    Args:
+        image_path: Path of a JPEG, PNG or any other format PIL can read
+    """
+    with open(image_path, 'rb') as f:
+        raw = f.read()
+
+    prepared = None
+    try:
+        if raw.startswith(b'\xff\xd8'):
+            prepared = _from_jpeg(raw)
+        elif raw.startswith(_PNG_SIGNATURE):
+            prepared = _from_png(raw)
+    except Exception as e:
+        logger.debug(f"Embedding {image_path} directly failed, decoding it instead: {e}")
+    return prepared or _decoded(raw)
+
+
+class StreamingPdfWriter:
+    """
+    Writes a PDF page by page to a binary stream
+
+    Usage:
+        with open(path, 'wb') as f:
+            writer = StreamingPdfWriter(f)
+            for image_path in image_paths:
+                writer.add_page(prepare_image(image_path))
+            writer.close()
+    """
+
+    # 目录和页面树对象的编号固定，页面树在最后写入（写完所有页面后才知道 Kids）
+    _CATALOG = 1
+    _PAGES = 2
+
+    def __init__(self, stream: BinaryIO):
+        self.stream = stream
+        self._offsets: Dict[int, int] = {}
+        self._next_id = 3
+        self._page_ids: List[int] = []
+        self._position = 0
+        self._write(b'%PDF-1.4\n%\xe2\xe3\xcf\xd3\n')
+
+    @property
+    def page_count(self) -> int:
+        return len(self._page_ids)
+
+    def _write(self, data: bytes):
+        self.stream.write(data)
+        self._position += len(data)
+
+    def _reserve(self) -> int:
+        object_id = self._next_id
+        self._next_id += 1
+        return object_id
+
+    def _write_object(self, object_id: int, body: bytes, stream_data: Optional[bytes] = None):
+        self._offsets[object_id] = self._position
+        self._write(f"{object_id} 0 obj\n".encode('ascii'))
+        self._write(body)
+        if stream_data is not None:
+            self._write(b'\nstream\n')
+            self._write(stream_data)
+            self._write(b'\nendstream')
+        self._write(b'\nendobj\n')
+
+    def add_page(self, image: PdfImage):
+        """Write a page showing the image at full size"""
+        image_id, content_id, page_id = self._reserve(), self._reserve(), self._reserve()
+
+        self._write_object(image_id, (
+            f"<< /Type /XObject /Subtype /Image /Width {image.width} /Height {image.height} "
+            f"{image.entries} /Length {len(image.data)} >>"
+        ).encode('ascii'), image.data)
+
+        content = f"q {image.width} 0 0 {image.height} 0 0 cm /Im0 Do Q".encode('ascii')
+        self._write_object(content_id, f"<< /Length {len(content)} >>".encode('ascii'), content)
+
+        self._write_object(page_id, (
+            f"<< /Type /Page /Parent {self._PAGES} 0 R /MediaBox [0 0 {image.width} {image.height}] "
+            f"/Resources << /XObject << /Im0 {image_id} 0 R >> >> /Contents {content_id} 0 R >>"
+        ).encode('ascii'))
+        self._page_ids.append(page_id)
+
+    def close(self):
+        """Write the page tree, catalog, cross-reference table and trailer"""
+        kids = ' '.join(f"{page_id} 0 R" for page_id in self._page_ids)
+        self._write_object(self._PAGES, f"<< /Type /Pages /Kids [{kids}] /Count {len(self._page_ids)} >>".encode('ascii'))
+        self._write_object(self._CATALOG, f"<< /Type /Catalog /Pages {self._PAGES} 0 R >>".encode('ascii'))
+
+        xref_offset = self._position
+        size = self._next_id
+        lines = [f"xref\n0 {size}\n", "0000000000 65535 f \n"]
+        for object_id in range(1, size):
+            lines.append(f"{self._offsets[object_id]:010d} 00000 n \n")
+        lines.append(f"trailer\n<< /Size {size} /Root {self._CATALOG} 0 R >>\nstartxref\n{xref_offset}\n%%EOF\n")
+        self._write(''.join(lines).encode('ascii'))
+
@@ -4,7 +4,7 @@ AI Service Prompts - 集中管理所有 AI 服务的 prompt 模板
 import json
 import logging
 from textwrap import dedent
-from typing import List, Dict, Optional, TYPE_CHECKING
+from typing import List, Dict, Optional, Tuple, TYPE_CHECKING
 
 if TYPE_CHECKING:
     from services.ai_service import ProjectContext
@@ -106,6 +106,32 @@ def _format_reference_files_xml(reference_files_content: Optional[List[Dict[str,
     return '\n'.join(xml_parts)
 
 
+def _format_reference_chunks_xml(reference_chunks: Optional[List[Dict]]) -> str:
+    """
+    Format retrieved reference file chunks as XML structure
+    
+    Args:
+        reference_chunks: List of dicts with 'filename', 'heading' and 'content' keys
+        
+    Returns:
+        Formatted XML string
+    """
+    if not reference_chunks:
+        return ""
+    
+    xml_parts = ["<uploaded_file_excerpts>"]
+    for chunk in reference_chunks:
+        filename = chunk.get('filename', 'unknown')
+        heading = chunk.get('heading') or ''
+        xml_parts.append(f'  <excerpt file="{filename}" section="{heading}">')
+        xml_parts.append(chunk.get('content', ''))
+        xml_parts.append('  </excerpt>')
+    xml_parts.append('</uploaded_file_excerpts>')
+    xml_parts.append('')  # Empty line after XML
+    
+    return '\n'.join(xml_parts)
+
+
 def get_outline_generation_prompt(project_context: 'ProjectContext', language: str = None) -> str:
     """
     生成 PPT 大纲的 prompt
@@ -221,12 +247,16 @@ Now parse the outline text above into the structured format. Return only the JSO
     return final_prompt
 
 
-def get_page_description_prompt(project_context: 'ProjectContext', outline: list, 
-                                page_outline: dict, page_index: int, 
-                                part_info: str = "",
-                                language: str = None) -> str:
+def get_page_description_prompt_parts(project_context: 'ProjectContext', outline: list, 
+                                      page_outline: dict, page_index: int, 
+                                      part_info: str = "",
+                                      language: str = None,
+                                      reference_chunks: Optional[List[Dict]] = None) -> Tuple[str, str]:
     """
-    生成单个页面描述的 prompt
+    生成单个页面描述的 prompt，拆分为共享前缀和页面后缀
+    
+    前缀（参考文件 + 原始需求 + 完整大纲）对同一项目的所有页面完全相同且位于最前，
+    便于 Gemini 显式上下文缓存 / OpenAI 自动 prompt 缓存复用；后缀只包含当前页信息。
     
     Args:
         project_context: 项目上下文对象，包含所有原始信息
@@ -234,11 +264,18 @@ def get_page_description_prompt(project_context: 'ProjectContext', outline: list
         page_outline: 当前页面的大纲
         page_index: 页面编号（从1开始）
         part_info: 可选的章节信息
+        reference_chunks: 检索到的与本页相关的参考文件片段；为 None 时前缀包含完整参考文件
         
     Returns:
-        格式化后的 prompt 字符串
+        (prefix, suffix) 元组，prefix + suffix 即完整 prompt
     """
-    files_xml = _format_reference_files_xml(project_context.reference_files_content)
+    if reference_chunks is None:
+        files_xml = _format_reference_files_xml(project_context.reference_files_content)
+        excerpts_xml = ""
+    else:
+        # 参考文件较大时只携带与本页相关的片段，片段随页面变化，因此放在后缀中
+        files_xml = ""
+        excerpts_xml = _format_reference_chunks_xml(reference_chunks)
     # 根据项目类型选择最相关的原始输入
     if project_context.creation_type == 'idea' and project_context.idea_prompt:
         original_input = project_context.idea_prompt
@@ -249,10 +286,14 @@ def get_page_description_prompt(project_context: 'ProjectContext', outline: list
     else:
         original_input = project_context.idea_prompt or ""
     
-    prompt = (f"""\
+    # 前缀中不能出现任何与页面相关的内容，否则缓存无法命中
+    prefix = files_xml + (f"""\
 我们正在为PPT的每一页生成内容描述。
 用户的原始需求是：\n{original_input}\n
-我们已经有了完整的大纲：\n{outline}\n{part_info}
+我们已经有了完整的大纲：\n{outline}\n""")
+    
+    suffix = excerpts_xml + (f"""\
+{part_info}
 现在请为第 {page_index} 页生成描述：
 {page_outline}
 
@@ -279,9 +320,8 @@ def get_page_description_prompt(project_context: 'ProjectContext', outline: list
 {get_language_instruction(language)}
 """)
     
-    final_prompt = files_xml + prompt
-    logger.debug(f"[get_page_description_prompt] Final prompt:\n{final_prompt}")
-    return final_prompt
+    logger.debug(f"[get_page_description_prompt_parts] Prefix: {len(prefix)} chars, suffix:\n{suffix}")
+    return prefix, suffix
 
 
 def get_image_generation_prompt(page_desc: str, outline_text: str, 
@@ -530,6 +570,12 @@ def get_outline_refinement_prompt(current_outline: List[Dict], user_requirement:
     else:
         outline_text = json.dumps(current_outline, ensure_ascii=False, indent=2)
     
+    # 页面带有 id 时，要求模型原样带回，以便只更新改动过的页面
+    id_instruction = ""
+    if '"id":' in outline_text:
+        id_instruction = ("\n当前大纲中每个页面都有一个 \"id\" 字段。输出时，对保留或修改的已有页面请原样保留其 id"
+                          "（页面移动位置时也保留）；新增的页面不要包含 id；拆分页面时只有一个新页面沿用原 id。\n")
+    
     # 构建之前的修改历史记录
     previous_req_text = ""
     if previous_requirements and len(previous_requirements) > 0:
@@ -564,7 +610,7 @@ You are a helpful assistant that modifies PPT outlines based on user requirement
 - 合并或拆分页面
 - 根据用户要求进行任何合理的调整
 - 如果当前没有内容，请根据用户要求和原始输入信息创建新的大纲
-
+{id_instruction}
 输出格式可以选择：
 
 1. 简单格式（适用于没有主要章节的短 PPT）：
@@ -0,0 +1,261 @@
+"""
+Reference file retrieval index
+
+Parsed reference files are split into markdown sections (ReferenceChunk rows)
+when parsing completes. When a project's reference material is large, page
+description prompts include only the chunks most relevant to each page
+(BM25 over the page title, points and part) instead of every full document.
+
+Tokenization handles mixed Chinese/English text: ASCII words are kept whole,
+CJK runs are split into character bigrams.
+
+Configuration (see config.py):
+    REFERENCE_RETRIEVAL_ENABLED: "false" always sends the full documents
+    REFERENCE_RETRIEVAL_MIN_CHARS: Total reference size above which retrieval is used
+    REFERENCE_RETRIEVAL_TOP_K: Number of chunks included per page
+    REFERENCE_CHUNK_MAX_CHARS: Target maximum size of a chunk
+"""
+import logging
+import math
+import re
+from collections import Counter
+from typing import Dict, List, Optional
+
+from models import db, ReferenceFile, ReferenceChunk
+
+logger = logging.getLogger(__name__)
+
+_HEADING_PATTERN = re.compile(r'^(#{1,6})\s+(.+?)\s*#*\s*$')
+_IMAGE_PATTERN = re.compile(r'!\[(.*?)\]\([^\)]*\)')
+_TOKEN_PATTERN = re.compile(r'[a-z0-9]+|[\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af]+')
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Split text into search terms
+
+    Args:
+        text: Markdown or plain text
+
+    Returns:
+        ASCII words (lowercased) and CJK character bigrams
+    """
+    # 图片只保留描述文字，URL 不参与检索
+    text = _IMAGE_PATTERN.sub(r'\1', text or '').lower()
+    tokens = []
+    for run in _TOKEN_PATTERN.findall(text):
+        if run.isascii():
+            tokens.append(run)
+        elif len(run) == 1:
+            tokens.append(run)
+        else:
+            tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+    return tokens
+
+
+def split_markdown(markdown: str, max_chars: int = 1500) -> List[Dict[str, str]]:
+    """
+    Split markdown into chunks along headings and paragraphs
+
+    Args:
+        markdown: Parsed document content
+        max_chars: Target maximum chunk size; paragraphs are never merged past it
+
+    Returns:
+        List of dicts with 'heading' (heading path) and 'content' keys
+    """
+    chunks = []
+    headings: List[str] = []
+    paragraphs: List[str] = []
+    size = 0
+
+    def flush():
+        nonlocal paragraphs, size
+        content = '\n\n'.join(paragraphs).strip()
+        if content:
+            chunks.append({'heading': ' > '.join(headings), 'content': content})
+        paragraphs, size = [], 0
+
+    def add_paragraph(paragraph: str):
+        nonlocal size
+        # 超长段落（如大表格）按长度硬切分
+        while len(paragraph) > max_chars:
+            flush()
+            paragraphs.append(paragraph[:max_chars])
+            flush()
+            paragraph = paragraph[max_chars:]
+        if size and size + len(paragraph) > max_chars:
+            flush()
+        paragraphs.append(paragraph)
+        size += len(paragraph)
+
+    current: List[str] = []
+    for line in (markdown or '').splitlines():
+        match = _HEADING_PATTERN.match(line)
+        if match:
+            if current:
+                add_paragraph('\n'.join(current))
+                current = []
+            flush()
+            level = len(match.group(1))
+            headings = headings[:level - 1] + [match.group(2)]
+            paragraphs.append(line)
+            size = len(line)
+        elif line.strip():
+            current.append(line)
+        elif current:
+            add_paragraph('\n'.join(current))
+            current = []
+    if current:
+        add_paragraph('\n'.join(current))
+    flush()
+
+    # 只有标题没有正文的块并入下一块没有意义，直接丢弃
+    return [c for c in chunks if not _HEADING_PATTERN.match(c['content'])]
+
+
+def build_reference_index(reference_file: ReferenceFile, max_chars: Optional[int] = None) -> int:
+    """
+    Replace the chunk index of a reference file (the caller commits)
+
+    Args:
+        reference_file: Reference file whose markdown_content was just parsed
+        max_chars: Chunk size, defaults to REFERENCE_CHUNK_MAX_CHARS
+
+    Returns:
+        Number of chunks created
+    """
+    if max_chars is None:
+        from config import get_config
+        max_chars = get_config().REFERENCE_CHUNK_MAX_CHARS
+
+    ReferenceChunk.query.filter_by(reference_file_id=reference_file.id).delete()
+    chunks = split_markdown(reference_file.markdown_content, max_chars)
+    for index, chunk in enumerate(chunks):
+        db.session.add(ReferenceChunk(
+            reference_file_id=reference_file.id,
+            chunk_index=index,
+            heading=chunk['heading'][:500] or None,
+            content=chunk['content'],
+            terms=' '.join(tokenize(f"{chunk['heading']}\n{chunk['content']}"))
+        ))
+    logger.info(f"Indexed reference file {reference_file.filename}: {len(chunks)} chunks")
+    return len(chunks)
+
+
+class ReferenceIndex:
+    """In-memory BM25 index over the chunks of a project's reference files"""
+
+    def __init__(self, chunks: List[Dict], k1: float = 1.5, b: float = 0.75):
+        """
+        Args:
+            chunks: Dicts with 'filename', 'heading', 'content' and 'terms' (list of tokens),
+                    in document order
+            k1: BM25 term frequency saturation
+            b: BM25 length normalization
+        """
+        self.chunks = chunks
+        self.k1 = k1
+        self.b = b
+        self._term_freqs = [Counter(chunk['terms']) for chunk in chunks]
+        self._lengths = [len(chunk['terms']) for chunk in chunks]
+        self._avg_length = (sum(self._lengths) / len(chunks)) if chunks else 0.0
+        doc_freqs = Counter()
+        for freqs in self._term_freqs:
+            doc_freqs.update(freqs.keys())
+        count = len(chunks)
+        self._idf = {
+            term: math.log(1 + (count - df + 0.5) / (df + 0.5))
+            for term, df in doc_freqs.items()
+        }
+
+    def __len__(self) -> int:
+        return len(self.chunks)
+
+    def search(self, query: str, top_k: int = 6) -> List[Dict]:
+        """
+        Return the top_k chunks most relevant to the query, in document order
+
+        Falls back to the leading chunks when nothing in the query matches.
+        """
+        query_terms = set(tokenize(query))
+        scores = []
+        for position, freqs in enumerate(self._term_freqs):
+            norm = self.k1 * (1 - self.b + self.b * self._lengths[position] / (self._avg_length or 1))
+            score = 0.0
+            for term in query_terms:
+                tf = freqs.get(term)
+                if tf:
+                    score += self._idf[term] * tf * (self.k1 + 1) / (tf + norm)
+            if score > 0:
+                scores.append((score, position))
+
+        if scores:
+            scores.sort(key=lambda item: -item[0])
+            positions = sorted(position for _, position in scores[:top_k])
+        else:
+            positions = list(range(min(top_k, len(self.chunks))))
+        return [self.chunks[position] for position in positions]
+
+    def search_for_page(self, page_outline: Dict, top_k: int = 6) -> List[Dict]:
+        """Search with a page's title, points and part as the query"""
+        points = page_outline.get('points') or []
+        if isinstance(points, str):
+            points = [points]
+        query = '\n'.join([page_outline.get('title', ''), page_outline.get('part', '')] + [str(p) for p in points])
+        return self.search(query, top_k)
+
+    @classmethod
+    def for_project(cls, project_id: str) -> 'ReferenceIndex':
+        """Load the chunks of a project's completed reference files, indexing unindexed files first"""
+        reference_files = ReferenceFile.query.filter_by(
+            project_id=project_id,
+            parse_status='completed'
+        ).order_by(ReferenceFile.created_at).all()
+
+        # 兼容索引功能上线前已解析的文件
+        backfilled = [f for f in reference_files if f.markdown_content and f.chunks.count() == 0]
+        for reference_file in backfilled:
+            build_reference_index(reference_file)
+        if backfilled:
+            db.session.commit()
+
+        chunks = []
+        for reference_file in reference_files:
+            for chunk in reference_file.chunks:
+                chunks.append({
+                    'filename': reference_file.filename,
+                    'heading': chunk.heading,
+                    'content': chunk.content,
+                    'terms': chunk.terms.split(),
+                })
+        return cls(chunks)
+
+
+def load_reference_index(project_id: str, reference_files_content: List[Dict[str, str]]) -> Optional[ReferenceIndex]:
+    """
+    Build the retrieval index for a project when its reference material is large enough
+
+    Args:
+        project_id: Project ID
+        reference_files_content: The project's reference files ('filename', 'content')
+
+    Returns:
+        ReferenceIndex, or None when retrieval is disabled or the full documents are small
+        enough to send as they are
+    """
+    from config import get_config
+    config = get_config()
+    if not config.REFERENCE_RETRIEVAL_ENABLED or not reference_files_content:
+        return None
+
+    total_chars = sum(len(f.get('content') or '') for f in reference_files_content)
+    if total_chars < config.REFERENCE_RETRIEVAL_MIN_CHARS:
+        return None
+
+    index = ReferenceIndex.for_project(project_id)
+    if not len(index):
+        return None
+    logger.info(f"Using reference retrieval for project {project_id}: {total_chars} chars in "
+                f"{len(index)} chunks, top {config.REFERENCE_RETRIEVAL_TOP_K} per page")
+    return index
@@ -0,0 +1,250 @@
+"""
+On-disk cache for remote images referenced in page descriptions
+
+Descriptions can embed http(s) image URLs; every page that references one used
+to download it again for image generation and captioning. Downloads now go
+through a shared cache keyed by URL:
+    - bytes are stored only after PIL verifies them as an image, and downloads
+      larger than REMOTE_IMAGE_MAX_MB are rejected while streaming
+    - entries younger than REMOTE_IMAGE_CACHE_FRESH_SECONDS are served without
+      a request; older ones are revalidated with If-None-Match /
+      If-Modified-Since (a 304 keeps the stored bytes)
+    - concurrent requests for the same URL wait for a single download
+    - the least recently used entries are evicted beyond REMOTE_IMAGE_CACHE_MAX_MB
+
+Layout: {REMOTE_IMAGE_CACHE_DIR}/{sha256(url)}.bin plus a .json sidecar with the
+URL and validators; the .bin modification time records the last access.
+"""
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from io import BytesIO
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import requests
+from PIL import Image
+
+logger = logging.getLogger(__name__)
+
+DOWNLOAD_TIMEOUT = 30
+_CHUNK_SIZE = 64 * 1024
+
+
+class RemoteImageError(Exception):
+    """A remote image could not be downloaded or is not a valid image"""
+    pass
+
+
+class RemoteImageCache:
+    """URL-keyed image download cache with revalidation, size limits and single-flight downloads"""
+
+    def __init__(self, cache_dir: str, max_bytes: int = 200 * 1024 * 1024,
+                 max_image_bytes: int = 20 * 1024 * 1024, fresh_seconds: int = 3600):
+        """
+        Args:
+            cache_dir: Directory holding the cached files
+            max_bytes: Total size of cached images (least recently used evicted)
+            max_image_bytes: Largest single image accepted
+            fresh_seconds: Age below which an entry is served without revalidation
+        """
+        self.cache_dir = Path(cache_dir)
+        self.max_bytes = max_bytes
+        self.max_image_bytes = max_image_bytes
+        self.fresh_seconds = fresh_seconds
+        self.hits = 0
+        self.misses = 0
+        self.revalidations = 0
+        self._lock = threading.Lock()
+        # url key -> [per-URL lock, number of threads using it]
+        self._flights: Dict[str, List] = {}
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+
+    @staticmethod
+    def make_key(url: str) -> str:
+        return hashlib.sha256(url.encode('utf-8')).hexdigest()
+
+    def _data_path(self, key: str) -> Path:
+        return self.cache_dir / f"{key}.bin"
+
+    def _meta_path(self, key: str) -> Path:
+        return self.cache_dir / f"{key}.json"
+
+    def _read_meta(self, key: str) -> Optional[Dict]:
+        try:
+            with open(self._meta_path(key), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _write_atomic(self, path: Path, data: bytes):
+        tmp = path.with_name(f".{path.name}.{uuid.uuid4().hex}.tmp")
+        try:
+            with open(tmp, 'wb') as f:
+                f.write(data)
+            os.replace(tmp, path)
+        finally:
+            if tmp.exists():
+                tmp.unlink()
+
+    def get_bytes(self, url: str) -> bytes:
+        """
+        Return the image bytes for a URL, downloading or revalidating them if needed
+
+        Raises:
+            RemoteImageError: If the image cannot be downloaded and no cached copy exists
+        """
+        key = self.make_key(url)
+        with self._lock:
+            flight = self._flights.setdefault(key, [threading.Lock(), 0])
+            flight[1] += 1
+        try:
+            # 同一 URL 同时只有一个线程下载，其余线程等待后直接读取缓存
+            with flight[0]:
+                return self._get_locked(url, key)
+        finally:
+            with self._lock:
+                flight[1] -= 1
+                if flight[1] == 0:
+                    self._flights.pop(key, None)
+
+    def open_image(self, url: str) -> Image.Image:
+        """Return the cached image for a URL as a loaded PIL image"""
+        image = Image.open(BytesIO(self.get_bytes(url)))
+        image.load()
+        return image
+
+    def _get_locked(self, url: str, key: str) -> bytes:
+        data_path = self._data_path(key)
+        meta = self._read_meta(key) if data_path.exists() else None
+        if meta and meta.get('url') != url:
+            meta = None
+
+        if meta and time.time() - meta.get('fetched_at', 0) < self.fresh_seconds:
+            with self._lock:
+                self.hits += 1
+            return self._touch_and_read(data_path)
+
+        headers = {}
+        if meta:
+            if meta.get('etag'):
+                headers['If-None-Match'] = meta['etag']
+            if meta.get('last_modified'):
+                headers['If-Modified-Since'] = meta['last_modified']
+
+        try:
+            response = requests.get(url, timeout=DOWNLOAD_TIMEOUT, stream=True, headers=headers)
+            with response:
+                if response.status_code == 304 and meta:
+                    meta['fetched_at'] = time.time()
+                    self._write_atomic(self._meta_path(key), json.dumps(meta).encode('utf-8'))
+                    with self._lock:
+                        self.revalidations += 1
+                    return self._touch_and_read(data_path)
+                response.raise_for_status()
+                data = self._read_limited(response)
+                validators = {
+                    'etag': response.headers.get('ETag'),
+                    'last_modified': response.headers.get('Last-Modified'),
+                }
+        except (requests.RequestException, RemoteImageError) as e:
+            if meta:
+                # 重新验证失败时继续使用已缓存的版本
+                logger.warning(f"Revalidating cached image {url} failed, using the cached copy: {e}")
+                return self._touch_and_read(data_path)
+            raise RemoteImageError(f"Failed to download image from {url}: {e}") from e
+
+        self._validate(url, data)
+        with self._lock:
+            self.misses += 1
+        self._write_atomic(data_path, data)
+        self._write_atomic(self._meta_path(key), json.dumps({
+            'url': url,
+            'size': len(data),
+            'fetched_at': time.time(),
+            **validators,
+        }).encode('utf-8'))
+        self._evict()
+        return data
+
+    def _read_limited(self, response: requests.Response) -> bytes:
+        """Read the response body, rejecting it as soon as it exceeds max_image_bytes"""
+        length = response.headers.get('Content-Length')
+        if length and length.isdigit() and int(length) > self.max_image_bytes:
+            raise RemoteImageError(f"Image is {length} bytes, larger than the {self.max_image_bytes} byte limit")
+        chunks = []
+        total = 0
+        for chunk in response.iter_content(_CHUNK_SIZE):
+            total += len(chunk)
+            if total > self.max_image_bytes:
+                raise RemoteImageError(f"Image is larger than the {self.max_image_bytes} byte limit")
+            chunks.append(chunk)
+        return b''.join(chunks)
+
+    @staticmethod
+    def _validate(url: str, data: bytes):
+        """Only bytes PIL recognizes as an image are stored"""
+        try:
+            with Image.open(BytesIO(data)) as image:
+                image.verify()
+        except Exception as e:
+            raise RemoteImageError(f"Downloaded content from {url} is not a valid image: {e}") from e
+
+    @staticmethod
+    def _touch_and_read(data_path: Path) -> bytes:
+        data = data_path.read_bytes()
+        # 修改时间记录最近访问时间，供 LRU 淘汰使用
+        os.utime(data_path)
+        return data
+
+    def _evict(self):
+        """Delete least recently used entries until the total size fits max_bytes"""
+        if not self.max_bytes:
+            return
+        entries = []
+        for data_path in self.cache_dir.glob('*.bin'):
+            try:
+                stat = data_path.stat()
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, data_path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, data_path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            key = data_path.stem
+            # 正在下载的条目不淘汰
+            with self._lock:
+                if key in self._flights:
+                    continue
+            for path in (data_path, self._meta_path(key)):
+                try:
+                    path.unlink()
+                except OSError:
+                    pass
+            total -= size
+            logger.debug(f"Evicted cached remote image {key}")
+
+
+_cache: Optional[RemoteImageCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_remote_image_cache() -> RemoteImageCache:
+    """Return the process-wide remote image cache"""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            from config import get_config
+            config = get_config()
+            _cache = RemoteImageCache(
+                config.REMOTE_IMAGE_CACHE_DIR,
+                max_bytes=config.REMOTE_IMAGE_CACHE_MAX_MB * 1024 * 1024,
+                max_image_bytes=config.REMOTE_IMAGE_MAX_MB * 1024 * 1024,
+                fresh_seconds=config.REMOTE_IMAGE_CACHE_FRESH_SECONDS
+            )
+        return _cache
@@ -0,0 +1,134 @@
+"""
+In-process pub/sub for task progress, consumed by the SSE endpoint
+
+Task and Page changes are captured from the SQLAlchemy session when they are
+flushed and published once the transaction commits, so every code path that
+updates a task (status, progress, error) or a page (status, image) is covered
+without explicit publish calls, and subscribers never see uncommitted state.
+
+Events are delivered per project:
+    ('task', {...Task.to_dict()})
+    ('page', {"page_id", "order_index", "status", "generated_image_url", "updated_at"})
+
+Only changes committed in this process are published. Subscribers re-read the
+task from the database periodically, so jobs executed by an external worker
+process (TASK_WORKER_MODE=external) are still reported, just less promptly.
+"""
+import logging
+import queue
+import threading
+from collections import defaultdict
+from typing import Any, Dict, List, Set, Tuple
+
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+
+from models import Task, Page
+
+logger = logging.getLogger(__name__)
+
+_TASK_FIELDS = ('status', 'progress', 'error_message')
+_PAGE_FIELDS = ('status', 'generated_image_path')
+
+
+class TaskEventBus:
+    """Fan-out of task/page events to per-project subscriber queues"""
+
+    def __init__(self, max_queue_size: int = 1000):
+        """
+        Args:
+            max_queue_size: Events buffered per subscriber; a subscriber that falls
+                            further behind drops new events (the next task snapshot
+                            catches it up)
+        """
+        self.max_queue_size = max_queue_size
+        self._subscribers: Dict[str, Set[queue.Queue]] = defaultdict(set)
+        self._lock = threading.Lock()
+
+    def subscribe(self, project_id: str) -> queue.Queue:
+        """Register a subscriber for a project's events"""
+        subscriber = queue.Queue(maxsize=self.max_queue_size)
+        with self._lock:
+            self._subscribers[project_id].add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, project_id: str, subscriber: queue.Queue):
+        """Remove a subscriber"""
+        with self._lock:
+            subscribers = self._subscribers.get(project_id)
+            if subscribers:
+                subscribers.discard(subscriber)
+                if not subscribers:
+                    del self._subscribers[project_id]
+
+    def has_subscribers(self, project_id: str) -> bool:
+        """Whether anyone is listening to a project"""
+        with self._lock:
+            return bool(self._subscribers.get(project_id))
+
+    def publish(self, project_id: str, event_type: str, data: Dict[str, Any]):
+        """Deliver an event to every subscriber of the project"""
+        with self._lock:
+            subscribers = list(self._subscribers.get(project_id, ()))
+        for subscriber in subscribers:
+            try:
+                subscriber.put_nowait((event_type, data))
+            except queue.Full:
+                logger.debug(f"Task event subscriber for project {project_id} is full, dropping {event_type} event")
+
+
+task_events = TaskEventBus()
+
+
+def _changed(obj, fields) -> bool:
+    """Whether any of the given attributes changed in this flush"""
+    state = inspect(obj)
+    if state.pending:
+        return True
+    return any(state.attrs[field].history.has_changes() for field in fields)
+
+
+@event.listens_for(Session, 'after_flush')
+def _collect_task_events(session, flush_context):
+    """
+    Snapshot changed tasks and pages once they are written
+
+    after_flush still sees the pre-flush new/dirty lists and attribute history,
+    and new rows already have their default ids, so creations are published too.
+    """
+    candidates = list(session.new) + list(session.dirty)
+    if not any(isinstance(obj, (Task, Page)) for obj in candidates):
+        return
+
+    pending: List[Tuple[str, str, Dict[str, Any]]] = session.info.setdefault('task_events', [])
+    for obj in candidates:
+        if isinstance(obj, Task) and obj.id and obj.project_id and _changed(obj, _TASK_FIELDS):
+            if task_events.has_subscribers(obj.project_id):
+                pending.append((obj.project_id, 'task', obj.to_dict()))
+        elif isinstance(obj, Page) and obj.id and obj.project_id and _changed(obj, _PAGE_FIELDS):
+            if task_events.has_subscribers(obj.project_id):
+                pending.append((obj.project_id, 'page', {
+                    'page_id': obj.id,
+                    'order_index': obj.order_index,
+                    'status': obj.status,
+                    'generated_image_url': (
+                        f'/files/{obj.project_id}/pages/{obj.generated_image_path.split("/")[-1]}'
+                        if obj.generated_image_path else None
+                    ),
+                    # 前端用于图片缓存失效（与 Page.to_dict 一致）
+                    'updated_at': obj.updated_at.isoformat() if obj.updated_at else None,
+                }))
+
+
+@event.listens_for(Session, 'after_commit')
+def _publish_task_events(session):
+    """Publish the events collected during the committed transaction"""
+    pending = session.info.pop('task_events', None)
+    for project_id, event_type, data in pending or ():
+        task_events.publish(project_id, event_type, data)
+
+
+@event.listens_for(Session, 'after_soft_rollback')
+def _discard_task_events(session, previous_transaction):
+    """Drop events of a rolled back transaction"""
+    session.info.pop('task_events', None)
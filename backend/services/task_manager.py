@@ -1,57 +1,436 @@
 """
-Task Manager - handles background tasks using ThreadPoolExecutor
-No need for Celery or Redis, uses in-memory task tracking
+Task Manager - handles background tasks using a durable, database-backed job queue
+No need for Celery or Redis: jobs are persisted in the task_jobs table and executed
+by in-process worker threads that claim them with a renewable lease, so in-flight
+tasks survive a backend restart
 """
 import logging
+import os
+import re
+import socket
 import threading
-from concurrent.futures import ThreadPoolExecutor, as_completed
-from typing import Callable, List, Dict, Any
-from datetime import datetime
-from models import db, Task, Page, Material
+import time
+import uuid
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Callable, List, Dict, Any, Optional, Tuple
+from datetime import datetime, timedelta
+from sqlalchemy import or_, and_, update
+from models import db, Task, TaskJob, Page, Material
 from pathlib import Path
+from .ai_service import AIService, ProjectContext
+from .file_service import FileService
+from .export_service import ExportService
+from .reference_index import load_reference_index
 
 logger = logging.getLogger(__name__)
 
 
 class TaskManager:
-    """Simple task manager using ThreadPoolExecutor"""
+    """
+    Durable task queue executed by in-process worker threads
+    
+    Each submitted task is stored as a TaskJob row. Workers claim jobs with a
+    conditional UPDATE (so several threads or processes can share the queue),
+    hold a lease that a heartbeat thread keeps renewing, and delete the job once
+    its handler returns. If the process dies, the lease expires and the job is
+    claimed again, up to max_attempts times.
+    """
     
-    def __init__(self, max_workers: int = 4):
+    def __init__(self, max_workers: int = 4, lease_seconds: int = 60,
+                 max_attempts: int = 3, poll_interval: float = 1.0):
         """Initialize task manager"""
-        self.executor = ThreadPoolExecutor(max_workers=max_workers)
-        self.active_tasks = {}  # task_id -> Future
+        self.max_workers = max_workers
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.poll_interval = poll_interval
+        self.app = None
+        self.mode = 'embedded'  # embedded: workers run in the API process; external: separate worker process
+        self.before_job: Optional[Callable[[], None]] = None  # called in an app context before each job
+        self.worker_id = None
+        self.handlers: Dict[str, Callable] = {}  # job_type -> handler(task_id, app, **payload)
+        self.active_tasks = set()  # task ids currently running in this process
         self.lock = threading.Lock()
+        self._threads: List[threading.Thread] = []
+        self._heartbeat_thread: Optional[threading.Thread] = None
+        self._stop_event = threading.Event()
+        # 心跳单独停止：关闭时要等所有运行中的任务结束后再停止续租
+        self._heartbeat_stop = threading.Event()
+        self._wakeup = threading.Event()
+    
+    def init_app(self, app):
+        """Bind the Flask app and load queue settings from its config"""
+        self.app = app
+        self.max_workers = int(app.config.get('TASK_QUEUE_WORKERS', self.max_workers))
+        self.lease_seconds = int(app.config.get('TASK_LEASE_SECONDS', self.lease_seconds))
+        self.max_attempts = int(app.config.get('TASK_MAX_ATTEMPTS', self.max_attempts))
+        self.mode = app.config.get('TASK_WORKER_MODE', self.mode)
+        if self.mode not in ('embedded', 'external'):
+            logger.warning(f"Unknown TASK_WORKER_MODE '{self.mode}', falling back to 'embedded'")
+            self.mode = 'embedded'
+    
+    @property
+    def runs_embedded(self) -> bool:
+        """Whether jobs are executed by worker threads inside the API process"""
+        return self.mode == 'embedded'
+    
+    def register(self, job_type: str, handler: Callable):
+        """Register the handler that executes jobs of the given type"""
+        self.handlers[job_type] = handler
     
-    def submit_task(self, task_id: str, func: Callable, *args, **kwargs):
-        """Submit a background task"""
-        future = self.executor.submit(func, task_id, *args, **kwargs)
+    def enqueue(self, task_id: str, job_type: str, **payload):
+        """
+        Persist a job for an existing Task and wake up a worker
         
-        with self.lock:
-            self.active_tasks[task_id] = future
+        Must be called inside an app context. The payload must be JSON serializable,
+        since the job may be executed after a restart or by another process. In
+        external mode the job is only stored; a `python -m services.worker` process
+        picks it up.
+        """
+        job = TaskJob(
+            id=task_id,
+            job_type=job_type,
+            status='QUEUED',
+            max_attempts=self.max_attempts
+        )
+        job.set_payload(payload)
+        db.session.add(job)
+        db.session.commit()
         
-        # Add callback to clean up when done
-        future.add_done_callback(lambda f: self._cleanup_task(task_id))
+        if self.runs_embedded:
+            self.start()
+            self._wakeup.set()
+        logger.info(f"Task {task_id} ({job_type}) enqueued")
     
-    def _cleanup_task(self, task_id: str):
-        """Clean up completed task"""
+    def start(self):
+        """Recover orphaned tasks and start worker threads (idempotent)"""
         with self.lock:
-            if task_id in self.active_tasks:
-                del self.active_tasks[task_id]
+            if self._threads:
+                return
+            if self.app is None:
+                raise RuntimeError("TaskManager.init_app(app) must be called before start()")
+            
+            # 每个进程只生成一次：restart 后心跳与收尾仍按原 worker_id 续租/删除未结束的任务
+            # （在首次 start 时生成而非 __init__，避免 fork 出的进程共用同一个 id）
+            if self.worker_id is None:
+                self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+            self._stop_event.clear()
+            self._heartbeat_stop.clear()
+            self.recover_orphaned_tasks()
+            
+            for i in range(self.max_workers):
+                thread = threading.Thread(target=self._worker_loop, name=f"task-worker-{i}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+            
+            # shutdown(wait=False) 后心跳仍在为未结束的任务续租，可直接复用
+            if self._heartbeat_thread is None or not self._heartbeat_thread.is_alive():
+                self._heartbeat_thread = threading.Thread(target=self._heartbeat_loop, name="task-heartbeat", daemon=True)
+                self._heartbeat_thread.start()
+            
+            logger.info(f"Task queue started: {self.max_workers} workers, worker_id={self.worker_id}")
+    
+    def recover_orphaned_tasks(self):
+        """
+        Re-queue jobs whose lease has expired and fail unfinished tasks that have
+        no job to resume (e.g. tasks left behind by the old in-memory manager)
+        """
+        with self.app.app_context():
+            try:
+                now = datetime.utcnow()
+                
+                expired_jobs = TaskJob.query.filter(
+                    TaskJob.status == 'RUNNING',
+                    TaskJob.lease_expires_at < now
+                ).all()
+                for job in expired_jobs:
+                    job.status = 'QUEUED'
+                    job.lease_owner = None
+                    job.lease_expires_at = None
+                    if job.task and job.task.status == 'PROCESSING':
+                        job.task.status = 'PENDING'
+                
+                # 刚创建、尚未写入队列记录的任务不算孤儿，留出一个租约周期的余量
+                cutoff = now - timedelta(seconds=self.lease_seconds)
+                orphaned_tasks = Task.query.outerjoin(TaskJob, TaskJob.id == Task.id).filter(
+                    Task.status.in_(['PENDING', 'PROCESSING']),
+                    TaskJob.id.is_(None),
+                    Task.created_at < cutoff
+                ).all()
+                for task in orphaned_tasks:
+                    task.status = 'FAILED'
+                    task.error_message = 'Task was interrupted by a server restart and cannot be resumed'
+                    task.completed_at = now
+                
+                db.session.commit()
+                
+                if expired_jobs or orphaned_tasks:
+                    logger.warning(
+                        f"Task recovery: re-queued {len(expired_jobs)} interrupted job(s), "
+                        f"marked {len(orphaned_tasks)} unrecoverable task(s) as FAILED"
+                    )
+            except Exception as e:
+                db.session.rollback()
+                logger.error(f"Failed to recover orphaned tasks: {str(e)}", exc_info=True)
+    
+    def _claim_next_job(self) -> Optional[Tuple[str, str, Dict[str, Any], int, int]]:
+        """Atomically claim the oldest claimable job, returns None if nothing was claimed"""
+        with self.app.app_context():
+            try:
+                now = datetime.utcnow()
+                claimable = or_(
+                    TaskJob.status == 'QUEUED',
+                    and_(TaskJob.status == 'RUNNING', TaskJob.lease_expires_at < now)
+                )
+                
+                candidate = TaskJob.query.filter(claimable).order_by(TaskJob.created_at).first()
+                if candidate is None:
+                    return None
+                
+                # 条件更新实现原子领取：多个线程/进程竞争同一任务时只有一个能成功
+                result = db.session.execute(
+                    update(TaskJob)
+                    .where(TaskJob.id == candidate.id, claimable)
+                    .values(
+                        status='RUNNING',
+                        attempts=TaskJob.attempts + 1,
+                        lease_owner=self.worker_id,
+                        lease_expires_at=now + timedelta(seconds=self.lease_seconds),
+                        heartbeat_at=now,
+                        updated_at=now
+                    )
+                    .execution_options(synchronize_session=False)
+                )
+                db.session.commit()
+                
+                if result.rowcount != 1:
+                    return None
+                
+                db.session.refresh(candidate)
+                return (candidate.id, candidate.job_type, candidate.get_payload(),
+                        candidate.attempts, candidate.max_attempts)
+            except Exception as e:
+                db.session.rollback()
+                logger.error(f"Failed to claim job: {str(e)}", exc_info=True)
+                return None
+    
+    def _run_job(self, task_id: str, job_type: str, payload: Dict[str, Any],
+                 attempts: int, max_attempts: int):
+        """Execute a claimed job and remove it from the queue afterwards"""
+        with self.lock:
+            self.active_tasks.add(task_id)
+        
+        try:
+            handler = self.handlers.get(job_type)
+            if handler is None:
+                raise ValueError(f"No handler registered for job type {job_type}")
+            if attempts > max_attempts:
+                raise RuntimeError(f"Task was interrupted {attempts - 1} times, giving up")
+            if attempts > 1:
+                logger.warning(f"Resuming task {task_id} ({job_type}), attempt {attempts}/{max_attempts}")
+            
+            if self.before_job is not None:
+                with self.app.app_context():
+                    self.before_job()
+            
+            handler(task_id, self.app, **payload)
+        
+        except Exception as e:
+            logger.error(f"Task {task_id} ({job_type}) FAILED in worker: {str(e)}", exc_info=True)
+            self._mark_task_failed(task_id, str(e))
+        
+        finally:
+            self._finish_job(task_id)
+            with self.lock:
+                self.active_tasks.discard(task_id)
+    
+    def _mark_task_failed(self, task_id: str, error_message: str):
+        """Mark a task as failed unless its handler already finalized it"""
+        with self.app.app_context():
+            try:
+                task = Task.query.get(task_id)
+                if task and task.status not in ('COMPLETED', 'FAILED'):
+                    task.status = 'FAILED'
+                    task.error_message = error_message
+                    task.completed_at = datetime.utcnow()
+                    db.session.commit()
+            except Exception as e:
+                db.session.rollback()
+                logger.error(f"Failed to mark task {task_id} as FAILED: {str(e)}")
+    
+    def _finish_job(self, task_id: str):
+        """Delete a finished job, unless its lease has been taken over by another worker"""
+        with self.app.app_context():
+            try:
+                TaskJob.query.filter_by(id=task_id, lease_owner=self.worker_id).delete()
+                db.session.commit()
+            except Exception as e:
+                db.session.rollback()
+                logger.error(f"Failed to remove finished job {task_id}: {str(e)}")
+    
+    def _worker_loop(self):
+        """Claim and run jobs until shutdown"""
+        while not self._stop_event.is_set():
+            job = self._claim_next_job()
+            if job is None:
+                self._wakeup.wait(self.poll_interval)
+                self._wakeup.clear()
+                continue
+            self._run_job(*job)
+    
+    def _heartbeat_loop(self):
+        """
+        Renew the leases of all jobs running in this process
+        
+        Runs until _heartbeat_stop is set, which shutdown() only does after every
+        worker thread has finished its job, so a draining job never loses its lease.
+        """
+        interval = max(1.0, self.lease_seconds / 3)
+        while not self._heartbeat_stop.wait(interval):
+            with self.lock:
+                if not self.active_tasks:
+                    continue
+            
+            with self.app.app_context():
+                try:
+                    now = datetime.utcnow()
+                    db.session.execute(
+                        update(TaskJob)
+                        .where(TaskJob.lease_owner == self.worker_id, TaskJob.status == 'RUNNING')
+                        .values(
+                            heartbeat_at=now,
+                            lease_expires_at=now + timedelta(seconds=self.lease_seconds)
+                        )
+                        .execution_options(synchronize_session=False)
+                    )
+                    db.session.commit()
+                except Exception as e:
+                    db.session.rollback()
+                    logger.warning(f"Task heartbeat failed: {str(e)}")
     
     def is_task_active(self, task_id: str) -> bool:
-        """Check if task is still running"""
+        """Check if task is currently running in this process"""
         with self.lock:
             return task_id in self.active_tasks
     
-    def shutdown(self):
-        """Shutdown the executor"""
-        self.executor.shutdown(wait=True)
+    def shutdown(self, wait: bool = True):
+        """
+        Stop worker threads; running jobs finish first when wait=True
+        
+        Leases keep being renewed while jobs drain. With wait=False the heartbeat
+        keeps running as long as the process lives, so jobs still running in the
+        daemon threads are not claimed by another worker in the meantime.
+        """
+        self._stop_event.set()
+        self._wakeup.set()
+        if wait:
+            for thread in self._threads:
+                thread.join()
+            self._heartbeat_stop.set()
+            if self._heartbeat_thread is not None:
+                self._heartbeat_thread.join()
+            self._heartbeat_thread = None
+        self._threads = []
 
 
 # Global task manager instance
 task_manager = TaskManager(max_workers=4)
 
 
+class ProgressAggregator:
+    """
+    Coalesces per-page results and task progress into batched writes
+    
+    Instead of two write transactions per finished page (page + task), results are
+    buffered and flushed in a single transaction once `flush_batch_size` results
+    are pending or `flush_interval` seconds have passed since the last flush.
+    Task.progress keeps the same {"total", "completed", "failed"} shape.
+    
+    Not thread-safe: use it from the thread that collects the futures' results,
+    inside an app context. The collector should wake up at least every
+    `flush_interval` seconds and call flush_if_due(), so results are written
+    even while no other page finishes.
+    """
+    
+    def __init__(self, task_id: str, total: int, completed: int = 0, failed: int = 0,
+                 flush_interval: float = 1.0, flush_batch_size: int = 5):
+        self.task_id = task_id
+        self.total = total
+        self.completed = completed
+        self.failed = failed
+        self.flush_interval = flush_interval
+        self.flush_batch_size = max(1, flush_batch_size)
+        self._pending: Dict[str, Dict[str, Any]] = {}  # page_id -> field updates
+        self._last_flush = time.monotonic()
+    
+    @classmethod
+    def for_app(cls, app, task_id: str, total: int, **kwargs) -> 'ProgressAggregator':
+        """Create an aggregator using the flush settings from the app config"""
+        kwargs.setdefault('flush_interval', float(app.config.get('TASK_PROGRESS_FLUSH_INTERVAL', 1.0)))
+        kwargs.setdefault('flush_batch_size', int(app.config.get('TASK_PROGRESS_FLUSH_BATCH', 5)))
+        return cls(task_id, total, **kwargs)
+    
+    def record_page(self, page_id: str, status: str, failed: bool = False,
+                    description_content: Dict = None, generated_image_path: str = None):
+        """
+        Record the result of one page and flush if a batch is due
+        
+        Args:
+            page_id: Page ID
+            status: New page status
+            failed: Whether the page counts as failed (otherwise completed)
+            description_content: New description content, if any
+            generated_image_path: New image path, if any
+        """
+        if failed:
+            self.failed += 1
+        else:
+            self.completed += 1
+        
+        self._pending[page_id] = {
+            'status': status,
+            'description_content': description_content,
+            'generated_image_path': generated_image_path,
+        }
+        
+        if len(self._pending) >= self.flush_batch_size:
+            self.flush()
+        else:
+            self.flush_if_due()
+    
+    def flush_if_due(self):
+        """Flush pending results once flush_interval has passed since the last flush"""
+        if self._pending and time.monotonic() - self._last_flush >= self.flush_interval:
+            self.flush()
+    
+    def flush(self):
+        """Write all pending page updates and the task progress in one transaction"""
+        self._last_flush = time.monotonic()
+        pending, self._pending = self._pending, {}
+        
+        # 其他线程可能已修改页面状态，先丢弃会话缓存，确保变更能被正确检测和写入
+        db.session.expire_all()
+        
+        if pending:
+            pages = Page.query.filter(Page.id.in_(list(pending.keys()))).all()
+            for page in pages:
+                changes = pending[page.id]
+                page.status = changes['status']
+                if changes['description_content'] is not None:
+                    page.set_description_content(changes['description_content'])
+                if changes['generated_image_path'] is not None:
+                    page.generated_image_path = changes['generated_image_path']
+        
+        task = Task.query.get(self.task_id)
+        if task:
+            task.set_progress({
+                "total": self.total,
+                "completed": self.completed,
+                "failed": self.failed
+            })
+        
+        db.session.commit()
+
+
 def generate_descriptions_task(task_id: str, project_id: str, ai_service, 
                                project_context, outline: List[Dict], 
                                max_workers: int = 5, app=None,
@@ -68,7 +447,7 @@ def generate_descriptions_task(task_id: str, project_id: str, ai_service,
         ai_service: AI service instance
         project_context: ProjectContext object containing all project information
         outline: Complete outline structure
-        max_workers: Maximum number of parallel workers
+        max_workers: Maximum number of descriptions generated concurrently
         app: Flask app instance
         language: Output language (zh, en, ja, auto)
     """
@@ -77,6 +456,7 @@ def generate_descriptions_task(task_id: str, project_id: str, ai_service,
     
     # 在整个任务中保持应用上下文
     with app.app_context():
+        progress = None
         try:
             # 重要：在后台线程开始时就获取task和设置状态
             task = Task.query.get(task_id)
@@ -98,77 +478,42 @@ def generate_descriptions_task(task_id: str, project_id: str, ai_service,
                 raise ValueError("Page count mismatch")
             
             # Initialize progress
-            task.set_progress({
-                "total": len(pages),
-                "completed": 0,
-                "failed": 0
-            })
-            db.session.commit()
-            
-            # Generate descriptions in parallel
-            completed = 0
-            failed = 0
-            
-            def generate_single_desc(page_id, page_outline, page_index):
-                """
-                Generate description for a single page
-                注意：只传递 page_id（字符串），不传递 ORM 对象，避免跨线程会话问题
-                """
-                # 关键修复：在子线程中也需要应用上下文
-                with app.app_context():
-                    try:
-                        desc_text = ai_service.generate_page_description(
-                            project_context, outline, page_outline, page_index,
-                            language=language
-                        )
-                        
-                        # Parse description into structured format
-                        # This is a simplified version - you may want more sophisticated parsing
-                        desc_content = {
-                            "text": desc_text,
-                            "generated_at": datetime.utcnow().isoformat()
-                        }
-                        
-                        return (page_id, desc_content, None)
-                    except Exception as e:
-                        import traceback
-                        error_detail = traceback.format_exc()
-                        logger.error(f"Failed to generate description for page {page_id}: {error_detail}")
-                        return (page_id, None, str(e))
-            
-            # Use ThreadPoolExecutor for parallel generation
-            # 关键：提前提取 page.id，不要传递 ORM 对象到子线程
-            with ThreadPoolExecutor(max_workers=max_workers) as executor:
-                futures = [
-                    executor.submit(generate_single_desc, page.id, page_data, i)
-                    for i, (page, page_data) in enumerate(zip(pages, pages_data), 1)
-                ]
-                
-                # Process results as they complete
-                for future in as_completed(futures):
-                    page_id, desc_content, error = future.result()
-                    
-                    db.session.expire_all()
-                    
-                    # Update page in database
-                    page = Page.query.get(page_id)
-                    if page:
-                        if error:
-                            page.status = 'FAILED'
-                            failed += 1
-                        else:
-                            page.set_description_content(desc_content)
-                            page.status = 'DESCRIPTION_GENERATED'
-                            completed += 1
-                        
-                        db.session.commit()
-                    
-                    # Update task progress
-                    task = Task.query.get(task_id)
-                    if task:
-                        task.update_progress(completed=completed, failed=failed)
-                        db.session.commit()
-                        logger.info(f"Description Progress: {completed}/{len(pages)} pages completed")
+            progress = ProgressAggregator.for_app(app, task_id, total=len(pages))
+            progress.flush()
+            
+            # 提前提取 page.id，回调中不使用 ORM 对象
+            page_ids = [page.id for page in pages]
+            
+            def on_page_done(position, desc_text, error):
+                """Record one finished page (runs on this thread, results are written in batches)"""
+                page_id = page_ids[position]
+                if error is not None:
+                    logger.error(f"Failed to generate description for page {page_id}: {error}", exc_info=error)
+                    progress.record_page(page_id, 'FAILED', failed=True)
+                else:
+                    # Parse description into structured format
+                    # This is a simplified version - you may want more sophisticated parsing
+                    desc_content = {
+                        "text": desc_text,
+                        "generated_at": datetime.utcnow().isoformat()
+                    }
+                    progress.record_page(page_id, 'DESCRIPTION_GENERATED',
+                                         description_content=desc_content)
+                logger.info(f"Description Progress: {progress.completed}/{len(pages)} pages completed")
+            
+            # All pages are in flight on one event loop instead of one thread per page.
+            # Results are recorded here, off the event loop, and the idle timeout
+            # lets buffered results be written while the remaining pages generate.
+            for result in ai_service.iter_page_descriptions(
+                project_context, outline, pages_data, language=language,
+                max_concurrency=max_workers, idle_timeout=progress.flush_interval
+            ):
+                if result is not None:
+                    on_page_done(*result)
+                progress.flush_if_due()
+            
+            progress.flush()
+            completed, failed = progress.completed, progress.failed
             
             # Mark task as completed
             task = Task.query.get(task_id)
@@ -187,6 +532,13 @@ def generate_descriptions_task(task_id: str, project_id: str, ai_service,
                 logger.info(f"Project {project_id} status updated to DESCRIPTIONS_GENERATED")
         
         except Exception as e:
+            # Keep the results of pages that finished before the failure
+            if progress is not None:
+                try:
+                    progress.flush()
+                except Exception:
+                    db.session.rollback()
+            
             # Mark task as failed
             task = Task.query.get(task_id)
             if task:
@@ -201,7 +553,8 @@ def generate_images_task(task_id: str, project_id: str, ai_service, file_service
                         max_workers: int = 8, aspect_ratio: str = "16:9",
                         resolution: str = "2K", app=None,
                         extra_requirements: str = None,
-                        language: str = None):
+                        language: str = None,
+                        page_ids: List[str] = None):
     """
     Background task for generating page images
     Based on demo.py gen_images_parallel()
@@ -210,11 +563,13 @@ def generate_images_task(task_id: str, project_id: str, ai_service, file_service
     
     Args:
         language: Output language (zh, en, ja, auto)
+        page_ids: Only generate these pages (resume mode); None generates all pages
     """
     if app is None:
         raise ValueError("Flask app instance must be provided")
     
     with app.app_context():
+        progress = None
         try:
             # Update task status to PROCESSING
             task = Task.query.get(task_id)
@@ -236,17 +591,28 @@ def generate_images_task(task_id: str, project_id: str, ai_service, file_service
             if not ref_image_path:
                 raise ValueError("No template image found for project")
             
-            # Initialize progress
-            task.set_progress({
-                "total": len(pages),
-                "completed": 0,
-                "failed": 0
-            })
-            db.session.commit()
+            # 保持页码与大纲对齐：先编号再筛选需要生成的页面
+            selected_ids = set(page_ids) if page_ids is not None else None
+            scheduled = [
+                (page, page_data, i)
+                for i, (page, page_data) in enumerate(zip(pages, pages_data), 1)
+                if selected_ids is None or page.id in selected_ids
+            ]
+            
+            # Checkpoint: pages already completed by an earlier attempt of this task
+            # (the job was interrupted and resumed) are not generated again
+            already_done = {
+                page.id for page, _, _ in scheduled
+                if page.status == 'COMPLETED' and page.generated_image_path
+                and page.updated_at and page.updated_at >= task.created_at
+            }
+            if already_done:
+                logger.info(f"Task {task_id}: {len(already_done)} page(s) already completed, resuming the rest")
             
-            # Generate images in parallel
-            completed = 0
-            failed = 0
+            # Initialize progress
+            progress = ProgressAggregator.for_app(app, task_id, total=len(scheduled),
+                                                  completed=len(already_done))
+            progress.flush()
             
             def generate_single_image(page_id, page_data, page_index):
                 """
@@ -317,12 +683,10 @@ def generate_images_task(task_id: str, project_id: str, ai_service, file_service
                         if not image:
                             raise ValueError("Failed to generate image")
                         
-                        # Save image
-                        image_path = file_service.save_generated_image(
-                            image, project_id, page_id
-                        )
+                        # Save image (re-encoding, if configured, runs on the encoder pool)
+                        saved = file_service.submit_generated_image(image, project_id, page_id)
                         
-                        return (page_id, image_path, None)
+                        return (page_id, saved, None)
                         
                     except Exception as e:
                         import traceback
@@ -335,35 +699,43 @@ def generate_images_task(task_id: str, project_id: str, ai_service, file_service
             with ThreadPoolExecutor(max_workers=max_workers) as executor:
                 futures = [
                     executor.submit(generate_single_image, page.id, page_data, i)
-                    for i, (page, page_data) in enumerate(zip(pages, pages_data), 1)
+                    for page, page_data, i in scheduled
+                    if page.id not in already_done
                 ]
                 
-                # Process results as they complete
-                for future in as_completed(futures):
-                    page_id, image_path, error = future.result()
-                    
-                    
-                    db.session.expire_all()
-                    
-                    # Update page in database
-                    page = Page.query.get(page_id)
-                    if page:
-                        if error:
-                            page.status = 'FAILED'
-                            failed += 1
+                # Process results as they complete (written to the database in batches).
+                # Waking up every flush_interval writes buffered results even while
+                # the remaining pages take a long time to generate.
+                saving = {}  # save future -> page_id
+                pending = set(futures)
+                while pending:
+                    done, pending = wait(pending, timeout=progress.flush_interval,
+                                         return_when=FIRST_COMPLETED)
+                    for future in done:
+                        if future in saving:
+                            page_id = saving.pop(future)
+                            try:
+                                image_path, error = future.result(), None
+                            except Exception as e:
+                                logger.error(f"Failed to save image for page {page_id}: {e}", exc_info=True)
+                                image_path, error = None, str(e)
                         else:
-                            page.generated_image_path = image_path
-                            page.status = 'COMPLETED'
-                            completed += 1
+                            page_id, saved, error = future.result()
+                            if not error:
+                                # 图片写入完成后再标记页面完成
+                                saving[saved] = page_id
+                                pending.add(saved)
+                                continue
                         
-                        db.session.commit()
-                    
-                    # Update task progress
-                    task = Task.query.get(task_id)
-                    if task:
-                        task.update_progress(completed=completed, failed=failed)
-                        db.session.commit()
-                        logger.info(f"Image Progress: {completed}/{len(pages)} pages completed")
+                        if error:
+                            progress.record_page(page_id, 'FAILED', failed=True)
+                        else:
+                            progress.record_page(page_id, 'COMPLETED', generated_image_path=image_path)
+                        logger.info(f"Image Progress: {progress.completed}/{len(scheduled)} pages completed")
+                    progress.flush_if_due()
+            
+            progress.flush()
+            completed, failed = progress.completed, progress.failed
             
             # Mark task as completed
             task = Task.query.get(task_id)
@@ -382,6 +754,13 @@ def generate_images_task(task_id: str, project_id: str, ai_service, file_service
                 logger.info(f"Project {project_id} status updated to COMPLETED")
         
         except Exception as e:
+            # Keep the results of pages that finished before the failure
+            if progress is not None:
+                try:
+                    progress.flush()
+                except Exception:
+                    db.session.rollback()
+            
             # Mark task as failed
             task = Task.query.get(task_id)
             if task:
@@ -767,3 +1146,212 @@ def generate_material_image_task(task_id: str, project_id: str, prompt: str,
                 temp_path = Path(temp_dir)
                 if temp_path.exists():
                     shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+def prune_export_versions(output_path: str, keep: int = 3, max_age_seconds: float = 86400) -> List[str]:
+    """
+    Delete old versions of an export artifact
+    
+    Versions share the name stem and differ in the artifact key
+    (`{stem}_{16 hex}.{ext}`). A version is only deleted when it is not among
+    the `keep` most recently used ones AND was last used more than
+    max_age_seconds ago; cache hits refresh the modification time, so download
+    URLs handed out recently (by a completed task or a cached response) keep
+    working.
+    
+    Args:
+        output_path: Path of the current artifact (never deleted)
+        keep: Number of most recently used versions kept regardless of age
+        max_age_seconds: Versions used more recently than this are kept
+    
+    Returns:
+        Names of the deleted files
+    """
+    filename = os.path.basename(output_path)
+    stem, ext = os.path.splitext(filename)
+    version = re.compile(re.escape(stem.rsplit('_', 1)[0]) + r'_[0-9a-f]{16}' + re.escape(ext) + '$')
+    exports_dir = os.path.dirname(output_path)
+    
+    versions = []
+    for name in os.listdir(exports_dir):
+        if name == filename or not version.match(name):
+            continue
+        try:
+            versions.append((os.path.getmtime(os.path.join(exports_dir, name)), name))
+        except OSError:
+            continue
+    versions.sort(reverse=True)
+    
+    cutoff = time.time() - max_age_seconds
+    deleted = []
+    # 当前文件本身占一个保留名额
+    for mtime, name in versions[max(0, keep - 1):]:
+        if mtime >= cutoff:
+            continue
+        try:
+            os.remove(os.path.join(exports_dir, name))
+            deleted.append(name)
+        except OSError as e:
+            logger.warning(f"Failed to delete old export {name}: {e}")
+    return deleted
+
+
+def export_presentation_task(task_id: str, project_id: str, export_format: str,
+                             image_paths: List[str], output_path: str,
+                             json_paths: List[str] = None, assets_dir: str = None,
+                             max_workers: int = 4, app=None):
+    """
+    Background task for exporting a project as PPTX or PDF
+    
+    The file is written under a temporary name and renamed when complete, so a
+    finished artifact at output_path is always valid and can be served from cache.
+    
+    Args:
+        export_format: 'pptx' or 'pdf'
+        image_paths: Absolute paths of the page images, in page order
+        output_path: Artifact path (its name contains the artifact key)
+        json_paths: PPT Agent page JSON files; when given the PPTX is re-rendered from them
+        assets_dir: Asset directory for rendering json_paths
+        max_workers: Number of page images loaded concurrently
+    """
+    if app is None:
+        raise ValueError("Flask app instance must be provided")
+    
+    with app.app_context():
+        task = Task.query.get(task_id)
+        if not task:
+            return
+        
+        task.status = 'PROCESSING'
+        db.session.commit()
+        
+        tmp_path = f"{output_path}.{uuid.uuid4().hex[:8]}.part"
+        try:
+            if export_format == 'pptx' and json_paths:
+                ExportService.create_pptx_from_jsons(json_paths, output_file=tmp_path, assets_dir=assets_dir)
+            elif export_format == 'pptx':
+                ExportService.create_pptx_from_images(image_paths, output_file=tmp_path, max_workers=max_workers)
+            else:
+                ExportService.create_pdf_from_images(image_paths, output_file=tmp_path, max_workers=max_workers)
+            os.replace(tmp_path, output_path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        
+        filename = os.path.basename(output_path)
+        progress = task.get_progress()
+        progress.update({
+            'completed': progress.get('total', len(image_paths)),
+            'download_url': f"/files/{project_id}/exports/{filename}",
+        })
+        task.set_progress(progress)
+        task.status = 'COMPLETED'
+        task.completed_at = datetime.utcnow()
+        db.session.commit()
+        
+        logger.info(f"✅ Task {task_id} COMPLETED - exported {filename}")
+
+
+# ---------------------------------------------------------------------------
+# Job handlers
+# 队列中只保存可 JSON 序列化的参数，服务对象在执行时于 worker 中重新构建，
+# 因此任务可以在重启后或在其他进程中继续执行
+# ---------------------------------------------------------------------------
+
+def _build_services(app):
+    """Create the AI and file services for a job (needs app context for provider config)"""
+    with app.app_context():
+        return AIService(), FileService(app.config['UPLOAD_FOLDER'])
+
+
+def _run_generate_descriptions(task_id: str, app, project_id: str, project_context: Dict,
+                               outline: List[Dict], max_workers: int = 5,
+                               language: str = None):
+    """Job handler for GENERATE_DESCRIPTIONS"""
+    ai_service, _ = _build_services(app)
+    context = ProjectContext(project_context, project_context.get('reference_files_content'))
+    with app.app_context():
+        context.reference_index = load_reference_index(project_id, context.reference_files_content)
+    generate_descriptions_task(task_id, project_id, ai_service, context, outline,
+                               max_workers, app, language)
+
+
+def _run_generate_images(task_id: str, app, project_id: str, outline: List[Dict],
+                         use_template: bool = True, max_workers: int = 8,
+                         aspect_ratio: str = "16:9", resolution: str = "2K",
+                         extra_requirements: str = None, language: str = None,
+                         page_ids: List[str] = None):
+    """Job handler for GENERATE_IMAGES"""
+    ai_service, file_service = _build_services(app)
+    generate_images_task(task_id, project_id, ai_service, file_service, outline,
+                         use_template, max_workers, aspect_ratio, resolution, app,
+                         extra_requirements, language, page_ids)
+
+
+def _run_generate_page_image(task_id: str, app, project_id: str, page_id: str,
+                             outline: List[Dict], use_template: bool = True,
+                             aspect_ratio: str = "16:9", resolution: str = "2K",
+                             extra_requirements: str = None, language: str = None):
+    """Job handler for GENERATE_PAGE_IMAGE"""
+    ai_service, file_service = _build_services(app)
+    generate_single_page_image_task(task_id, project_id, page_id, ai_service, file_service,
+                                    outline, use_template, aspect_ratio, resolution, app,
+                                    extra_requirements, language)
+
+
+def _run_edit_page_image(task_id: str, app, project_id: str, page_id: str,
+                         edit_instruction: str, aspect_ratio: str = "16:9",
+                         resolution: str = "2K", original_description: str = None,
+                         additional_ref_images: List[str] = None, temp_dir: str = None):
+    """Job handler for EDIT_PAGE_IMAGE"""
+    ai_service, file_service = _build_services(app)
+    edit_page_image_task(task_id, project_id, page_id, edit_instruction, ai_service,
+                         file_service, aspect_ratio, resolution, original_description,
+                         additional_ref_images, temp_dir, app)
+
+
+def _run_generate_material(task_id: str, app, project_id: str, prompt: str,
+                           ref_image_path: str = None, additional_ref_images: List[str] = None,
+                           aspect_ratio: str = "16:9", resolution: str = "2K",
+                           temp_dir: str = None):
+    """Job handler for GENERATE_MATERIAL"""
+    ai_service, file_service = _build_services(app)
+    generate_material_image_task(task_id, project_id, prompt, ai_service, file_service,
+                                 ref_image_path, additional_ref_images, aspect_ratio,
+                                 resolution, temp_dir, app)
+
+
+def _run_export(task_id: str, app, project_id: str, export_format: str,
+                image_paths: List[str], filename: str, json_paths: List[str] = None):
+    """Job handler for EXPORT_PPTX / EXPORT_PDF"""
+    file_service = FileService(app.config['UPLOAD_FOLDER'])
+    exports_dir = file_service._get_exports_dir(project_id)
+    export_presentation_task(
+        task_id, project_id, export_format,
+        image_paths=[file_service.get_absolute_path(path) for path in image_paths],
+        output_path=str(exports_dir / filename),
+        json_paths=json_paths,
+        assets_dir=os.path.join(app.config['UPLOAD_FOLDER'], project_id),
+        max_workers=app.config.get('EXPORT_MAX_WORKERS', 4),
+        app=app
+    )
+    
+    # 同名导出的旧版本只在不再被近期使用时清理，以免 exports 目录无限增长
+    try:
+        deleted = prune_export_versions(
+            str(exports_dir / filename),
+            keep=app.config.get('EXPORT_KEEP_VERSIONS', 3),
+            max_age_seconds=app.config.get('EXPORT_RETENTION_HOURS', 24) * 3600
+        )
+        if deleted:
+            logger.info(f"Deleted {len(deleted)} old export(s) of project {project_id}")
+    except OSError as e:
+        logger.warning(f"Failed to prune old exports of project {project_id}: {e}")
+
+
+task_manager.register('GENERATE_DESCRIPTIONS', _run_generate_descriptions)
+task_manager.register('GENERATE_IMAGES', _run_generate_images)
+task_manager.register('GENERATE_PAGE_IMAGE', _run_generate_page_image)
+task_manager.register('EDIT_PAGE_IMAGE', _run_edit_page_image)
+task_manager.register('GENERATE_MATERIAL', _run_generate_material)
+task_manager.register('EXPORT', _run_export)
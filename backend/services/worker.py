@@ -0,0 +1,76 @@
+"""
+Standalone task worker - executes queued generation jobs outside the API process
+
+Usage (from the backend directory):
+    python -m services.worker [--workers N]
+
+Run with TASK_WORKER_MODE=external so the API process only enqueues jobs. Any
+number of worker processes can share the same database: jobs are claimed with
+an atomic lease, so each job runs in exactly one worker at a time.
+"""
+import argparse
+import logging
+import signal
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+def _refresh_settings(app):
+    """
+    Reload settings from the database before each job
+
+    Settings are edited through the API process, so the worker re-reads them to
+    pick up new API keys, models and resolution without a restart.
+    """
+    from app import _load_settings_to_config
+    _load_settings_to_config(app)
+
+
+def main(argv=None):
+    """Worker process entry point"""
+    parser = argparse.ArgumentParser(description='Banana Slides background task worker')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='Number of worker threads (default: TASK_QUEUE_WORKERS)')
+    args = parser.parse_args(argv)
+
+    # Importing the app module builds the Flask app (config, database, logging)
+    from app import app
+    from services.task_manager import task_manager
+
+    if args.workers:
+        task_manager.max_workers = args.workers
+    if task_manager.runs_embedded:
+        logger.warning(
+            "TASK_WORKER_MODE is 'embedded': the API process executes jobs as well. "
+            "Set TASK_WORKER_MODE=external so that only worker processes run them."
+        )
+
+    task_manager.before_job = lambda: _refresh_settings(app)
+
+    stop_event = threading.Event()
+
+    def _handle_signal(signum, frame):
+        if stop_event.is_set():
+            # 第二次信号直接退出，未完成的任务会在租约过期后被其他 worker 接管
+            logger.warning("Forced shutdown, running jobs will be resumed after their lease expires")
+            raise SystemExit(1)
+        logger.info("Shutting down worker, waiting for running jobs to finish (signal again to force)")
+        stop_event.set()
+
+    signal.signal(signal.SIGINT, _handle_signal)
+    signal.signal(signal.SIGTERM, _handle_signal)
+
+    task_manager.start()
+    logger.info(f"Task worker running: {task_manager.max_workers} threads, database: "
+                f"{app.config['SQLALCHEMY_DATABASE_URI']}")
+
+    while not stop_event.wait(1.0):
+        pass
+
+    task_manager.shutdown(wait=True)
+    logger.info("Task worker stopped")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,33 @@
+"""
+Shared fixtures for backend unit tests
+
+Run from the repository root (or backend/) with:
+    python -m pytest -q
+"""
+import os
+import sys
+
+import pytest
+from flask import Flask
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+
+from models import db  # noqa: E402
+
+
+@pytest.fixture
+def app(tmp_path):
+    """Minimal Flask app with the models bound to a temporary SQLite database"""
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{tmp_path / 'test.db'}"
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    app.config['UPLOAD_FOLDER'] = str(tmp_path / 'uploads')
+    db.init_app(app)
+    with app.app_context():
+        db.create_all()
+    yield app
+    with app.app_context():
+        db.session.remove()
+        db.drop_all()
@@ -0,0 +1,45 @@
+"""
+Old export versions are only deleted when they are neither among the most
+recently used ones nor used recently
+"""
+import os
+import time
+
+from services.task_manager import prune_export_versions
+
+
+def _touch(path, age_seconds):
+    path.write_bytes(b'x')
+    mtime = time.time() - age_seconds
+    os.utime(path, (mtime, mtime))
+
+
+def test_keeps_recent_and_newest_versions(tmp_path):
+    current = tmp_path / 'deck_aaaaaaaaaaaaaaaa.pptx'
+    _touch(current, 0)
+    _touch(tmp_path / 'deck_bbbbbbbbbbbbbbbb.pptx', 60)           # recently used
+    _touch(tmp_path / 'deck_cccccccccccccccc.pptx', 3 * 86400)    # among the newest
+    _touch(tmp_path / 'deck_dddddddddddddddd.pptx', 4 * 86400)
+    _touch(tmp_path / 'deck_eeeeeeeeeeeeeeee.pdf', 5 * 86400)     # other format
+    _touch(tmp_path / 'other_ffffffffffffffff.pptx', 5 * 86400)   # other stem
+
+    deleted = prune_export_versions(str(current), keep=3, max_age_seconds=86400)
+
+    assert deleted == ['deck_dddddddddddddddd.pptx']
+    assert sorted(os.listdir(tmp_path)) == [
+        'deck_aaaaaaaaaaaaaaaa.pptx',
+        'deck_bbbbbbbbbbbbbbbb.pptx',
+        'deck_cccccccccccccccc.pptx',
+        'deck_eeeeeeeeeeeeeeee.pdf',
+        'other_ffffffffffffffff.pptx',
+    ]
+
+
+def test_recently_used_versions_survive_beyond_keep(tmp_path):
+    current = tmp_path / 'deck_aaaaaaaaaaaaaaaa.pdf'
+    _touch(current, 0)
+    for i, key in enumerate('bcd'):
+        _touch(tmp_path / f'deck_{key * 16}.pdf', 60 * (i + 1))
+
+    assert prune_export_versions(str(current), keep=1, max_age_seconds=3600) == []
+    assert len(os.listdir(tmp_path)) == 4
@@ -0,0 +1,54 @@
+"""
+PPTX export of stored page images, including formats python-pptx cannot embed
+"""
+import io
+
+from PIL import Image
+from pptx import Presentation
+
+from config import get_config
+from services.export_service import ExportService
+from services.file_service import FileService
+
+
+def test_webp_pages_are_converted_for_pptx(tmp_path, monkeypatch):
+    monkeypatch.setattr(get_config(), 'IMAGE_SAVE_FORMAT', 'webp')
+    monkeypatch.setattr(get_config(), 'IMAGE_DERIVATIVES_ON_SAVE', False)
+    file_service = FileService(str(tmp_path))
+    webp_path = file_service.submit_generated_image(
+        Image.new('RGB', (160, 90), (200, 30, 30)), 'project', 'page-1'
+    ).result(timeout=10)
+    assert webp_path.endswith('.webp')
+
+    png_path = tmp_path / 'page-2.png'
+    Image.new('RGBA', (160, 90), (30, 30, 200, 255)).save(png_path)
+
+    pptx_bytes = ExportService.create_pptx_from_images(
+        [file_service.get_absolute_path(webp_path), str(png_path)]
+    )
+
+    presentation = Presentation(io.BytesIO(pptx_bytes))
+    pictures = [slide.shapes[0].image for slide in presentation.slides]
+    assert [picture.content_type for picture in pictures] == ['image/png', 'image/png']
+    # PNG 页面原样嵌入，WebP 页面转为 PNG 后像素不变
+    assert pictures[1].blob == png_path.read_bytes()
+    with Image.open(io.BytesIO(pictures[0].blob)) as converted:
+        assert converted.size == (160, 90)
+        assert converted.convert('RGB').getpixel((80, 45))[0] > 150
+
+
+def test_original_bytes_are_written_immediately(tmp_path, monkeypatch):
+    from services.ai_providers.image.base import image_from_bytes
+
+    monkeypatch.setattr(get_config(), 'IMAGE_SAVE_FORMAT', 'original')
+    monkeypatch.setattr(get_config(), 'IMAGE_DERIVATIVES_ON_SAVE', False)
+    buffer = io.BytesIO()
+    Image.new('RGB', (32, 32), (0, 128, 0)).save(buffer, format='JPEG')
+    file_service = FileService(str(tmp_path))
+
+    saved = file_service.submit_generated_image(image_from_bytes(buffer.getvalue()), 'project', 'page')
+
+    assert saved.done()
+    path = tmp_path / saved.result()
+    assert path.suffix == '.jpg'
+    assert path.read_bytes() == buffer.getvalue()
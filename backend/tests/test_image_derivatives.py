@@ -0,0 +1,97 @@
+"""
+Image derivatives: generation on first request, regeneration of outdated files
+and a single generation for concurrent requests
+"""
+import os
+import threading
+import time
+
+from PIL import Image
+
+from services import image_derivatives
+from services.image_derivatives import create_derivatives, derivative_path, get_derivative
+
+
+def _source(tmp_path, size=(1600, 900)):
+    path = tmp_path / 'page_v1.png'
+    Image.new('RGB', size, (20, 120, 220)).save(path)
+    return path
+
+
+def _count_writes(monkeypatch, delay=0.0):
+    """Wrap _write_derivative to count calls, optionally slowing them down"""
+    calls = []
+    original = image_derivatives._write_derivative
+
+    def write(image, target, max_side, quality):
+        calls.append(target)
+        time.sleep(delay)
+        original(image, target, max_side, quality)
+
+    monkeypatch.setattr(image_derivatives, '_write_derivative', write)
+    return calls
+
+
+def test_derivative_is_generated_once_and_reused(tmp_path, monkeypatch):
+    source = _source(tmp_path)
+    calls = _count_writes(monkeypatch)
+
+    path = get_derivative(source, 'thumb')
+
+    assert path == derivative_path(source, 'thumb')
+    with Image.open(path) as thumb:
+        assert thumb.format == 'WEBP'
+        assert thumb.size == (480, 270)
+    assert get_derivative(source, 'thumb') == path
+    assert len(calls) == 1
+
+
+def test_outdated_derivative_is_regenerated(tmp_path, monkeypatch):
+    source = _source(tmp_path)
+    create_derivatives(source)
+    medium = derivative_path(source, 'medium')
+    with Image.open(medium) as image:
+        assert image.size == (1280, 720)
+
+    # 原图被覆盖后，比原图旧的缩略图需要重新生成
+    Image.new('RGB', (900, 1600), (200, 40, 40)).save(source)
+    past = time.time() - 60
+    os.utime(medium, (past, past))
+    calls = _count_writes(monkeypatch)
+
+    assert get_derivative(source, 'medium') == medium
+    assert calls == [medium]
+    with Image.open(medium) as image:
+        assert image.size == (720, 1280)
+    assert medium.stat().st_mtime >= source.stat().st_mtime
+
+
+def test_concurrent_requests_generate_once(tmp_path, monkeypatch):
+    source = _source(tmp_path)
+    calls = _count_writes(monkeypatch, delay=0.2)
+    barrier = threading.Barrier(6)
+    results = []
+
+    def request():
+        barrier.wait()
+        results.append(get_derivative(source, 'thumb'))
+
+    threads = [threading.Thread(target=request) for _ in range(6)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert results == [derivative_path(source, 'thumb')] * 6
+    assert len(calls) == 1
+    assert image_derivatives._flights == {}
+    # 只留下最终文件，没有残留的临时文件
+    assert [p.name for p in derivative_path(source, 'thumb').parent.iterdir()] == ['page_v1.thumb.webp']
+
+
+def test_unreadable_source_returns_none(tmp_path):
+    source = tmp_path / 'broken.png'
+    source.write_bytes(b'not an image')
+
+    assert get_derivative(source, 'thumb') is None
+    assert not derivative_path(source, 'thumb').exists()
@@ -0,0 +1,32 @@
+"""
+LoopLocal: one object per event loop, closed before the loop ends
+"""
+import asyncio
+
+from services.ai_providers.loop_local import LoopLocal, close_loop_clients
+
+
+class _Client:
+    def __init__(self):
+        self.closed = False
+
+    async def close(self):
+        self.closed = True
+
+
+def test_clients_are_per_loop_and_closed():
+    clients = LoopLocal(_Client)
+    flights = LoopLocal(dict)  # 没有 close 方法的对象只会被丢弃
+
+    async def run():
+        client = clients.get()
+        assert clients.get() is client
+        flights.get()['key'] = 'value'
+        await close_loop_clients()
+        return client
+
+    first = asyncio.run(run())
+    second = asyncio.run(run())
+    assert first is not second
+    assert first.closed and second.closed
+    assert not clients._items and not flights._items
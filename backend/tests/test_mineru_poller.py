@@ -0,0 +1,132 @@
+"""
+MinerUPoller: per-file result dispatch, backoff between polls and timeouts
+"""
+import threading
+
+import requests
+
+from services import mineru_poller
+from services.mineru_poller import MinerUPoller
+
+
+class _FakeResponse:
+    def __init__(self, payload):
+        self._payload = payload
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return self._payload
+
+
+class _FakeApi:
+    """Batch result API returning one scripted response per poll (the last one repeats)"""
+
+    def __init__(self, *responses):
+        self.responses = list(responses)
+        self.polls = 0
+
+    def get(self, url, headers=None, timeout=None):
+        response = self.responses[min(self.polls, len(self.responses) - 1)]
+        self.polls += 1
+        if isinstance(response, Exception):
+            raise response
+        return _FakeResponse(response)
+
+
+def _results(*entries):
+    return {'code': 0, 'data': {'extract_result': [dict(entry) for entry in entries]}}
+
+
+class _Collector:
+    def __init__(self, expected):
+        self.results = {}
+        self.lock = threading.Lock()
+        self.expected = expected
+        self.done = threading.Event()
+
+    def __call__(self, data_id, zip_url, error):
+        with self.lock:
+            self.results[data_id] = (zip_url, error)
+            if len(self.results) == self.expected:
+                self.done.set()
+
+
+def _poller():
+    return MinerUPoller(initial_interval=0.01, max_interval=0.02, backoff=1.5)
+
+
+def test_files_are_dispatched_as_they_finish(monkeypatch):
+    api = _FakeApi(
+        _results({'data_id': 'a', 'state': 'running'},
+                 {'data_id': 'b', 'state': 'failed', 'err_msg': 'bad pdf'},
+                 {'data_id': 'c', 'state': 'pending'}),
+        requests.exceptions.ConnectionError('dropped'),
+        _results({'data_id': 'a', 'state': 'done', 'full_zip_url': 'http://x/a.zip'},
+                 {'data_id': 'c', 'state': 'running'}),
+        # 未返回 data_id 的结果按文件名匹配
+        _results({'file_name': 'c.pdf', 'state': 'done', 'full_zip_url': 'http://x/c.zip'}),
+    )
+    monkeypatch.setattr(mineru_poller.requests, 'get', api.get)
+    poller = _poller()
+    collector = _Collector(expected=3)
+
+    poller.track('batch', 'http://x/batch', {}, {'a': 'a.pdf', 'b': 'b.pdf', 'c': 'c.pdf'},
+                 collector, timeout=10)
+
+    assert collector.done.wait(5)
+    assert collector.results == {
+        'a': ('http://x/a.zip', None),
+        'b': (None, 'File parsing failed: bad pdf'),
+        'c': ('http://x/c.zip', None),
+    }
+    assert api.polls == 4
+    assert poller.outstanding() == 0
+
+
+def test_unfinished_files_fail_after_timeout(monkeypatch):
+    api = _FakeApi(_results({'data_id': 'a', 'state': 'done', 'full_zip_url': 'http://x/a.zip'},
+                            {'data_id': 'b', 'state': 'running'}))
+    monkeypatch.setattr(mineru_poller.requests, 'get', api.get)
+    poller = _poller()
+    collector = _Collector(expected=2)
+
+    poller.track('batch', 'http://x/batch', {}, {'a': 'a.pdf', 'b': 'b.pdf'}, collector, timeout=0.2)
+
+    assert collector.done.wait(5)
+    assert collector.results['a'] == ('http://x/a.zip', None)
+    assert collector.results['b'][0] is None
+    assert 'timeout' in collector.results['b'][1].lower()
+    assert poller.outstanding() == 0
+
+
+def test_api_error_fails_every_pending_file(monkeypatch):
+    api = _FakeApi({'code': -60012, 'msg': 'batch not found'})
+    monkeypatch.setattr(mineru_poller.requests, 'get', api.get)
+    poller = _poller()
+    collector = _Collector(expected=2)
+
+    poller.track('batch', 'http://x/batch', {}, {'a': 'a.pdf', 'b': 'b.pdf'}, collector, timeout=10)
+
+    assert collector.done.wait(5)
+    assert all(zip_url is None and 'batch not found' in error
+               for zip_url, error in collector.results.values())
+    assert api.polls == 1
+
+
+def test_parse_file_gives_up_when_no_result_arrives(monkeypatch):
+    from config import get_config
+    from services import file_parser_service
+    from services.file_parser_service import FileParserService
+
+    monkeypatch.setattr(get_config(), 'MINERU_PARSE_TIMEOUT_SECONDS', 0.1)
+    monkeypatch.setattr(file_parser_service, 'PARSE_WAIT_MARGIN_SECONDS', 0.1)
+    parser = FileParserService(mineru_token='token', mineru_api_base='http://x')
+    # 上传成功但结果回调始终没有到来
+    monkeypatch.setattr(parser, 'submit_batch', lambda files, on_result: 'batch')
+
+    batch_id, content, error, failed = parser.parse_file('/tmp/report.pdf', 'report.pdf')
+
+    assert content is None
+    assert 'timeout' in error.lower()
@@ -0,0 +1,88 @@
+"""
+Matching a refined outline to existing pages and applying it in place
+"""
+from models import db, Project, Page
+from services.outline_reconciler import match_outlines, reconcile_pages
+
+
+def _outline(title, *points, **extra):
+    return dict(title=title, points=list(points), **extra)
+
+
+def test_match_by_id_then_exact_then_title_then_fuzzy():
+    old = [
+        _outline('Intro', 'why'),
+        _outline('Market size', 'TAM', 'SAM'),
+        _outline('Roadmap', 'Q1', 'Q2'),
+        _outline('Team', 'founders'),
+        _outline('Unrelated', 'x'),
+    ]
+    new = [
+        _outline('Completely new opening', 'hello', id='p1'),  # id wins over content
+        _outline('Team', 'founders'),                           # identical
+        _outline('Roadmap', 'Q1', 'Q2', 'Q3'),                  # same title
+        _outline('Market sizes', 'TAM', 'SAM', 'SOM'),          # fuzzy
+        _outline('Pricing', 'plans'),                           # new page
+    ]
+
+    assert match_outlines(old, new) == [0, 3, 2, 1, None]
+
+
+def test_ids_and_titles_are_used_once():
+    old = [_outline('Same'), _outline('Same')]
+    new = [_outline('Same', id='p2'), _outline('Same', id='p2'), _outline('Same')]
+
+    assert match_outlines(old, new) == [1, 0, None]
+
+
+def test_fuzzy_match_respects_threshold():
+    old = [_outline('Quarterly revenue', 'growth')]
+    new = [_outline('Hiring plan', 'engineers')]
+
+    assert match_outlines(old, new) == [None]
+    assert match_outlines(old, new, threshold=0.0) == [0]
+
+
+def test_reconcile_pages_keeps_matched_rows(app):
+    with app.app_context():
+        project = Project(creation_type='idea', idea_prompt='test')
+        db.session.add(project)
+        db.session.flush()
+        contents = [
+            (_outline('Intro', 'why'), 'intro text'),
+            (_outline('Roadmap', 'Q1'), 'roadmap text'),
+            (_outline('Legacy', 'old'), 'legacy text'),
+        ]
+        for i, (outline, description) in enumerate(contents):
+            page = Page(project_id=project.id, order_index=i, status='COMPLETED',
+                        generated_image_path=f'{project.id}/pages/{i}.png')
+            page.set_outline_content(outline)
+            page.set_description_content({'text': description})
+            db.session.add(page)
+        db.session.commit()
+        old_pages = Page.query.filter_by(project_id=project.id).order_by(Page.order_index).all()
+        intro, roadmap, legacy = old_pages
+
+        intro_id, roadmap_id, legacy_id = intro.id, roadmap.id, legacy.id
+
+        pages, stats = reconcile_pages(project.id, old_pages, [
+            _outline('Roadmap', 'Q1', 'Q2'),                    # same title, new points
+            _outline('Intro', 'why'),                           # its page is claimed by id below
+            _outline('Brand new title', 'why', id='p1'),        # id of Intro, new title
+        ])
+        db.session.commit()
+
+        assert stats == {'unchanged': 0, 'updated': 2, 'added': 1, 'removed': 1}
+        assert [p.order_index for p in pages] == [0, 1, 2]
+        assert pages[0].id == roadmap_id and pages[2].id == intro_id
+        assert pages[1].id not in (intro_id, roadmap_id, legacy_id)
+        assert db.session.get(Page, legacy_id) is None
+
+        # 标题未变：保留描述和图片
+        assert pages[0].get_description_content() == {'text': 'roadmap text'}
+        assert pages[0].generated_image_path
+        # 标题变了：清空描述、重置状态，图片保留
+        assert pages[2].description_content is None
+        assert pages[2].status == 'DRAFT'
+        assert pages[2].generated_image_path
+        assert pages[2].get_outline_content() == {'title': 'Brand new title', 'points': ['why']}
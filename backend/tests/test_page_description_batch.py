@@ -0,0 +1,63 @@
+"""
+AIService.iter_page_descriptions: pages run concurrently on a background event
+loop and results are handed back to the calling thread
+"""
+import asyncio
+import threading
+
+import pytest
+
+from services.ai_service import AIService
+
+
+def _service(delays, fail=()):
+    service = AIService(text_provider=object(), image_provider=object())
+    loop_threads = set()
+
+    async def describe(project_context, outline, page_outline, page_index, language='zh'):
+        loop_threads.add(threading.get_ident())
+        await asyncio.sleep(delays[page_index - 1])
+        if page_index in fail:
+            raise RuntimeError(f'page {page_index} failed')
+        return f'description {page_index}'
+
+    service.generate_page_description_async = describe
+    return service, loop_threads
+
+
+def test_results_arrive_on_the_calling_thread_as_pages_finish():
+    service, loop_threads = _service([0.3, 0.1, 0.2], fail={3})
+    outlines = [{'title': str(i)} for i in range(3)]
+
+    received = []
+    for position, text, error in service.iter_page_descriptions(None, [], outlines, max_concurrency=3):
+        received.append((position, text, str(error) if error else None, threading.get_ident()))
+
+    assert [r[:3] for r in received] == [
+        (1, 'description 2', None),
+        (2, None, 'page 3 failed'),
+        (0, 'description 1', None),
+    ]
+    # 结果在调用方线程处理，事件循环在另一个线程上运行
+    assert {r[3] for r in received} == {threading.get_ident()}
+    assert threading.get_ident() not in loop_threads
+
+
+def test_idle_timeout_yields_none_while_waiting():
+    service, _ = _service([0.35])
+
+    results = list(service.iter_page_descriptions(None, [], [{'title': 'a'}], idle_timeout=0.1))
+
+    assert results[-1] == (0, 'description 1', None)
+    assert results[:-1] and all(r is None for r in results[:-1])
+
+
+def test_batch_errors_are_raised_to_the_caller(monkeypatch):
+    service, _ = _service([0])
+
+    async def broken_close():
+        raise RuntimeError('loop failed')
+
+    monkeypatch.setattr('services.ai_service.close_loop_clients', broken_close)
+    with pytest.raises(RuntimeError, match='loop failed'):
+        list(service.iter_page_descriptions(None, [], [{'title': 'a'}]))
@@ -0,0 +1,104 @@
+"""
+Streaming single-page description endpoint: deltas, save on completion and
+edits made while the description is streaming
+"""
+import json
+
+import pytest
+from sqlalchemy import update
+
+from controllers import page_controller
+from models import db, Project, Page
+
+
+class _StreamingAIService:
+    """AIService stand-in that streams fixed chunks and runs a hook halfway"""
+
+    chunks = ['Title: Intro\n', 'Body text']
+    during_stream = None
+
+    def stream_page_description(self, project_context, outline, page_outline, page_index, language='zh'):
+        yield self.chunks[0]
+        if self.during_stream:
+            self.during_stream()
+        yield from self.chunks[1:]
+
+
+@pytest.fixture
+def client(app, monkeypatch):
+    app.register_blueprint(page_controller.page_bp)
+    monkeypatch.setattr(page_controller, 'AIService', _StreamingAIService)
+    monkeypatch.setattr(page_controller, 'load_reference_index', lambda *args: None)
+    monkeypatch.setattr(_StreamingAIService, 'during_stream', None)
+    return app.test_client()
+
+
+@pytest.fixture
+def page_ids(app):
+    with app.app_context():
+        project = Project(creation_type='idea', idea_prompt='test')
+        db.session.add(project)
+        db.session.commit()
+        page = Page(project_id=project.id, order_index=0, part='Opening')
+        page.set_outline_content({'title': 'Intro', 'points': ['why']})
+        db.session.add(page)
+        db.session.commit()
+        return project.id, page.id
+
+
+def _events(response):
+    """Parse a text/event-stream body into (event, data) pairs"""
+    events = []
+    for block in response.get_data(as_text=True).strip().split('\n\n'):
+        lines = dict(line.split(': ', 1) for line in block.split('\n'))
+        events.append((lines['event'], json.loads(lines['data'])))
+    return events
+
+
+def _stream(client, project_id, page_id):
+    return client.post(f'/api/projects/{project_id}/pages/{page_id}/generate/description/stream', json={})
+
+
+def test_streams_deltas_and_saves_the_description(client, app, page_ids):
+    project_id, page_id = page_ids
+
+    events = _events(_stream(client, project_id, page_id))
+
+    assert [e for e, _ in events] == ['delta', 'delta', 'done']
+    assert ''.join(data['text'] for e, data in events if e == 'delta') == 'Title: Intro\nBody text'
+    assert events[-1][1]['status'] == 'DESCRIPTION_GENERATED'
+    with app.app_context():
+        page = db.session.get(Page, page_id)
+        assert page.get_description_content()['text'] == 'Title: Intro\nBody text'
+
+
+def test_edits_made_while_streaming_are_kept(client, app, page_ids):
+    project_id, page_id = page_ids
+
+    def edit_page():
+        # 模拟另一个请求在流式生成期间修改了页面
+        with db.engine.begin() as connection:
+            connection.execute(update(Page).where(Page.id == page_id).values(part='Renamed'))
+
+    _StreamingAIService.during_stream = staticmethod(edit_page)
+    events = _events(_stream(client, project_id, page_id))
+
+    assert events[-1][0] == 'done'
+    assert events[-1][1]['part'] == 'Renamed'
+    with app.app_context():
+        page = db.session.get(Page, page_id)
+        assert page.part == 'Renamed'
+        assert page.status == 'DESCRIPTION_GENERATED'
+
+
+def test_page_deleted_while_streaming(client, app, page_ids):
+    project_id, page_id = page_ids
+
+    def delete_page():
+        with db.engine.begin() as connection:
+            connection.execute(Page.__table__.delete().where(Page.id == page_id))
+
+    _StreamingAIService.during_stream = staticmethod(delete_page)
+    events = _events(_stream(client, project_id, page_id))
+
+    assert events[-1] == ('error', {'message': 'Page was deleted during generation'})
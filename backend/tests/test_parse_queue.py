@@ -0,0 +1,132 @@
+"""
+ParseQueue: global worker limit, per-project cap, FIFO order and queue positions
+"""
+import threading
+import time
+
+from services.parse_queue import ParseQueue
+
+
+class _Recorder:
+    """Parse job stand-in recording how many jobs run at once"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.running = {}
+        self.max_total = 0
+        self.max_per_project = {}
+        self.order = []
+        self.release = threading.Event()
+
+    def job(self, project, name, hold):
+        with self.lock:
+            self.running[project] = self.running.get(project, 0) + 1
+            self.max_total = max(self.max_total, sum(self.running.values()))
+            self.max_per_project[project] = max(self.max_per_project.get(project, 0), self.running[project])
+            self.order.append(name)
+        if hold:
+            self.release.wait(5)
+        else:
+            time.sleep(0.02)
+        with self.lock:
+            self.running[project] -= 1
+
+
+def _wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+def test_worker_and_project_limits():
+    queue = ParseQueue(max_workers=2, per_project_limit=1)
+    recorder = _Recorder()
+    recorder.release.set()
+    for i in range(6):
+        for project in ('a', 'b', 'c'):
+            queue.submit([f'{project}{i}'], project, recorder.job, project, f'{project}{i}', False)
+
+    assert _wait_for(lambda: len(recorder.order) == 18)
+    assert recorder.max_total <= 2
+    assert all(count == 1 for count in recorder.max_per_project.values())
+    # 同一项目内按提交顺序执行
+    for project in ('a', 'b', 'c'):
+        assert [n for n in recorder.order if n[0] == project] == [f'{project}{i}' for i in range(6)]
+
+
+def test_busy_project_does_not_block_other_projects():
+    queue = ParseQueue(max_workers=2, per_project_limit=1)
+    recorder = _Recorder()
+    queue.submit(['a0'], 'a', recorder.job, 'a', 'a0', True)
+    queue.submit(['a1'], 'a', recorder.job, 'a', 'a1', True)
+    queue.submit(['b0'], 'b', recorder.job, 'b', 'b0', True)
+
+    # a1 等待项目名额，b0 越过它先运行
+    assert _wait_for(lambda: recorder.order == ['a0', 'b0'])
+    assert queue.queue_position('a1') == 1
+    recorder.release.set()
+    assert _wait_for(lambda: len(recorder.order) == 3)
+
+
+def test_queue_position_counts_waiting_jobs():
+    queue = ParseQueue(max_workers=1, per_project_limit=1)
+    recorder = _Recorder()
+    queue.submit(['x'], 'p', recorder.job, 'p', 'x', True)
+    assert _wait_for(lambda: recorder.order == ['x'])
+
+    # 一个批次任务包含多个文件，它们的位置相同
+    queue.submit(['y1', 'y2'], 'p', recorder.job, 'p', 'y', True)
+    queue.submit(['z'], 'q', recorder.job, 'q', 'z', True)
+
+    assert queue.queue_position('x') is None
+    assert queue.queue_position('y1') == queue.queue_position('y2') == 1
+    assert queue.queue_position('z') == 2
+    assert queue.queue_position('unknown') is None
+    assert queue.queue_positions() == {'y1': 1, 'y2': 1, 'z': 2}
+    recorder.release.set()
+    assert _wait_for(lambda: len(recorder.order) == 3)
+
+
+def test_failing_job_releases_its_slot():
+    queue = ParseQueue(max_workers=1, per_project_limit=1)
+    done = threading.Event()
+
+    def fail():
+        raise RuntimeError('boom')
+
+    queue.submit(['bad'], 'p', fail)
+    queue.submit(['good'], 'p', done.set)
+    assert done.wait(5)
+
+
+def test_deferred_job_holds_its_slot_until_released():
+    queue = ParseQueue(max_workers=2, per_project_limit=1)
+    recorder = _Recorder()
+    recorder.release.set()
+    releases = []
+
+    def deferred_job(name, release):
+        # 结果由其他线程处理，任务函数本身立即返回
+        recorder.order.append(name)
+        releases.append(release)
+
+    queue.submit(['a0'], 'a', deferred_job, 'a0', deferred=True)
+    queue.submit(['a1'], 'a', recorder.job, 'a', 'a1', False)
+    queue.submit(['b0'], 'b', deferred_job, 'b0', deferred=True)
+    queue.submit(['c0'], 'c', recorder.job, 'c', 'c0', False)
+
+    # a0、b0 占满两个全局名额，a1 和 c0 都要等待
+    assert _wait_for(lambda: recorder.order == ['a0', 'b0'])
+    time.sleep(0.1)
+    assert recorder.order == ['a0', 'b0']
+    assert queue.queue_positions() == {'a1': 1, 'c0': 2}
+
+    releases[0]()
+    releases[0]()  # 重复释放无影响
+    assert _wait_for(lambda: recorder.order == ['a0', 'b0', 'a1', 'c0'])
+    assert _wait_for(lambda: queue._active == 1)
+    releases[1]()
+    assert _wait_for(lambda: queue._active == 0)
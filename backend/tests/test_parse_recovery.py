@@ -0,0 +1,29 @@
+"""
+Reference files left queued or parsing by a previous process are reset on startup
+"""
+from controllers.reference_file_controller import recover_interrupted_parsing
+from models import db, ReferenceFile
+
+
+def _add(status):
+    reference_file = ReferenceFile(filename=f'{status}.pdf', file_path=f'{status}.pdf',
+                                   file_size=1, file_type='pdf', parse_status=status)
+    db.session.add(reference_file)
+    return reference_file
+
+
+def test_recover_interrupted_parsing(app):
+    with app.app_context():
+        files = {status: _add(status) for status in ('pending', 'queued', 'parsing', 'completed')}
+        db.session.commit()
+        ids = {status: reference_file.id for status, reference_file in files.items()}
+
+    recover_interrupted_parsing(app)
+
+    with app.app_context():
+        status = {name: db.session.get(ReferenceFile, file_id) for name, file_id in ids.items()}
+        assert status['queued'].parse_status == 'pending'
+        assert status['parsing'].parse_status == 'failed'
+        assert status['parsing'].error_message
+        assert status['pending'].parse_status == 'pending'
+        assert status['completed'].parse_status == 'completed'
@@ -0,0 +1,201 @@
+"""
+Streaming PDF export: every supported input is written as a valid PDF whose
+pages show the original pixels at the original size
+"""
+import io
+import re
+import struct
+import zlib
+
+import pytest
+from PIL import Image
+
+from services.export_service import ExportService
+from services.pdf_writer import prepare_image
+
+
+def _gradient(mode, size=(24, 16)):
+    """Test image with a different value in every pixel"""
+    width, height = size
+    image = Image.new('RGB', size)
+    image.putdata([((x * 10) % 256, (y * 15) % 256, (x * y * 3) % 256)
+                   for y in range(height) for x in range(width)])
+    if mode == 'P':
+        return image.quantize(colors=16)
+    if mode == 'RGBA':
+        image = image.convert('RGBA')
+        image.putalpha(128)
+        return image
+    return image.convert(mode)
+
+
+def _png_chunk(chunk_type: bytes, data: bytes) -> bytes:
+    return struct.pack('>I', len(data)) + chunk_type + data + struct.pack('>I', zlib.crc32(chunk_type + data))
+
+
+def _png(width, height, color_type, bit_depth, data, palette=None, interlace=0) -> bytes:
+    """Assemble a PNG file from already filtered, zlib-compressed image data"""
+    header = struct.pack('>IIBBBBB', width, height, bit_depth, color_type, 0, 0, interlace)
+    chunks = _png_chunk(b'IHDR', header)
+    if palette:
+        chunks += _png_chunk(b'PLTE', palette)
+    return b'\x89PNG\r\n\x1a\n' + chunks + _png_chunk(b'IDAT', data) + _png_chunk(b'IEND', b'')
+
+
+def _interlaced_png(image: Image.Image) -> bytes:
+    """Encode an RGB image as an Adam7-interlaced PNG (Pillow only writes non-interlaced files)"""
+    width, height = image.size
+    pixels = image.tobytes()
+    passes = [(0, 0, 8, 8), (4, 0, 8, 8), (0, 4, 4, 8), (2, 0, 4, 4), (0, 2, 2, 4), (1, 0, 2, 2), (0, 1, 1, 2)]
+    raw = b''
+    for x0, y0, dx, dy in passes:
+        for y in range(y0, height, dy):
+            row = b''.join(pixels[(y * width + x) * 3:(y * width + x) * 3 + 3] for x in range(x0, width, dx))
+            if row:
+                raw += b'\x00' + row
+    return _png(width, height, 2, 8, zlib.compress(raw), interlace=1)
+
+
+def _read_pdf(data: bytes):
+    """
+    Minimal reader for the writer's output
+
+    Checks the cross-reference table and returns (MediaBox size, decoded image)
+    for every page. Predictor streams are turned back into PNG files so PIL does
+    the decoding.
+    """
+    assert data.startswith(b'%PDF-1.4\n')
+    xref_offset = int(re.search(rb'startxref\n(\d+)\n%%EOF\n$', data).group(1))
+    xref = data[xref_offset:]
+    assert xref.startswith(b'xref\n0 ')
+    size = int(re.match(rb'xref\n0 (\d+)\n', xref).group(1))
+    offsets = [int(line[:10]) for line in xref.split(b'\n')[3:3 + size - 1]]
+
+    objects = {}
+    for object_id, offset in enumerate(offsets, 1):
+        header = f"{object_id} 0 obj\n".encode('ascii')
+        assert data[offset:offset + len(header)] == header, f"xref offset of object {object_id} is wrong"
+        body = data[offset + len(header):]
+        body = body[:body.index(b'\nendobj\n')]
+        stream = None
+        if b'\nstream\n' in body:
+            body, stream = body.split(b'\nstream\n', 1)
+            length = int(re.search(rb'/Length (\d+) >>$', body).group(1))
+            assert stream[length:] == b'\nendstream'
+            stream = stream[:length]
+        objects[object_id] = (body.decode('latin-1'), stream)
+
+    root = int(re.search(r'/Root (\d+) 0 R', data[xref_offset:].decode('latin-1')).group(1))
+    pages_id = int(re.search(r'/Pages (\d+) 0 R', objects[root][0]).group(1))
+    pages_dict = objects[pages_id][0]
+    kids = [int(kid) for kid in re.findall(r'(\d+) 0 R', re.search(r'/Kids \[(.*?)\]', pages_dict).group(1))]
+    assert f'/Count {len(kids)}' in pages_dict
+
+    pages = []
+    for kid in kids:
+        page = objects[kid][0]
+        media_box = tuple(int(v) for v in re.search(r'/MediaBox \[0 0 (\d+) (\d+)\]', page).groups())
+        image_id = int(re.search(r'/Im0 (\d+) 0 R', page).group(1))
+        pages.append((media_box, _decode_image(*objects[image_id])))
+    return pages
+
+
+def _decode_image(entries: str, stream: bytes) -> Image.Image:
+    width = int(re.search(r'/Width (\d+)', entries).group(1))
+    height = int(re.search(r'/Height (\d+)', entries).group(1))
+    if '/DCTDecode' in entries:
+        return Image.open(io.BytesIO(stream))
+
+    bits = int(re.search(r'/BitsPerComponent (\d+)', entries).group(1))
+    indexed = re.search(r'/Indexed /DeviceRGB \d+ <([0-9a-f]*)>', entries)
+    if '/Predictor 15' in entries:
+        if indexed:
+            color_type, palette = 3, bytes.fromhex(indexed.group(1))
+        else:
+            color_type, palette = (0 if '/DeviceGray' in entries else 2), None
+        return Image.open(io.BytesIO(_png(width, height, color_type, bits, stream, palette)))
+
+    assert '/DeviceRGB' in entries and bits == 8
+    return Image.frombytes('RGB', (width, height), zlib.decompress(stream))
+
+
+def _export(tmp_path, files):
+    paths = []
+    for i, (suffix, data) in enumerate(files):
+        path = tmp_path / f'page{i}.{suffix}'
+        path.write_bytes(data)
+        paths.append(str(path))
+    return paths, _read_pdf(ExportService.create_pdf_from_images(paths, max_workers=2))
+
+
+def _encode(image: Image.Image, image_format: str, **params) -> bytes:
+    buffer = io.BytesIO()
+    image.save(buffer, format=image_format, **params)
+    return buffer.getvalue()
+
+
+@pytest.mark.parametrize('mode', ['RGB', 'P', 'L'])
+def test_png_idat_is_embedded_without_decoding(tmp_path, mode):
+    source = _gradient(mode)
+    paths, pages = _export(tmp_path, [('png', _encode(source, 'PNG'))])
+
+    assert '/Predictor 15' in prepare_image(paths[0]).entries
+    (media_box, image), = pages
+    assert media_box == source.size
+    assert image.convert('RGB').tobytes() == source.convert('RGB').tobytes()
+
+
+@pytest.mark.parametrize('mode', ['RGB', 'L'])
+def test_jpeg_bytes_are_embedded_as_they_are(tmp_path, mode):
+    data = _encode(_gradient(mode), 'JPEG', quality=90)
+    paths, pages = _export(tmp_path, [('jpg', data)])
+
+    prepared = prepare_image(paths[0])
+    assert '/DCTDecode' in prepared.entries and prepared.data == data
+    (media_box, image), = pages
+    assert media_box == (24, 16)
+    assert image.mode == mode
+
+
+@pytest.mark.parametrize('name, suffix, data', [
+    ('rgba png', 'png', lambda: _encode(_gradient('RGBA'), 'PNG')),
+    ('interlaced png', 'png', lambda: _interlaced_png(_gradient('RGB'))),
+    ('16-bit png', 'png', lambda: _encode(_gradient('L').convert('I;16'), 'PNG')),
+    ('webp', 'webp', lambda: _encode(_gradient('RGB'), 'WEBP', lossless=True)),
+    ('bmp', 'bmp', lambda: _encode(_gradient('RGB'), 'BMP')),
+])
+def test_other_inputs_are_decoded_to_rgb(tmp_path, name, suffix, data):
+    raw = data()
+    paths, pages = _export(tmp_path, [(suffix, raw)])
+
+    assert prepare_image(paths[0]).entries.startswith('/ColorSpace /DeviceRGB /BitsPerComponent 8 /Filter /FlateDecode')
+    (media_box, image), = pages
+    with Image.open(io.BytesIO(raw)) as source:
+        expected = source.convert('RGB')
+    assert media_box == expected.size
+    assert image.tobytes() == expected.tobytes()
+
+
+def test_mixed_pages_keep_their_order_and_sizes(tmp_path):
+    files = [
+        ('jpg', _encode(_gradient('RGB', (30, 20)), 'JPEG')),
+        ('png', _encode(_gradient('P', (10, 40)), 'PNG')),
+        ('png', _encode(_gradient('RGBA', (16, 9)), 'PNG')),
+        ('webp', _encode(_gradient('RGB', (8, 8)), 'WEBP')),
+        ('png', _encode(_gradient('L', (5, 7)), 'PNG')),
+    ]
+    _, pages = _export(tmp_path, files)
+
+    assert [media_box for media_box, _ in pages] == [(30, 20), (10, 40), (16, 9), (8, 8), (5, 7)]
+    assert [image.size for _, image in pages] == [(30, 20), (10, 40), (16, 9), (8, 8), (5, 7)]
+
+
+def test_missing_images_are_skipped_and_empty_export_fails(tmp_path):
+    existing = tmp_path / 'page.png'
+    existing.write_bytes(_encode(_gradient('RGB'), 'PNG'))
+
+    pdf = ExportService.create_pdf_from_images([str(tmp_path / 'missing.png'), str(existing)])
+    assert len(_read_pdf(pdf)) == 1
+
+    with pytest.raises(ValueError):
+        ExportService.create_pdf_from_images([str(tmp_path / 'missing.png')])
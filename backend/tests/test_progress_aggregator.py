@@ -0,0 +1,78 @@
+"""
+ProgressAggregator: page results and task progress are written in batches,
+on a timer, and in a final flush
+"""
+import time
+
+import pytest
+
+from models import db, Project, Page, Task
+from services.task_manager import ProgressAggregator
+
+
+@pytest.fixture
+def task_pages(app):
+    with app.app_context():
+        project = Project(creation_type='idea', idea_prompt='test')
+        db.session.add(project)
+        db.session.commit()
+        pages = [Page(project_id=project.id, order_index=i) for i in range(4)]
+        task = Task(project_id=project.id, task_type='GENERATE_IMAGES', status='PROCESSING')
+        db.session.add_all(pages + [task])
+        db.session.commit()
+        return task.id, [page.id for page in pages]
+
+
+def _stored(task_id, page_ids):
+    """Statuses and progress as stored in the database"""
+    db.session.expire_all()
+    statuses = [db.session.get(Page, page_id).status for page_id in page_ids]
+    return statuses, db.session.get(Task, task_id).get_progress()
+
+
+def test_flushes_when_batch_is_full(app, task_pages):
+    task_id, page_ids = task_pages
+    with app.app_context():
+        progress = ProgressAggregator(task_id, total=4, flush_interval=3600, flush_batch_size=2)
+
+        progress.record_page(page_ids[0], 'COMPLETED', generated_image_path='a.png')
+        assert _stored(task_id, page_ids)[0] == ['DRAFT'] * 4
+
+        progress.record_page(page_ids[1], 'FAILED', failed=True)
+        statuses, task_progress = _stored(task_id, page_ids)
+        assert statuses == ['COMPLETED', 'FAILED', 'DRAFT', 'DRAFT']
+        assert task_progress == {'total': 4, 'completed': 1, 'failed': 1}
+        assert db.session.get(Page, page_ids[0]).generated_image_path == 'a.png'
+
+
+def test_flush_if_due_writes_results_after_the_interval(app, task_pages):
+    task_id, page_ids = task_pages
+    with app.app_context():
+        progress = ProgressAggregator(task_id, total=4, flush_interval=0.2, flush_batch_size=10)
+        progress.flush()
+
+        progress.record_page(page_ids[0], 'DESCRIPTION_GENERATED', description_content={'text': 'hi'})
+        progress.flush_if_due()
+        assert _stored(task_id, page_ids)[0][0] == 'DRAFT'
+
+        # 没有新的结果到达，只靠定时检查也会写入
+        time.sleep(0.25)
+        progress.flush_if_due()
+        statuses, task_progress = _stored(task_id, page_ids)
+        assert statuses[0] == 'DESCRIPTION_GENERATED'
+        assert db.session.get(Page, page_ids[0]).get_description_content() == {'text': 'hi'}
+        assert task_progress == {'total': 4, 'completed': 1, 'failed': 0}
+
+
+def test_final_flush_writes_the_remainder(app, task_pages):
+    task_id, page_ids = task_pages
+    with app.app_context():
+        progress = ProgressAggregator(task_id, total=4, completed=1, flush_interval=3600, flush_batch_size=10)
+        for page_id in page_ids[1:]:
+            progress.record_page(page_id, 'COMPLETED')
+        assert _stored(task_id, page_ids)[0] == ['DRAFT'] * 4
+
+        progress.flush()
+        statuses, task_progress = _stored(task_id, page_ids)
+        assert statuses == ['DRAFT', 'COMPLETED', 'COMPLETED', 'COMPLETED']
+        assert task_progress == {'total': 4, 'completed': 4, 'failed': 0}
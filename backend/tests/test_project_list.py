@@ -0,0 +1,113 @@
+"""
+GET /api/projects: single-query summaries by default, full pages with view=full
+"""
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import event
+
+from controllers.project_controller import project_bp
+from models import db, Project, Page
+
+
+@pytest.fixture
+def client(app):
+    app.register_blueprint(project_bp)
+    return app.test_client()
+
+
+@pytest.fixture
+def project_ids(app):
+    """Three projects, newest first: one with pages, one without, one with descriptions only"""
+    with app.app_context():
+        now = datetime(2026, 1, 1)
+        projects = [Project(creation_type='idea', idea_prompt=f'p{i}', updated_at=now - timedelta(hours=i))
+                    for i in range(3)]
+        db.session.add_all(projects)
+        db.session.commit()
+
+        with_images, _, with_descriptions = projects
+        pages = [Page(project_id=with_images.id, order_index=i) for i in range(3)]
+        pages[0].set_outline_content({'title': 'Opening'})
+        # 第一页没有图片，封面取第一张已生成图片的页面
+        pages[1].generated_image_path = f'{with_images.id}/pages/second_v2.png'
+        pages[1].updated_at = now
+        pages[2].generated_image_path = f'{with_images.id}/pages/third_v1.png'
+        described = Page(project_id=with_descriptions.id, order_index=0)
+        described.set_description_content({'text': 'hello'})
+        db.session.add_all(pages + [described])
+        db.session.commit()
+        return [project.id for project in projects]
+
+
+def _count_queries(app):
+    statements = []
+    with app.app_context():
+        engine = db.engine
+
+    def before_execute(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    event.listen(engine, 'before_cursor_execute', before_execute)
+    return statements, lambda: event.remove(engine, 'before_cursor_execute', before_execute)
+
+
+def test_summary_view_returns_page_statistics_in_one_query(client, app, project_ids):
+    statements, stop = _count_queries(app)
+    try:
+        response = client.get('/api/projects')
+    finally:
+        stop()
+
+    assert response.status_code == 200
+    data = response.get_json()['data']
+    assert len(statements) == 1
+    assert data['total'] == 3
+    assert [p['project_id'] for p in data['projects']] == project_ids
+
+    with_images, empty, with_descriptions = data['projects']
+    assert 'pages' not in with_images
+    assert with_images['page_count'] == 3
+    assert with_images['first_page_title'] == 'Opening'
+    assert with_images['has_images'] is True
+    assert with_images['has_descriptions'] is False
+    assert with_images['cover_image_url'] == f'/files/{project_ids[0]}/pages/second_v2.png'
+    assert with_images['cover_updated_at'] == '2026-01-01T00:00:00'
+
+    assert empty['page_count'] == 0
+    assert empty['first_page_title'] is None
+    assert empty['has_images'] is False
+    assert empty['cover_image_url'] is None
+    assert empty['cover_updated_at'] is None
+
+    assert with_descriptions['page_count'] == 1
+    assert with_descriptions['has_descriptions'] is True
+    assert with_descriptions['cover_image_url'] is None
+
+
+def test_pagination_keeps_the_total(client, project_ids):
+    data = client.get('/api/projects?limit=1&offset=1').get_json()['data']
+    assert [p['project_id'] for p in data['projects']] == [project_ids[1]]
+    assert data['total'] == 3
+
+    # 偏移量超出范围时没有返回行，总数仍然正确
+    data = client.get('/api/projects?offset=10').get_json()['data']
+    assert data == {'projects': [], 'total': 3}
+
+
+def test_full_view_includes_pages(client, project_ids):
+    data = client.get('/api/projects?view=full').get_json()['data']
+
+    assert data['total'] == 3
+    pages = data['projects'][0]['pages']
+    assert [page['order_index'] for page in pages] == [0, 1, 2]
+    assert pages[1]['generated_image_url'] == f'/files/{project_ids[0]}/pages/second_v2.png'
+    assert data['projects'][1]['pages'] == []
+    assert 'page_count' not in data['projects'][0]
+
+
+def test_unknown_view_is_rejected(client, project_ids):
+    response = client.get('/api/projects?view=compact')
+
+    assert response.status_code == 400
+    assert response.get_json()['success'] is False
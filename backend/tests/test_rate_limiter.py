@@ -0,0 +1,129 @@
+"""
+ProviderRateLimiter slots shared by threads and coroutines, and RetryPolicy
+holding the slot per attempt only
+"""
+import asyncio
+import threading
+import time
+
+from services.ai_providers.rate_limiter import ProviderRateLimiter
+from services.ai_providers.retry_policy import RetryPolicy
+
+
+class _Transient(Exception):
+    status_code = 503
+
+
+def test_threads_and_coroutines_share_slots():
+    limiter = ProviderRateLimiter('test', max_concurrency=2)
+    lock = threading.Lock()
+    state = {'running': 0, 'max': 0}
+
+    def enter():
+        with lock:
+            state['running'] += 1
+            state['max'] = max(state['max'], state['running'])
+
+    def leave():
+        with lock:
+            state['running'] -= 1
+
+    def thread_call():
+        with limiter.acquire():
+            enter()
+            time.sleep(0.05)
+            leave()
+
+    async def coroutine_call():
+        async with limiter.acquire_async():
+            enter()
+            await asyncio.sleep(0.05)
+            leave()
+
+    async def run_coroutines():
+        await asyncio.gather(*[coroutine_call() for _ in range(6)])
+
+    threads = [threading.Thread(target=thread_call) for _ in range(6)]
+    threads.append(threading.Thread(target=asyncio.run, args=(run_coroutines(),)))
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(10)
+
+    assert state == {'running': 0, 'max': 2}
+    assert limiter._available == 2 and not limiter._waiters
+
+
+def test_slots_are_handed_over_in_order():
+    limiter = ProviderRateLimiter('test', max_concurrency=1)
+    order = []
+
+    def call(name):
+        with limiter.acquire():
+            order.append(name)
+            time.sleep(0.02)
+
+    with limiter.acquire():
+        threads = []
+        for name in 'abcd':
+            thread = threading.Thread(target=call, args=(name,))
+            thread.start()
+            threads.append(thread)
+            # 等待线程进入等待队列，保证先后顺序
+            while len(limiter._waiters) < len(threads):
+                time.sleep(0.001)
+    for thread in threads:
+        thread.join(5)
+
+    assert order == list('abcd')
+
+
+def test_cancelled_coroutine_gives_up_its_place():
+    limiter = ProviderRateLimiter('test', max_concurrency=1)
+
+    async def main():
+        async with limiter.acquire_async():
+            waiter = asyncio.ensure_future(limiter.acquire_async().__aenter__())
+            await asyncio.sleep(0.01)
+            waiter.cancel()
+            await asyncio.gather(waiter, return_exceptions=True)
+        async with limiter.acquire_async():
+            pass
+
+    asyncio.run(asyncio.wait_for(main(), 5))
+    assert limiter._available == 1 and not limiter._waiters
+
+
+def test_retry_backoff_does_not_hold_the_slot():
+    limiter = ProviderRateLimiter('test', max_concurrency=1)
+    policy = RetryPolicy(max_attempts=2, base_delay=0, limiter=limiter)
+    held_during_backoff = []
+    attempts = []
+
+    def flaky():
+        attempts.append(limiter._available)
+        if len(attempts) == 1:
+            raise _Transient('busy')
+        return 'ok'
+
+    policy._wait = lambda state: held_during_backoff.append(limiter._available) or 0
+    assert policy.call(flaky) == 'ok'
+    assert attempts == [0, 0]
+    assert held_during_backoff == [1]
+    assert limiter._available == 1
+
+
+def test_stream_holds_slot_until_closed():
+    limiter = ProviderRateLimiter('test', max_concurrency=1)
+    policy = RetryPolicy(max_attempts=1, limiter=limiter)
+
+    stream = policy.call_stream(lambda: iter(['a', 'b', 'c']))
+    assert next(stream) == 'a'
+    assert limiter._available == 0
+    assert list(stream) == ['b', 'c']
+    assert limiter._available == 1
+
+    stream = policy.call_stream(lambda: iter(['a', 'b']))
+    next(stream)
+    stream.close()
+    assert limiter._available == 1
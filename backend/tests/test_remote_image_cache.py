@@ -0,0 +1,181 @@
+"""
+RemoteImageCache with a mocked requests.get: freshness, 304 revalidation,
+size limits, single-flight downloads and LRU eviction
+"""
+import io
+import os
+import threading
+import time
+
+import pytest
+import requests
+from PIL import Image
+
+from services import remote_image_cache
+from services.remote_image_cache import RemoteImageCache, RemoteImageError
+
+
+def _png(color, size=(16, 16)) -> bytes:
+    buffer = io.BytesIO()
+    Image.new('RGB', size, color).save(buffer, format='PNG')
+    return buffer.getvalue()
+
+
+class _Response:
+    """Minimal streamed requests.Response"""
+
+    def __init__(self, status_code=200, body=b'', headers=None, chunk_size=1024):
+        self.status_code = status_code
+        self.body = body
+        self.headers = headers or {}
+        self.chunk_size = chunk_size
+        self.chunks_read = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.HTTPError(f'{self.status_code} error')
+
+    def iter_content(self, chunk_size):
+        for start in range(0, len(self.body), self.chunk_size):
+            self.chunks_read += 1
+            yield self.body[start:start + self.chunk_size]
+
+
+@pytest.fixture
+def server(monkeypatch):
+    """Replace requests.get; tests queue responses and inspect the recorded calls"""
+
+    class Server:
+        def __init__(self):
+            self.responses = []
+            self.calls = []
+            self.delay = 0.0
+
+        def get(self, url, timeout=None, stream=False, headers=None):
+            self.calls.append((url, dict(headers or {})))
+            time.sleep(self.delay)
+            response = self.responses.pop(0)
+            if isinstance(response, Exception):
+                raise response
+            return response
+
+    fake = Server()
+    monkeypatch.setattr(remote_image_cache.requests, 'get', fake.get)
+    return fake
+
+
+def test_fresh_entries_are_served_without_a_request(tmp_path, server):
+    cache = RemoteImageCache(str(tmp_path), fresh_seconds=3600)
+    image = _png('red')
+    server.responses.append(_Response(body=image))
+
+    assert cache.get_bytes('https://example.com/a.png') == image
+    assert cache.get_bytes('https://example.com/a.png') == image
+    assert len(server.calls) == 1
+    assert (cache.misses, cache.hits) == (1, 1)
+
+
+def test_stale_entries_are_revalidated(tmp_path, server):
+    cache = RemoteImageCache(str(tmp_path), fresh_seconds=0)
+    url = 'https://example.com/a.png'
+    image = _png('red')
+    server.responses.append(_Response(body=image, headers={
+        'ETag': '"v1"', 'Last-Modified': 'Wed, 01 Jan 2026 00:00:00 GMT'}))
+    cache.get_bytes(url)
+
+    # 304 保留已缓存的内容
+    server.responses.append(_Response(status_code=304))
+    assert cache.get_bytes(url) == image
+    assert server.calls[1][1] == {'If-None-Match': '"v1"', 'If-Modified-Since': 'Wed, 01 Jan 2026 00:00:00 GMT'}
+    assert cache.revalidations == 1
+
+    # 内容变化时替换缓存
+    updated = _png('blue')
+    server.responses.append(_Response(body=updated, headers={'ETag': '"v2"'}))
+    assert cache.get_bytes(url) == updated
+    server.responses.append(_Response(status_code=304))
+    assert cache.get_bytes(url) == updated
+    assert server.calls[3][1] == {'If-None-Match': '"v2"'}
+
+    # 重新验证失败时继续使用缓存
+    server.responses.append(requests.ConnectionError('offline'))
+    assert cache.get_bytes(url) == updated
+
+
+def test_oversized_and_invalid_images_are_rejected(tmp_path, server):
+    cache = RemoteImageCache(str(tmp_path), max_image_bytes=4096)
+
+    server.responses.append(_Response(body=b'', headers={'Content-Length': '5000'}))
+    with pytest.raises(RemoteImageError, match='limit'):
+        cache.get_bytes('https://example.com/declared.png')
+
+    # 没有 Content-Length 时在读取过程中超过上限即停止
+    streamed = _Response(body=b'x' * 20000, chunk_size=1024)
+    server.responses.append(streamed)
+    with pytest.raises(RemoteImageError, match='limit'):
+        cache.get_bytes('https://example.com/streamed.png')
+    assert streamed.chunks_read == 5
+
+    server.responses.append(_Response(body=b'<html>not found</html>'))
+    with pytest.raises(RemoteImageError, match='not a valid image'):
+        cache.get_bytes('https://example.com/page.png')
+
+    server.responses.append(_Response(status_code=404))
+    with pytest.raises(RemoteImageError):
+        cache.get_bytes('https://example.com/missing.png')
+
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_concurrent_requests_share_one_download(tmp_path, server):
+    cache = RemoteImageCache(str(tmp_path))
+    image = _png('green')
+    server.responses.append(_Response(body=image))
+    server.delay = 0.2
+    barrier = threading.Barrier(5)
+    results = []
+
+    def fetch():
+        barrier.wait()
+        results.append(cache.get_bytes('https://example.com/shared.png'))
+
+    threads = [threading.Thread(target=fetch) for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert results == [image] * 5
+    assert len(server.calls) == 1
+    assert (cache.misses, cache.hits) == (1, 4)
+    assert cache._flights == {}
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path, server):
+    images = {name: _png(color, (64, 64)) for name, color in
+              [('a', 'red'), ('b', 'green'), ('c', 'blue')]}
+    cache = RemoteImageCache(str(tmp_path), max_bytes=sum(len(data) for data in images.values()) - 1)
+    urls = {name: f'https://example.com/{name}.png' for name in images}
+
+    for name in ('a', 'b'):
+        server.responses.append(_Response(body=images[name]))
+        cache.get_bytes(urls[name])
+    now = time.time()
+    for age, name in ((20, 'a'), (10, 'b')):
+        os.utime(cache._data_path(cache.make_key(urls[name])), (now - age, now - age))
+
+    # 访问 a 后，b 成为最久未使用的条目
+    cache.get_bytes(urls['a'])
+    server.responses.append(_Response(body=images['c']))
+    cache.get_bytes(urls['c'])
+
+    remaining = {name for name, url in urls.items() if cache._data_path(cache.make_key(url)).exists()}
+    assert remaining == {'a', 'c'}
+    assert not cache._meta_path(cache.make_key(urls['b'])).exists()
+    assert len(server.calls) == 3
@@ -0,0 +1,126 @@
+"""
+RetryPolicy: transient error classification, Retry-After handling and deadline
+"""
+import asyncio
+import time
+from email.utils import formatdate
+
+import pytest
+
+from services.ai_providers.retry_policy import RetryPolicy, classify_error
+
+
+class _Response:
+    def __init__(self, status_code, headers=None):
+        self.status_code = status_code
+        self.headers = headers or {}
+
+
+class _HttpError(Exception):
+    def __init__(self, status_code, headers=None, message='error'):
+        super().__init__(message)
+        self.response = _Response(status_code, headers)
+
+
+class _Flaky:
+    """Raises the given errors in turn, then returns 'ok'"""
+
+    def __init__(self, *errors):
+        self.errors = list(errors)
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        return 'ok'
+
+
+def _record_sleeps(policy):
+    sleeps = []
+    policy._log_retry = lambda state, description: sleeps.append(state.upcoming_sleep)
+    return sleeps
+
+
+def test_classify_error():
+    assert classify_error(_HttpError(429, {'Retry-After': '7'})) == (True, 7.0)
+    assert classify_error(_HttpError(503)) == (True, None)
+    assert classify_error(_HttpError(400)) == (False, None)
+    assert classify_error(TimeoutError()) == (True, None)
+    assert classify_error(ValueError('bad prompt')) == (False, None)
+
+    # Gemini 在错误详情中给出 retryDelay
+    error = _HttpError(429, message="RESOURCE_EXHAUSTED {'retryDelay': '12s'}")
+    assert classify_error(error) == (True, 12.0)
+
+    # 被包装的 SDK 异常按原因链识别
+    try:
+        try:
+            raise _HttpError(502)
+        except _HttpError as e:
+            raise Exception('provider failed') from e
+    except Exception as wrapped:
+        assert classify_error(wrapped) == (True, None)
+
+
+def test_retry_after_http_date():
+    retryable, delay = classify_error(_HttpError(503, {'Retry-After': formatdate(time.time() + 30, usegmt=True)}))
+    assert retryable and 25 <= delay <= 30
+
+
+def test_retry_after_overrides_backoff():
+    policy = RetryPolicy(max_attempts=3, base_delay=10, max_delay=10, deadline=None)
+    sleeps = _record_sleeps(policy)
+    fn = _Flaky(_HttpError(429, {'retry-after': '0.05'}), _HttpError(503, {'Retry-After': '0'}))
+
+    assert policy.call(fn) == 'ok'
+    assert fn.calls == 3
+    assert sleeps == [0.05, 0.0]
+
+
+def test_non_retryable_error_fails_immediately():
+    policy = RetryPolicy(max_attempts=4, base_delay=0)
+    fn = _Flaky(_HttpError(400))
+
+    with pytest.raises(_HttpError):
+        policy.call(fn)
+    assert fn.calls == 1
+
+
+def test_attempts_are_capped():
+    policy = RetryPolicy(max_attempts=2, base_delay=0, deadline=None)
+    fn = _Flaky(*[_HttpError(503, {'Retry-After': '0'}) for _ in range(5)])
+
+    with pytest.raises(_HttpError):
+        policy.call(fn)
+    assert fn.calls == 2
+
+
+def test_deadline_stops_retries_that_would_start_too_late():
+    policy = RetryPolicy(max_attempts=10, base_delay=0, deadline=1.0)
+    sleeps = _record_sleeps(policy)
+    fn = _Flaky(_HttpError(429, {'Retry-After': '5'}))
+
+    started = time.monotonic()
+    with pytest.raises(_HttpError):
+        policy.call(fn)
+    assert fn.calls == 1
+    assert sleeps == []
+    assert time.monotonic() - started < 1.0
+
+    # 单次调用可覆盖策略的时限
+    fn = _Flaky(_HttpError(429, {'Retry-After': '2'}))
+    with pytest.raises(_HttpError):
+        policy.call(fn, deadline=0.5)
+    assert fn.calls == 1
+
+
+def test_async_call_retries():
+    policy = RetryPolicy(max_attempts=3, base_delay=0, deadline=None)
+    fn = _Flaky(_HttpError(503, {'Retry-After': '0'}))
+
+    async def attempt():
+        return fn()
+
+    assert asyncio.run(policy.call_async(attempt)) == 'ok'
+    assert fn.calls == 2
@@ -0,0 +1,51 @@
+"""
+Task and page changes are published to project subscribers after commit
+"""
+import queue
+
+from models import db, Project, Task, Page
+from services.task_events import task_events
+
+
+def _drain(subscriber):
+    events = []
+    while True:
+        try:
+            events.append(subscriber.get_nowait())
+        except queue.Empty:
+            return events
+
+
+def test_task_creation_update_and_page_events(app):
+    with app.app_context():
+        project = Project(creation_type='idea', idea_prompt='test')
+        db.session.add(project)
+        db.session.commit()
+        subscriber = task_events.subscribe(project.id)
+        try:
+            task = Task(project_id=project.id, task_type='GENERATE_IMAGES', status='PENDING')
+            db.session.add(task)
+            db.session.commit()
+            events = _drain(subscriber)
+            assert [(kind, data['task_id'], data['status']) for kind, data in events] == [
+                ('task', task.id, 'PENDING')
+            ]
+
+            task.status = 'PROCESSING'
+            page = Page(project_id=project.id, order_index=0, status='GENERATING')
+            db.session.add(page)
+            db.session.commit()
+            events = _drain(subscriber)
+            assert ('task', 'PROCESSING') in [(kind, data.get('status')) for kind, data in events]
+            page_events = [data for kind, data in events if kind == 'page']
+            assert [data['page_id'] for data in page_events] == [page.id]
+            assert page_events[0]['status'] == 'GENERATING'
+            assert page_events[0]['updated_at'] == page.updated_at.isoformat()
+
+            # 回滚的改动不发布
+            task.status = 'FAILED'
+            db.session.flush()
+            db.session.rollback()
+            assert _drain(subscriber) == []
+        finally:
+            task_events.unsubscribe(project.id, subscriber)
@@ -0,0 +1,142 @@
+"""
+Lease-based task queue: atomic claim, re-claim after expiry and lease renewal
+while a shutdown drains running jobs
+"""
+import threading
+import time
+from datetime import datetime, timedelta
+
+from models import db, Project, Task, TaskJob
+from services.task_manager import TaskManager
+
+
+def _manager(app, worker_id, lease_seconds=60):
+    manager = TaskManager(max_workers=1, lease_seconds=lease_seconds, poll_interval=0.05)
+    manager.app = app
+    manager.mode = 'external'  # enqueue 只写入队列，不自动启动线程
+    manager.worker_id = worker_id
+    return manager
+
+
+def _create_task(app, manager, job_type='TEST', **payload):
+    with app.app_context():
+        project = Project(creation_type='idea', idea_prompt='test')
+        db.session.add(project)
+        db.session.commit()
+        task = Task(project_id=project.id, task_type=job_type, status='PENDING')
+        db.session.add(task)
+        db.session.commit()
+        manager.enqueue(task.id, job_type, **payload)
+        return task.id
+
+
+def _job(app, task_id):
+    with app.app_context():
+        return db.session.get(TaskJob, task_id)
+
+
+def test_claim_is_exclusive(app):
+    first = _manager(app, 'worker-a')
+    second = _manager(app, 'worker-b')
+    task_id = _create_task(app, first, value=1)
+
+    claimed = first._claim_next_job()
+    assert claimed == (task_id, 'TEST', {'value': 1}, 1, first.max_attempts)
+    assert second._claim_next_job() is None
+    assert _job(app, task_id).lease_owner == 'worker-a'
+
+
+def test_expired_lease_is_reclaimed_and_stale_owner_keeps_job(app):
+    first = _manager(app, 'worker-a')
+    second = _manager(app, 'worker-b')
+    task_id = _create_task(app, first)
+    assert first._claim_next_job() is not None
+
+    with app.app_context():
+        job = db.session.get(TaskJob, task_id)
+        job.lease_expires_at = datetime.utcnow() - timedelta(seconds=1)
+        db.session.commit()
+
+    claimed = second._claim_next_job()
+    assert claimed is not None
+    assert claimed[3] == 2  # attempts
+
+    # 原 worker 结束时租约已被接管，不能删除新 worker 的任务
+    first._finish_job(task_id)
+    job = _job(app, task_id)
+    assert job is not None and job.lease_owner == 'worker-b'
+
+    second._finish_job(task_id)
+    assert _job(app, task_id) is None
+
+
+def test_job_over_max_attempts_fails_task(app):
+    manager = _manager(app, 'worker-a')
+    manager.max_attempts = 1
+    manager.register('TEST', lambda task_id, app: None)
+    task_id = _create_task(app, manager)
+
+    with app.app_context():
+        db.session.get(TaskJob, task_id).attempts = 1
+        db.session.commit()
+
+    manager._run_job(*manager._claim_next_job())
+    with app.app_context():
+        assert db.session.get(Task, task_id).status == 'FAILED'
+        assert db.session.get(TaskJob, task_id) is None
+
+
+def test_shutdown_keeps_renewing_leases_until_jobs_finish(app):
+    started = threading.Event()
+    manager = _manager(app, None, lease_seconds=2)
+    manager.max_workers = 1
+
+    def slow_handler(task_id, app):
+        started.set()
+        time.sleep(3.5)
+
+    manager.register('TEST', slow_handler)
+    task_id = _create_task(app, manager)
+    manager.start()
+    assert started.wait(5)
+
+    shutdown = threading.Thread(target=manager.shutdown, kwargs={'wait': True})
+    shutdown.start()
+
+    # 超过一个租约周期后，另一个 worker 仍不能领取正在收尾的任务
+    other = _manager(app, 'worker-b', lease_seconds=2)
+    time.sleep(2.5)
+    assert other._claim_next_job() is None
+
+    shutdown.join(10)
+    assert not shutdown.is_alive()
+    assert _job(app, task_id) is None
+
+
+def test_restart_keeps_worker_id_for_running_jobs(app):
+    started = threading.Event()
+    release = threading.Event()
+    manager = _manager(app, None)
+
+    def blocking_handler(task_id, app):
+        started.set()
+        release.wait(10)
+
+    manager.register('TEST', blocking_handler)
+    task_id = _create_task(app, manager)
+    manager.start()
+    assert started.wait(5)
+    worker_id = manager.worker_id
+
+    manager.shutdown(wait=False)
+    manager.start()
+    # 重启前领取的任务仍归本进程所有，心跳续租和收尾删除都按原 id 进行
+    assert manager.worker_id == worker_id
+    assert _job(app, task_id).lease_owner == worker_id
+
+    release.set()
+    deadline = time.time() + 5
+    while _job(app, task_id) is not None and time.time() < deadline:
+        time.sleep(0.05)
+    assert _job(app, task_id) is None
+    manager.shutdown(wait=True)
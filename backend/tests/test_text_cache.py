@@ -0,0 +1,44 @@
+"""
+Text response cache: malformed JSON responses are not replayed on retry
+"""
+from services.ai_providers.text import TextProvider, TextResponseCache, CachedTextProvider
+from services.ai_service import AIService
+
+
+class _Scripted(TextProvider):
+    """Returns the given responses in turn"""
+
+    def __init__(self, *responses):
+        self.responses = list(responses)
+        self.calls = 0
+
+    def generate_text(self, prompt, thinking_budget=1000):
+        self.calls += 1
+        return self.responses.pop(0)
+
+
+def test_cache_delete(tmp_path):
+    cache = TextResponseCache(str(tmp_path / 'cache.db'))
+    key = cache.make_key('m', 'prompt', 1000)
+    cache.set(key, 'm', 'answer')
+    assert cache.get(key) == 'answer'
+
+    cache.delete(key)
+    assert cache.get(key) is None
+
+
+def test_generate_json_invalidates_malformed_cached_response(tmp_path):
+    cache = TextResponseCache(str(tmp_path / 'cache.db'))
+    provider = CachedTextProvider(_Scripted('{"title": "bro', '{"title": "ok"}'), cache)
+    # 预先缓存一个无法解析的响应，模拟之前请求留下的坏数据
+    key = cache.make_key(provider.model, 'outline prompt', 1000)
+    cache.set(key, provider.model, '{"title": "cached and broken')
+
+    service = AIService(text_provider=provider, image_provider=object())
+
+    assert service.generate_json('outline prompt') == {'title': 'ok'}
+    assert provider.provider.calls == 2
+    # 有效响应被缓存，下次直接命中
+    assert cache.get(key) == '{"title": "ok"}'
+    assert service.generate_json('outline prompt') == {'title': 'ok'}
+    assert provider.provider.calls == 2
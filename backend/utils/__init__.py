@@ -6,10 +6,18 @@ from .response import (
     not_found, 
     invalid_status,
     ai_service_error,
-    rate_limit_error
+    rate_limit_error,
+    sse_event,
+    sse_response
 )
 from .validators import validate_project_status, validate_page_status, allowed_file
-from .path_utils import convert_mineru_path_to_local, find_mineru_file_with_prefix, find_file_with_prefix
+from .path_utils import (
+    convert_mineru_path_to_local,
+    find_mineru_file_with_prefix,
+    find_file_with_prefix,
+    resolve_mineru_file,
+    write_mineru_manifest
+)
 
 __all__ = [
     'success_response',
@@ -19,11 +27,15 @@ __all__ = [
     'invalid_status',
     'ai_service_error',
     'rate_limit_error',
+    'sse_event',
+    'sse_response',
     'validate_project_status',
     'validate_page_status',
     'allowed_file',
     'convert_mineru_path_to_local',
     'find_mineru_file_with_prefix',
-    'find_file_with_prefix'
+    'find_file_with_prefix',
+    'resolve_mineru_file',
+    'write_mineru_manifest'
 ]
 
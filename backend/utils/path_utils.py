@@ -2,12 +2,90 @@
 Path utilities for handling MinerU file paths and prefix matching
 """
 import os
+import json
 import logging
+import threading
+from collections import OrderedDict
 from pathlib import Path
-from typing import Optional
+from typing import Dict, Optional
 
 logger = logging.getLogger(__name__)
 
+# 解析时写入每个 extract 目录的短路径清单：{短路径: 实际相对路径}
+MINERU_MANIFEST_NAME = '.manifest.json'
+# 内存中保留的清单数量
+_MANIFEST_CACHE_SIZE = 256
+_manifest_cache: 'OrderedDict[str, Dict[str, str]]' = OrderedDict()
+_manifest_lock = threading.Lock()
+
+
+def write_mineru_manifest(extract_dir: Path, mapping: Dict[str, str]):
+    """
+    保存 MinerU 短路径到实际文件的映射，之后的查找不再需要扫描目录
+    
+    Args:
+        extract_dir: 解析结果目录 uploads/mineru_files/{extract_id}
+        mapping: 短路径（/files/mineru/{extract_id}/ 之后的部分）-> 相对 extract_dir 的实际路径
+    """
+    manifest_path = Path(extract_dir) / MINERU_MANIFEST_NAME
+    tmp_path = manifest_path.with_name(manifest_path.name + '.tmp')
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(mapping, f, ensure_ascii=False)
+    os.replace(tmp_path, manifest_path)
+    _remember_manifest(str(Path(extract_dir).resolve()), dict(mapping))
+
+
+def _remember_manifest(key: str, mapping: Dict[str, str]):
+    with _manifest_lock:
+        _manifest_cache[key] = mapping
+        _manifest_cache.move_to_end(key)
+        while len(_manifest_cache) > _MANIFEST_CACHE_SIZE:
+            _manifest_cache.popitem(last=False)
+
+
+def _load_manifest(extract_dir: Path) -> Optional[Dict[str, str]]:
+    """Return the manifest of an extract directory (LRU cached), None for extracts without one"""
+    key = str(Path(extract_dir).resolve())
+    with _manifest_lock:
+        mapping = _manifest_cache.get(key)
+        if mapping is not None:
+            _manifest_cache.move_to_end(key)
+            return mapping
+    try:
+        with open(Path(extract_dir) / MINERU_MANIFEST_NAME, 'r', encoding='utf-8') as f:
+            mapping = json.load(f)
+    except FileNotFoundError:
+        # 旧的解析结果没有清单，不缓存，由调用方回退到前缀匹配
+        return None
+    except (OSError, ValueError) as e:
+        logger.warning(f"Failed to read MinerU manifest in {extract_dir}: {str(e)}")
+        return None
+    _remember_manifest(key, mapping)
+    return mapping
+
+
+def resolve_mineru_file(extract_dir: Path, rel_path: str) -> Optional[Path]:
+    """
+    查找解析结果中的文件：先查清单（O(1)，不扫描目录），再回退到直接路径和前缀匹配
+    
+    Args:
+        extract_dir: 解析结果目录 uploads/mineru_files/{extract_id}
+        rel_path: /files/mineru/{extract_id}/ 之后的路径（可能是被截断的短路径）
+        
+    Returns:
+        找到的文件路径（Path 对象），如果未找到则返回 None
+    """
+    extract_dir = Path(extract_dir)
+    manifest = _load_manifest(extract_dir)
+    if manifest is not None:
+        real_path = manifest.get(rel_path)
+        if real_path is not None:
+            candidate = extract_dir / real_path
+            if candidate.is_file():
+                return candidate
+    
+    return find_file_with_prefix(extract_dir / rel_path)
+
 
 def convert_mineru_path_to_local(mineru_path: str, project_root: Optional[Path] = None) -> Optional[Path]:
     """
@@ -47,7 +125,7 @@ def find_mineru_file_with_prefix(mineru_path: str, project_root: Optional[Path]
     """
     查找 MinerU 文件，支持前缀匹配
     
-    首先尝试直接路径匹配，如果失败则尝试前缀匹配。
+    首先查 extract 目录的短路径清单，没有清单时尝试直接路径匹配，再尝试前缀匹配。
     前缀匹配逻辑：如果文件名看起来像是一个前缀+扩展名（前缀长度 >= 5），
     则在目录中查找以该前缀开头的文件。
     
@@ -64,9 +142,11 @@ def find_mineru_file_with_prefix(mineru_path: str, project_root: Optional[Path]
     if local_path is None:
         return None
     
-    # Direct file matching
-    if local_path.exists() and local_path.is_file():
-        return local_path
+    # /files/mineru/{extract_id}/{rel_path}: look up the extract's manifest first
+    parts = mineru_path[len('/files/mineru/'):].split('/', 1)
+    if len(parts) == 2 and parts[0] and parts[1]:
+        extract_dir = convert_mineru_path_to_local(f"/files/mineru/{parts[0]}", project_root)
+        return resolve_mineru_file(extract_dir, parts[1])
     
     # Try prefix match using the generic function
     return find_file_with_prefix(local_path)
@@ -1,8 +1,9 @@
 """
 Unified response format utilities
 """
-from flask import jsonify
-from typing import Any, Dict, Optional
+import json
+from flask import jsonify, Response, stream_with_context
+from typing import Any, Dict, Iterable, Optional
 
 
 def success_response(data: Any = None, message: str = "Success", status_code: int = 200):
@@ -69,3 +70,33 @@ def ai_service_error(message: str = "AI service error"):
 def rate_limit_error(message: str = "Rate limit exceeded"):
     return error_response("RATE_LIMIT_EXCEEDED", message, 429)
 
+
+# Server-Sent Events
+def sse_event(event_type: str, data: Any) -> str:
+    """
+    Format one Server-Sent Event
+    
+    Args:
+        event_type: Event name (the client listens with addEventListener(event_type))
+        data: JSON-serializable payload
+    
+    Returns:
+        Event text, terminated by a blank line
+    """
+    return f"event: {event_type}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+def sse_response(events: Iterable[str]):
+    """
+    Stream events produced by a generator as a text/event-stream response
+    
+    The generator runs inside the request context (database session, current_app).
+    """
+    return Response(
+        stream_with_context(events),
+        mimetype='text/event-stream',
+        headers={
+            'Cache-Control': 'no-cache',
+            'X-Accel-Buffering': 'no',  # 禁止反向代理缓冲
+        }
+    )
@@ -53,9 +53,12 @@ apiClient.interceptors.response.use(
   }
 );
 
+export type ImageSize = 'thumb' | 'medium';
+
 // 图片URL处理工具
 // 使用相对路径，通过代理转发到后端
-export const getImageUrl = (path?: string, timestamp?: string | number): string => {
+// size: 'thumb' / 'medium' 请求后端生成的 WebP 缩略图（仅对本地图片生效）
+export const getImageUrl = (path?: string, timestamp?: string | number, size?: ImageSize): string => {
   if (!path) return '';
   // 如果已经是完整URL，直接返回
   if (path.startsWith('http://') || path.startsWith('https://')) {
@@ -72,6 +75,10 @@ export const getImageUrl = (path?: string, timestamp?: string | number): string
     url += `?v=${ts}`;
   }
   
+  if (size) {
+    url += `${url.includes('?') ? '&' : '?'}size=${size}`;
+  }
+  
   return url;
 };
 
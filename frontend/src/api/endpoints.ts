@@ -1,5 +1,5 @@
 import { apiClient } from './client';
-import type { Project, Task, ApiResponse, CreateProjectRequest, Page } from '@/types';
+import type { Project, Task, ApiResponse, CreateProjectRequest, Page, PageStatus } from '@/types';
 import type { Settings } from '../types/index';
 
 // ===== 项目相关 API =====
@@ -164,6 +164,68 @@ export const generatePageDescription = async (
   return response.data;
 };
 
+/**
+ * 流式生成单页描述，生成过程中通过 onDelta 逐段返回文本
+ * @returns 保存描述后的页面数据
+ */
+export const streamPageDescription = async (
+  projectId: string,
+  pageId: string,
+  onDelta: (text: string) => void,
+  forceRegenerate: boolean = false,
+  language?: OutputLanguage
+): Promise<Page> => {
+  const lang = language || getStoredOutputLanguage() || 'zh';
+  // axios 不支持读取流式响应，这里直接使用 fetch
+  const response = await fetch(
+    `/api/projects/${projectId}/pages/${pageId}/generate/description/stream`,
+    {
+      method: 'POST',
+      headers: { 'Content-Type': 'application/json' },
+      body: JSON.stringify({ force_regenerate: forceRegenerate, language: lang }),
+    }
+  );
+  if (!response.ok || !response.body) {
+    const body = await response.json().catch(() => null);
+    throw new Error(body?.error?.message || `请求失败: ${response.status}`);
+  }
+
+  const reader = response.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = '';
+  while (true) {
+    const { done, value } = await reader.read();
+    if (done) break;
+    buffer += decoder.decode(value, { stream: true });
+
+    // 事件之间以空行分隔
+    let boundary = buffer.indexOf('\n\n');
+    while (boundary !== -1) {
+      const rawEvent = buffer.slice(0, boundary);
+      buffer = buffer.slice(boundary + 2);
+      boundary = buffer.indexOf('\n\n');
+
+      let eventType = 'message';
+      let data = '';
+      rawEvent.split('\n').forEach((line) => {
+        if (line.startsWith('event:')) eventType = line.slice(6).trim();
+        else if (line.startsWith('data:')) data += line.slice(5).trim();
+      });
+      if (!data) continue;
+
+      const payload = JSON.parse(data);
+      if (eventType === 'delta') {
+        onDelta(payload.text);
+      } else if (eventType === 'done') {
+        return payload as Page;
+      } else if (eventType === 'error') {
+        throw new Error(payload.message || '生成描述失败');
+      }
+    }
+  }
+  throw new Error('生成描述的连接意外中断');
+};
+
 /**
  * 根据用户要求修改大纲
  * @param projectId 项目ID
@@ -216,16 +278,23 @@ export const refineDescriptions = async (
 
 // ===== 图片生成 =====
 
+export type ImageResumeMode = 'all' | 'skip_completed' | 'only_failed';
+
 /**
  * 批量生成图片
  * @param projectId 项目ID
  * @param language 输出语言（可选，默认从 sessionStorage 获取）
+ * @param resumeMode 续传模式：all 全部重新生成，skip_completed 跳过已完成页面，only_failed 仅重试失败页面
  */
-export const generateImages = async (projectId: string, language?: OutputLanguage): Promise<ApiResponse> => {
+export const generateImages = async (
+  projectId: string,
+  language?: OutputLanguage,
+  resumeMode: ImageResumeMode = 'all'
+): Promise<ApiResponse> => {
   const lang = language || getStoredOutputLanguage() || 'zh';
   const response = await apiClient.post<ApiResponse>(
     `/api/projects/${projectId}/generate/images`,
-    { language: lang }
+    { language: lang, resume_mode: resumeMode }
   );
   return response.data;
 };
@@ -403,17 +472,87 @@ export const getTaskStatus = async (projectId: string, taskId: string): Promise<
   return response.data;
 };
 
+export interface TaskPageEvent {
+  page_id: string;
+  order_index: number;
+  status: PageStatus;
+  generated_image_url: string | null;
+  updated_at: string | null;  // 用于图片缓存失效
+}
+
+export interface TaskEventHandlers {
+  onTask: (task: Task) => void;
+  onPage?: (page: TaskPageEvent) => void;
+  // 连接失败或中断（例如代理不支持 SSE），调用方应回退为轮询
+  onError?: () => void;
+}
+
+/**
+ * 订阅任务进度推送（Server-Sent Events）
+ * 任务结束（COMPLETED/FAILED）后服务端关闭连接
+ * @returns 取消订阅函数
+ */
+export const subscribeTaskEvents = (
+  projectId: string,
+  taskId: string,
+  handlers: TaskEventHandlers
+): (() => void) => {
+  if (typeof EventSource === 'undefined') {
+    handlers.onError?.();
+    return () => {};
+  }
+
+  const source = new EventSource(`/api/projects/${projectId}/tasks/${taskId}/events`);
+  let closed = false;
+  const close = () => {
+    closed = true;
+    source.close();
+  };
+
+  source.addEventListener('task', (event) => {
+    const task: Task = JSON.parse((event as MessageEvent).data);
+    if (task.status === 'COMPLETED' || task.status === 'FAILED') {
+      close();
+    }
+    handlers.onTask(task);
+  });
+  source.addEventListener('page', (event) => {
+    handlers.onPage?.(JSON.parse((event as MessageEvent).data));
+  });
+  source.onerror = () => {
+    // EventSource 默认会自动重连，这里交给调用方回退为轮询
+    if (!closed) {
+      close();
+      handlers.onError?.();
+    }
+  };
+
+  return close;
+};
+
 // ===== 导出 =====
 
+/**
+ * 导出结果：内容未变化时直接返回已有文件的下载链接（cached），
+ * 否则返回后台导出任务的 task_id，任务完成后 progress.download_url 为下载链接
+ */
+export interface ExportResult {
+  download_url?: string;
+  download_url_absolute?: string;
+  cached?: boolean;
+  task_id?: string;
+  status?: string;
+}
+
 /**
  * 导出为PPTX
  */
 export const exportPPTX = async (
   projectId: string
-): Promise<ApiResponse<{ download_url: string; download_url_absolute?: string }>> => {
-  const response = await apiClient.get<
-    ApiResponse<{ download_url: string; download_url_absolute?: string }>
-  >(`/api/projects/${projectId}/export/pptx`);
+): Promise<ApiResponse<ExportResult>> => {
+  const response = await apiClient.get<ApiResponse<ExportResult>>(
+    `/api/projects/${projectId}/export/pptx`
+  );
   return response.data;
 };
 
@@ -422,10 +561,10 @@ export const exportPPTX = async (
  */
 export const exportPDF = async (
   projectId: string
-): Promise<ApiResponse<{ download_url: string; download_url_absolute?: string }>> => {
-  const response = await apiClient.get<
-    ApiResponse<{ download_url: string; download_url_absolute?: string }>
-  >(`/api/projects/${projectId}/export/pdf`);
+): Promise<ApiResponse<ExportResult>> => {
+  const response = await apiClient.get<ApiResponse<ExportResult>>(
+    `/api/projects/${projectId}/export/pdf`
+  );
   return response.data;
 };
 
@@ -612,10 +751,11 @@ export interface ReferenceFile {
   filename: string;
   file_size: number;
   file_type: string;
-  parse_status: 'pending' | 'parsing' | 'completed' | 'failed';
+  parse_status: 'pending' | 'queued' | 'parsing' | 'completed' | 'failed';
   markdown_content: string | null;
   error_message: string | null;
   image_caption_failed_count?: number;  // Optional, calculated dynamically
+  queue_position?: number | null;  // 在解析队列中的位置（1 = 下一个），未排队时为 null
   created_at: string;
   updated_at: string;
 }
@@ -688,6 +828,18 @@ export const triggerFileParse = async (fileId: string): Promise<ApiResponse<{ fi
   return response.data;
 };
 
+/**
+ * 批量触发文件解析（需要 MinerU 解析的文件会合并为一个批次提交）
+ * @param fileIds 文件ID列表
+ */
+export const triggerFilesParse = async (fileIds: string[]): Promise<ApiResponse<{ files: ReferenceFile[]; message: string }>> => {
+  const response = await apiClient.post<ApiResponse<{ files: ReferenceFile[]; message: string }>>(
+    '/api/reference-files/parse',
+    { file_ids: fileIds }
+  );
+  return response.data;
+};
+
 /**
  * 将参考文件关联到项目
  * @param fileId 文件ID
@@ -1,7 +1,7 @@
 import React, { useState, useEffect } from 'react';
 import { Clock, FileText, ChevronRight, Trash2 } from 'lucide-react';
 import { Card } from '@/components/shared';
-import { getProjectTitle, getFirstPageImage, formatDate, getStatusText, getStatusColor } from '@/utils/projectUtils';
+import { getProjectTitle, getFirstPageImage, formatDate, getStatusText, getStatusColor, getPageCount } from '@/utils/projectUtils';
 import type { Project } from '@/types';
 
 export interface ProjectCardProps {
@@ -37,7 +37,7 @@ export const ProjectCard: React.FC<ProjectCardProps> = ({
   if (!projectId) return null;
 
   const title = getProjectTitle(project);
-  const pageCount = project.pages?.length || 0;
+  const pageCount = getPageCount(project);
   const statusText = getStatusText(project);
   const statusColor = getStatusColor(project);
   
@@ -11,6 +11,8 @@ export interface DescriptionCardProps {
   onRegenerate: () => void;
   isGenerating?: boolean;
   isAiRefining?: boolean;
+  // 流式生成过程中已收到的文本
+  streamingText?: string;
 }
 
 export const DescriptionCard: React.FC<DescriptionCardProps> = ({
@@ -20,6 +22,7 @@ export const DescriptionCard: React.FC<DescriptionCardProps> = ({
   onRegenerate,
   isGenerating = false,
   isAiRefining = false,
+  streamingText,
 }) => {
   // 从 description_content 提取文本内容
   const getDescriptionText = (descContent: DescriptionContent | undefined): string => {
@@ -77,7 +80,11 @@ export const DescriptionCard: React.FC<DescriptionCardProps> = ({
 
         {/* 内容 */}
         <div className="p-4 flex-1">
-          {generating ? (
+          {generating && streamingText ? (
+            <div className="text-sm text-gray-700">
+              <Markdown>{streamingText}</Markdown>
+            </div>
+          ) : generating ? (
             <div className="space-y-2">
               <Skeleton className="h-4 w-full" />
               <Skeleton className="h-4 w-full" />
@@ -23,7 +23,7 @@ export const ReferenceFileCard: React.FC<ReferenceFileCardProps> = ({
 
   // Poll for status updates if parsing
   useEffect(() => {
-    if (file.parse_status === 'pending' || file.parse_status === 'parsing') {
+    if (file.parse_status === 'pending' || file.parse_status === 'queued' || file.parse_status === 'parsing') {
       const intervalId = setInterval(async () => {
         try {
           const response = await getReferenceFile(file.id);
@@ -74,7 +74,7 @@ export const ReferenceFileCard: React.FC<ReferenceFileCardProps> = ({
   };
 
   const handleReparse = async () => {
-    if (isReparsing || file.parse_status === 'parsing' || file.parse_status === 'pending') return;
+    if (isReparsing || file.parse_status === 'queued' || file.parse_status === 'parsing' || file.parse_status === 'pending') return;
     
     setIsReparsing(true);
     try {
@@ -104,6 +104,7 @@ export const ReferenceFileCard: React.FC<ReferenceFileCardProps> = ({
   const getStatusIcon = () => {
     switch (file.parse_status) {
       case 'pending':
+      case 'queued':
       case 'parsing':
         return <Loader2 className="w-4 h-4 text-blue-500 animate-spin" />;
       case 'completed':
@@ -119,6 +120,8 @@ export const ReferenceFileCard: React.FC<ReferenceFileCardProps> = ({
     switch (file.parse_status) {
       case 'pending':
         return '等待解析';
+      case 'queued':
+        return file.queue_position ? `排队中（第 ${file.queue_position} 位）` : '排队中...';
       case 'parsing':
         return '解析中...';
       case 'completed':
@@ -133,6 +136,7 @@ export const ReferenceFileCard: React.FC<ReferenceFileCardProps> = ({
   const getStatusColor = () => {
     switch (file.parse_status) {
       case 'pending':
+      case 'queued':
       case 'parsing':
         return 'text-blue-600';
       case 'completed':
@@ -6,7 +6,7 @@ import {
   uploadReferenceFile,
   deleteReferenceFile,
   getReferenceFile,
-  triggerFileParse,
+  triggerFilesParse,
   type ReferenceFile,
 } from '@/api/endpoints';
 
@@ -197,11 +197,9 @@ export const ReferenceFileSelector: React.FC<ReferenceFileSelectorProps> = React
           type: 'success',
         });
 
-        // 触发所有未解析文件的解析（不等待完成）
-        unparsedFiles.forEach(file => {
-          triggerFileParse(file.id).catch(error => {
-            console.error(`触发文件 ${file.filename} 解析失败:`, error);
-          });
+        // 一次性触发所有未解析文件的解析（不等待完成）
+        triggerFilesParse(unparsedFiles.map(file => file.id)).catch(error => {
+          console.error('触发文件解析失败:', error);
         });
         
         // 立即返回所有选中的文件（包括 pending 状态的）
@@ -216,9 +214,9 @@ export const ReferenceFileSelector: React.FC<ReferenceFileSelectorProps> = React
       }
     } else {
       // 所有文件都已解析或正在解析，直接确认
-      // 允许选择所有状态的文件（completed, parsing）
+      // 允许选择所有状态的文件（completed, queued, parsing）
       const validFiles = selected.filter(f => 
-        f.parse_status === 'completed' || f.parse_status === 'parsing'
+        f.parse_status === 'completed' || f.parse_status === 'queued' || f.parse_status === 'parsing'
       );
       
       if (validFiles.length === 0) {
@@ -272,7 +270,7 @@ export const ReferenceFileSelector: React.FC<ReferenceFileSelectorProps> = React
         
         // 只有正在解析的文件才添加到轮询列表（pending 状态的文件不轮询）
         const needsParsing = uploadedFiles.filter(f => 
-          f.parse_status === 'parsing'
+          f.parse_status === 'queued' || f.parse_status === 'parsing'
         );
         if (needsParsing.length > 0) {
           setParsingIds(prev => {
@@ -368,7 +366,7 @@ export const ReferenceFileSelector: React.FC<ReferenceFileSelectorProps> = React
   };
 
   const getStatusIcon = (file: ReferenceFile) => {
-    if (parsingIds.has(file.id) || file.parse_status === 'parsing') {
+    if (parsingIds.has(file.id) || file.parse_status === 'queued' || file.parse_status === 'parsing') {
       return <Loader2 className="w-4 h-4 text-blue-500 animate-spin" />;
     }
     switch (file.parse_status) {
@@ -382,6 +380,9 @@ export const ReferenceFileSelector: React.FC<ReferenceFileSelectorProps> = React
   };
 
   const getStatusText = (file: ReferenceFile) => {
+    if (file.parse_status === 'queued') {
+      return file.queue_position ? `排队中（第 ${file.queue_position} 位）` : '排队中...';
+    }
     if (parsingIds.has(file.id) || file.parse_status === 'parsing') {
       return '解析中...';
     }
@@ -173,7 +173,7 @@ export const TemplateSelector: React.FC<TemplateSelectorProps> = ({
                   }`}
                 >
                   <img
-                    src={getImageUrl(template.template_image_url)}
+                    src={getImageUrl(template.template_image_url, undefined, 'thumb')}
                     alt={template.name || 'Template'}
                     className="absolute inset-0 w-full h-full object-cover"
                   />
@@ -18,6 +18,7 @@ export const DetailEditor: React.FC = () => {
     generateDescriptions,
     generatePageDescription,
     pageDescriptionGeneratingTasks,
+    pageDescriptionStreams,
   } = useProjectStore();
   const { show, ToastContainer } = useToast();
   const { confirm, ConfirmDialog } = useConfirm();
@@ -265,6 +266,7 @@ export const DetailEditor: React.FC = () => {
                     onRegenerate={() => handleRegeneratePage(pageId)}
                     isGenerating={pageId ? !!pageDescriptionGeneratingTasks[pageId] : false}
                     isAiRefining={isAiRefining}
+                    streamingText={pageId ? pageDescriptionStreams[pageId] : undefined}
                   />
                 );
               })}
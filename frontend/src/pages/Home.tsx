@@ -202,9 +202,9 @@ export const Home: React.FC = () => {
                 prev.map(f => f.id === uploadedFile.id ? parsedFile : f)
               );
             } else {
-              // 如果没有返回文件对象，手动更新状态为 parsing（异步线程会稍后更新）
+              // 如果没有返回文件对象，手动更新状态为 queued（解析队列会稍后更新）
               setReferenceFiles(prev => 
-                prev.map(f => f.id === uploadedFile.id ? { ...f, parse_status: 'parsing' as const } : f)
+                prev.map(f => f.id === uploadedFile.id ? { ...f, parse_status: 'queued' as const } : f)
               );
             }
           } catch (parseError: any) {
@@ -359,7 +359,7 @@ export const Home: React.FC = () => {
 
     // 检查是否有正在解析的文件
     const parsingFiles = referenceFiles.filter(f => 
-      f.parse_status === 'pending' || f.parse_status === 'parsing'
+      f.parse_status === 'pending' || f.parse_status === 'queued' || f.parse_status === 'parsing'
     );
     if (parsingFiles.length > 0) {
       show({ 
@@ -619,11 +619,11 @@ export const Home: React.FC = () => {
                 loading={isGlobalLoading}
                 disabled={
                   !content.trim() || 
-                  referenceFiles.some(f => f.parse_status === 'pending' || f.parse_status === 'parsing')
+                  referenceFiles.some(f => f.parse_status === 'pending' || f.parse_status === 'queued' || f.parse_status === 'parsing')
                 }
                 className="shadow-sm text-xs md:text-sm px-3 md:px-4"
               >
-                {referenceFiles.some(f => f.parse_status === 'pending' || f.parse_status === 'parsing')
+                {referenceFiles.some(f => f.parse_status === 'pending' || f.parse_status === 'queued' || f.parse_status === 'parsing')
                   ? '解析中...'
                   : '下一步'}
               </Button>
@@ -815,7 +815,7 @@ export const SlidePreview: React.FC = () => {
                   >
                     {page.generated_image_path ? (
                       <img
-                        src={getImageUrl(page.generated_image_path, page.updated_at)}
+                        src={getImageUrl(page.generated_image_path, page.updated_at, 'thumb')}
                         alt={`Slide ${index + 1}`}
                         className="w-full h-full object-cover rounded"
                       />
@@ -1196,7 +1196,7 @@ export const SlidePreview: React.FC = () => {
                   <span className="text-sm text-gray-700">使用模板图片</span>
                   {currentProject.template_image_path && (
                     <img
-                      src={getImageUrl(currentProject.template_image_path, currentProject.updated_at)}
+                      src={getImageUrl(currentProject.template_image_path, currentProject.updated_at, 'thumb')}
                       alt="Template"
                       className="w-16 h-10 object-cover rounded border border-gray-300"
                     />
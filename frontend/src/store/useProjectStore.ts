@@ -1,6 +1,7 @@
 import { create } from 'zustand';
-import type { Project, Task } from '@/types';
+import type { ApiResponse, Project, Task } from '@/types';
 import * as api from '@/api/endpoints';
+import type { ExportResult } from '@/api/endpoints';
 import { debounce, normalizeProject, normalizeErrorMessage } from '@/utils';
 
 interface ProjectState {
@@ -14,6 +15,8 @@ interface ProjectState {
   pageGeneratingTasks: Record<string, string>;
   // 每个页面的描述生成状态 (pageId -> boolean)
   pageDescriptionGeneratingTasks: Record<string, boolean>;
+  // 流式生成中的描述文本 (pageId -> 已收到的文本)
+  pageDescriptionStreams: Record<string, string>;
 
   // Actions
   setCurrentProject: (project: Project | null) => void;
@@ -57,7 +60,99 @@ interface ProjectState {
   exportPDF: () => Promise<void>;
 }
 
+/**
+ * 跟踪异步任务进度：优先通过 SSE 接收推送，连接不可用时回退为每 2 秒轮询
+ * @param handleTask 处理一次任务状态，返回 true 表示停止跟踪
+ * @param handlePollError 轮询请求出错时调用，返回 true 表示继续轮询
+ * @param handlePage 处理单个页面的状态推送（仅 SSE 提供，轮询时由 handleTask 同步项目）
+ */
+const watchTask = (
+  projectId: string,
+  taskId: string,
+  handleTask: (task: Task) => Promise<boolean>,
+  handlePollError: (error: any) => Promise<boolean> | boolean,
+  handlePage?: (page: api.TaskPageEvent) => void
+) => {
+  let stopped = false;
+  let unsubscribe = () => {};
+  // 按顺序处理任务状态，避免多次 syncProject 交错执行
+  let queue: Promise<void> = Promise.resolve();
+
+  const handle = (task: Task) => {
+    queue = queue
+      .then(async () => {
+        if (stopped) return;
+        if (await handleTask(task)) {
+          stopped = true;
+          unsubscribe();
+        }
+      })
+      .catch((error) => {
+        console.error('[任务跟踪] 处理任务状态出错:', error);
+      });
+    return queue;
+  };
+
+  const poll = async () => {
+    if (stopped) return;
+    try {
+      const response = await api.getTaskStatus(projectId, taskId);
+      if (!response.data) {
+        console.warn('[轮询] 响应中没有任务数据');
+        return;
+      }
+      await handle(response.data);
+    } catch (error: any) {
+      if (!(await handlePollError(error))) {
+        stopped = true;
+        return;
+      }
+    }
+    if (!stopped) {
+      setTimeout(poll, 2000);
+    }
+  };
+
+  unsubscribe = api.subscribeTaskEvents(projectId, taskId, {
+    onTask: (task) => {
+      handle(task);
+    },
+    onPage: (page) => {
+      if (!stopped) {
+        handlePage?.(page);
+      }
+    },
+    onError: () => {
+      if (!stopped) {
+        console.warn(`[任务推送] Task ${taskId} 无法使用 SSE，回退为轮询`);
+        setTimeout(poll, 2000);
+      }
+    },
+  });
+};
+
 export const useProjectStore = create<ProjectState>((set, get) => {
+  // 将 SSE 推送的页面状态合并到当前项目，单页完成后立即显示，无需等待整个任务结束
+  const applyPageEvent = (event: api.TaskPageEvent) => {
+    const { currentProject } = get();
+    if (!currentProject) return;
+    let changed = false;
+    const pages = currentProject.pages.map((page) => {
+      if (page.id !== event.page_id) return page;
+      changed = true;
+      return {
+        ...page,
+        status: event.status,
+        generated_image_url: event.generated_image_url ?? page.generated_image_url,
+        generated_image_path: event.generated_image_url ?? page.generated_image_path,
+        updated_at: event.updated_at ?? page.updated_at,
+      };
+    });
+    if (changed) {
+      set({ currentProject: { ...currentProject, pages } });
+    }
+  };
+
   // 防抖的API更新函数（在store内部定义，以便访问syncProject）
 const debouncedUpdatePage = debounce(
   async (projectId: string, pageId: string, data: any) => {
@@ -85,6 +180,59 @@ const debouncedUpdatePage = debounce(
   1000
 );
 
+  // 导出：内容未变化时直接下载已有文件，否则等待后台导出任务完成
+  const runExport = async (
+    exportFn: (projectId: string) => Promise<ApiResponse<ExportResult>>
+  ) => {
+    const { currentProject } = get();
+    if (!currentProject) return;
+    const projectId = currentProject.id!;
+
+    set({ isGlobalLoading: true, error: null });
+    try {
+      const response = await exportFn(projectId);
+      // 优先使用相对路径，避免 Docker 环境下的端口问题
+      let downloadUrl =
+        response.data?.download_url || response.data?.download_url_absolute;
+
+      const taskId = response.data?.task_id;
+      if (!downloadUrl && taskId) {
+        downloadUrl = await new Promise<string | undefined>((resolve, reject) => {
+          watchTask(
+            projectId,
+            taskId,
+            async (task) => {
+              if (task.status === 'COMPLETED') {
+                resolve(task.progress?.download_url);
+                return true;
+              }
+              if (task.status === 'FAILED') {
+                reject(new Error(task.error_message || '导出失败'));
+                return true;
+              }
+              return false;
+            },
+            (error) => {
+              reject(error);
+              return false;
+            }
+          );
+        });
+      }
+
+      if (!downloadUrl) {
+        throw new Error('导出链接获取失败');
+      }
+
+      // 使用浏览器直接下载链接，避免 axios 受带宽和超时影响
+      window.open(downloadUrl, '_blank');
+    } catch (error: any) {
+      set({ error: error.message || '导出失败' });
+    } finally {
+      set({ isGlobalLoading: false });
+    }
+  };
+
   return {
   // 初始状态
   currentProject: null,
@@ -94,6 +242,7 @@ const debouncedUpdatePage = debounce(
   error: null,
   pageGeneratingTasks: {},
   pageDescriptionGeneratingTasks: {},
+  pageDescriptionStreams: {},
 
   // Setters
   setCurrentProject: (project) => set({ currentProject: project }),
@@ -352,76 +501,67 @@ const debouncedUpdatePage = debounce(
     }
   },
 
-  // 轮询任务状态
+  // 跟踪任务状态（SSE 推送，失败时回退为轮询）
   pollTask: async (taskId) => {
-    console.log(`[轮询] 开始轮询任务: ${taskId}`);
+    console.log(`[轮询] 开始跟踪任务: ${taskId}`);
     const { currentProject } = get();
     if (!currentProject) {
       console.warn('[轮询] 没有当前项目，停止轮询');
       return;
     }
 
-    const poll = async () => {
-      try {
-        console.log(`[轮询] 查询任务状态: ${taskId}`);
-        const response = await api.getTaskStatus(currentProject.id!, taskId);
-        const task = response.data;
-        
-        if (!task) {
-          console.warn('[轮询] 响应中没有任务数据');
-          return;
-        }
-
-        // 更新进度
-        if (task.progress) {
-          set({ taskProgress: task.progress });
-        }
+    const handleTask = async (task: Task): Promise<boolean> => {
+      // 更新进度
+      if (task.progress) {
+        set({ taskProgress: task.progress });
+      }
 
-        console.log(`[轮询] Task ${taskId} 状态: ${task.status}`, task);
+      console.log(`[轮询] Task ${taskId} 状态: ${task.status}`, task);
 
-        // 检查任务状态
-        if (task.status === 'COMPLETED') {
-          console.log(`[轮询] Task ${taskId} 已完成，刷新项目数据`);
-          set({ 
-            activeTaskId: null, 
-            taskProgress: null, 
-            isGlobalLoading: false 
-          });
-          // 刷新项目数据
-          await get().syncProject();
-        } else if (task.status === 'FAILED') {
-          console.error(`[轮询] Task ${taskId} 失败:`, task.error_message || task.error);
-          set({ 
-            error: normalizeErrorMessage(task.error_message || task.error || '任务失败'),
-            activeTaskId: null,
-            taskProgress: null,
-            isGlobalLoading: false
-          });
-        } else if (task.status === 'PENDING' || task.status === 'PROCESSING') {
-          // 继续轮询（PENDING 或 PROCESSING）
-          console.log(`[轮询] Task ${taskId} 处理中，2秒后继续轮询...`);
-          setTimeout(poll, 2000);
-        } else {
-          // 未知状态，停止轮询
-          console.warn(`[轮询] Task ${taskId} 未知状态: ${task.status}，停止轮询`);
-          set({ 
-            error: `未知任务状态: ${task.status}`,
-            activeTaskId: null,
-            taskProgress: null,
-            isGlobalLoading: false
-          });
-        }
-      } catch (error: any) {
-        console.error('任务轮询错误:', error);
+      // 检查任务状态
+      if (task.status === 'COMPLETED') {
+        console.log(`[轮询] Task ${taskId} 已完成，刷新项目数据`);
         set({ 
-          error: normalizeErrorMessage(error.message || '任务查询失败'),
+          activeTaskId: null, 
+          taskProgress: null, 
+          isGlobalLoading: false 
+        });
+        // 刷新项目数据
+        await get().syncProject();
+        return true;
+      } else if (task.status === 'FAILED') {
+        console.error(`[轮询] Task ${taskId} 失败:`, task.error_message || task.error);
+        set({ 
+          error: normalizeErrorMessage(task.error_message || task.error || '任务失败'),
           activeTaskId: null,
+          taskProgress: null,
           isGlobalLoading: false
         });
+        return true;
+      } else if (task.status === 'PENDING' || task.status === 'PROCESSING') {
+        // 继续等待（PENDING 或 PROCESSING）
+        return false;
       }
+      // 未知状态，停止轮询
+      console.warn(`[轮询] Task ${taskId} 未知状态: ${task.status}，停止轮询`);
+      set({ 
+        error: `未知任务状态: ${task.status}`,
+        activeTaskId: null,
+        taskProgress: null,
+        isGlobalLoading: false
+      });
+      return true;
     };
 
-    await poll();
+    watchTask(currentProject.id!, taskId, handleTask, (error: any) => {
+      console.error('任务轮询错误:', error);
+      set({ 
+        error: normalizeErrorMessage(error.message || '任务查询失败'),
+        activeTaskId: null,
+        isGlobalLoading: false
+      });
+      return false;
+    }, applyPageEvent);
   },
 
   // 生成大纲（同步操作，不需要轮询）
@@ -507,74 +647,85 @@ const debouncedUpdatePage = debounce(
         throw new Error('未收到任务ID');
       }
       
-      // 启动轮询任务状态和定期同步项目数据
-      const pollAndSync = async () => {
-        try {
-          // 轮询任务状态
-          const taskResponse = await api.getTaskStatus(projectId, taskId);
-          const task = taskResponse.data;
-          
-          if (task) {
-            // 更新进度
-            if (task.progress) {
-              set({ taskProgress: task.progress });
-            }
-            
-            // 同步项目数据以获取最新的页面状态
-            await get().syncProject();
-            
-            // 根据项目数据更新每个页面的生成状态
-            const { currentProject: updatedProject } = get();
-            if (updatedProject) {
-              const updatedTasks: Record<string, boolean> = {};
-              updatedProject.pages.forEach((page) => {
-                if (page.id) {
-                  // 如果页面已有描述，说明已完成
-                  const hasDescription = !!page.description_content;
-                  // 如果状态是 GENERATING 或还没有描述，说明还在生成中
-                  const isGenerating = page.status === 'GENERATING' || 
-                                      (!hasDescription && initialTasks[page.id]);
-                  if (isGenerating) {
-                    updatedTasks[page.id] = true;
-                  }
-                }
-              });
-              set({ pageDescriptionGeneratingTasks: updatedTasks });
-            }
-            
-            // 检查任务是否完成
-            if (task.status === 'COMPLETED') {
-              // 清除所有生成状态
-              set({ 
-                pageDescriptionGeneratingTasks: {},
-                taskProgress: null,
-                activeTaskId: null
-              });
-              // 最后同步一次确保数据最新
-              await get().syncProject();
-            } else if (task.status === 'FAILED') {
-              // 任务失败
-              set({ 
-                pageDescriptionGeneratingTasks: {},
-                taskProgress: null,
-                activeTaskId: null,
-                error: normalizeErrorMessage(task.error_message || task.error || '生成描述失败')
-              });
-            } else if (task.status === 'PENDING' || task.status === 'PROCESSING') {
-              // 继续轮询
-              setTimeout(pollAndSync, 2000);
-            }
+      // 收到过页面推送说明 SSE 可用，进行中无需再整体同步项目
+      let receivedPageEvents = false;
+
+      // 单页描述完成（或失败）时立即清除该页的生成状态
+      const handlePage = (event: api.TaskPageEvent) => {
+        receivedPageEvents = true;
+        applyPageEvent(event);
+        if (event.status === 'DESCRIPTION_GENERATED' || event.status === 'FAILED') {
+          const { pageDescriptionGeneratingTasks } = get();
+          if (pageDescriptionGeneratingTasks[event.page_id]) {
+            const updatedTasks = { ...pageDescriptionGeneratingTasks };
+            delete updatedTasks[event.page_id];
+            set({ pageDescriptionGeneratingTasks: updatedTasks });
           }
-        } catch (error: any) {
-          console.error('[生成描述] 轮询错误:', error);
-          // 即使轮询出错，也继续尝试同步项目数据
+        }
+      };
+
+      // 跟踪任务状态（SSE 推送，失败时回退为轮询）
+      const handleTask = async (task: Task): Promise<boolean> => {
+        // 更新进度
+        if (task.progress) {
+          set({ taskProgress: task.progress });
+        }
+        
+        // 检查任务是否完成
+        if (task.status === 'COMPLETED') {
+          // 清除所有生成状态
+          set({ 
+            pageDescriptionGeneratingTasks: {},
+            taskProgress: null,
+            activeTaskId: null
+          });
+          // 同步一次以获取生成的描述内容
           await get().syncProject();
-          setTimeout(pollAndSync, 2000);
+          return true;
+        } else if (task.status === 'FAILED') {
+          // 任务失败
+          set({ 
+            pageDescriptionGeneratingTasks: {},
+            taskProgress: null,
+            activeTaskId: null,
+            error: normalizeErrorMessage(task.error_message || task.error || '生成描述失败')
+          });
+          await get().syncProject();
+          return true;
+        }
+
+        // 轮询模式下没有页面推送，通过同步项目数据更新每个页面的生成状态
+        if (!receivedPageEvents) {
+          await get().syncProject();
+          const { currentProject: updatedProject } = get();
+          if (updatedProject) {
+            const updatedTasks: Record<string, boolean> = {};
+            updatedProject.pages.forEach((page) => {
+              if (page.id) {
+                // 如果页面已有描述，说明已完成
+                const hasDescription = !!page.description_content;
+                // 如果状态是 GENERATING 或还没有描述，说明还在生成中
+                const isGenerating = page.status === 'GENERATING' || 
+                                    (!hasDescription && initialTasks[page.id]);
+                if (isGenerating) {
+                  updatedTasks[page.id] = true;
+                }
+              }
+            });
+            set({ pageDescriptionGeneratingTasks: updatedTasks });
+          }
         }
+        
+        // 继续等待（PENDING 或 PROCESSING）
+        return task.status !== 'PENDING' && task.status !== 'PROCESSING';
       };
       
-      // 开始轮询
-      setTimeout(pollAndSync, 2000);
+      watchTask(projectId, taskId, handleTask, async (error: any) => {
+        console.error('[生成描述] 轮询错误:', error);
+        // 即使轮询出错，也继续尝试同步项目数据
+        await get().syncProject();
+        return true;
+      }, handlePage);
       
     } catch (error: any) {
       console.error('[生成描述] 启动任务失败:', error);
@@ -611,8 +762,16 @@ const debouncedUpdatePage = debounce(
       // 立即同步一次项目数据，以更新页面状态
       await get().syncProject();
       
-      // 传递 force_regenerate=true 以允许重新生成已有描述
-      await api.generatePageDescription(currentProject.id, pageId, true);
+      // 传递 force_regenerate=true 以允许重新生成已有描述，生成的文本边收边显示
+      await api.streamPageDescription(currentProject.id, pageId, (text) => {
+        const { pageDescriptionStreams } = get();
+        set({
+          pageDescriptionStreams: {
+            ...pageDescriptionStreams,
+            [pageId]: (pageDescriptionStreams[pageId] || '') + text,
+          },
+        });
+      }, true);
       
       // 刷新项目数据
       await get().syncProject();
@@ -621,10 +780,12 @@ const debouncedUpdatePage = debounce(
       throw error;
     } finally {
       // 清除生成状态
-      const { pageDescriptionGeneratingTasks: currentTasks } = get();
+      const { pageDescriptionGeneratingTasks: currentTasks, pageDescriptionStreams: currentStreams } = get();
       const newTasks = { ...currentTasks };
       delete newTasks[pageId];
-      set({ pageDescriptionGeneratingTasks: newTasks });
+      const newStreams = { ...currentStreams };
+      delete newStreams[pageId];
+      set({ pageDescriptionGeneratingTasks: newTasks, pageDescriptionStreams: newStreams });
     }
   },
 
@@ -677,7 +838,7 @@ const debouncedUpdatePage = debounce(
     }
   },
 
-  // 轮询单个页面的任务状态
+  // 跟踪单个页面的任务状态（SSE 推送，失败时回退为轮询）
   pollPageTask: async (pageId: string, taskId: string) => {
     const { currentProject } = get();
     if (!currentProject) {
@@ -685,65 +846,48 @@ const debouncedUpdatePage = debounce(
       return;
     }
 
-    const poll = async () => {
-      try {
-        const response = await api.getTaskStatus(currentProject.id!, taskId);
-        const task = response.data;
-        
-        if (!task) {
-          console.warn('[轮询] 响应中没有任务数据');
-          return;
-        }
+    // 清除该页面的任务记录
+    const clearPageTask = () => {
+      const { pageGeneratingTasks } = get();
+      const newTasks = { ...pageGeneratingTasks };
+      delete newTasks[pageId];
+      set({ pageGeneratingTasks: newTasks });
+    };
 
-        console.log(`[轮询] Page ${pageId} Task ${taskId} 状态: ${task.status}`);
+    const handleTask = async (task: Task): Promise<boolean> => {
+      console.log(`[轮询] Page ${pageId} Task ${taskId} 状态: ${task.status}`);
 
-        // 检查任务状态
-        if (task.status === 'COMPLETED') {
-          console.log(`[轮询] Page ${pageId} 任务已完成，刷新项目数据`);
-          // 清除该页面的任务记录
-          const { pageGeneratingTasks } = get();
-          const newTasks = { ...pageGeneratingTasks };
-          delete newTasks[pageId];
-          set({ pageGeneratingTasks: newTasks });
-          // 刷新项目数据
-          await get().syncProject();
-        } else if (task.status === 'FAILED') {
-          console.error(`[轮询] Page ${pageId} 任务失败:`, task.error_message || task.error);
-          // 清除该页面的任务记录
-          const { pageGeneratingTasks } = get();
-          const newTasks = { ...pageGeneratingTasks };
-          delete newTasks[pageId];
-          set({ 
-            pageGeneratingTasks: newTasks,
-            error: normalizeErrorMessage(task.error_message || task.error || '生成失败')
-          });
-          // 刷新项目数据以更新页面状态
-          await get().syncProject();
-        } else if (task.status === 'PENDING' || task.status === 'PROCESSING') {
-          // 继续轮询，同时同步项目数据以更新页面状态
-          console.log(`[轮询] Page ${pageId} 处理中，同步项目数据...`);
-          await get().syncProject();
-          console.log(`[轮询] Page ${pageId} 处理中，2秒后继续轮询...`);
-          setTimeout(poll, 2000);
-        } else {
-          // 未知状态，停止轮询
-          console.warn(`[轮询] Page ${pageId} 未知状态: ${task.status}，停止轮询`);
-          const { pageGeneratingTasks } = get();
-          const newTasks = { ...pageGeneratingTasks };
-          delete newTasks[pageId];
-          set({ pageGeneratingTasks: newTasks });
-        }
-      } catch (error: any) {
-        console.error('页面任务轮询错误:', error);
-        // 清除该页面的任务记录
-        const { pageGeneratingTasks } = get();
-        const newTasks = { ...pageGeneratingTasks };
-        delete newTasks[pageId];
-        set({ pageGeneratingTasks: newTasks });
+      // 检查任务状态
+      if (task.status === 'COMPLETED') {
+        console.log(`[轮询] Page ${pageId} 任务已完成，刷新项目数据`);
+        clearPageTask();
+        // 刷新项目数据
+        await get().syncProject();
+        return true;
+      } else if (task.status === 'FAILED') {
+        console.error(`[轮询] Page ${pageId} 任务失败:`, task.error_message || task.error);
+        clearPageTask();
+        set({ error: normalizeErrorMessage(task.error_message || task.error || '生成失败') });
+        // 刷新项目数据以更新页面状态
+        await get().syncProject();
+        return true;
+      } else if (task.status === 'PENDING' || task.status === 'PROCESSING') {
+        // 继续等待，同时同步项目数据以更新页面状态
+        console.log(`[轮询] Page ${pageId} 处理中，同步项目数据...`);
+        await get().syncProject();
+        return false;
       }
+      // 未知状态，停止轮询
+      console.warn(`[轮询] Page ${pageId} 未知状态: ${task.status}，停止轮询`);
+      clearPageTask();
+      return true;
     };
 
-    await poll();
+    watchTask(currentProject.id!, taskId, handleTask, (error: any) => {
+      console.error('页面任务轮询错误:', error);
+      clearPageTask();
+      return false;
+    }, applyPageEvent);
   },
 
   // 编辑页面图片（异步）
@@ -788,52 +932,8 @@ const debouncedUpdatePage = debounce(
   },
 
   // 导出PPTX
-  exportPPTX: async () => {
-    const { currentProject } = get();
-    if (!currentProject) return;
-
-    set({ isGlobalLoading: true, error: null });
-    try {
-      const response = await api.exportPPTX(currentProject.id);
-      // 优先使用相对路径，避免 Docker 环境下的端口问题
-      const downloadUrl =
-        response.data?.download_url || response.data?.download_url_absolute;
-
-      if (!downloadUrl) {
-        throw new Error('导出链接获取失败');
-      }
-
-      // 使用浏览器直接下载链接，避免 axios 受带宽和超时影响
-      window.open(downloadUrl, '_blank');
-    } catch (error: any) {
-      set({ error: error.message || '导出失败' });
-    } finally {
-      set({ isGlobalLoading: false });
-    }
-  },
+  exportPPTX: () => runExport(api.exportPPTX),
 
   // 导出PDF
-  exportPDF: async () => {
-    const { currentProject } = get();
-    if (!currentProject) return;
-
-    set({ isGlobalLoading: true, error: null });
-    try {
-      const response = await api.exportPDF(currentProject.id);
-      // 优先使用相对路径，避免 Docker 环境下的端口问题
-      const downloadUrl =
-        response.data?.download_url || response.data?.download_url_absolute;
-
-      if (!downloadUrl) {
-        throw new Error('导出链接获取失败');
-      }
-
-      // 使用浏览器直接下载链接，避免 axios 受带宽和超时影响
-      window.open(downloadUrl, '_blank');
-    } catch (error: any) {
-      set({ error: error.message || '导出失败' });
-    } finally {
-      set({ isGlobalLoading: false });
-    }
-  },
+  exportPDF: () => runExport(api.exportPDF),
 };});
\ No newline at end of file
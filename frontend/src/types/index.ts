@@ -65,6 +65,13 @@ export interface Project {
   pages: Page[];
   created_at: string;
   updated_at: string;
+  // 项目列表（摘要模式）返回的页面统计，此时不包含 pages
+  page_count?: number;
+  first_page_title?: string | null;
+  has_descriptions?: boolean;
+  has_images?: boolean;
+  cover_image_url?: string | null;
+  cover_updated_at?: string | null;
 }
 
 // 任务状态
@@ -10,6 +10,11 @@ export const getProjectTitle = (project: Project): string => {
     return project.idea_prompt;
   }
   
+  // 项目列表（摘要模式）直接返回第一页标题
+  if (project.first_page_title) {
+    return project.first_page_title;
+  }
+  
   // 如果没有 idea_prompt，尝试从第一个页面获取标题
   if (project.pages && project.pages.length > 0) {
     // 按 order_index 排序，找到第一个页面
@@ -32,6 +37,10 @@ export const getProjectTitle = (project: Project): string => {
  * 获取第一页图片URL
  */
 export const getFirstPageImage = (project: Project): string | null => {
+  if (project.cover_image_url) {
+    return getImageUrl(project.cover_image_url, project.cover_updated_at || undefined, 'thumb');
+  }
+  
   if (!project.pages || project.pages.length === 0) {
     return null;
   }
@@ -39,12 +48,28 @@ export const getFirstPageImage = (project: Project): string | null => {
   // 找到第一页有图片的页面
   const firstPageWithImage = project.pages.find(p => p.generated_image_path);
   if (firstPageWithImage?.generated_image_path) {
-    return getImageUrl(firstPageWithImage.generated_image_path, firstPageWithImage.updated_at);
+    return getImageUrl(firstPageWithImage.generated_image_path, firstPageWithImage.updated_at, 'thumb');
   }
   
   return null;
 };
 
+/**
+ * 获取项目页数
+ */
+export const getPageCount = (project: Project): number => {
+  return project.page_count ?? project.pages?.length ?? 0;
+};
+
+/**
+ * 项目是否已有图片 / 描述（兼容摘要模式和完整模式）
+ */
+const hasPageImages = (project: Project): boolean =>
+  project.has_images ?? (project.pages || []).some(p => p.generated_image_path);
+
+const hasPageDescriptions = (project: Project): boolean =>
+  project.has_descriptions ?? (project.pages || []).some(p => p.description_content);
+
 /**
  * 格式化日期
  */
@@ -63,15 +88,13 @@ export const formatDate = (dateString: string): string => {
  * 获取项目状态文本
  */
 export const getStatusText = (project: Project): string => {
-  if (!project.pages || project.pages.length === 0) {
+  if (getPageCount(project) === 0) {
     return '未开始';
   }
-  const hasImages = project.pages.some(p => p.generated_image_path);
-  if (hasImages) {
+  if (hasPageImages(project)) {
     return '已完成';
   }
-  const hasDescriptions = project.pages.some(p => p.description_content);
-  if (hasDescriptions) {
+  if (hasPageDescriptions(project)) {
     return '待生成图片';
   }
   return '待生成描述';
@@ -95,13 +118,11 @@ export const getProjectRoute = (project: Project): string => {
   const projectId = project.id || project.project_id;
   if (!projectId) return '/';
   
-  if (project.pages && project.pages.length > 0) {
-    const hasImages = project.pages.some(p => p.generated_image_path);
-    if (hasImages) {
+  if (getPageCount(project) > 0) {
+    if (hasPageImages(project)) {
       return `/project/${projectId}/preview`;
     }
-    const hasDescriptions = project.pages.some(p => p.description_content);
-    if (hasDescriptions) {
+    if (hasPageDescriptions(project)) {
       return `/project/${projectId}/detail`;
     }
     return `/project/${projectId}/outline`;
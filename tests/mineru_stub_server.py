@@ -0,0 +1,185 @@
+"""
+Local stand-in for the MinerU batch API
+
+Implements just enough of https://mineru.net/api/v4 to exercise reference file
+parsing without a MinerU account:
+    POST /api/v4/file-urls/batch               -> batch_id + one upload URL per file
+    PUT  /upload/{batch_id}/{index}            -> stores the uploaded file
+    GET  /api/v4/extract-results/batch/{id}    -> waiting-file / running / done / failed
+    GET  /results/{batch_id}/{index}.zip       -> full.md plus one image
+    GET  /stats                                -> request counters (JSON)
+
+A file is "running" for --delay seconds after its upload, then "done". Files
+whose name contains "fail" end up "failed".
+
+Usage:
+    python tests/mineru_stub_server.py --port 8765 --delay 3
+    # backend/.env
+    MINERU_API_BASE=http://127.0.0.1:8765
+    MINERU_TOKEN=anything
+"""
+import argparse
+import io
+import json
+import re
+import threading
+import time
+import uuid
+import zipfile
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# 1x1 PNG
+PNG_PIXEL = bytes.fromhex(
+    '89504e470d0a1a0a0000000d4948445200000001000000010806000000'
+    '1f15c4890000000d49444154789c6360f8cf00000301010018dd8db000'
+    '00000049454e44ae426082'
+)
+
+batches = {}
+stats = Counter()
+lock = threading.Lock()
+
+
+class MinerUStubHandler(BaseHTTPRequestHandler):
+    delay = 3.0
+
+    def _send_json(self, payload, status=200):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _read_body(self) -> bytes:
+        length = int(self.headers.get('Content-Length') or 0)
+        return self.rfile.read(length) if length else b''
+
+    def _authorized(self) -> bool:
+        if not self.headers.get('Authorization', '').startswith('Bearer '):
+            self._send_json({'code': -1, 'msg': 'missing token'}, 401)
+            return False
+        return True
+
+    def do_POST(self):
+        if self.path != '/api/v4/file-urls/batch':
+            return self._send_json({'code': -1, 'msg': 'not found'}, 404)
+        if not self._authorized():
+            return
+        request = json.loads(self._read_body() or b'{}')
+        files = request.get('files') or []
+        batch_id = uuid.uuid4().hex
+        host = self.headers.get('Host')
+        with lock:
+            stats['batches'] += 1
+            stats['files'] += len(files)
+            batches[batch_id] = [
+                {'name': f.get('name'), 'data_id': f.get('data_id'), 'uploaded_at': None, 'size': 0}
+                for f in files
+            ]
+        self._send_json({'code': 0, 'msg': 'ok', 'data': {
+            'batch_id': batch_id,
+            'file_urls': [f"http://{host}/upload/{batch_id}/{i}" for i in range(len(files))],
+        }})
+
+    def do_PUT(self):
+        match = re.fullmatch(r'/upload/(\w+)/(\d+)', self.path)
+        body = self._read_body()
+        with lock:
+            batch = batches.get(match.group(1)) if match else None
+            if batch is None or int(match.group(2)) >= len(batch):
+                self.send_response(404)
+                self.end_headers()
+                return
+            entry = batch[int(match.group(2))]
+            entry['uploaded_at'] = time.time()
+            entry['size'] = len(body)
+            stats['uploads'] += 1
+        self.send_response(200)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def do_GET(self):
+        if self.path == '/stats':
+            with lock:
+                return self._send_json(dict(stats))
+
+        match = re.fullmatch(r'/api/v4/extract-results/batch/(\w+)', self.path)
+        if match:
+            if not self._authorized():
+                return
+            return self._send_results(match.group(1))
+
+        match = re.fullmatch(r'/results/(\w+)/(\d+)\.zip', self.path)
+        if match:
+            return self._send_zip(match.group(1), int(match.group(2)))
+
+        self._send_json({'code': -1, 'msg': 'not found'}, 404)
+
+    def _send_results(self, batch_id: str):
+        host = self.headers.get('Host')
+        with lock:
+            stats['polls'] += 1
+            batch = batches.get(batch_id)
+            if batch is None:
+                return self._send_json({'code': -60012, 'msg': 'batch not found'})
+            results = []
+            for i, entry in enumerate(batch):
+                result = {'file_name': entry['name'], 'data_id': entry['data_id'], 'err_msg': ''}
+                if entry['uploaded_at'] is None:
+                    result['state'] = 'waiting-file'
+                elif time.time() - entry['uploaded_at'] < self.delay:
+                    result['state'] = 'running'
+                elif 'fail' in (entry['name'] or ''):
+                    result['state'] = 'failed'
+                    result['err_msg'] = 'stub: simulated failure'
+                else:
+                    result['state'] = 'done'
+                    result['full_zip_url'] = f"http://{host}/results/{batch_id}/{i}.zip"
+                results.append(result)
+        self._send_json({'code': 0, 'msg': 'ok', 'data': {'batch_id': batch_id, 'extract_result': results}})
+
+    def _send_zip(self, batch_id: str, index: int):
+        with lock:
+            batch = batches.get(batch_id)
+            entry = batch[index] if batch and index < len(batch) else None
+        if entry is None:
+            self.send_response(404)
+            self.end_headers()
+            return
+        image_name = f"images/{uuid.uuid4().hex}{uuid.uuid4().hex}.png"
+        buffer = io.BytesIO()
+        with zipfile.ZipFile(buffer, 'w') as z:
+            z.writestr('full.md', (
+                f"# {entry['name']}\n\n"
+                f"Parsed by the MinerU stand-in ({entry['size']} bytes uploaded).\n\n"
+                f"![]({image_name})\n"
+            ))
+            z.writestr(image_name, PNG_PIXEL)
+        body = buffer.getvalue()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/zip')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Local stand-in for the MinerU batch API')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--delay', type=float, default=3.0, help='seconds a file stays "running" after upload')
+    args = parser.parse_args()
+
+    MinerUStubHandler.delay = args.delay
+    server = ThreadingHTTPServer((args.host, args.port), MinerUStubHandler)
+    print(f"MinerU stand-in listening on http://{args.host}:{args.port} (delay {args.delay}s)")
+    server.serve_forever()
+
+
+if __name__ == '__main__':
+    main()